@@ -9,6 +9,7 @@ from libsf.argutil import SFArgumentParser, GetFirstLine, SFArgFormatter
 from libsf.logutil import GetLogger, SetThreadLogPrefix, logargs
 from libsf.sfclient import SFClient
 from libsf.sfcluster import SFCluster
+from libsf.sfvolgroup import VolgroupBatcher
 from libsf.util import ValidateAndDefault, ItemList, IPv4AddressType, BoolType, StrType, OptionalValueType
 from libsf import sfdefaults
 from libsf import threadutil
@@ -118,10 +119,10 @@ def _ClientThread(mvip, username, password, client_ip, client_user, client_pass,
                 raise
             client_group = cluster.FindVolumeAccessGroup(volgroupName=volgroup_name)
 
-    # Create/modify the group
+    # Create/modify the group.  Clients sharing a group have their initiators added in one combined call
     if iqn not in client_group.initiators:
         log.info("Adding initiator to group {}".format(volgroup_name))
-        client_group.AddInitiators([iqn])
+        VolgroupBatcher.Get(mvip, username, password).AddInitiators(client_group.ID, [iqn])
     else:
         log.passed("Group {} already exists with initiator".format(volgroup_name))
 
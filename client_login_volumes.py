@@ -9,6 +9,7 @@ from libsf.argutil import SFArgumentParser, GetFirstLine, SFArgFormatter
 from libsf.logutil import GetLogger, SetThreadLogPrefix, logargs
 from libsf.sfclient import SFClient, OSType
 from libsf.sfcluster import SFCluster
+from libsf.sfinventory import InventoryFamily
 from libsf.util import ValidateAndDefault, IPv4AddressType, ItemList, SelectionType, OptionalValueType, BoolType, StrType, SolidFireIDType
 from libsf import sfdefaults
 from libsf import SolidFireError
@@ -60,8 +61,11 @@ def ClientLoginVolumes(client_ips,
     """
     log = GetLogger()
 
+    # Get the cluster info and the accounts/groups once, instead of in every client thread
     try:
-        svip = SFCluster(mvip, username, password).GetClusterInfo()["svip"]
+        cluster = SFCluster(mvip, username, password)
+        svip = cluster.GetClusterInfo()["svip"]
+        inventory = cluster.Snapshot(families=[InventoryFamily.Accounts if auth_type == "chap" else InventoryFamily.VolumeAccessGroups])
     except SolidFireError as ex:
         log.error(ex)
         return False
@@ -70,6 +74,7 @@ def ClientLoginVolumes(client_ips,
     allgood = True
     results = []
     pool = threadutil.GlobalPool()
+    progress = threadutil.ProgressReporter(pool.telemetry, "Logging in clients", total=len(client_ips))
     for client_ip in client_ips:
         results.append(pool.Post(_ClientThread, client_ip,
                                                 client_user,
@@ -81,17 +86,16 @@ def ClientLoginVolumes(client_ips,
                                                 target_list,
                                                 clean,
                                                 svip,
-                                                mvip,
-                                                username,
-                                                password))
-
-    for idx, client_ip in enumerate(client_ips):
-        try:
-            results[idx].Get()
-        except SolidFireError as e:
-            log.error("  {}: Failure connecting to volumes: {}".format(client_ip, e))
-            allgood = False
-            continue
+                                                inventory))
+
+    with progress:
+        for idx, client_ip in enumerate(client_ips):
+            try:
+                results[idx].Get()
+            except SolidFireError as e:
+                log.error("  {}: Failure connecting to volumes: {}".format(client_ip, e))
+                allgood = False
+                continue
 
     if allgood:
         log.passed("Successfully logged in to volumes on all clients")
@@ -101,7 +105,8 @@ def ClientLoginVolumes(client_ips,
         return False
 
 @threadutil.threadwrapper
-def _ClientThread(client_ip, client_user, client_pass, auth_type, account_name, account_id, login_order, target_list, clean, svip, mvip, username, password):
+def _ClientThread(client_ip, client_user, client_pass, auth_type, account_name, account_id, login_order, target_list, clean, svip, inventory):
+    """Log in to volumes on a client, run as a thread"""
     log = GetLogger()
     SetThreadLogPrefix(client_ip)
 
@@ -115,32 +120,30 @@ def _ClientThread(client_ip, client_user, client_pass, auth_type, account_name,
         client.CleanIscsi()
 
     expected_volumes = 0
-    cluster = SFCluster(mvip, username, password)
     if auth_type == "chap":
         # If we are using CHAP, find/create the account on the cluster
         if not account_name:
             account_name = client.hostname
         
         # Find the account
-        account = cluster.FindAccount(accountName=account_name, accountID=account_id)
+        account = inventory.FindAccount(accountName=account_name, accountID=account_id)
 
         # If this is a Windows client, make sure the CHAP secret is aphanumeric
         if client.remoteOS == OSType.Windows:
-            if not account.initiatorSecret.isalnum():
+            if not account["initiatorSecret"].isalnum():
                 raise SolidFireError("CHAP secret must be alphanumeric for Windows client")
 
-        log.info("Using account {} with initiator secret {}".format(account.username, account.initiatorSecret))
-        expected_volumes = len(account.volumes)
+        log.info("Using account {} with initiator secret {}".format(account["username"], account["initiatorSecret"]))
+        expected_volumes = len(account["volumes"])
 
         # Setup the CHAP credentials on the client
-        client.SetupCHAP(svip, account.username, account.initiatorSecret)
+        client.SetupCHAP(svip, account["username"], account["initiatorSecret"])
 
     else: # auth_type is volume access group
         client_iqn = client.GetInitiatorIDs()[0]
-        volgroups = cluster.ListVolumeAccessGroups()
-        for group in volgroups:
-            if client_iqn in group.initiators:
-                expected_volumes += len(group.volumes)
+        group = inventory.GetVolumeAccessGroupForInitiator(client_iqn)
+        if group:
+            expected_volumes = len(group["volumes"])
 
     # Do an iSCSI discovery
     log.info("Discovering iSCSI volumes")
@@ -69,14 +69,12 @@ def ClusterAddNodes(node_ips,
 
         if add_drives:
             # Wait for the drives in all the added nodes to be available
-            drive_list = []
-            for node_ip in node_list:
-                log.info("Waiting for available drives in {}".format(node_ip))
-                try:
-                    drive_list += cluster.WaitForAvailableDrives(nodeIP=node_ip)
-                except SolidFireError as e:
-                    log.error("Failed waiting for available drives in {}: {}".format(node_ip, e))
-                    return False
+            log.info("Waiting for available drives in [{}]".format(",".join(node_list)))
+            try:
+                drive_list = cluster.WaitForAvailableDrives(nodeIPs=node_list)
+            except SolidFireError as e:
+                log.error("Failed waiting for available drives in [{}]: {}".format(",".join(node_list), e))
+                return False
 
             # Add the drives from the nodes to the cluster
             log.info("Adding {} drives to cluster".format(len(drive_list)))
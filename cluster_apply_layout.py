@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""
+This action will make the accounts, volumes and volume access groups on a cluster match a layout file
+"""
+
+from libsf.apputil import PythonApp
+from libsf.argutil import SFArgumentParser, GetFirstLine, SFArgFormatter
+from libsf.logutil import GetLogger, logargs
+from libsf.sflayout import ClusterLayout, ApplyLayout
+from libsf.util import ValidateAndDefault, IPv4AddressType, BoolType, StrType
+from libsf import sfdefaults
+from libsf import SolidFireError
+
+@logargs
+@ValidateAndDefault({
+    # "arg_name" : (arg_type, arg_default)
+    "layout" : (StrType, None),
+    "prune" : (BoolType, False),
+    "test" : (BoolType, False),
+    "mvip" : (IPv4AddressType, sfdefaults.mvip),
+    "username" : (StrType, sfdefaults.username),
+    "password" : (StrType, sfdefaults.password),
+})
+def ClusterApplyLayout(layout,
+                       prune,
+                       test,
+                       mvip,
+                       username,
+                       password):
+    """
+    Make the cluster match a layout
+
+    Args:
+        layout:         the JSON file with the layout to apply
+        prune:          remove initiators and volumes from the volume access groups in the layout that the layout does not list
+        test:           show the changes that would be made but don't actually make them
+        mvip:           the management IP of the cluster
+        username:       the admin user of the cluster
+        password:       the admin password of the cluster
+    """
+    log = GetLogger()
+
+    try:
+        desired = ClusterLayout.Load(layout)
+    except SolidFireError as e:
+        log.error("Could not read layout: {}".format(e))
+        return False
+
+    log.info("Comparing the cluster to the layout")
+    try:
+        plan = ApplyLayout(desired, mvip, username, password, prune=prune, test=True)
+    except SolidFireError as e:
+        log.error("Could not compare the cluster to the layout: {}".format(e))
+        return False
+
+    if len(plan) <= 0:
+        log.passed("Cluster already matches the layout")
+        return True
+
+    log.info("{} changes will be made:".format(len(plan)))
+    for step in plan:
+        log.info("  {}".format(step.description))
+
+    if test:
+        log.warning("Test option set; the cluster will not be modified")
+        return True
+
+    try:
+        plan.Execute(mvip, username, password)
+    except SolidFireError as e:
+        log.error("Failed to apply layout: {}".format(e))
+        return False
+
+    log.passed("Successfully applied layout")
+    return True
+
+
+if __name__ == '__main__':
+    parser = SFArgumentParser(description=GetFirstLine(__doc__), formatter_class=SFArgFormatter)
+    parser.add_cluster_mvip_args()
+    parser.add_argument("--layout", type=str, required=True, metavar="FILE", help="the JSON file with the layout to apply")
+    parser.add_argument("--prune", action="store_true", default=False, help="remove initiators and volumes from the groups in the layout that the layout does not list")
+    parser.add_argument("--test", action="store_true", default=False, help="show the changes that would be made but don't actually make them")
+    args = parser.parse_args_to_dict()
+
+    app = PythonApp(ClusterApplyLayout, args)
+    app.Run(**args)
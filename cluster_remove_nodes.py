@@ -56,13 +56,11 @@ def ClusterRemoveNodes(node_ips,
         # Remove the drives
         if remove_drives:
             log.info("Removing drives from nodes [{}]".format(",".join(node_list)))
-            drive_list = []
-            for node_ip in node_list:
-                try:
-                    drive_list.extend(cluster.ListDrives(driveState=DriveState.Active, nodeIP=node_ip))
-                except SolidFireError as ex:
-                    log.error("Failed to get a list of drives in node {}: {}".format(node_ip, ex))
-                    return False
+            try:
+                drive_list = cluster.ListDrives(driveState=DriveState.Active, nodeIP=node_list)
+            except SolidFireError as ex:
+                log.error("Failed to get a list of drives in nodes [{}]: {}".format(",".join(node_list), ex))
+                return False
             if drive_list:
                 try:
                     cluster.RemoveDrives(drive_list, waitForSync=True)
@@ -65,7 +65,7 @@ def ClusterSaveReports(dest,
 
         log.info("Saving reports")
         timestamp = TimestampToStr(time.time(), "%Y-%m-%d_%H.%M.%S")
-        pool = threadutil.ThreadPool(maxThreads=len(reports))
+        pool = threadutil.IOPool()
         results = []
         report_files = []
         for rep in reports:
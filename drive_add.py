@@ -69,11 +69,17 @@ def DriveAdd(node_ips,
     node_ids = [nodeip2nodeid[node_ip] for node_ip in node_ips]
 
     try:
-        drive_list = cluster.ListDrives()
+        drive_index = cluster.GetDriveIndex()
     except SolidFireError as e:
         log.error("Failed to list drives: {}".format(e))
         return False
 
+    def _SelectDrives(nodeIDs):
+        drives = drive_index.Get(driveState=DriveState.Available, nodeID=nodeIDs)
+        if drive_slots:
+            drives = [drive for drive in drives if drive["slot"] in drive_slots]
+        return drives
+
     # Make a list of drives to add
     # add_drives is a dictionary where the keys are the node IP and the value is the list of available drives from that node. 
     # Drives will then be added in the order of node_ips argument passed in.
@@ -81,25 +87,13 @@ def DriveAdd(node_ips,
     add_drives = {}
     if by_node:
         for node_ip in node_ips:
-            add_drives[node_ip] = []
-            if drive_slots:
-                add_drives[node_ip] = [drive for drive in drive_list if drive["status"] == DriveState.Available and \
-                                                                        drive["nodeID"] == nodeip2nodeid[node_ip] and \
-                                                                        drive["slot"] in drive_slots]
-            else:
-                add_drives[node_ip] = [drive for drive in drive_list if drive["status"] == DriveState.Available and \
-                                                                        drive["nodeID"] == nodeip2nodeid[node_ip]]
+            add_drives[node_ip] = _SelectDrives(nodeip2nodeid[node_ip])
     else:
-        add_drives["all"] = []
         if not drive_slots:
             log.info("Getting drives from nodes [{}]".format(",".join(node_ips)))
-            add_drives["all"] = [drive for drive in drive_list if drive["status"] == DriveState.Available and \
-                                                                  drive["nodeID"] in node_ids]
         else:
             log.info("Getting drives in slots [{}] from nodes [{}]".format(",".join([str(s) for s in sorted(drive_slots)]), ",".join(node_ips)))
-            add_drives["all"] = [drive for drive in drive_list if drive["status"] == DriveState.Available and \
-                                                                  drive["nodeID"] in node_ids and \
-                                                                  drive["slot"] in drive_slots]
+        add_drives["all"] = _SelectDrives(node_ids)
 
     # Add the drives
     for node in add_drives.keys():
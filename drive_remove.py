@@ -65,11 +65,17 @@ def DriveRemove(node_ips,
     node_ids = [nodeip2nodeid[node_ip] for node_ip in node_ips]
 
     try:
-        drive_list = cluster.ListDrives()
+        drive_index = cluster.GetDriveIndex()
     except SolidFireError as e:
         log.error("Failed to list drives: {}".format(e))
         return False
 
+    def _SelectDrives(nodeIDs):
+        drives = drive_index.Get(driveState=DriveState.Active, nodeID=nodeIDs)
+        if drive_slots:
+            drives = [drive for drive in drives if drive["slot"] in drive_slots]
+        return drives
+
     # Make a list of drives to remove
     # rem_drives is a dictionary where the keys are the node IP and the value is the list of drives to remove from that node. 
     # Drives will then be removed in the order of node_ips argument passed in.
@@ -77,25 +83,13 @@ def DriveRemove(node_ips,
     rem_drives = {}
     if by_node:
         for node_ip in node_ips:
-            rem_drives[node_ip] = []
-            if drive_slots:
-                rem_drives[node_ip] = [drive for drive in drive_list if drive["status"] == DriveState.Active and \
-                                                                        drive["nodeID"] == nodeip2nodeid[node_ip] and \
-                                                                        drive["slot"] in drive_slots]
-            else:
-                rem_drives[node_ip] = [drive for drive in drive_list if drive["status"] == DriveState.Active and \
-                                                                        drive["nodeID"] == nodeip2nodeid[node_ip]]
+            rem_drives[node_ip] = _SelectDrives(nodeip2nodeid[node_ip])
     else:
-        rem_drives["all"] = []
         if not drive_slots:
             log.info("Getting drives from nodes [{}]".format(",".join(node_ips)))
-            rem_drives["all"] = [drive for drive in drive_list if drive["status"] == DriveState.Active and \
-                                                                  drive["nodeID"] in node_ids]
         else:
             log.info("Getting drives in slots [{}] from nodes [{}]".format(",".join([str(s) for s in sorted(drive_slots)]), ",".join(node_ips)))
-            rem_drives["all"] = [drive for drive in drive_list if drive["status"] == DriveState.Active and \
-                                                                  drive["nodeID"] in node_ids and \
-                                                                  drive["slot"] in drive_slots]
+        rem_drives["all"] = _SelectDrives(node_ids)
 
     # Add the drives
     for node in rem_drives.keys():
@@ -44,19 +44,19 @@ def DriveVerifyCount(expected,
 
     # Get the list of drives
     try:
-        drives = SFCluster(mvip, username, password).ListDrives(driveState=state)
+        drive_count = SFCluster(mvip, username, password).GetDriveIndex().Count(driveState=state)
     except SolidFireError as e:
         log.error("Failed to list drives: {}".format(e))
         return False
 
-    expression = "{}{}{}".format(len(drives), op, expected)
+    expression = "{}{}{}".format(drive_count, op, expected)
     log.debug("Evaluating expression {}".format(expression))
     result = eval(expression)
     if result:
-        log.passed("Found {} drives in {} state".format(len(drives), state))
+        log.passed("Found {} drives in {} state".format(drive_count, state))
         return True
     else:
-        log.error("Found {} drives in {} state".format(len(drives), state))
+        log.error("Found {} drives in {} state".format(drive_count, state))
         return False
 
 if __name__ == '__main__':
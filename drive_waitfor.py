@@ -11,8 +11,7 @@ from libsf.logutil import GetLogger, logargs
 from libsf.sfcluster import SFCluster
 from libsf.util import ValidateAndDefault, IPv4AddressType, CountType, ItemList, SelectionType, StrType, PositiveIntegerType
 from libsf import sfdefaults
-from libsf import SolidFireError
-import time
+from libsf import SolidFireError, SFTimeoutError
 
 @logargs
 @ValidateAndDefault({
@@ -45,32 +44,28 @@ def DriveWaitfor(expected,
     op = sfdefaults.all_compare_ops[compare]
 
     log.info("Waiting for {}{} drives in state [{}]...".format(op, expected, ",".join(states)))
-    start_time = time.time()
-    last_count = 0
-    while True:
-        if time.time() - start_time > timeout:
-            log.error("Timeout waiting for drives")
-            return False
+    found = {"count" : 0}
+    def _CheckDrives(index):
+        count = index.Count(driveState=states)
+        if count != found["count"]:
+            log.info("  Found {} drives".format(count))
+            found["count"] = count
 
-        try:
-            drives = SFCluster(mvip, username, password).ListDrives(driveState=states)
-        except SolidFireError as e:
-            log.error("Failed to list drives: {}".format(e))
-            return False
-
-        if len(drives) != last_count:
-            log.info("  Found {} drives".format(len(drives)))
-            last_count = len(drives)
-
-        expression = "{}{}{}".format(len(drives), op, expected)
+        expression = "{}{}{}".format(count, op, expected)
         log.debug("Evaluating expression {}".format(expression))
-        result = eval(expression)
+        return eval(expression)
 
-        if result:
-            log.passed("Successfully waited for drives")
-            return True
+    try:
+        SFCluster(mvip, username, password).WaitForDrives(_CheckDrives, timeout=timeout)
+    except SFTimeoutError:
+        log.error("Timeout waiting for drives")
+        return False
+    except SolidFireError as e:
+        log.error("Failed to list drives: {}".format(e))
+        return False
 
-        time.sleep(sfdefaults.TIME_SECOND * 20)
+    log.passed("Successfully waited for drives")
+    return True
 
 
 if __name__ == '__main__':
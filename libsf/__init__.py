@@ -10,8 +10,10 @@ import sys
 if sys.version[0] == '2':
     import warnings
     warnings.filterwarnings('ignore')
+import atexit
 import base64
 import six.moves.BaseHTTPServer
+import contextlib
 import copy
 import six.moves.http_client
 import inspect
@@ -22,13 +24,14 @@ import paramiko
 import random
 import socket
 import ssl
-import time
+import threading
 import six.moves.urllib.parse
 import six.moves.urllib.error
 # For some reason pylint 1.9 in python2.7 chokes on this import line
 import six.moves.urllib.request #pylint: disable=import-error
 
 from .logutil import GetLogger
+from . import clockutil
 from . import sfdefaults
 
 class SolidFireError(Exception):
@@ -62,6 +65,9 @@ class UnknownNodeError(UnknownObjectError):
 class SFTimeoutError(SolidFireError):
     """Exception raised when a timeout expires"""
 
+class SFCancelledError(SolidFireError):
+    """Exception raised when an operation is cancelled"""
+
 class SolidFireAPIError(SolidFireError):
     """Exception raised when an error is returned from a SolidFire API call"""
 
@@ -282,7 +288,7 @@ class LocalEnvironmentError(SolidFireError):
         assert(hasattr(innerException, 'errno'))
         assert(hasattr(innerException, 'strerror'))
 
-        self.args = (innerException)
+        self.args = (innerException,)
 
         if innerException.strerror:
             self.message = innerException.strerror.strip()
@@ -482,6 +488,33 @@ class HTTPDownloader(object):
                                    useSSL=pieces.scheme == "https",
                                    timeout=timeout)
 
+# API methods that start clone or copy jobs on the cluster, which are much heavier than other modifying calls
+CLONE_API_METHODS = [
+    "CloneMultipleVolumes",
+    "CloneVolume",
+    "CopyVolume",
+    "CreateGroupSnapshot",
+    "CreateSnapshot",
+    "RollbackToGroupSnapshot",
+    "RollbackToSnapshot",
+]
+
+def GetAPIMethodClass(methodName):
+    """
+    Get the class of an API method for rate limiting
+
+    Args:
+        methodName:     the name of the API method (str)
+
+    Returns:
+        "read", "write" or "clone" (str)
+    """
+    if methodName in CLONE_API_METHODS:
+        return "clone"
+    if methodName.startswith("List") or methodName.startswith("Get"):
+        return "read"
+    return "write"
+
 class SolidFireAPI(object):
     """
     Base class for making SolidFire API calls - do not instantiate directly
@@ -542,9 +575,12 @@ class SolidFireAPI(object):
             timeout:        how long to wait for the call before abandoning the connection
         Returns:
             The API response dictionary
+
+        The call gives up early if the calling thread is cancelled, and never waits past the calling thread's deadline
         """
 
         apiVersion = apiVersion or self.minApiVersion
+        token = _threadutil.CurrentToken()
         retryCount = 0
         errorCount = 0
         lastErrorMessage = ''
@@ -552,14 +588,15 @@ class SolidFireAPI(object):
             if errorCount >= self.errorLogThreshold and errorCount % self.errorLogRepeat == 0:
                 self.log.error(lastErrorMessage)
 
+            token.Check()
             try:
-                return self._Call(methodName, methodParams, apiVersion, timeout)
+                return self._Call(methodName, methodParams, apiVersion, token.Remaining(timeout))
             except SolidFireError as ex:
                 if retryCount < self.maxRetryCount and ex.IsRetryable():
                     retryCount += 1
                     errorCount += 1
                     lastErrorMessage = str(ex)
-                    time.sleep(self.retrySleep)
+                    token.Sleep(self.retrySleep)
                     continue
                 raise
             except Exception as ex:
@@ -567,6 +604,33 @@ class SolidFireAPI(object):
                 raise
 
     def _Call(self, methodName, methodParams=None, apiVersion=None, timeout=180):
+        """Call a SolidFire API method, waiting for the rate limit for its class of method and for room under the adaptive
+        concurrency limit for the endpoint first
+        Arguments:
+            methodName:     The method to call
+            methodparams:   dictionary of parameters for the call
+            apiVersion:     API endpoint version to use
+            timeout:        how long to wait for the call before abandoning the connection
+        Returns:
+            The API response dictionary
+        """
+        method_class = GetAPIMethodClass(methodName)
+        bucket = _threadutil.TokenBucket.Get((self.server, method_class),
+                                             getattr(sfdefaults, "api_{}_rate".format(method_class)),
+                                             getattr(sfdefaults, "api_{}_burst".format(method_class)))
+        if bucket:
+            waited = bucket.Take()
+            if waited > 0:
+                self.log.debug2("Waited {:.2f}s for the {} API rate limit on {}".format(waited, method_class, self.server))
+
+        # Overrides from the environment are strings, so parse the setting instead of testing if it is truthy
+        if not _util.BoolType(sfdefaults.api_adaptive_concurrency, "api_adaptive_concurrency"):
+            return self._SendCall(methodName, methodParams, apiVersion, timeout)
+
+        with _threadutil.AdaptiveLimiter.Get((self.server, self.port)).Slot(methodName):
+            return self._SendCall(methodName, methodParams, apiVersion, timeout)
+
+    def _SendCall(self, methodName, methodParams=None, apiVersion=None, timeout=180):
         """Call a SolidFire API method
         Arguments:
             methodName:     The method to call
@@ -1001,7 +1065,10 @@ class SolidFireNodeAPI(SolidFireAPI):
 #pylint: enable=method-hidden
 
 class SSHConnection(object):
-    """Helper class for making SSH connections and running commands on nodes/clients"""
+    """
+    Helper class for making SSH connections and running commands on nodes/clients.
+    Each command runs on its own channel, so many threads can run commands over one connection at the same time
+    """
 
     def __init__(self, ipAddress, username, password, keyfile=None):
         """
@@ -1021,6 +1088,12 @@ class SSHConnection(object):
         self.client.load_system_host_keys()
         self.keyfile = None
         self.log = GetLogger()
+        self.lastUsed = clockutil.Time()
+        self.activeCount = 0
+        self.retired = False
+        self._sftp = None
+        self._sftpLock = threading.Lock()
+        self._lock = threading.Lock()
 
         # Try to find a default keyfile on Windows
         if not keyfile and sys.platform.startswith("win"):
@@ -1046,16 +1119,16 @@ class SSHConnection(object):
         Create the SSH connection
         """
         try:
-            self.client.connect(self.ipAddress, username=self.username, password=self.password, key_filename=self.keyfile)
+            try:
+                self.client.connect(self.ipAddress, username=self.username, password=self.password, key_filename=self.keyfile)
+            except paramiko.AuthenticationException:
+                # If a password was given, try again without the keyfile
+                if not self.keyfile or not self.password:
+                    raise
+                self.client.connect(self.ipAddress, username=self.username, password=self.password)
+            self.client.get_transport().set_keepalive(int(sfdefaults.ssh_keepalive_interval))
             return self
         except paramiko.AuthenticationException:
-            # If a password was given, try again without the keyfile
-            if self.keyfile and self.password:
-                try:
-                    self.client.connect(self.ipAddress, username=self.username, password=self.password)
-                    return self
-                except paramiko.AuthenticationException:
-                    pass
             raise UnauthorizedError.IPContext(self.ipAddress)
         except paramiko.SSHException as e:
             raise SolidFireError("SSH error connecting to {}: {}".format(self.ipAddress, e))
@@ -1075,9 +1148,42 @@ class SSHConnection(object):
         """
         Close the SSH connection
         """
-        if self.client:
-            self.client.close()
-            self.client = None
+        with self._lock:
+            client, self.client = self.client, None
+            sftp, self._sftp = self._sftp, None
+        if sftp:
+            sftp.close()
+        if client:
+            client.close()
+
+    def Retire(self):
+        """
+        Close the SSH connection once the operations running on it have finished, or right away if there are none
+        """
+        with self._lock:
+            self.retired = True
+            idle = self.activeCount <= 0
+        if idle:
+            self.Close()
+
+    @contextlib.contextmanager
+    def _Using(self):
+        """
+        Keep track of an operation on the connection, so the pool does not close it as idle while the operation runs and
+        a retired connection is closed when its last operation finishes
+        """
+        with self._lock:
+            self.activeCount += 1
+            self.lastUsed = clockutil.Time()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.activeCount -= 1
+                self.lastUsed = clockutil.Time()
+                finished = self.retired and self.activeCount <= 0
+            if finished:
+                self.Close()
 
     def RunCommand(self, command, exceptOnError=True, pipeFail=True):
         """
@@ -1089,6 +1195,8 @@ class SSHConnection(object):
 
         Returns:
             A tuple of (return code, stdout, stderr)
+
+        The command is abandoned if the calling thread is cancelled or passes its deadline while it runs
         """
         if not self.client:
             raise SolidFireError("SSH session is not connected")
@@ -1098,10 +1206,21 @@ class SSHConnection(object):
             cmd = "set -o pipefail; {}".format(command)
         else:
             cmd = command
-        _, stdout, stderr = self.client.exec_command(cmd)
-        retcode = stdout.channel.recv_exit_status()
-        stdout_data = "".join(stdout.readlines())
-        stderr_data = "".join(stderr.readlines())
+        token = _threadutil.CurrentToken()
+        token.Check()
+        with self._Using():
+            _, stdout, stderr = self.client.exec_command(cmd, timeout=token.Remaining())
+            try:
+                # Wake up as soon as the command exits, and in between check often enough to notice cancellation
+                while not stdout.channel.status_event.wait(token.Remaining(_threadutil.CancellationToken.POLL_INTERVAL)):
+                    token.Check()
+            except SolidFireError:
+                self.log.debug2("Abandoning remote command=[{}] on host={}".format(command, self.ipAddress))
+                stdout.channel.close()
+                raise
+            retcode = stdout.channel.recv_exit_status()
+            stdout_data = "".join(stdout.readlines())
+            stderr_data = "".join(stderr.readlines())
 
         self.log.debug2("retcode=[{}] stdout=[{}] stderr=[{}] host=[{}]".format(retcode, stdout_data.rstrip("\n"), stderr_data.rstrip("\n"), self.ipAddress))
 
@@ -1122,12 +1241,142 @@ class SSHConnection(object):
 
         self.log.debug2("Copying localPath=[{}] to host={} remotePath=[{}]".format(localPath, self.ipAddress, remotePath))
         try:
-            sftp = self.client.open_sftp()
-            sftp.put(localPath, remotePath)
-            sftp.close()
+            # One SFTP session is opened the first time it is needed and kept for the life of the connection.  The
+            # session handles one transfer at a time, so transfers from different threads take turns
+            with self._Using(), self._sftpLock:
+                if not self._sftp:
+                    self._sftp = self.client.open_sftp()
+                self._sftp.put(localPath, remotePath)
         except paramiko.SSHException as e:
             raise SolidFireError("SFTP error connecting to {}: {}".format(self.ipAddress, e))
 
+class SSHConnectionPool(object):
+    """
+    Keep SSH connections open between uses, so each command does not pay for a new handshake and login.
+    Connections are kept by (host, username, password, keyfile) and shared by every thread that asks for the same one,
+    with each command running on its own channel.  Connections that have died are replaced the next time they are asked
+    for, and connections that have been unused for sfdefaults.ssh_idle_timeout seconds are closed.  A connection taken
+    out of the pool is only closed after the commands other threads are running on it finish.
+    """
+
+    _shared = None
+    _sharedLock = threading.Lock()
+
+    # Errors that mean the connection itself is broken, rather than the command that was run over it
+    CONNECTION_ERRORS = (paramiko.SSHException, socket.error, EOFError)
+
+    def __init__(self):
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def Shared(cls):
+        """
+        Get the pool shared by the whole process
+
+        Returns:
+            SSHConnectionPool
+        """
+        with cls._sharedLock:
+            if cls._shared is None:
+                cls._shared = SSHConnectionPool()
+                atexit.register(cls._shared.CloseAll)
+            return cls._shared
+
+    def Get(self, ipAddress, username, password, keyfile=None):
+        """
+        Get an open connection, connecting if there is not already a live one
+
+        Args:
+            ipAddress:      the address of the server
+            username:       the username to use to connect
+            password:       the password to use to connect
+            keyfile:        filename of RSA key to use to connect
+
+        Returns:
+            A connected SSHConnection
+        """
+        key = (ipAddress, username, password, keyfile)
+        stale = self._EvictIdle()
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection and not connection.IsAlive():
+                stale.append(self._connections.pop(key))
+                connection = None
+            if connection:
+                connection.lastUsed = clockutil.Time()
+        for old in stale:
+            old.Retire()
+        if connection:
+            return connection
+
+        # Connect without holding the lock so connecting to one host does not hold up the others
+        connection = SSHConnection(ipAddress, username, password, keyfile).Connect()
+        with self._lock:
+            existing = self._connections.get(key)
+            if existing and existing.IsAlive():
+                # Another thread connected first
+                stale = [connection]
+                connection = existing
+            else:
+                stale = [existing] if existing else []
+                self._connections[key] = connection
+        for old in stale:
+            old.Retire()
+        return connection
+
+    @contextlib.contextmanager
+    def Session(self, ipAddress, username, password, keyfile=None):
+        """
+        Context manager that gives an open connection for the duration of the block.  The connection stays open for the next
+        user afterwards, unless the block failed because the connection broke.  The arguments are the same as Get
+        """
+        connection = self.Get(ipAddress, username, password, keyfile)
+        try:
+            yield connection
+        except self.CONNECTION_ERRORS:
+            self.Discard(connection)
+            raise
+
+    def Discard(self, connection):
+        """
+        Stop sharing a connection, for instance because the host is going to reboot.  The connection is closed once the
+        commands and transfers other threads are running on it finish
+
+        Args:
+            connection:     the connection to discard (SSHConnection)
+        """
+        with self._lock:
+            for key, pooled in list(self._connections.items()):
+                if pooled is connection:
+                    del self._connections[key]
+        connection.Retire()
+
+    def _EvictIdle(self):
+        """
+        Take the connections that have been unused too long out of the pool
+
+        Returns:
+            A list of the connections to close (list of SSHConnection)
+        """
+        cutoff = clockutil.Time() - float(sfdefaults.ssh_idle_timeout)
+        idle = []
+        with self._lock:
+            for key, connection in list(self._connections.items()):
+                if connection.activeCount <= 0 and connection.lastUsed < cutoff:
+                    idle.append(self._connections.pop(key))
+        return idle
+
+    def CloseAll(self):
+        """
+        Close all of the connections in the pool
+        """
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections = {}
+        for connection in connections:
+            connection.Close()
+
 
 def GetHighestAPIVersion(mvip, username, password):
     """
@@ -1151,7 +1400,8 @@ def GetHighestAPIVersion(mvip, username, password):
     except ValueError: # Format must have changed, assume an early version
         return 5.0
 
-
-
+# threadutil and util use the exceptions above, so they can only be imported once they are defined
+from . import threadutil as _threadutil #pylint: disable=wrong-import-position
+from . import util as _util #pylint: disable=wrong-import-position
 
 #pylint: enable=unidiomatic-typecheck,protected-access,global-statement
@@ -145,8 +145,12 @@ class PythonApp(object):
         else:
             self.log.HideDebug()
 
-        sfdefaults.parallel_calls_max = self.PopOption("parallel_max")
-        sfdefaults.parallel_calls_min = self.PopOption("parallel_min")
+        parallel_max = self.PopOption("parallel_max")
+        if parallel_max:
+            sfdefaults.concurrency = parallel_max
+        parallel_min = self.PopOption("parallel_min")
+        if parallel_min:
+            sfdefaults.parallel_calls_min = parallel_min
 
     def PopOption(self, optionName):
         """Remove and return the value of an option passed from the command line"""
@@ -201,6 +205,9 @@ class PythonApp(object):
             self.Abort()
             sys.exit(1)
 
+        for name, (wait_time, wait_count) in threadutil.TokenBucket.WaitStats().items():
+            self.log.info("Rate limit {} held back {} API calls for a total of {:.1f}s".format(name, wait_count, wait_time))
+
         # Determine exit code based on return value. We explicitly use type() vs isinstance() because bool is a child of int
         if type(result) == int:
             sys.exit(result)
@@ -1698,7 +1698,7 @@ class SFArgumentParser(_AttributeHolder, _ActionsContainer):
                           help=SUPPRESS)
         self.add_argument(default_prefix*2+"parallel-max",
                           type=int,
-                          default=_sfdefaults.parallel_calls_max,
+                          default=_sfdefaults.concurrency,
                           metavar="COUNT",
                           help=SUPPRESS)
 
@@ -2542,7 +2542,11 @@ class SFArgumentParser(_AttributeHolder, _ActionsContainer):
 
     def add_parallel_args(self):
         self.add_argument("--parallel-min", type=int, default=_sfdefaults.parallel_calls_min, metavar="COUNT", help="run operations in parallel using multiple threads if there are at least this many")
-        self.add_argument("--parallel-max", type=int, default=_sfdefaults.parallel_calls_max, metavar="COUNT", help="run at most this many operations in parallel")
+        self.add_argument("--parallel-max", type=int, default=_sfdefaults.concurrency, metavar="COUNT", help="run at most this many operations in parallel")
+
+    def add_resume_args(self):
+        """Add resume arg"""
+        self.add_argument("--resume", type=str, metavar="JOURNAL", help="resume an interrupted run from its journal, skipping the items that already finished")
 
     def add_console_format_args(self):
         ex_args = self.add_mutually_exclusive_group()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+The source of time for all of the waits in libsf, so that long workflows can be run against simulated time
+"""
+
+import contextlib
+import threading
+import time
+
+class Clock(object):
+    """Interface for a source of time"""
+
+    def Time(self):
+        """
+        Get the current time
+
+        Returns:
+            Seconds since the epoch (float)
+        """
+        raise NotImplementedError()
+
+    def Wait(self, event, seconds):
+        """
+        Let time pass, returning early if an event is set
+
+        Args:
+            event:      the event to wake up for, or None to sleep the whole time (threading.Event)
+            seconds:    how long to wait (float)
+
+        Returns:
+            Boolean true if the event is set, false otherwise
+        """
+        raise NotImplementedError()
+
+class RealClock(Clock):
+    """Wall clock time"""
+
+    def Time(self):
+        return time.time()
+
+    def Wait(self, event, seconds):
+        if event is None:
+            time.sleep(max(0, seconds))
+            return False
+        return event.wait(max(0, seconds))
+
+class VirtualClock(Clock):
+    """
+    Simulated time that only moves forward when something waits, so a workflow that would take hours runs as fast as
+    the calls it makes.  Waits from different threads each advance the clock, so this is meant for workflows that wait
+    from one thread at a time
+    """
+
+    def __init__(self, start=None):
+        """
+        Args:
+            start:  the time to start the clock at, defaults to now (float)
+        """
+        self.now = time.time() if start is None else start
+        self.waitCount = 0
+        self.waitTime = 0
+        self._lock = threading.Lock()
+
+    def Time(self):
+        with self._lock:
+            return self.now
+
+    def Wait(self, event, seconds):
+        if event is not None and event.is_set():
+            return True
+        self.Advance(seconds)
+        return event is not None and event.is_set()
+
+    def Advance(self, seconds):
+        """
+        Move the clock forward
+
+        Args:
+            seconds:    how far to move the clock (float)
+        """
+        seconds = max(0, seconds)
+        with self._lock:
+            self.now += seconds
+            self.waitCount += 1
+            self.waitTime += seconds
+
+_clock = RealClock()
+
+def GetClock():
+    """
+    Get the clock in use
+
+    Returns:
+        Clock
+    """
+    return _clock
+
+def SetClock(clock):
+    """
+    Change the clock in use
+
+    Args:
+        clock:  the clock to use from now on (Clock)
+
+    Returns:
+        The clock that was in use before (Clock)
+    """
+    global _clock #pylint: disable=global-statement
+    previous, _clock = _clock, clock
+    return previous
+
+@contextlib.contextmanager
+def UseClock(clock):
+    """
+    Context manager that uses a clock for the duration of the block
+
+    Args:
+        clock:  the clock to use (Clock)
+    """
+    previous = SetClock(clock)
+    try:
+        yield clock
+    finally:
+        SetClock(previous)
+
+def Time():
+    """
+    Get the current time from the clock in use
+
+    Returns:
+        Seconds since the epoch (float)
+    """
+    return _clock.Time()
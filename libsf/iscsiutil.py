@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+Parsers for open-iscsi command output
+"""
+
+class IscsiSession(object):
+    """One iSCSI session from iscsiadm -m session -P 3"""
+
+    __slots__ = ["iqn", "portal", "port", "sid", "connectionState", "sessionState", "hostNumber", "devices", "deviceStates"]
+
+    def __init__(self, iqn, portal=None, port=None):
+        """
+        Args:
+            iqn:        the target IQN (str)
+            portal:     the IP address of the current portal (str)
+            port:       the TCP port of the current portal (int)
+        """
+        self.iqn = iqn
+        self.portal = portal
+        self.port = port
+        self.sid = None
+        self.connectionState = None
+        self.sessionState = None
+        self.hostNumber = None
+        self.devices = []
+        self.deviceStates = []
+
+    @property
+    def device(self):
+        """The full path of the last SCSI disk attached to the session, or None if there are no disks (str)"""
+        return "/dev/" + self.devices[-1] if self.devices else None
+
+    def ToDict(self):
+        """
+        Get the session as a dictionary
+
+        Returns:
+            A dictionary of string attribute name => value
+        """
+        return {key : getattr(self, key) for key in self.__slots__}
+
+    def __repr__(self):
+        return "IscsiSession(iqn={}, portal={}, sid={}, state={}, devices={})".format(self.iqn, self.portal, self.sid, self.sessionState, self.devices)
+
+def _SplitPortal(value):
+    """
+    Split an iscsiadm portal like 10.1.1.1:3260,1 or [fe80::1]:3260,1 into the address and port
+    """
+    address, _, port = value.partition(",")[0].rpartition(":")
+    if address.startswith("["):
+        address = address[1:-1]
+    try:
+        return address, int(port)
+    except ValueError:
+        return address, None
+
+def _ToInt(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+# Session attribute lines that are kept, as label => (attribute, conversion)
+_SESSION_FIELDS = {
+    "SID" : ("sid", _ToInt),
+    "iSCSI Connection State" : ("connectionState", str),
+    "iSCSI Session State" : ("sessionState", str),
+}
+
+_DISK_PREFIX = "Attached scsi disk "
+_HOST_PREFIX = "Host Number: "
+
+def ParseSessions(text):
+    """
+    Parse the output of iscsiadm -m session -P 3 in a single pass.  Each Target line may be followed by several
+    sessions, each starting at its Current Portal line, and each session may have several disks attached.  Output that
+    has been filtered down to the interesting lines, for example with egrep 'Target:|Portal:|State:|SID:|disk', parses
+    the same as the full output
+
+    Args:
+        text:   the output to parse (str)
+
+    Returns:
+        A list of IscsiSession in the order they appear
+    """
+    sessions = []
+    iqn = None
+    session = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line[0] == "*":
+            continue
+
+        if line.startswith("Target: "):
+            # Drop the (non-flash) suffix newer versions of open-iscsi add
+            iqn = line[8:].split(None, 1)[0]
+            session = None
+            continue
+        if iqn is None:
+            continue
+
+        if line.startswith("Current Portal: "):
+            session = IscsiSession(iqn, *_SplitPortal(line[16:].strip()))
+            sessions.append(session)
+            continue
+        if session is None:
+            continue
+
+        if line.startswith(_DISK_PREFIX):
+            # Attached scsi disk sdb		State: running
+            fields = line[len(_DISK_PREFIX):].split()
+            session.devices.append(fields[0])
+            session.deviceStates.append(fields[-1] if len(fields) > 2 else None)
+            continue
+        if line.startswith(_HOST_PREFIX):
+            # Host Number: 3	State: running
+            session.hostNumber = _ToInt(line[len(_HOST_PREFIX):].split(None, 1)[0])
+            continue
+
+        label, sep, value = line.partition(": ")
+        if not sep:
+            continue
+        field = _SESSION_FIELDS.get(label)
+        if field:
+            setattr(session, field[0], field[1](value.strip()))
+
+    return sessions
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+"""
+Append-only journal of the work items in a bulk operation, so an interrupted run can be resumed without repeating
+the items that already finished
+"""
+
+import collections
+import datetime
+import json
+import os
+import tempfile
+import threading
+from io import open
+import six
+from . import sfdefaults
+from . import SolidFireError, LocalEnvironmentError
+from .logutil import GetLogger
+
+class BulkJournal(object):
+    """
+    Journal of the planned and completed items of a bulk operation
+
+    The journal is a JSON lines file.  The first line names the operation and carries the parameters shared by all of
+    the items, followed by one line per planned item and then one line for each item as it is started, finished or
+    fails.  Only whole lines are ever appended, so a run that dies partway through a write only loses that last line
+    """
+
+    def __init__(self, path, operation):
+        self.path = path
+        self.operation = operation
+        self.params = {}
+        self.planned = collections.OrderedDict()
+        self.completed = {}
+        self.failed = {}
+        self.started = set()
+        self.log = GetLogger()
+        self._lock = threading.Lock()
+        self._file = None
+
+    @staticmethod
+    def Create(operation, items, params=None, journalDir=None):
+        """
+        Start a new journal for a bulk operation
+
+        Args:
+            operation:  the name of the operation (string)
+            items:      the items to journal, in order.  Either a list of keys or a dictionary of key => item data (list or dict)
+            params:     the parameters shared by all of the items (dict)
+            journalDir: the directory to create the journal in.  Defaults to sfdefaults.journal_dir (string)
+
+        Returns:
+            A BulkJournal object
+        """
+        try:
+            handle, path = tempfile.mkstemp(prefix="{}-{}-".format(operation, datetime.datetime.now().strftime("%Y%m%d%H%M%S")),
+                                            suffix=".journal",
+                                            dir=journalDir or sfdefaults.journal_dir)
+            os.close(handle)
+        except EnvironmentError as e:
+            raise LocalEnvironmentError(e)
+        journal = BulkJournal(path, operation)
+        journal.params = params or {}
+        if not isinstance(items, dict):
+            items = collections.OrderedDict([(key, None) for key in items])
+
+        records = [{"event" : "begin", "operation" : operation, "params" : journal.params}]
+        for key, data in six.iteritems(items):
+            journal.planned[key] = data
+            records.append({"event" : "plan", "key" : key, "data" : data})
+        journal._Append(records)
+        journal.log.info("Journaling progress to {}".format(path))
+        return journal
+
+    @staticmethod
+    def Resume(path, operation):
+        """
+        Open an existing journal to continue the operation it describes
+
+        Args:
+            path:       the journal file to resume from (string)
+            operation:  the name of the operation that is resuming, which must match the journal (string)
+
+        Returns:
+            A BulkJournal object
+        """
+        journal = BulkJournal(path, operation)
+        try:
+            with open(path, "r", encoding="utf-8") as journal_file:
+                lines = journal_file.readlines()
+        except EnvironmentError as e:
+            raise LocalEnvironmentError(e)
+
+        for idx, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # The last line may have been cut off when the previous run died
+                if idx == len(lines) - 1:
+                    break
+                raise SolidFireError("Journal {} is corrupt at line {}".format(path, idx + 1))
+            journal._Replay(record)
+
+        if not lines or journal.operation != operation:
+            raise SolidFireError("Journal {} is not for a {} operation".format(path, operation))
+
+        journal.log.info("Resuming from journal {}: {} of {} items already finished".format(path, len(journal.completed), len(journal.planned)))
+        return journal
+
+    def _Replay(self, record):
+        """Apply one journal record to the in-memory state"""
+        event = record.get("event")
+        key = record.get("key")
+        if event == "begin":
+            self.operation = record["operation"]
+            self.params = record.get("params") or {}
+        elif event == "plan":
+            self.planned[key] = record.get("data")
+        elif event == "start":
+            self.started.add(key)
+            self.failed.pop(key, None)
+        elif event == "done":
+            self.completed[key] = record.get("result")
+            self.started.discard(key)
+        elif event == "fail":
+            self.failed[key] = record.get("error")
+            self.started.discard(key)
+
+    def _Append(self, records):
+        """Apply and append a list of records to the journal file"""
+        with self._lock:
+            for record in records:
+                if record["event"] != "plan":
+                    self._Replay(record)
+            try:
+                if not self._file:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write("".join([six.text_type(json.dumps(record, sort_keys=True)) + "\n" for record in records]))
+                self._file.flush()
+            except EnvironmentError as e:
+                raise LocalEnvironmentError(e)
+
+    def InFlight(self):
+        """
+        Get the items that were started but never finished or failed
+
+        Returns:
+            A list of item keys (list)
+        """
+        return [key for key in self.planned if key in self.started]
+
+    def Remaining(self):
+        """
+        Get the items that have not finished yet, in planned order
+
+        Returns:
+            A list of (key, item data) tuples (list of tuple)
+        """
+        return [(key, data) for key, data in six.iteritems(self.planned) if key not in self.completed]
+
+    def Reconcile(self, checkFunc):
+        """
+        Find out what happened to the items that were in flight or failed when the previous run stopped, since a
+        failed batch call may still have finished some of its items.  Items the check finds finished are marked
+        complete; the rest are left to be retried
+
+        Args:
+            checkFunc:  function that takes a list of keys and returns the ones that actually finished (callable)
+        """
+        unsure = [key for key in self.planned if key in self.started or key in self.failed]
+        if not unsure:
+            return
+        self.log.info("Checking the state of {} items that were in progress".format(len(unsure)))
+        finished = set(checkFunc(unsure))
+        self.Complete([key for key in unsure if key in finished])
+
+    def Start(self, keys):
+        """
+        Record that a list of items is about to be started
+
+        Args:
+            keys:   the keys of the items (list)
+        """
+        self._Append([{"event" : "start", "key" : key} for key in keys])
+
+    def Complete(self, keys, result=None):
+        """
+        Record that a list of items finished
+
+        Args:
+            keys:   the keys of the items (list)
+            result: the result to record for each of the items (JSON serializable)
+        """
+        self._Append([{"event" : "done", "key" : key, "result" : result} for key in keys])
+
+    def Fail(self, keys, error):
+        """
+        Record that a list of items failed.  Failed items are retried when the journal is resumed
+
+        Args:
+            keys:   the keys of the items (list)
+            error:  the reason the items failed
+        """
+        self._Append([{"event" : "fail", "key" : key, "error" : str(error)} for key in keys])
+
+    def Finish(self, success):
+        """
+        Close the journal.  The journal is removed if the operation succeeded, otherwise it is kept so the operation
+        can be resumed
+
+        Args:
+            success:    whether or not the operation finished all of its items (bool)
+        """
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+        if success:
+            try:
+                os.remove(self.path)
+            except EnvironmentError as e:
+                self.log.debug("Could not remove journal {}: {}".format(self.path, e))
+        else:
+            self.log.info("Journal kept at {}; use --resume {} to finish the remaining items".format(self.path, self.path))
@@ -5,7 +5,7 @@ Helpers for PXE booting
 import tempfile
 from .logutil import GetLogger
 from . import sfdefaults
-from . import SSHConnection
+from . import SSHConnectionPool
 
 log = GetLogger()
 
@@ -88,7 +88,7 @@ LABEL BootLocal
         temp.write(pxe_file_contents)
         temp.flush()
 
-        with SSHConnection(pxeServer, pxeUser, pxePassword) as ssh:
+        with SSHConnectionPool.Shared().Session(pxeServer, pxeUser, pxePassword) as ssh:
             ssh.PutFile(temp.name, remote_filename)
 
 def DeletePXEFile(macAddress, pxeServer=sfdefaults.pxe_server, pxeUser=sfdefaults.pxe_user, pxePassword=sfdefaults.pxe_pass):
@@ -98,5 +98,5 @@ def DeletePXEFile(macAddress, pxeServer=sfdefaults.pxe_server, pxeUser=sfdefault
     transformed_mac = macAddress.lower().replace(":", "-")
     remote_filename = PXE_CONFIG_PATH.format(transformed_mac)
     log.debug("Removing PXE config file {} from server {}".format(remote_filename, pxeServer))
-    with SSHConnection(pxeServer, pxeUser, pxePassword) as ssh:
+    with SSHConnectionPool.Shared().Session(pxeServer, pxeUser, pxePassword) as ssh:
         ssh.RunCommand("rm -f " + remote_filename)
@@ -3,17 +3,20 @@
 Client objects and data structures
 """
 
+import json
 import os
 import platform
 import re
 import sys
-import time
 
+from . import clockutil
+from . import iscsiutil
 from . import sfdefaults
 from . import netutil
 from . import shellutil
+from . import threadutil
 from . import util
-from . import SSHConnection, ClientError, ClientCommandError,ClientAuthorizationError, ClientRefusedError, ClientConnectionError
+from . import SSHConnectionPool, ClientError, ClientCommandError,ClientAuthorizationError, ClientRefusedError, ClientConnectionError
 from .logutil import GetLogger
 import six
 
@@ -21,6 +24,36 @@ class OSType(object):
     """Enumeration of known client types"""
     Linux, MacOS, Windows, ESX, SunOS = ("Linux", "MacOS", "Windows", "ESX", "SunOS")
 
+# Health checks for each OS family, as one script so a client can be checked with a single remote command.  The checks
+# run in the background at the same time, each leaving its result in a temp file, and when they are all done the results
+# are printed as one line of JSON with a string value for each check
+_HEALTH_SCRIPTS = {
+    OSType.Linux : r"""# sfauto health probe
+tmp=$(mktemp -d /tmp/sfhealth.XXXXXX) || exit 1
+trap 'rm -rf "$tmp"' EXIT
+cd "$tmp" || exit 1
+ifconfig 2>/dev/null | grep HWaddr | awk '{print $5}' | sed 's/://g' | sort | head -1 > mac &
+awk '{print $1}' /proc/uptime > uptime &
+awk '{print $1}' /proc/loadavg > load &
+awk '/^MemTotal:/ {t=$2} /^MemFree:/ {f=$2} /^Buffers:/ {b=$2} /^Cached:/ {c=$2} END {if (t > 0) printf "%.1f", 100 - (f + b + c) * 100 / t}' /proc/meminfo > mem &
+top -b -d 1 -n 2 | grep Cpu | tail -1 | grep -o '[0-9.]*[% ]*id' | grep -o '[0-9.]*' > cpuidle &
+ps -ef | grep -v grep | grep java | grep vdbench | wc -l > vdbench &
+[ -f /opt/vdbench/last_vdbench_pid ] && echo 1 > vdbenchd || echo 0 > vdbenchd &
+cat /opt/vdbench/last_vdbench_exit > vdbenchexit 2>/dev/null &
+pgrep -x iscsid > /dev/null && echo 1 > iscsid || echo 0 > iscsid &
+df -P / | awk 'NR == 2 {print $5}' | tr -d % > disk &
+dmesg 2>/dev/null | grep -ci 'i/o error' > ioerrors &
+wait
+sep=""
+printf "{"
+for name in mac uptime load mem cpuidle vdbench vdbenchd vdbenchexit iscsid disk ioerrors; do
+    printf '%s"%s":"%s"' "$sep" "$name" "$(tr -cd 'A-Za-z0-9._-' < $name 2>/dev/null)"
+    sep=","
+done
+printf "}\n"
+""",
+}
+
 def _prefix(logfn):
     """Add the client IP to a log message"""
     def wrapped(self, message):
@@ -224,15 +257,14 @@ class SFClient(object):
         """Execute a command on the client using SSH"""
         if not self.sshSession or not self.sshSession.IsAlive():
             self._debug("Connecting SSH")
-            self.sshSession = SSHConnection(clientIP, self.username, self.password)
-            self.sshSession.Connect()
+            self.sshSession = SSHConnectionPool.Shared().Get(clientIP, self.username, self.password)
 
         retcode, stdout, stderr = self.sshSession.RunCommand(command, exceptOnError=False)
         return retcode, stdout, stderr
 
     def _close_command_session(self):
         if self.remoteOS == OSType.Linux:
-            self.sshSession.Close()
+            SSHConnectionPool.Shared().Discard(self.sshSession)
             self.sshSession = None
 
     def _execute_winexe_command(self, clientIP, command, timeout=30):
@@ -305,7 +337,7 @@ class SFClient(object):
                     self._debug("Connect to {} failed NT_STATUS_RESOURCE_NAME_NOT_FOUND - retrying".format(clientIP))
                     retry -= 1
                     if retry > 0:
-                        time.sleep(sfdefaults.TIME_SECOND)
+                        threadutil.Sleep(sfdefaults.TIME_SECOND)
                         continue
                     else:
                         raise ClientError("Could not connect to Windows client - NT_STATUS_RESOURCE_NAME_NOT_FOUND")
@@ -591,9 +623,9 @@ class SFClient(object):
 
             if self.ipAddress == old_ip:
                 self.ipAddress = newIP
-                start_time = time.time()
+                start_time = clockutil.Time()
                 found = False
-                while (not found and time.time() - start_time < 2 * 60):
+                while (not found and clockutil.Time() - start_time < 2 * 60):
                     found = self.Ping(newIP)
                 if not found:
                     raise ClientError("Can't contact {} on the network - something went wrong".format(self.hostname))
@@ -665,13 +697,13 @@ class SFClient(object):
                 self.ExecuteCommand("nohup bash restart_net.sh 2>&1 >/tmp/netrestart &")
                 self._debug("Disconnecting SSH")
                 self._close_command_session()
-                time.sleep(sfdefaults.TIME_SECOND * 30)
+                threadutil.Sleep(sfdefaults.TIME_SECOND * 30)
 
                 if self.ipAddress == old_ip:
                     self.ipAddress = newIP
-                    start_time = time.time()
+                    start_time = clockutil.Time()
                     found = False
-                    while (not found and time.time() - start_time < 2 * 60):
+                    while (not found and clockutil.Time() - start_time < 2 * 60):
                         found = self.Ping(newIP)
                     if not found:
                         raise ClientError("Can't contact {} on the network - something went wrong".format(self.hostname))
@@ -726,13 +758,13 @@ class SFClient(object):
                 self.ExecuteCommand("nohup bash restart_net.sh 2>&1 >/tmp/netrestart &")
                 self._debug("Disconnecting SSH")
                 self._close_command_session()
-                time.sleep(sfdefaults.TIME_SECOND * 30)
+                threadutil.Sleep(sfdefaults.TIME_SECOND * 30)
 
                 if self.ipAddress == old_ip:
                     self.ipAddress = newIP
-                    start_time = time.time()
+                    start_time = clockutil.Time()
                     found = False
-                    while (not found and time.time() - start_time < 2 * 60):
+                    while (not found and clockutil.Time() - start_time < 2 * 60):
                         found = self.Ping(newIP)
                     if not found:
                         raise ClientError("Can't contact {} on the network - something went wrong".format(self.hostname))
@@ -1005,11 +1037,11 @@ class SFClient(object):
         Wait for the client to be up and usable
         """
         self._info("Waiting to come up")
-        start = time.time()
+        start = clockutil.Time()
         responding_ip = self.ipAddress
         # Wait until the client is responding to ping
         while not self.Ping():
-            if time.time() - start > 4 * 60:
+            if clockutil.Time() - start > 4 * 60:
                 # if the client hasn't come back yet, try another IP address
                 response = False
                 for ip in self.allIPAddresses:
@@ -1017,14 +1049,14 @@ class SFClient(object):
                     response = self.Ping(ip)
                 if response:
                     break
-            time.sleep(sfdefaults.TIME_SECOND * 5)
+            threadutil.Sleep(sfdefaults.TIME_SECOND * 5)
         # Wait until the client is responding to management requests
         while True:
             try:
                 self.ExecuteCommand("hostname", responding_ip)
                 break
             except ClientError:
-                time.sleep(sfdefaults.TIME_SECOND * 5)
+                threadutil.Sleep(sfdefaults.TIME_SECOND * 5)
 
         # Make sure all interfaces came back up on Linux
         if self.remoteOS == OSType.Linux:
@@ -1047,7 +1079,7 @@ class SFClient(object):
             self.ExecuteCommand("iscsiadm -m node -U all", throwOnError=False)
             self.ExecuteCommand("iscsiadm -m session -o delete", throwOnError=False)
             self.ExecuteCommand("systemctl stop iscsid")
-            time.sleep(sfdefaults.TIME_SECOND * 3)
+            threadutil.Sleep(sfdefaults.TIME_SECOND * 3)
             self.ExecuteCommand("killall -9 iscsid", throwOnError=False)
 
             if defaultConfigFile:
@@ -1059,7 +1091,7 @@ class SFClient(object):
             self.ExecuteCommand("rm -rf /var/lib/iscsi")
             self.ExecuteCommand("touch /etc/iscsi/iscsi.initramfs")
             self.ExecuteCommand("systemctl start iscsid")
-            time.sleep(sfdefaults.TIME_SECOND * 5)
+            threadutil.Sleep(sfdefaults.TIME_SECOND * 5)
             self._passed("Cleaned iSCSI")
 
         elif self.remoteOS == OSType.SunOS:
@@ -1206,6 +1238,20 @@ class SFClient(object):
         # If we couldn't find a recognizable error, just return the last line
         return stdout.split("\n")[1]
 
+    def _LoginTargetsParallel(self, targets):
+        """
+        Log in to a list of targets on a Linux client, running a chunk of logins at once with one remote command per chunk.
+        The result of each login is not checked here
+
+        Args:
+            targets:    the IQNs of the targets to log in to (list of str)
+        """
+        chunk_size = max(1, int(sfdefaults.login_parallel_max))
+        for start in range(0, len(targets), chunk_size):
+            chunk = targets[start:start + chunk_size]
+            self._debug("Logging in to {} targets at once".format(len(chunk)))
+            self.ExecuteCommand(" ".join(["iscsiadm -m node -l -T {} &".format(target) for target in chunk] + ["wait"]), throwOnError=False)
+
     def LoginTargets(self, portalAddress=None, loginOrder="serial", targetList=None):
         """
         Login to discovered iSCSI targets
@@ -1234,38 +1280,26 @@ class SFClient(object):
             login_count = 0
             error_count = 0
             if loginOrder == "parallel":
-                if targetList != None and len(targetList) > 0:
-                    raise ClientError("Parallel login with a target_list is not currently implemented")
-                self._info("Logging in to all targets in parallel")
-                _, stdout, stderr = self.ExecuteCommand("iscsiadm -m node -L all", throwOnError=False)
-                for line in stdout.split("\n"):
-                    m = re.search(r"^Logging in to", line)
-                    if (m):
-                        continue
-                    m = re.search(r"^Login to .+ target: (.+), portal.+]: (.+)", line)
-                    if (m):
-                        iqn = m.group(1)
-                        status = m.group(2)
-                        if (status != "successful"):
-                            self._error("Failed to log in to '{}'".format(iqn))
-                        else:
-                            login_count += 1
-                if (login_count <= 0):
-                    iqn = ""
-                    for line in stderr.split("\n"):
-                        line = line.strip()
-                        m = re.search(r"Could not login to.+target: (.+), portal", line)
-                        if (m):
-                            iqn = m.group(1)
-                        m = re.search("already exists", line)
-                        if (m):
-                            self._warn("Session already exists for '{}'".format(iqn))
-                            login_count += 1
-                            continue
-                        m = re.search("reported error", line)
-                        if (m):
-                            self._error("Failed to log in to '{}' -- {}".format(iqn, line))
-                            error_count += 1
+                targets = targetList if targetList else self.GetAllTargets()
+                if not targets:
+                    self._warn("There are no targets to log in to")
+                    return
+                if targetList:
+                    self._info("Logging in to {} targets in parallel".format(len(targets)))
+                    self._LoginTargetsParallel(targets)
+                else:
+                    self._info("Logging in to all targets in parallel")
+                    self.ExecuteCommand("iscsiadm -m node -L all", throwOnError=False)
+
+                # Check every target against one list of sessions, instead of picking the result of each login out of
+                # the interleaved output
+                sessions = set(self.GetLoggedInTargets())
+                for target in targets:
+                    if target in sessions:
+                        login_count += 1
+                    else:
+                        self._error("Failed to log in to {}".format(target))
+                        error_count += 1
             elif loginOrder == "serial":
                 self._info("Logging in to targets serially")
                 targets = self.GetAllTargets()
@@ -1289,17 +1323,15 @@ class SFClient(object):
                     else:
                         login_count += 1
 
-            # Set up automatic login
-            all_targets = self.GetAllTargets()
-            for target in all_targets:
-                retcode, stdout, stderr = self.ExecuteCommand("iscsiadm -m node -o update -n node.startup -v automatic -T {}".format(target), throwOnError=False)
-                if retcode != 0:
-                    self._error("Failed to set automatic login on {}".format(target))
-                    error_count += 1
+            # Set up automatic login for all of the targets at once
+            retcode, stdout, stderr = self.ExecuteCommand("iscsiadm -m node -o update -n node.startup -v automatic", throwOnError=False)
+            if retcode != 0:
+                self._error("Failed to set automatic login: {}".format(stderr.strip()))
+                error_count += 1
 
             # Wait for SCSI devices for all sessions
             if login_count > 0:
-                start_time = time.time()
+                start_time = clockutil.Time()
                 while True:
                     retcode, stdout, stderr = self.ExecuteCommand("iscsiadm -m session -P3 | egrep 'Target:|scsi disk' | wc -l", throwOnError=False)
                     stdout = stdout.strip()
@@ -1309,9 +1341,9 @@ class SFClient(object):
                     # Instead of parsing the output, we'll assume that an even number of lines means there is a device for every session
                     if int(stdout) % 2 == 0:
                         break
-                    if time.time() - start_time > 120: # Wait up to 2 minutes
+                    if clockutil.Time() - start_time > 120: # Wait up to 2 minutes
                         raise ClientError("Timeout waiting for all iSCSI sessions to have SCSI devices")
-                    time.sleep(sfdefaults.TIME_SECOND)
+                    threadutil.Sleep(sfdefaults.TIME_SECOND)
 
             if (login_count > 0):
                 self._passed("Successfully logged in to {} volumes".format(login_count))
@@ -1562,21 +1594,11 @@ class SFClient(object):
                     return sorted(dev_list, key=lambda x: int(re.findall(r'\d+$', x)[0]))
 
             # Look for regular iSCSI volumes
-            _, stdout, _ = self.ExecuteCommand("iscsiadm -m session -P 3 | egrep 'Target:|State:|disk'")
-            new_volume = None
+            _, stdout, _ = self.ExecuteCommand("iscsiadm -m session -P 3 | egrep 'Target:|Portal:|State:|disk'")
             volumes = {}
-            for line in stdout.split("\n"):
-                m = re.search(r"Target:\s+(\S+)", line)
-                if(m):
-                    new_volume = dict()
-                    new_volume["iqn"] = m.group(1)
-                m = re.search(r"iSCSI Session State:\s+(.+)", line)
-                if(m):
-                    new_volume["state"] = m.group(1)
-                m = re.search(r"disk\s+(\S+)\s", line)
-                if(m):
-                    new_volume["device"] = "/dev/" + m.group(1)
-                    volumes[new_volume["iqn"]] = new_volume
+            for session in iscsiutil.ParseSessions(stdout):
+                if session.devices:
+                    volumes[session.iqn] = {"iqn" : session.iqn, "state" : session.sessionState, "device" : session.device}
             devices = []
             devs_by_length = dict()
             for iqn in sorted(volumes.keys()):
@@ -1650,34 +1672,17 @@ class SFClient(object):
             retcode, raw_iscsiadm, stderr = self.ExecuteCommand("iscsiadm -m session -P 3 | egrep 'Target:|Portal:|State:|SID:|disk'", throwOnError=False)
             if not (retcode == 0 or retcode == 21 or (retcode == 1 and "No active sessions" in stderr)):
                 raise ClientCommandError("iscsiadm command failed: {} {}".format(raw_iscsiadm, stderr))
-            new_volume = None
             volumes = dict()
-            for line in raw_iscsiadm.split("\n"):
-                m = re.search(r"Target:\s+(\S+)", line)
-                if m:
-                    new_volume = dict()
-                    new_volume["iqn"] = m.group(1)
-                    for key in ["portal", "sid", "state", "device", "sectors"]:
-                        new_volume[key] = "unknown"
-                m = re.search(r"Current Portal:\s+(.+):", line)
-                if m:
-                    new_volume["portal"] = m.group(1)
-                m = re.search(r"SID:\s+(.+)", line)
-                if m:
-                    new_volume["sid"] = m.group(1)
-                m = re.search(r"iSCSI Session State:\s+(.+)", line)
-                if m:
-                    new_volume["state"] = m.group(1)
-                m = re.search(r"disk\s+(\S+)\s", line)
-                if m:
-                    new_volume["device"] = "/dev/" + m.group(1)
-                    #_, stdout, _ = self.ExecuteCommand("cat /sys/block/" + m.group(1) + "/queue/hw_sector_size")
-                    #new_volume["sectors"] = stdout.strip()
-                    if m.group(1) in list(sectors.keys()):
-                        new_volume["sectors"] = sectors[m.group(1)]
-                    else:
-                        new_volume["sectors"] = 0
-                    volumes[new_volume["device"]] = new_volume
+            for session in iscsiutil.ParseSessions(raw_iscsiadm):
+                for disk in session.devices:
+                    volumes["/dev/" + disk] = {
+                        "iqn" : session.iqn,
+                        "portal" : session.portal or "unknown",
+                        "sid" : "unknown" if session.sid is None else str(session.sid),
+                        "state" : session.sessionState or "unknown",
+                        "device" : "/dev/" + disk,
+                        "sectors" : sectors.get(disk, 0),
+                    }
             return volumes
 
         elif self.remoteOS == OSType.SunOS:
@@ -1928,111 +1933,90 @@ class SFClient(object):
         else:
             raise ClientError("Sorry, this is not implemented for {}".format(self.remoteOS))
 
-    def IsHealthy(self):
+    def GetHealthReport(self):
         """
-        Check various info on the client to see if it appears to be behaving normally
+        Gather health info from the client with a single remote command.  All of the checks run at the same time on the
+        client and come back together as JSON
 
         Returns:
-            Boolean true if the client is healthy, false otherwise
+            A dictionary of health info, with -1 for any number that could not be found (dict)
         """
-        if self.remoteOS == OSType.Linux:
-            #self._step("Checking health")
-
-            # alphabetically first MAC
-            _, stdout, _ = self.ExecuteCommand("ifconfig | grep HWaddr | awk '{print $5}' | sed 's/://g' | sort | head -1")
-            unique_id = stdout.strip()
-
-            # Get uptime
-            _, stdout, _ = self.ExecuteCommand("cat /proc/uptime | awk '{print $1}'")
-            uptime = stdout.strip()
-
-            # Check memory usage
-            _, stdout, _ = self.ExecuteCommand("cat /proc/meminfo")
-            mem_total = 0
-            mem_free = 0
-            mem_buff = 0
-            mem_cache = 0
-            for line in stdout.split("\n"):
-                m = re.search(r"MemTotal:\s+(\d+) kB", line)
-                if m:
-                    mem_total = float(m.group(1))
-                    continue
-                m = re.search(r"MemFree:\s+(\d+) kB", line)
-                if m:
-                    mem_free = float(m.group(1))
-                    continue
-                m = re.search(r"Buffers:\s+(\d+) kB", line)
-                if m:
-                    mem_buff = float(m.group(1))
-                    continue
-                m = re.search(r"Cached:\s+(\d+) kB", line)
-                if m:
-                    mem_cache = float(m.group(1))
-                    continue
-            mem_usage = 0
-            if mem_total > 0:
-                mem_usage = "%.1f" % (100 - ((mem_free + mem_buff + mem_cache) * 100) / mem_total)
-
-            # Check CPU usage
-            cpu_usage = "-1"
-            try:
-                _, stdout, _ = self.ExecuteCommand("top -b -d 1 -n 2 | grep Cpu | tail -1")
-                m = re.search(r"(\d+\.\d+)%id", stdout)
-                if (m):
-                    cpu_usage = "%.1f" % (100.0 - float(m.group(1)))
-            except ValueError:
-                pass
-
-            # Check if vdbench is running here
-            _, stdout, _ = self.ExecuteCommand("ps -ef | grep -v grep | grep java | grep vdbench | wc -l")
-            vdbench_count = 0
-            try:
-                vdbench_count = int(stdout.strip())
-            except ValueError:
-                pass
+        script = _HEALTH_SCRIPTS.get(self.remoteOS)
+        if not script:
+            raise ClientError("Sorry, this is not implemented for {}".format(self.remoteOS))
 
-            # See if vdbenchd is in use
-            _, stdout, _ = self.ExecuteCommand("if [ -f /opt/vdbench/last_vdbench_pid ]; then echo 'True'; else echo 'False'; fi")
-            vdbenchd = bool(stdout.strip())
+        _, stdout, _ = self.ExecuteCommand(script)
+        try:
+            raw = json.loads(stdout.strip().split("\n")[-1])
+        except ValueError:
+            raise ClientError("Could not parse health info from client: {}".format(stdout))
 
-            # See if we have a vdbench last exit status
-            vdbench_exit = -1
-            _, stdout, _ = self.ExecuteCommand("cat /opt/vdbench/last_vdbench_exit")
+        def _Number(name, numType=float):
             try:
-                vdbench_exit = int(stdout.strip())
-            except ValueError:pass
-
-            self._step("Checking health")
-            self._info("Hostname {} MAC {}".format(self.hostname, unique_id))
-            self._info("Uptime {}".format(uptime))
-
-            # Use vdbench status to determine health
-            healthy = True
-            if vdbench_count > 0:
-                self._info("vdbench is running")
-            elif not vdbenchd and vdbench_count <= 0:
-                self._error("vdbench failed")
-                healthy = False
-            elif vdbenchd and vdbench_exit == 0:
-                self._info("Last vdbench run finished without errors")
-            else:
-                self._error("vdbench failed")
-                healthy = False
-
-            if cpu_usage > 0:
-                self._info("CPU usage {}%".format(cpu_usage))
-            if mem_usage > 0:
-                self._info("Mem usage {}".format(mem_usage))
-
-            if healthy:
-                self._passed("Client is healthy")
-            else:
-                self._error("Client is not healthy")
+                return numType(raw.get(name, ""))
+            except (TypeError, ValueError):
+                return -1
+
+        cpu_idle = _Number("cpuidle")
+        return {
+            "uniqueID" : raw.get("mac", ""),
+            "uptime" : _Number("uptime"),
+            "load" : _Number("load"),
+            "memUsage" : _Number("mem"),
+            "cpuUsage" : 100.0 - cpu_idle if cpu_idle >= 0 else -1,
+            "diskUsage" : _Number("disk", int),
+            "iscsidRunning" : raw.get("iscsid") == "1",
+            "ioErrors" : _Number("ioerrors", int),
+            "vdbenchCount" : _Number("vdbench", int),
+            "vdbenchd" : raw.get("vdbenchd") == "1",
+            "vdbenchExit" : _Number("vdbenchexit", int),
+        }
 
-            return healthy
+    def IsHealthy(self):
+        """
+        Check various info on the client to see if it appears to be behaving normally
 
+        Returns:
+            Boolean true if the client is healthy, false otherwise
+        """
+        report = self.GetHealthReport()
+
+        self._step("Checking health")
+        self._info("Hostname {} MAC {}".format(self.hostname, report["uniqueID"]))
+        self._info("Uptime {}".format(report["uptime"]))
+
+        # Use vdbench status to determine health
+        healthy = True
+        if report["vdbenchCount"] > 0:
+            self._info("vdbench is running")
+        elif not report["vdbenchd"]:
+            self._error("vdbench failed")
+            healthy = False
+        elif report["vdbenchExit"] == 0:
+            self._info("Last vdbench run finished without errors")
         else:
-            raise ClientError("Sorry, this is not implemented for {}".format(self.remoteOS))
+            self._error("vdbench failed")
+            healthy = False
+
+        if report["cpuUsage"] >= 0:
+            self._info("CPU usage {:.1f}%".format(report["cpuUsage"]))
+        if report["memUsage"] >= 0:
+            self._info("Mem usage {:.1f}%".format(report["memUsage"]))
+        if report["load"] >= 0:
+            self._info("Load average {}".format(report["load"]))
+        if report["diskUsage"] >= 0:
+            self._info("Root disk usage {}%".format(report["diskUsage"]))
+        if not report["iscsidRunning"]:
+            self._warn("iscsid is not running")
+        if report["ioErrors"] > 0:
+            self._warn("{} I/O errors in the kernel log".format(report["ioErrors"]))
+
+        if healthy:
+            self._passed("Client is healthy")
+        else:
+            self._error("Client is not healthy")
+
+        return healthy
 
     def HostnameToAccountName(self):
         return self.hostname.split(".")[0]
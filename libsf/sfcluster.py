@@ -6,14 +6,18 @@ SolidFire cluster objects and data structures
 import copy
 import json
 import re
-import time
+import threading
+from . import clockutil
 from . import sfdefaults
+from . import threadutil
 from . import util
-from . import SolidFireClusterAPI, GetHighestAPIVersion, SolidFireError, SFTimeoutError, UnknownObjectError
+from . import waitutil
+from . import SolidFireClusterAPI, GetHighestAPIVersion, SolidFireError, SolidFireAPIError, SFTimeoutError, UnknownObjectError
 from .sfvolgroup import SFVolGroup
 from .sfaccount import SFAccount
 from .sfnode import DriveType, SFNode
 from .sfclusterpair import SFClusterPair
+from .sfinventory import ClusterInventory, InventoryCache, InventoryFamily
 from .logutil import GetLogger
 import six
 
@@ -47,6 +51,282 @@ class DriveState(object):
     Failed = "failed"
     Removing = "removing"
 
+class DriveIndex(object):
+    """
+    The drives in a cluster grouped by state, node and type so that lookups do not need to scan the whole drive list
+    """
+
+    def __init__(self, drives=None, cluster=None):
+        """
+        Args:
+            drives:     the drive dictionaries to index (list of dict)
+            cluster:    the cluster to list the drives from when refreshing (SFCluster)
+        """
+        self.cluster = cluster
+        self.drives = []
+        self._groups = {}
+        self._byID = {}
+        if drives is not None:
+            self._Build(drives)
+
+    def _Build(self, drives):
+        """
+        Group the drives under every (state, node, type) key they match, including the wildcard keys
+        """
+        groups = {}
+        for drive in drives:
+            for state in set([DriveState.Any, drive["status"]]):
+                for node_id in set([0, drive["nodeID"]]):
+                    for drive_type in set([DriveType.Any, drive["type"]]):
+                        groups.setdefault((state, node_id, drive_type), []).append(drive)
+        self.drives = list(drives)
+        self._groups = groups
+        self._byID = {drive["driveID"] : drive for drive in self.drives}
+
+    def Refresh(self):
+        """
+        List the drives from the cluster and rebuild the index
+
+        Returns:
+            This index (DriveIndex)
+        """
+        self._Build(self.cluster.api.CallWithRetry("ListDrives", {})["drives"])
+        return self
+
+    def _Keys(self, driveState, nodeID, driveType):
+        """
+        Get the group keys that cover a lookup, where each criteria may be a scalar or a list
+        """
+        states = driveState if isinstance(driveState, list) else [driveState]
+        node_ids = nodeID if isinstance(nodeID, list) else [nodeID]
+        types = driveType if isinstance(driveType, list) else [driveType]
+        if DriveState.Any in states:
+            states = [DriveState.Any]
+        if 0 in node_ids:
+            node_ids = [0]
+        if DriveType.Any in types:
+            types = [DriveType.Any]
+        return [(state, node_id, drive_type) for state in set(states) for node_id in set(node_ids) for drive_type in set(types)]
+
+    def Get(self, driveState=DriveState.Any, nodeID=0, driveType=DriveType.Any):
+        """
+        Get the drives that match the criteria
+
+        Args:
+            driveState: only get drives in this state (DriveState) - this may be a scalar or a list
+            nodeID:     only get drives from this node (int) - this may be a scalar or a list
+            driveType:  only get drives of this type (DriveType) - this may be a scalar or a list
+
+        Returns:
+            A list of drive dictionaries, in the order the cluster listed them (list of dict)
+        """
+        keys = self._Keys(driveState, nodeID, driveType)
+        if len(keys) == 1:
+            return list(self._groups.get(keys[0], []))
+        matched = set([drive["driveID"] for key in keys for drive in self._groups.get(key, [])])
+        return [drive for drive in self.drives if drive["driveID"] in matched]
+
+    def Count(self, driveState=DriveState.Any, nodeID=0, driveType=DriveType.Any):
+        """
+        Count the drives that match the criteria
+
+        Args:
+            driveState: only count drives in this state (DriveState) - this may be a scalar or a list
+            nodeID:     only count drives from this node (int) - this may be a scalar or a list
+            driveType:  only count drives of this type (DriveType) - this may be a scalar or a list
+
+        Returns:
+            The number of matching drives (int)
+        """
+        # The keys are disjoint once the wildcards have been collapsed, so the group sizes can be added up
+        return sum([len(self._groups.get(key, [])) for key in self._Keys(driveState, nodeID, driveType)])
+
+    def Find(self, driveID):
+        """
+        Get a drive by ID
+
+        Args:
+            driveID:    the ID of the drive (int)
+
+        Returns:
+            The drive dictionary, or None if there is no such drive (dict)
+        """
+        return self._byID.get(driveID)
+
+class _DriveEventWatcher(object):
+    """
+    Watch the cluster events for signs that the drives in the cluster have changed
+    """
+
+    DRIVE_EVENT_TYPES = ["driveEvent", "serviceEvent", "hardwareEvent"]
+    MAX_EVENTS = 100
+
+    def __init__(self, api):
+        """
+        Args:
+            api:    the API connection to the cluster (SolidFireClusterAPI)
+        """
+        self.api = api
+        events = self.api.CallWithRetry("ListEvents", {"maxEvents" : 1})["events"]
+        self.lastEventID = max([event["eventID"] for event in events] or [0])
+
+    def Changed(self):
+        """
+        Check if there have been any drive related events since the last check, with a single ListEvents call
+
+        Returns:
+            True if the drives may have changed, False otherwise (bool)
+        """
+        events = self.api.CallWithRetry("ListEvents", {"startEventID" : self.lastEventID + 1, "maxEvents" : self.MAX_EVENTS})["events"]
+        events = [event for event in events if event["eventID"] > self.lastEventID]
+        if not events:
+            return False
+        self.lastEventID = max([event["eventID"] for event in events])
+        # If the page is full there may be drive events we did not see
+        return len(events) >= self.MAX_EVENTS or any([event["eventInfoType"] in self.DRIVE_EVENT_TYPES for event in events])
+
+def _SliceServicesFromStats(stats):
+    """Get the primary and secondary slice services from a volume stats dictionary"""
+    return {"primary" : stats["metadataHosts"]["primary"], "secondaries" : stats["metadataHosts"]["liveSecondaries"] + stats["metadataHosts"]["deadSecondaries"]}
+
+def _IsSyncingFromStats(stats):
+    """Check if a volume is syncing from its volume stats dictionary"""
+    # Special case for single node clusters - there are no secondaries
+    if not stats["metadataHosts"]["liveSecondaries"] and not stats["metadataHosts"]["deadSecondaries"]:
+        return True
+
+    if len(stats["metadataHosts"]["deadSecondaries"]) > 0:
+        return True
+    if len(stats["metadataHosts"]["liveSecondaries"]) > 1:
+        return True
+    return False
+
+class AsyncJobTracker(object):
+    """
+    Watch a set of outstanding async handles on a cluster and call back as each one completes.
+    All of the handles are checked with a single ListAsyncResults call per poll, falling back to
+    GetAsyncResult per handle on clusters that do not support it
+    """
+
+    def __init__(self, cluster, pollInterval=5):
+        """
+        Args:
+            cluster:        the cluster the jobs are running on (SFCluster)
+            pollInterval:   the longest to wait between polls, in seconds (int)
+        """
+        self.cluster = cluster
+        self.pollInterval = pollInterval
+        self.log = GetLogger()
+        self.telemetry = threadutil.PoolTelemetry("async jobs")
+        self._jobs = {}
+        self._jobsLock = threading.Lock()
+        self._useList = True
+
+    def __len__(self):
+        with self._jobsLock:
+            return len(self._jobs)
+
+    def Add(self, asyncHandle, callback=None, context=None):
+        """
+        Start tracking an async handle
+
+        Args:
+            asyncHandle:    the handle to track (int)
+            callback:       function to call when the handle completes, as callback(asyncHandle, result, context)
+                            where result is the GetAsyncResult style dictionary for the handle
+            context:        caller data to pass back to the callback
+        """
+        self.telemetry.Submitted()
+        key = self.telemetry.Started("async handle {}".format(asyncHandle))
+        with self._jobsLock:
+            self._jobs[asyncHandle] = (callback, context, key)
+
+    def Poll(self):
+        """
+        Check all of the outstanding handles once and fire the callbacks for any that have completed
+
+        Returns:
+            A dictionary of asyncHandle (int) => result (dict) for the handles that completed
+        """
+        with self._jobsLock:
+            handles = list(self._jobs.keys())
+        if not handles:
+            return {}
+
+        results = {}
+        if self._useList:
+            try:
+                results = self.cluster.ListAsyncResults()
+            except SolidFireAPIError as ex:
+                if not ex.IsUnknownAPIError():
+                    raise
+                self.log.debug("ListAsyncResults is not supported, falling back to GetAsyncResult")
+                self._useList = False
+        # Anything the batched call did not report is checked individually
+        for handle in handles:
+            if handle not in results:
+                results[handle] = self.cluster.GetAsyncResult(handle)
+
+        completed = {}
+        for handle in handles:
+            if results[handle]["status"].lower() != "complete":
+                continue
+            with self._jobsLock:
+                callback, context, key = self._jobs.pop(handle, (None, None, None))
+            self.telemetry.Finished(key, failed="error" in results[handle])
+            completed[handle] = results[handle]
+            if callback:
+                callback(handle, results[handle], context)
+        return completed
+
+    def WaitForAny(self, timeout=None):
+        """
+        Wait for at least one of the outstanding handles to complete
+
+        Args:
+            timeout:    how long to wait before giving up, in seconds (int)
+
+        Returns:
+            A dictionary of asyncHandle (int) => result (dict) for the handles that completed
+        """
+        completed = {}
+        def _AnyComplete():
+            completed.update(self.Poll())
+            return completed or len(self) <= 0
+        if len(self) > 0:
+            waitutil.WaitUntil(_AnyComplete,
+                               timeout=timeout or None,
+                               strategy=self._Strategy(),
+                               description="async jobs to complete")
+        return completed
+
+    def WaitForAll(self, timeout=None):
+        """
+        Wait for all of the outstanding handles to complete
+
+        Args:
+            timeout:    how long to wait before giving up, in seconds (int)
+
+        Returns:
+            A dictionary of asyncHandle (int) => result (dict) for all of the handles
+        """
+        completed = {}
+        def _AllComplete():
+            completed.update(self.Poll())
+            return len(self) <= 0
+        if len(self) > 0:
+            waitutil.WaitUntil(_AllComplete,
+                               timeout=timeout or None,
+                               strategy=self._Strategy(),
+                               description="async jobs to complete")
+        return completed
+
+    def _Strategy(self):
+        """
+        Poll quickly at first so short jobs are noticed right away, backing off to the poll interval
+        """
+        return waitutil.ExponentialInterval(initial=min(1, self.pollInterval), maximum=self.pollInterval)
+
 class SFCluster(object):
     """Common interactions with a SolidFire cluster"""
 
@@ -87,6 +367,43 @@ class SFCluster(object):
         for key in self._unpicklable:
             assert hasattr(self, key)
 
+    def _ListFamily(self, family, fetchFunc):
+        """
+        List the objects in an inventory family, from the inventory cache if it is enabled and current
+
+        Args:
+            family:     the family to list (InventoryFamily)
+            fetchFunc:  function that lists the objects from the cluster (callable)
+
+        Returns:
+            A list of object dictionaries (list of dict)
+        """
+        cache = InventoryCache.Get(self.mvip, self.username, self.password)
+        if not cache:
+            return fetchFunc()
+        return cache.List(family, fetchFunc)
+
+    def _FindInFamily(self, family, name=None, objectID=None):
+        """
+        Look for an object by name or ID in the inventory cache
+
+        Args:
+            family:     the family to search (InventoryFamily)
+            name:       the name of the object (string)
+            objectID:   the ID of the object (int)
+
+        Returns:
+            A list of matching object dictionaries (list of dict), or None if the cache is not enabled or not current
+        """
+        cache = InventoryCache.Get(self.mvip, self.username, self.password)
+        if not cache or not (name or objectID):
+            return None
+        try:
+            objectID = int(objectID) if not name else None
+        except (TypeError, ValueError):
+            return None
+        return cache.Find(family, cache.Token(), objectID=objectID, name=name)
+
     def GetLastGCInfo(self):
         """
         Get some information about the most recent garbage collection
@@ -186,7 +503,7 @@ class SFCluster(object):
             if gc_info.Rescheduled:
                 continue
             elif gc_info.EndTime <= 0:
-                if time.time() - gc_info.StartTime > 60 * 90: # If it has been more than 90 min assume GC is not going to complete
+                if clockutil.Time() - gc_info.StartTime > 60 * 90: # If it has been more than 90 min assume GC is not going to complete
                     gc_in_progress = False
                     break
                 self.log.warning("GC generation {} started at {} has not completed".format(gc_info.Generation, util.TimestampToStr(gc_info.StartTime)))
@@ -214,7 +531,7 @@ class SFCluster(object):
             if gc_info.Rescheduled:
                 continue
             elif gc_info.EndTime <= 0:
-                if time.time() - gc_info.StartTime > 60 * 90: # If it has been more than 90 min assume GC is not going to complete
+                if clockutil.Time() - gc_info.StartTime > 60 * 90: # If it has been more than 90 min assume GC is not going to complete
                     gc_in_progress = False
                     break
                 self.log.warning("GC generation {} started at {} has not completed".format(gc_info.Generation, util.TimestampToStr(gc_info.StartTime)))
@@ -230,19 +547,13 @@ class SFCluster(object):
 
         # Ask the cluster to start GC
         self.log.info("Starting GC on {}".format(self. mvip))
-        request_time = time.time()
-        time.sleep(sfdefaults.TIME_SECOND * 2)
+        request_time = clockutil.Time()
+        threadutil.Sleep(sfdefaults.TIME_SECOND * 2)
         self.api.CallWithRetry("StartGC", {})
 
         # Wait for GC to start
         self.log.info("Waiting for GC to start")
-        wait_start = time.time()
-        started = False
-        while not started:
-            time.sleep(sfdefaults.TIME_SECOND * 3)
-            if time.time() - wait_start > 120:
-                raise SFTimeoutError("Timeout waiting for GC to start")
-
+        def _GCStarted():
             event_list = self.api.CallWithRetry('ListEvents', {})
             for event in event_list["events"]:
                 event_time = util.ParseTimestamp(event['timeOfReport'])
@@ -250,12 +561,15 @@ class SFCluster(object):
                     continue
 
                 if ("GCStarted" in event["message"]):
-                    started = True
-                    break
+                    return True
 
                 if ("GCRescheduled" in event["message"]):
-                    started = True
-                    break
+                    return True
+            return False
+        waitutil.WaitUntil(_GCStarted,
+                           timeout=120,
+                           strategy=waitutil.ExponentialInterval(initial=1, maximum=10),
+                           description="GC to start")
 
     def WaitForGC(self, timeout=90):
         """
@@ -269,18 +583,27 @@ class SFCluster(object):
         """
 
         # Find the most recent non-rescheduled GC and wait for it to be complete
-        while True:
+        def _GCComplete():
             gc_list = self.GetAllGCInfo()
             for gc_info in reversed(gc_list):
                 if gc_info.Rescheduled:
                     continue
                 elif gc_info.EndTime <= 0:
-                    if time.time() - gc_info.StartTime > 60 * timeout:
+                    if clockutil.Time() - gc_info.StartTime > 60 * timeout:
                         raise SFTimeoutError("Timeout waiting for GC to finish")
-                    break
+                    return None
                 else:
                     return gc_info
-            time.sleep(sfdefaults.TIME_SECOND * 30)
+            return None
+
+        # Expect this GC to take about as long as the last one that finished
+        strategy = waitutil.ExponentialInterval(initial=10, maximum=60)
+        for gc_info in reversed(self.GetAllGCInfo()):
+            if not gc_info.Rescheduled and gc_info.EndTime > 0:
+                strategy = waitutil.EstimateInterval(gc_info.EndTime - gc_info.StartTime, minimum=10, maximum=120)
+                break
+
+        return waitutil.WaitUntil(_GCComplete, strategy=strategy, description="GC to finish")
 
     def ListReports(self):
         """
@@ -475,8 +798,7 @@ class SFCluster(object):
         Returns:
             A list of node dictionaries
         """
-        result = self.api.CallWithRetry("ListActiveNodes", {})
-        return result["nodes"]
+        return self._ListFamily(InventoryFamily.Nodes, lambda: self.api.CallWithRetry("ListActiveNodes", {})["nodes"])
 
     def ListAllNodes(self):
         """
@@ -504,8 +826,8 @@ class SFCluster(object):
         Returns:
             A list of SFVolGroup objects (list of SFVolGroup)
         """
-        result = self.api.CallWithRetry("ListVolumeAccessGroups", {}, apiVersion=GetHighestAPIVersion(self.mvip, self.username, self.password))
-        return [SFVolGroup(volgroup, self.mvip, self.username, self.password) for volgroup in result["volumeAccessGroups"]]
+        volgroups = self._ListFamily(InventoryFamily.VolumeAccessGroups, lambda: self.api.CallWithRetry("ListVolumeAccessGroups", {}, apiVersion=GetHighestAPIVersion(self.mvip, self.username, self.password))["volumeAccessGroups"])
+        return [SFVolGroup(volgroup, self.mvip, self.username, self.password) for volgroup in volgroups]
 
     def ListAccounts(self):
         """
@@ -514,18 +836,30 @@ class SFCluster(object):
         Returns:
             A list of SFAccount objects (list of SFAccount)
         """
-        result = self.api.CallWithRetry("ListAccounts", {}, apiVersion=GetHighestAPIVersion(self.mvip, self.username, self.password))
-        return [SFAccount(account, self.mvip, self.username, self.password) for account in result["accounts"]]
+        accounts = self._ListFamily(InventoryFamily.Accounts, lambda: self.api.CallWithRetry("ListAccounts", {}, apiVersion=GetHighestAPIVersion(self.mvip, self.username, self.password))["accounts"])
+        return [SFAccount(account, self.mvip, self.username, self.password) for account in accounts]
+
+    def Snapshot(self, families=None):
+        """
+        Get a read-only inventory of the objects on the cluster, indexed for cross reference lookups
+
+        Args:
+            families:   the families of objects to include (list of InventoryFamily).  If not specified, include all of them
+
+        Returns:
+            A ClusterInventory object
+        """
+        return ClusterInventory.Fetch(self.mvip, self.username, self.password, families)
 
     def ListActiveVolumes(self):
         """
-        Get a list of volumes on the cluster
+        Get a list of volumes on the cluster.  Every listing of active volumes goes through here, so the inventory cache
+        always holds volumes from the highest API version no matter which call filled it
 
         Returns:
             A list of volume dictionaries (list of dict)
         """
-        result = self.api.CallWithRetry("ListActiveVolumes", {}, apiVersion=GetHighestAPIVersion(self.mvip, self.username, self.password))
-        return result["volumes"]
+        return self._ListFamily(InventoryFamily.Volumes, lambda: self.api.CallWithRetry("ListActiveVolumes", {}, apiVersion=GetHighestAPIVersion(self.mvip, self.username, self.password))["volumes"])
 
     def ListDeletedVolumes(self):
         """
@@ -610,6 +944,9 @@ class SFCluster(object):
         Returns:
             An SFAccount object
         """
+        found = self._FindInFamily(InventoryFamily.Accounts, accountName, accountID)
+        if found:
+            return SFAccount(found[0], self.mvip, self.username, self.password)
         return SFAccount.Find(self.mvip, self.username, self.password, accountName, accountID)
 
     def FindVolumeAccessGroup(self, volgroupName=None, volgroupID=None):
@@ -623,6 +960,9 @@ class SFCluster(object):
         Returns:
             An SFVolGroup object
         """
+        found = self._FindInFamily(InventoryFamily.VolumeAccessGroups, volgroupName, volgroupID)
+        if found:
+            return SFVolGroup(found[0], self.mvip, self.username, self.password)
         return SFVolGroup.Find(self.mvip, self.username, self.password, volgroupName, volgroupID)
 
     def GetActiveVolumes(self):
@@ -633,9 +973,8 @@ class SFCluster(object):
             A dictionary of volumeID (int) => volume info (dict)
         """
 
-        result = self.api.CallWithRetry("ListActiveVolumes", {})
         all_volumes = dict()
-        for vol in result["volumes"]:
+        for vol in self.ListActiveVolumes():
             all_volumes[vol["volumeID"]] = vol
         return all_volumes
 
@@ -673,7 +1012,7 @@ class SFCluster(object):
         self.log.debug2("SearchForVolumes {}".format(options))
 
         # Get list of source volumes to filter
-        source_volumes = {vol["volumeID"] : vol for vol in self.api.CallWithRetry("ListActiveVolumes", {})["volumes"]}
+        source_volumes = {vol["volumeID"] : vol for vol in self.ListActiveVolumes()}
 
         # Narrow down to just an account
         if accountName or accountID:
@@ -766,6 +1105,15 @@ class SFCluster(object):
         self.log.debug("Searching for available drives...")
         return self.ListDrives(driveState=DriveState.Available)
 
+    def GetDriveIndex(self):
+        """
+        Get an index of all of the drives in the cluster
+
+        Returns:
+            The drives grouped by state, node and type (DriveIndex)
+        """
+        return DriveIndex(cluster=self).Refresh()
+
     def ListDrives(self, driveType=DriveType.Any, driveState=DriveState.Any, nodeID=0, nodeIP=None):
         """
         Get a list of the drives in the cluster
@@ -773,40 +1121,69 @@ class SFCluster(object):
         Args:
             driveType:  only list drives of this type (DriveType) - this may be a scalar or a list
             driveState: only list drives in this state (DriveState) - this may be a scalar or a list
-            nodeID:     only list drives from this node (int)
-            nodeIP:     only list drives from the node with this MIP (str)
+            nodeID:     only list drives from this node (int) - this may be a scalar or a list
+            nodeIP:     only list drives from the node with this MIP (str) - this may be a scalar or a list
 
         Returns:
             A list of drive dictionaries (list of dict)
         """
         if nodeIP:
-            nodeID = self.GetNodeIDs([nodeIP])[0]
+            nodeID = self._NodeIPsToIDs(nodeIP)
 
-        result = self.api.CallWithRetry("ListDrives", {})
-        if driveType == DriveType.Any and driveState == DriveState.Any:
-            return result["drives"]
+        drives = self._ListFamily(InventoryFamily.Drives, lambda: self.api.CallWithRetry("ListDrives", {})["drives"])
+        return DriveIndex(drives).Get(driveState=driveState, nodeID=nodeID, driveType=driveType)
 
-        if not isinstance(driveType, list):
-            driveType = [driveType]
-        if not isinstance(driveState, list):
-            driveState = [driveState]
+    def _NodeIPsToIDs(self, nodeIPs):
+        """
+        Get the node IDs for one or more node MIPs, raising if any of them are not in the cluster
+
+        Args:
+            nodeIPs:    the node MIPs to look up (str or list of str)
 
-        drive_list = []
-        for drive in result["drives"]:
-            include = True
-            if DriveType.Any not in driveType and drive["type"] not in driveType:
-                include = False
-            if DriveState.Any not in driveState and drive["status"] not in driveState:
-                include = False
-            if nodeID > 0 and drive["nodeID"] != nodeID:
-                include = False
+        Returns:
+            The node IDs, a scalar if nodeIPs was a scalar (int or list of int)
+        """
+        ip_list = nodeIPs if isinstance(nodeIPs, list) else [nodeIPs]
+        node_ids = self.GetNodeIDs(ip_list)
+        if len(node_ids) != len(ip_list):
+            raise UnknownObjectError("Could not find all of the nodes [{}] in the cluster".format(",".join(ip_list)))
+        return node_ids if isinstance(nodeIPs, list) else node_ids[0]
+
+    def WaitForDrives(self, condition, timeout=sfdefaults.available_drives_timeout):
+        """
+        Wait for the drives in the cluster to meet a condition.
+        Between checks this makes one ListEvents call every drive_event_poll_interval and only lists the drives again when
+        a drive related event has happened, or when drive_relist_interval has passed without one.  The periodic relist also
+        catches changes that do not log an event, like faults.
+
+        Args:
+            condition:  function that is passed a DriveIndex and returns True when the drives are as expected (callable)
+            timeout:    how long to wait before giving up, in seconds (int)
+
+        Returns:
+            The index of the drives that met the condition (DriveIndex)
+        """
+        # Start watching before the first listing so nothing that happens in between is missed
+        watcher = _DriveEventWatcher(self.api)
+        index = DriveIndex(cluster=self)
+        start_time = clockutil.Time()
+        while True:
+            if condition(index.Refresh()):
+                return index
 
-            if include:
-                drive_list.append(drive)
+            list_time = clockutil.Time()
+            while True:
+                if clockutil.Time() - start_time >= timeout:
+                    raise SFTimeoutError("Timed out waiting for drives [timeout={}s]".format(timeout))
 
-        return drive_list
+                threadutil.Sleep(sfdefaults.TIME_SECOND * float(sfdefaults.drive_event_poll_interval))
+                if clockutil.Time() - list_time >= sfdefaults.TIME_SECOND * float(sfdefaults.drive_relist_interval):
+                    break
+                if watcher.Changed():
+                    self.log.debug("Drive events have happened, listing drives")
+                    break
 
-    def WaitForAvailableDrives(self, driveCount=0, nodeIP=None, timeout=sfdefaults.available_drives_timeout):
+    def WaitForAvailableDrives(self, driveCount=0, nodeIP=None, timeout=sfdefaults.available_drives_timeout, nodeIPs=None):
         """
         Wait for drives to be in the available state
 
@@ -814,30 +1191,26 @@ class SFCluster(object):
             driveCount:     wait for this many drives of any type from any node (int)
             nodeIP:         wait for the expected number of drives from this node (string)
             timeout:        how long to wait before giving up (int)
+            nodeIPs:        wait for the expected number of drives from each of these nodes (list of str)
 
         Returns:
             A list of drive dictionaries that were waited for and are now present (list of dict)
         """
-        node_id = 0
-        expected_drives = driveCount
+        nodeIPs = list(nodeIPs or [])
         if nodeIP:
-            node = self.FindNode(nodeIP=nodeIP)
-            node_id = node.GetNodeID()
-            expected_drives = node.GetExpectedDriveCount()
-
-        start_time = time.time()
-        drives = []
-        while True:
-            drives = self.ListDrives(driveState=DriveState.Available, nodeID=node_id)
-            if len(drives) == expected_drives:
-                break
-
-            if time.time() - start_time >= timeout:
-                raise SFTimeoutError("Timed out waiting for available drives [timeout={}s]".format(timeout))
+            nodeIPs.append(nodeIP)
 
-            time.sleep(sfdefaults.TIME_SECOND * 10)
+        # Map each node ID to the number of drives to expect from it, with 0 meaning any node
+        expected = {0 : driveCount}
+        if nodeIPs:
+            expected = {}
+            for node_ip in nodeIPs:
+                node = self.FindNode(nodeIP=node_ip)
+                expected[node.GetNodeID()] = node.GetExpectedDriveCount()
 
-        return drives
+        index = self.WaitForDrives(lambda idx: all([idx.Count(driveState=DriveState.Available, nodeID=node_id) == count for node_id, count in expected.items()]),
+                                   timeout=timeout)
+        return index.Get(driveState=DriveState.Available, nodeID=list(expected.keys()))
 
     def AddAvailableDrives(self, waitForSync=True):
         """
@@ -878,15 +1251,7 @@ class SFCluster(object):
             # self.log.info("Waiting a little while to make sure syncing has started")
             # time.sleep(sfdefaults.TIME_MINUTE * 2)
 
-            self.log.info("Waiting for slice syncing")
-            while self.IsSliceSyncing():
-                time.sleep(sfdefaults.TIME_SECOND * 20)
-            self.log.info("Slice syncing is complete")
-
-            self.log.info("Waiting for bin syncing")
-            while self.IsBinSyncing():
-                time.sleep(sfdefaults.TIME_SECOND * 20)
-            self.log.info("Bin syncing is complete")
+            self.WaitForSyncing()
 
     def RemoveDrives(self, driveList, waitForSync=True):
         """
@@ -912,15 +1277,28 @@ class SFCluster(object):
             # self.log.info("Waiting a little while to make sure syncing has started")
             # time.sleep(sfdefaults.TIME_MINUTE * 2)
 
-            self.log.info("Waiting for slice syncing")
-            while self.IsSliceSyncing():
-                time.sleep(sfdefaults.TIME_SECOND * 20)
-            self.log.info("Slice syncing is complete")
+            self.WaitForSyncing()
+
+    def WaitForSyncing(self):
+        """
+        Wait for slice syncing and then bin syncing to finish
+        """
+        def _Progress(_attempt, elapsed):
+            self.log.debug("Still syncing after {:.0f} seconds".format(elapsed))
+
+        self.log.info("Waiting for slice syncing")
+        waitutil.WaitUntil(lambda: not self.IsSliceSyncing(),
+                           strategy=waitutil.FibonacciInterval(initial=5, maximum=60),
+                           progress=_Progress,
+                           description="slice syncing")
+        self.log.info("Slice syncing is complete")
 
-            self.log.info("Waiting for bin syncing")
-            while self.IsBinSyncing():
-                time.sleep(sfdefaults.TIME_SECOND * 20)
-            self.log.info("Bin syncing is complete")
+        self.log.info("Waiting for bin syncing")
+        waitutil.WaitUntil(lambda: not self.IsBinSyncing(),
+                           strategy=waitutil.FibonacciInterval(initial=5, maximum=60),
+                           progress=_Progress,
+                           description="bin syncing")
+        self.log.info("Bin syncing is complete")
 
     def RemoveNodes(self, nodeIPList):
         """
@@ -1105,6 +1483,30 @@ class SFCluster(object):
         params["volumeID"] = volumeID
         self.api.CallWithRetry("ModifyVolumePair", params, apiVersion=6.0)
 
+    def StartVolumePairing(self, volumeID, mode="Async"):
+        """
+        Start pairing a volume with a volume on a remote cluster
+
+        Args:
+            volumeID:   the ID of the volume to pair
+            mode:       the replication mode - Async, Sync or SnapshotsOnly
+
+        Returns:
+            The volume pairing key to give to the remote cluster (string)
+        """
+        result = self.api.CallWithRetry("StartVolumePairing", {"volumeID" : volumeID, "mode" : mode}, apiVersion=6.0)
+        return result["volumePairingKey"]
+
+    def CompleteVolumePairing(self, volumeID, pairingKey):
+        """
+        Complete pairing a volume with a volume on a remote cluster
+
+        Args:
+            volumeID:   the ID of the volume on this cluster
+            pairingKey: the volume pairing key from the remote cluster
+        """
+        self.api.CallWithRetry("CompleteVolumePairing", {"volumeID" : volumeID, "volumePairingKey" : pairingKey}, apiVersion=6.0)
+
     def CloneVolume(self, volumeID, cloneName, access="readWrite", newSize=0, newAccountID=0):
         """
         Clone a volume
@@ -1142,6 +1544,36 @@ class SFCluster(object):
         params["keepResult"] = True
         return self.api.CallWithRetry("GetAsyncResult", params, apiVersion=5.0)
 
+    def ListAsyncResults(self, resultTypes=None):
+        """
+        Get the results of all of the async API calls on the cluster in one call
+
+        Args:
+            resultTypes:    only list results of these types (list of str)
+
+        Returns:
+            A dictionary of asyncHandle (int) => result (dict), in the same format GetAsyncResult returns
+        """
+        params = {}
+        if resultTypes:
+            params["asyncResultTypes"] = resultTypes
+        result = self.api.CallWithRetry("ListAsyncResults", params, apiVersion=5.0)
+
+        async_results = {}
+        for handle in result["asyncHandles"]:
+            res = {}
+            res["status"] = "complete" if handle["completed"] else "running"
+            res["resultType"] = handle.get("resultType")
+            res["createTime"] = handle.get("createTime")
+            res["lastUpdateTime"] = handle.get("lastUpdateTime")
+            if handle["completed"]:
+                if handle.get("success", True):
+                    res["result"] = handle.get("data", {})
+                else:
+                    res["error"] = handle.get("data", {})
+            async_results[handle["asyncResultID"]] = res
+        return async_results
+
     def CreateVolume(self, volumeName, volumeSize, accountID, enable512e=False, minIOPS=100, maxIOPS=100000, burstIOPS=100000):
         """
         Create a single volume
@@ -1233,6 +1665,28 @@ class SFCluster(object):
                 params["volumeID"] = vol_id
                 self.api.CallWithRetry("PurgeDeletedVolume", params)
 
+    def ListVolumeStats(self, volumeIDs=None):
+        """
+        Get the stats for many volumes in one call
+
+        Args:
+            volumeIDs:  only get stats for these volumes (list of int). If not specified, get stats for all volumes
+
+        Returns:
+            A dictionary of volumeID (int) => volume stats (dict)
+        """
+        version = GetHighestAPIVersion(self.mvip, self.username, self.password)
+        params = {}
+        # Newer clusters can filter on the server side; older ones return everything and we filter here
+        if volumeIDs and version >= 11.0:
+            params["volumeIDs"] = list(volumeIDs)
+        result = self.api.CallWithRetry("ListVolumeStatsByVolume", params, apiVersion=version)
+
+        if volumeIDs:
+            wanted = set(volumeIDs)
+            return {stats["volumeID"] : stats for stats in result["volumeStats"] if stats["volumeID"] in wanted}
+        return {stats["volumeID"] : stats for stats in result["volumeStats"]}
+
     def GetVolumeSliceServices(self, volumeID):
         """
         Get the primary and one or more secondary slice services for a volume
@@ -1244,7 +1698,23 @@ class SFCluster(object):
             A dictionary with primary and secondary service IDs for the volume (dict)
         """
         stats = self.api.CallWithRetry("GetVolumeStats", {"volumeID" : volumeID}, apiVersion=GetHighestAPIVersion(self.mvip, self.username, self.password))["volumeStats"]
-        return {"primary" : stats["metadataHosts"]["primary"], "secondaries" : stats["metadataHosts"]["liveSecondaries"] + stats["metadataHosts"]["deadSecondaries"]}
+        return _SliceServicesFromStats(stats)
+
+    def GetVolumesSliceServices(self, volumeIDs):
+        """
+        Get the primary and secondary slice services for a list of volumes, in one call
+
+        Args:
+            volumeIDs:  the IDs of the volumes (list of int)
+
+        Returns:
+            A dictionary of volumeID (int) => dictionary with primary and secondary service IDs for the volume (dict)
+        """
+        all_stats = self.ListVolumeStats(volumeIDs)
+        missing = set(volumeIDs).difference(all_stats.keys())
+        if missing:
+            raise UnknownObjectError("Could not find stats for volumes {}".format(",".join([str(vid) for vid in sorted(missing)])))
+        return {vol_id : _SliceServicesFromStats(stats) for vol_id, stats in all_stats.items()}
 
     def IsVolumeSyncing(self, volumeID):
         """
@@ -1257,17 +1727,22 @@ class SFCluster(object):
             True if it is syncing, False otherwise (bool)
         """
         stats = self.api.CallWithRetry("GetVolumeStats", {"volumeID" : volumeID}, apiVersion=GetHighestAPIVersion(self.mvip, self.username, self.password))["volumeStats"]
-        
-        # Special case for single node clusters - there are no secondaries
-        if not stats["metadataHosts"]["liveSecondaries"] and not stats["metadataHosts"]["deadSecondaries"]:
-            return True
+        return _IsSyncingFromStats(stats)
+
+    def GetSyncingVolumes(self, volumeIDs):
+        """
+        Check which of a list of volumes are slice syncing, in one call
 
-        if len(stats["metadataHosts"]["deadSecondaries"]) > 0:
-            return True
-        if len(stats["metadataHosts"]["liveSecondaries"]) > 1:
-            return True
+        Args:
+            volumeIDs:  the IDs of the volumes to check (list of int)
 
-    def ForceWholeFileSync(self, volumeID, waitForSyncing=False, timeout=300):
+        Returns:
+            The IDs of the volumes that are syncing (set of int)
+        """
+        all_stats = self.ListVolumeStats(volumeIDs)
+        return set([vol_id for vol_id, stats in all_stats.items() if _IsSyncingFromStats(stats)])
+
+    def ForceWholeFileSync(self, volumeID, waitForSyncing=False, timeout=300, sliceServices=None):
         """
         Force a full sync from the primary to each of its secondaries
         
@@ -1275,8 +1750,10 @@ class SFCluster(object):
             volumeID:           the ID of the volume to sync (int)
             waitForSyncing:     wait for slice syncing to complete (bool)
             timeout:            how long to wait for syncing, in seconds (int)
+            sliceServices:      the slice services for the volume, from GetVolumesSliceServices.  If not specified they
+                                will be looked up (dict)
         """
-        services = self.GetVolumeSliceServices(volumeID)
+        services = sliceServices or self.GetVolumeSliceServices(volumeID)
 
         # Special case for single node clusters
         if not services["secondaries"]:
@@ -1291,13 +1768,32 @@ class SFCluster(object):
 
         if waitForSyncing:
             self.log.info("Waiting for volume {} to sync".format(volumeID))
-            start_time = time.time()
-            while True:
-                if not self.IsVolumeSyncing(volumeID):
-                    break
-                time.sleep(sfdefaults.TIME_SECOND)
-                if time.time() - start_time > timeout:
-                    raise SFTimeoutError("Timeout waiting for syncing on volume {}".format(volumeID))
+            self.WaitForVolumesSync([volumeID], timeout)
+
+    def WaitForVolumesSync(self, volumeIDs, timeout=300):
+        """
+        Wait for a list of volumes to finish slice syncing, checking all of them with a single call each poll.
+        The wait only gives up when none of the volumes have finished syncing for the whole timeout, so large sets of
+        volumes have as long as they need while they keep making progress
+
+        Args:
+            volumeIDs:  the IDs of the volumes to wait for (list of int)
+            timeout:    how long to wait without any volume finishing syncing, in seconds (int)
+        """
+        syncing = {"volumes" : set(volumeIDs), "progressTime" : clockutil.Time()}
+        def _Synced():
+            still_syncing = self.GetSyncingVolumes(volumeIDs)
+            if len(still_syncing) < len(syncing["volumes"]):
+                syncing["progressTime"] = clockutil.Time()
+            syncing["volumes"] = still_syncing
+            if still_syncing and clockutil.Time() - syncing["progressTime"] >= timeout:
+                raise SFTimeoutError("Timeout waiting for syncing on volumes {}".format(",".join([str(vid) for vid in sorted(still_syncing)])))
+            return not still_syncing
+        def _Progress(_attempt, _elapsed):
+            self.log.debug("{} volumes still syncing".format(len(syncing["volumes"])))
+        waitutil.WaitUntil(_Synced,
+                           strategy=waitutil.ExponentialInterval(initial=1, maximum=10),
+                           progress=_Progress)
 
     def CreateVLAN(self, tag, addressStart, addressCount, netmask, svip, namespace=False):
         """
@@ -1339,12 +1835,12 @@ class SFCluster(object):
         """
         Wait for an async handle to complete
         """
-        while True:
+        def _Complete():
             result = self.GetAsyncResult(asyncHandle)
-            if result["status"] == "complete":
-                break
-            time.sleep(sfdefaults.TIME_SECOND * 10)
-        return result
+            return result if result["status"] == "complete" else None
+        return waitutil.WaitUntil(_Complete,
+                                  strategy=waitutil.ExponentialInterval(initial=1, maximum=15),
+                                  description="async handle {}".format(asyncHandle))
 
     def RemoveSSLCertificate(self):
         """
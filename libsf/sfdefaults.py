@@ -22,11 +22,32 @@ use_multiprocessing = False         # Use multiprocessing instead of multithread
 all_api_versions = [                # All known endpoint versions
     0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 7.1, 7.2, 7.3, 7.4, 8.0, 8.1, 8.2, 8.3, 8.4, 9.0]
 parallel_thresh = 5                 # Run multi-client actions in parallel if there are more than this many
-parallel_max = 20                   # Run at most this many multi-client actions in parallel
 parallel_calls_min = 2              # Run multiple operations in parallel if there are at least this many
-parallel_calls_max = 100            # Run at most this many operations in parallel
+concurrency = 32                    # Run at most this many I/O bound operations (API calls, SSH, IPMI) in parallel
+scheduler_aging_interval = 10       # Seconds queued work in the shared I/O pool waits before it is treated as one priority class more urgent
+scheduler_bulk_share = 0.75         # Fraction of the shared I/O pool that bulk work can use, leaving the rest free for control-plane checks
+discover_parallel_max = 64          # Most addresses to probe at once when searching a subnet for nodes, in a pool of its own since most probes just time out
+progress_interval = 10              # Seconds between progress reports from bulk operations
+progress_status_file = None         # JSON file to keep the latest progress of bulk operations in (None to not write one)
+api_adaptive_concurrency = True     # Adapt how many API calls run at once against each endpoint, backing off when it is overloaded
+api_latency_spike_factor = 4        # An API call this many times slower than usual for its method counts as the endpoint being overloaded
+api_read_rate = 0                   # Most List/Get API calls per second to send to one endpoint (0 for no limit)
+api_read_burst = 20                 # Most List/Get API calls to send to one endpoint at once after it has been quiet
+api_write_rate = 0                  # Most modifying API calls per second to send to one endpoint (0 for no limit)
+api_write_burst = 10                # Most modifying API calls to send to one endpoint at once after it has been quiet
+api_clone_rate = 0                  # Most clone/copy API calls per second to send to one endpoint (0 for no limit)
+api_clone_burst = 2                 # Most clone/copy API calls to send to one endpoint at once after it has been quiet
 xenapi_parallel_calls_thresh = 2    # Run multiple XenServer API operations in parallel if there are more than this many
 xenapi_parallel_calls_max = 5       # Run at most this many parallel operations with XenServer API
+volgroup_batch_window = 1           # Seconds to collect volume access group changes from many threads into one modify call
+cluster_api_parallel_max = 16       # Run at most this many API calls in parallel against one cluster
+ssh_keepalive_interval = 30         # Seconds between keepalives on pooled SSH connections
+ssh_idle_timeout = 300              # Seconds a pooled SSH connection can sit unused before it is closed
+journal_dir = None                  # Directory to keep bulk operation journals in (None to use the system temp dir)
+inventory_cache = None              # SQLite file to cache cluster inventory in between runs (None to not cache)
+inventory_cache_max_age = 3600      # Seconds a cached inventory family can be used for, even if the cluster has no new events
+drive_event_poll_interval = 10      # Seconds between checks of cluster events while waiting for drives
+drive_relist_interval = 60          # Seconds to wait before re-listing drives when no drive events have been seen
 
 # =============================================================================
 # Default Values
@@ -75,6 +96,7 @@ client_volume_sort = "iqn"          # Sort order for displaying client volumes
 client_boot_timeout = 300           # Time for a client to boot up, in seconds
 # Volumes
 login_order = "serial"              # Order to log in to volumes on the client (serial or parallel)
+login_parallel_max = 16             # Most iSCSI logins to run at once on a client when logging in to a list of targets in parallel
 auth_type = "chap"                  # iSCSI auth type - chap or none
 connection_type = "iscsi"           # Type of volume connection (FC or iSCSI)
 volume_access = "readWrite"         # Volume access level
@@ -0,0 +1,550 @@
+#!/usr/bin/env python
+"""
+Point in time inventory of the objects on a SolidFire cluster, with cross reference indexes
+"""
+from . import SolidFireClusterAPI, GetHighestAPIVersion, InvalidArgumentError, UnknownObjectError
+from . import sfdefaults
+from . import threadutil
+from .logutil import GetLogger
+from .sfvoltable import VolumeTable
+import json
+import six
+import sqlite3
+import threading
+import time
+
+class InventoryFamily(object):
+    """Families of objects in a cluster inventory"""
+    Accounts = "accounts"
+    Volumes = "volumes"
+    VolumeAccessGroups = "volgroups"
+    Nodes = "nodes"
+    Drives = "drives"
+
+    All = [Accounts, Volumes, VolumeAccessGroups, Nodes, Drives]
+
+# API method, result key and ID key for each family
+_FAMILY_CALLS = {
+    InventoryFamily.Accounts : ("ListAccounts", "accounts", "accountID"),
+    InventoryFamily.Volumes : ("ListActiveVolumes", "volumes", "volumeID"),
+    InventoryFamily.VolumeAccessGroups : ("ListVolumeAccessGroups", "volumeAccessGroups", "volumeAccessGroupID"),
+    InventoryFamily.Nodes : ("ListActiveNodes", "nodes", "nodeID"),
+    InventoryFamily.Drives : ("ListDrives", "drives", "driveID"),
+}
+
+# Keys whose string values are repeated across many objects or used as lookup keys, and are worth interning
+_INTERN_KEYS = set(["name", "username", "iqn", "status", "type", "access", "mip", "serial"])
+
+class FrozenDict(dict):
+    """A dictionary that cannot be modified after it is created"""
+
+    def _Immutable(self, *args, **kwargs):
+        raise TypeError("Inventory objects are read-only")
+
+    __setitem__ = _Immutable
+    __delitem__ = _Immutable
+    clear = _Immutable
+    pop = _Immutable
+    popitem = _Immutable
+    setdefault = _Immutable
+    update = _Immutable
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+def _Freeze(obj, key=None):
+    """Recursively convert a JSON object into an immutable, compact equivalent"""
+    if isinstance(obj, dict):
+        return FrozenDict((k, _Freeze(v, k)) for k, v in obj.items())
+    if isinstance(obj, list):
+        return tuple(_Freeze(v, key) for v in obj)
+    if key in _INTERN_KEYS and isinstance(obj, str):
+        return six.moves.intern(obj)
+    return obj
+
+@threadutil.threadwrapper
+def _FetchFamily(mvip, username, password, family, apiVersion):
+    """Get the list of objects in one inventory family, run as a thread"""
+    method, result_key, _ = _FAMILY_CALLS[family]
+    api = SolidFireClusterAPI(mvip,
+                              username,
+                              password,
+                              maxRetryCount=5,
+                              retrySleep=20,
+                              errorLogThreshold=1,
+                              errorLogRepeat=1)
+    return api.CallWithRetry(method, {}, apiVersion=apiVersion)[result_key]
+
+class ClusterInventory(object):
+    """
+    Read-only snapshot of the accounts, volumes, volume access groups, nodes and drives on a cluster.
+    This object is typically meant to be constructed by SFCluster.Snapshot
+    """
+
+    @staticmethod
+    def Fetch(mvip, username, password, families=None):
+        """
+        Get a new inventory from the cluster, fetching each family of objects in parallel
+
+        Args:
+            mvip:       the management VIP of the cluster (string)
+            username:   the admin user of the cluster (string)
+            password:   the admin password of the cluster (string)
+            families:   the families of objects to get (list of InventoryFamily).  If not specified, get all of them
+
+        Returns:
+            A ClusterInventory object
+        """
+        inventory = ClusterInventory(mvip, username, password, {})
+        return inventory.Refresh(*(families or InventoryFamily.All))
+
+    def __init__(self, mvip, username, password, families):
+        """
+        Args:
+            mvip:       the management VIP of the cluster
+            username:   the admin username of the cluster
+            password:   the admin password of the cluster
+            families:   dictionary of family name => dictionary of object ID => object (dict)
+        """
+        self.mvip = mvip
+        self.username = username
+        self.password = password
+        self._families = families
+        self._BuildIndexes()
+
+    def __getstate__(self):
+        return {"mvip" : self.mvip, "username" : self.username, "password" : self.password, "_families" : self._families}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._BuildIndexes()
+
+    def _BuildIndexes(self):
+        """Build the cross reference indexes between the families in this inventory"""
+        accounts = self._families.get(InventoryFamily.Accounts, {})
+        volumes = self._families.get(InventoryFamily.Volumes, {})
+        volgroups = self._families.get(InventoryFamily.VolumeAccessGroups, {})
+        nodes = self._families.get(InventoryFamily.Nodes, {})
+        drives = self._families.get(InventoryFamily.Drives, {})
+
+        self._accountNames = {account["username"].lower() : account_id for account_id, account in accounts.items()}
+        self._volgroupNames = {group["name"].lower() : group_id for group_id, group in volgroups.items()}
+        self._nodeIPs = {node["mip"] : node_id for node_id, node in nodes.items()}
+
+        self._volumeAccount = {vol_id : int(account_id) for vol_id, account_id in zip(volumes, volumes.Column("accountID"))} if volumes else {}
+        account_volumes = {}
+        for vol_id, account_id in self._volumeAccount.items():
+            account_volumes.setdefault(account_id, []).append(vol_id)
+        self._accountVolumes = {account_id : tuple(sorted(vol_ids)) for account_id, vol_ids in account_volumes.items()}
+
+        volume_groups = {}
+        self._initiatorGroup = {}
+        for group_id, group in volgroups.items():
+            for vol_id in group["volumes"]:
+                volume_groups.setdefault(vol_id, []).append(group_id)
+            for init in group["initiators"]:
+                self._initiatorGroup[init.lower()] = group_id
+        self._volumeGroups = {vol_id : tuple(group_ids) for vol_id, group_ids in volume_groups.items()}
+
+        node_drives = {}
+        for drive_id, drive in drives.items():
+            node_drives.setdefault(drive["nodeID"], []).append(drive_id)
+        self._nodeDrives = {node_id : tuple(sorted(drive_ids)) for node_id, drive_ids in node_drives.items()}
+
+    def Refresh(self, *families):
+        """
+        Get a new inventory with the given families re-read from the cluster and the rest shared with this one
+
+        Args:
+            families:   the families of objects to re-read (InventoryFamily)
+
+        Returns:
+            A new ClusterInventory object
+        """
+        unknown = set(families).difference(InventoryFamily.All)
+        if unknown:
+            raise InvalidArgumentError("Unknown inventory families {}".format(",".join(sorted(unknown))))
+
+        log = GetLogger()
+        log.debug("Getting cluster inventory of {}".format(",".join(families)))
+        version = GetHighestAPIVersion(self.mvip, self.username, self.password)
+
+        # Get the families in parallel from the main thread. From other threads, get them serially
+        # so we cannot deadlock waiting on the pool we are running in
+        raw = {}
+        cache = InventoryCache.Get(self.mvip, self.username, self.password)
+        if cache:
+            token = cache.Token()
+            for family in families:
+                objects = cache.Find(family, token)
+                if objects is not None:
+                    raw[family] = objects
+        fetch = [family for family in families if family not in raw]
+        if threadutil.IsMainThread():
+            pool = threadutil.GlobalPool()
+            results = {family : pool.Post(_FetchFamily, self.mvip, self.username, self.password, family, version) for family in fetch}
+            for family, res in results.items():
+                raw[family] = res.Get()
+        else:
+            for family in fetch:
+                raw[family] = _FetchFamily(self.mvip, self.username, self.password, family, version)
+        if cache:
+            for family in fetch:
+                cache.Store(family, token, raw[family])
+
+        new_families = dict(self._families)
+        for family, objects in raw.items():
+            if family == InventoryFamily.Volumes:
+                # There can be a very large number of volumes, so keep them in a compact table
+                new_families[family] = VolumeTable(objects)
+                continue
+            id_key = _FAMILY_CALLS[family][2]
+            new_families[family] = {obj[id_key] : _Freeze(obj) for obj in objects}
+
+        return ClusterInventory(self.mvip, self.username, self.password, new_families)
+
+    def _Family(self, family):
+        if family not in self._families:
+            raise InvalidArgumentError("{} are not included in this inventory".format(family))
+        return self._families[family]
+
+    @property
+    def accounts(self):
+        """Dictionary of accountID (int) => account (dict)"""
+        return self._Family(InventoryFamily.Accounts)
+
+    @property
+    def volumes(self):
+        """Table of volumeID (int) => volume (VolumeTable)"""
+        return self._Family(InventoryFamily.Volumes)
+
+    @property
+    def volgroups(self):
+        """Dictionary of volumeAccessGroupID (int) => volume access group (dict)"""
+        return self._Family(InventoryFamily.VolumeAccessGroups)
+
+    @property
+    def nodes(self):
+        """Dictionary of nodeID (int) => node (dict)"""
+        return self._Family(InventoryFamily.Nodes)
+
+    @property
+    def drives(self):
+        """Dictionary of driveID (int) => drive (dict)"""
+        return self._Family(InventoryFamily.Drives)
+
+    def FindAccount(self, accountName=None, accountID=None):
+        """
+        Find an account with the given name or ID
+
+        Args:
+            accountName:    the name of the account to find (string)
+            accountID:      the ID of the account to find (int)
+
+        Returns:
+            An account dictionary (dict)
+        """
+        if not accountName and not accountID:
+            raise InvalidArgumentError("Please specify either accountName or accountID")
+        accounts = self.accounts
+        if accountName:
+            account_id = self._accountNames.get(str(accountName).lower())
+            if account_id is None:
+                raise UnknownObjectError("Could not find account with name {}".format(accountName))
+            return accounts[account_id]
+        if int(accountID) not in accounts:
+            raise UnknownObjectError("Could not find account with ID {}".format(accountID))
+        return accounts[int(accountID)]
+
+    def FindVolumeAccessGroup(self, volgroupName=None, volgroupID=None):
+        """
+        Find a volume access group with the given name or ID
+
+        Args:
+            volgroupName:   the name of the group to find (string)
+            volgroupID:     the ID of the group to find (int)
+
+        Returns:
+            A volume access group dictionary (dict)
+        """
+        if not volgroupName and not volgroupID:
+            raise InvalidArgumentError("Please specify either volgroupName or volgroupID")
+        volgroups = self.volgroups
+        if volgroupName:
+            group_id = self._volgroupNames.get(volgroupName.lower())
+            if group_id is None:
+                raise UnknownObjectError("Could not find group with name {}".format(volgroupName))
+            return volgroups[group_id]
+        if int(volgroupID) not in volgroups:
+            raise UnknownObjectError("Could not find group with ID {}".format(volgroupID))
+        return volgroups[int(volgroupID)]
+
+    def FindNode(self, nodeIP=None, nodeID=0):
+        """
+        Find a node with the given IP or ID
+
+        Args:
+            nodeIP:     the management IP address of the node (string)
+            nodeID:     the nodeID of the node (int)
+
+        Returns:
+            A node dictionary (dict)
+        """
+        nodes = self.nodes
+        if nodeIP:
+            node_id = self._nodeIPs.get(nodeIP)
+            if node_id is None:
+                raise UnknownObjectError("Could not find node {}".format(nodeIP))
+            return nodes[node_id]
+        if nodeID not in nodes:
+            raise UnknownObjectError("Could not find node {}".format(nodeID))
+        return nodes[nodeID]
+
+    def GetAccountForVolume(self, volumeID):
+        """
+        Get the account that owns a volume
+
+        Args:
+            volumeID:   the ID of the volume (int)
+
+        Returns:
+            An account dictionary (dict)
+        """
+        self._Family(InventoryFamily.Volumes)
+        if volumeID not in self._volumeAccount:
+            raise UnknownObjectError("Could not find volume {}".format(volumeID))
+        return self.FindAccount(accountID=self._volumeAccount[volumeID])
+
+    def GetVolumesForAccount(self, accountID):
+        """
+        Get the active volumes in an account
+
+        Args:
+            accountID:  the ID of the account (int)
+
+        Returns:
+            A list of volume dictionaries (list of dict)
+        """
+        volumes = self.volumes
+        return [volumes[vol_id] for vol_id in self._accountVolumes.get(accountID, ())]
+
+    def GetVolumeAccessGroupsForVolume(self, volumeID):
+        """
+        Get the volume access groups a volume is in
+
+        Args:
+            volumeID:   the ID of the volume (int)
+
+        Returns:
+            A list of volume access group dictionaries (list of dict)
+        """
+        volgroups = self.volgroups
+        return [volgroups[group_id] for group_id in self._volumeGroups.get(volumeID, ())]
+
+    def GetVolumeAccessGroupForInitiator(self, initiator):
+        """
+        Get the volume access group an initiator is in
+
+        Args:
+            initiator:  the IQN or WWN of the initiator (string)
+
+        Returns:
+            A volume access group dictionary (dict) or None if the initiator is not in a group
+        """
+        volgroups = self.volgroups
+        group_id = self._initiatorGroup.get(initiator.lower())
+        if group_id is None:
+            return None
+        return volgroups[group_id]
+
+    def GetDrivesForNode(self, nodeID):
+        """
+        Get the drives in a node
+
+        Args:
+            nodeID:     the ID of the node (int)
+
+        Returns:
+            A list of drive dictionaries (list of dict)
+        """
+        drives = self.drives
+        return [drives[drive_id] for drive_id in self._nodeDrives.get(nodeID, ())]
+
+# Name key and parent ID key that each family is indexed by in the inventory cache
+_CACHE_KEYS = {
+    InventoryFamily.Accounts : ("username", None),
+    InventoryFamily.Volumes : ("name", "accountID"),
+    InventoryFamily.VolumeAccessGroups : ("name", None),
+    InventoryFamily.Nodes : ("mip", None),
+    InventoryFamily.Drives : ("serial", "nodeID"),
+}
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS families (uuid TEXT, family TEXT, eventID INTEGER, updated REAL, PRIMARY KEY (uuid, family));
+CREATE TABLE IF NOT EXISTS objects (uuid TEXT, family TEXT, objectID INTEGER, name TEXT COLLATE NOCASE, parentID INTEGER, data TEXT, PRIMARY KEY (uuid, family, objectID));
+CREATE INDEX IF NOT EXISTS objects_name ON objects (uuid, family, name);
+CREATE INDEX IF NOT EXISTS objects_parent ON objects (uuid, family, parentID);
+"""
+
+class InventoryCache(object):
+    """
+    Local SQLite cache of cluster inventory families, shared between runs and keyed by cluster UUID.
+
+    A cached family is only used while the newest event ID on the cluster is the same as when the family was stored
+    and the family is younger than sfdefaults.inventory_cache_max_age, so checking the cache costs one ListEvents
+    call instead of listing every object.  The cache is off unless sfdefaults.inventory_cache is set to the path of
+    the database file
+    """
+
+    _caches = {}
+    _cachesLock = threading.Lock()
+
+    @staticmethod
+    def Get(mvip, username, password):
+        """
+        Get the cache for a cluster
+
+        Args:
+            mvip:       the management VIP of the cluster (string)
+            username:   the admin user of the cluster (string)
+            password:   the admin password of the cluster (string)
+
+        Returns:
+            An InventoryCache object, or None if the cache is not enabled
+        """
+        if not sfdefaults.inventory_cache:
+            return None
+        with InventoryCache._cachesLock:
+            key = (sfdefaults.inventory_cache, mvip, username, password)
+            if key not in InventoryCache._caches:
+                InventoryCache._caches[key] = InventoryCache(sfdefaults.inventory_cache, mvip, username, password)
+            return InventoryCache._caches[key]
+
+    def __init__(self, path, mvip, username, password):
+        """
+        Args:
+            path:       the SQLite database file to keep the cache in
+            mvip:       the management VIP of the cluster
+            username:   the admin username of the cluster
+            password:   the admin password of the cluster
+        """
+        self.path = path
+        self.mvip = mvip
+        self.username = username
+        self.password = password
+        self.log = GetLogger()
+        self._uuid = None
+
+    def _API(self):
+        return SolidFireClusterAPI(self.mvip,
+                                   self.username,
+                                   self.password,
+                                   maxRetryCount=5,
+                                   retrySleep=20,
+                                   errorLogThreshold=1,
+                                   errorLogRepeat=1)
+
+    def _Connect(self):
+        """Open a connection to the cache database, creating it if needed"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.executescript(_CACHE_SCHEMA)
+        return conn
+
+    def Token(self):
+        """
+        Get the current change token of the cluster, to compare against the cached families
+
+        Returns:
+            A tuple of (cluster UUID, newest event ID) (tuple)
+        """
+        api = self._API()
+        if not self._uuid:
+            self._uuid = api.CallWithRetry("GetClusterInfo", {})["clusterInfo"]["uuid"]
+        events = api.CallWithRetry("ListEvents", {"maxEvents" : 1})["events"]
+        return (self._uuid, max([event["eventID"] for event in events] or [0]))
+
+    def _IsFresh(self, conn, family, token):
+        row = conn.execute("SELECT eventID, updated FROM families WHERE uuid = ? AND family = ?", (token[0], family)).fetchone()
+        return row is not None and row[0] == token[1] and time.time() - row[1] < float(sfdefaults.inventory_cache_max_age)
+
+    def Find(self, family, token, objectID=None, name=None, parentID=None):
+        """
+        Find objects in a cached family
+
+        Args:
+            family:     the family to search (InventoryFamily)
+            token:      the current change token from Token (tuple)
+            objectID:   only get the object with this ID (int)
+            name:       only get objects with this name, ignoring case (string)
+            parentID:   only get objects with this account ID (volumes) or node ID (drives) (int)
+
+        Returns:
+            A list of object dictionaries (list of dict), or None if the cached family is missing or stale
+        """
+        query = "SELECT data FROM objects WHERE uuid = ? AND family = ?"
+        params = [token[0], family]
+        for column, value in (("objectID", objectID), ("name", name), ("parentID", parentID)):
+            if value is not None:
+                query += " AND {} = ?".format(column)
+                params.append(value)
+        query += " ORDER BY objectID"
+        try:
+            conn = self._Connect()
+            try:
+                if not self._IsFresh(conn, family, token):
+                    return None
+                return [json.loads(row[0]) for row in conn.execute(query, params)]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self.log.debug("Could not read inventory cache {}: {}".format(self.path, e))
+            return None
+
+    def Store(self, family, token, objects):
+        """
+        Replace a family in the cache
+
+        Args:
+            family:     the family to store (InventoryFamily)
+            token:      the change token from before the objects were read from the cluster (tuple)
+            objects:    the objects in the family (list of dict)
+        """
+        id_key = _FAMILY_CALLS[family][2]
+        name_key, parent_key = _CACHE_KEYS[family]
+        rows = [(token[0], family, obj[id_key], obj.get(name_key), obj.get(parent_key) if parent_key else None, json.dumps(obj)) for obj in objects]
+        try:
+            conn = self._Connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM objects WHERE uuid = ? AND family = ?", (token[0], family))
+                    conn.executemany("INSERT INTO objects (uuid, family, objectID, name, parentID, data) VALUES (?, ?, ?, ?, ?, ?)", rows)
+                    conn.execute("INSERT OR REPLACE INTO families (uuid, family, eventID, updated) VALUES (?, ?, ?, ?)", (token[0], family, token[1], time.time()))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self.log.debug("Could not write inventory cache {}: {}".format(self.path, e))
+
+    def List(self, family, fetchFunc):
+        """
+        Get the objects in a family from the cache if it is current, otherwise from the cluster and store them
+
+        Args:
+            family:     the family to get (InventoryFamily)
+            fetchFunc:  function that lists the objects in the family from the cluster (callable)
+
+        Returns:
+            A list of object dictionaries (list of dict)
+        """
+        token = self.Token()
+        objects = self.Find(family, token)
+        if objects is None:
+            self.log.debug("Inventory cache miss for {}".format(family))
+            objects = fetchFunc()
+            self.Store(family, token, objects)
+        return objects
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+"""
+Declarative layouts of accounts, volumes and volume access groups, and reconciling a cluster to match one
+"""
+import json
+from collections import OrderedDict
+from io import open
+import six
+from . import SolidFireClusterAPI, SolidFireError, InvalidArgumentError, UnknownObjectError, LocalEnvironmentError
+from . import threadutil
+from .logutil import GetLogger
+from .sfcluster import SFCluster
+from .sfinventory import InventoryFamily
+
+# Block size that volume sizes are rounded up to by the cluster
+_VOLUME_SIZE_ROUNDING = 4096
+
+class _Ref(object):
+    """Reference to the ID of an object that does not exist yet, filled in once an earlier phase creates it"""
+
+    def __init__(self, *key):
+        self.key = key
+
+    def __repr__(self):
+        return "<{}>".format("/".join([str(part) for part in self.key]))
+
+def _Resolve(value, ids):
+    """Replace any references in a parameter value with the IDs they refer to"""
+    if isinstance(value, _Ref):
+        return ids[value.key]
+    if isinstance(value, dict):
+        return {key : _Resolve(val, ids) for key, val in six.iteritems(value)}
+    if isinstance(value, list):
+        return [_Resolve(val, ids) for val in value]
+    return value
+
+class LayoutStep(object):
+    """A single API call needed to bring the cluster in line with a layout"""
+
+    def __init__(self, description, method, params, apiVersion=6.0, creates=None):
+        """
+        Args:
+            description:    human readable description of this step (string)
+            method:         the API method to call (string)
+            params:         the parameters for the call, which may contain references to objects created by earlier phases (dict)
+            apiVersion:     the API version to use (float)
+            creates:        function that takes the call result and returns a dictionary of the references and IDs it created (callable)
+        """
+        self.description = description
+        self.method = method
+        self.params = params
+        self.apiVersion = apiVersion
+        self.creates = creates
+
+    def __repr__(self):
+        return self.description
+
+class LayoutPlan(object):
+    """The minimal list of API calls to bring a cluster in line with a layout, grouped into phases in dependency order"""
+
+    Phases = ["accounts", "volumes", "volgroups"]
+
+    def __init__(self):
+        self.steps = OrderedDict([(phase, []) for phase in LayoutPlan.Phases])
+
+    def __len__(self):
+        return sum([len(steps) for steps in self.steps.values()])
+
+    def __iter__(self):
+        for steps in self.steps.values():
+            for step in steps:
+                yield step
+
+    def Add(self, phase, step):
+        """
+        Add a step to a phase of the plan
+
+        Args:
+            phase:  the phase to add to (string)
+            step:   the step to add (LayoutStep)
+        """
+        self.steps[phase].append(step)
+
+    def Execute(self, mvip, username, password):
+        """
+        Run the plan against a cluster.  Each phase is run in parallel, and each phase waits for the one before it to
+        finish so the objects it depends on exist
+
+        Args:
+            mvip:       the management VIP of the cluster (string)
+            username:   the admin user of the cluster (string)
+            password:   the admin password of the cluster (string)
+        """
+        log = GetLogger()
+        ids = {}
+        pool = threadutil.GlobalPool()
+        for phase, steps in six.iteritems(self.steps):
+            if not steps:
+                continue
+            log.info("Updating {} {}".format(len(steps), phase))
+            results = [pool.Post(_CallThread, mvip, username, password, step.method, _Resolve(step.params, ids), step.apiVersion) for step in steps]
+
+            failed = 0
+            for step, res in zip(steps, results):
+                try:
+                    result = res.Get()
+                except SolidFireError as e:
+                    log.error("  Failed to {}: {}".format(step.description, e))
+                    failed += 1
+                    continue
+                log.debug("  Finished {}".format(step.description))
+                if step.creates:
+                    ids.update(step.creates(result))
+
+            if failed:
+                raise SolidFireError("Failed {} of {} calls updating {}".format(failed, len(steps), phase))
+
+@threadutil.threadwrapper
+def _CallThread(mvip, username, password, method, params, apiVersion):
+    """Make one API call, run as a thread"""
+    api = SolidFireClusterAPI(mvip,
+                              username,
+                              password,
+                              logger=GetLogger(),
+                              maxRetryCount=5,
+                              retrySleep=20,
+                              errorLogThreshold=1,
+                              errorLogRepeat=1)
+    return api.CallWithRetry(method, params, apiVersion=apiVersion)
+
+class ClusterLayout(object):
+    """
+    The desired accounts, volumes and volume access groups on a cluster
+
+    A layout is a dictionary like this:
+        {
+            "accounts" : [
+                {"name" : "acct1", "initiatorSecret" : "...", "targetSecret" : "..."}
+            ],
+            "volumes" : [
+                {"name" : "vol1", "account" : "acct1", "size" : 100, "qos" : {"minIOPS" : 100, "maxIOPS" : 1000, "burstIOPS" : 1000}},
+                {"prefix" : "acct1-", "count" : 10, "start" : 1, "account" : "acct1", "size" : 100, "gib" : true, "enable512e" : true}
+            ],
+            "volgroups" : [
+                {"name" : "group1", "initiators" : ["iqn.1993-08.org.debian:01:client1"], "volumes" : ["vol1", "acct1-00001"]}
+            ]
+        }
+    Volume sizes are in GB, or GiB if gib is set.  Volumes given with a prefix and count are named prefix + %05d
+    """
+
+    def __init__(self, layout):
+        """
+        Args:
+            layout:     the layout (dict)
+        """
+        self.accounts = OrderedDict()
+        self.volumes = OrderedDict()
+        self.volgroups = OrderedDict()
+
+        if not isinstance(layout, dict):
+            raise InvalidArgumentError("Layout must be a dictionary")
+        unknown = set(layout.keys()) - set(["accounts", "volumes", "volgroups"])
+        if unknown:
+            raise InvalidArgumentError("Unknown layout sections: {}".format(", ".join(sorted(unknown))))
+
+        for account in layout.get("accounts", []):
+            if not account.get("name"):
+                raise InvalidArgumentError("Every account must have a name")
+            self.accounts[account["name"]] = account
+
+        for volume in layout.get("volumes", []):
+            self._AddVolumes(volume)
+
+        for volgroup in layout.get("volgroups", []):
+            if not volgroup.get("name"):
+                raise InvalidArgumentError("Every volume access group must have a name")
+            self.volgroups[volgroup["name"]] = volgroup
+
+    @staticmethod
+    def Load(filename):
+        """
+        Read a layout from a JSON file
+
+        Args:
+            filename:   the file to read (string)
+
+        Returns:
+            A ClusterLayout object
+        """
+        try:
+            with open(filename, "r", encoding="utf-8") as layout_file:
+                layout = json.load(layout_file)
+        except EnvironmentError as e:
+            raise LocalEnvironmentError(e)
+        except ValueError as e:
+            raise InvalidArgumentError("Could not parse layout {}: {}".format(filename, e))
+        return ClusterLayout(layout)
+
+    def _AddVolumes(self, volume):
+        """Expand a volume entry from the layout and add the volumes it describes"""
+        account = volume.get("account")
+        if not account:
+            raise InvalidArgumentError("Every volume must have an account")
+        if not volume.get("size"):
+            raise InvalidArgumentError("Every volume must have a size")
+        if volume.get("name"):
+            names = [volume["name"]]
+        elif volume.get("prefix") and volume.get("count"):
+            start = volume.get("start", 1)
+            names = ["{}{:05d}".format(volume["prefix"], num) for num in range(start, start + volume["count"])]
+        else:
+            raise InvalidArgumentError("Every volume must have a name, or a prefix and count")
+
+        unit = 1024 * 1024 * 1024 if volume.get("gib") else 1000 * 1000 * 1000
+        spec = {"totalSize" : volume["size"] * unit,
+                "enable512e" : volume.get("enable512e", False)}
+        if volume.get("qos"):
+            spec["qos"] = volume["qos"]
+        for name in names:
+            self.volumes[(account, name)] = spec
+
+    def Plan(self, inventory, prune=False):
+        """
+        Compare the layout to the current state of a cluster and work out the calls needed to make them match
+
+        Args:
+            inventory:  the current state of the cluster, with accounts, volumes and volume access groups (ClusterInventory)
+            prune:      remove initiators and volumes from the volume access groups in the layout that the layout does not list (bool)
+
+        Returns:
+            A LayoutPlan object
+        """
+        plan = LayoutPlan()
+
+        # Accounts
+        account_ids = {}
+        for name, account in six.iteritems(self.accounts):
+            try:
+                existing = inventory.FindAccount(accountName=name)
+            except UnknownObjectError:
+                existing = None
+            if existing and existing["username"] == name:
+                account_ids[name] = existing["accountID"]
+                changes = {key : account[key] for key in ("initiatorSecret", "targetSecret") if account.get(key) and account[key] != existing.get(key)}
+                if changes:
+                    changes["accountID"] = existing["accountID"]
+                    plan.Add("accounts", LayoutStep("modify account {}".format(name), "ModifyAccount", changes))
+                continue
+            params = {"username" : name}
+            params.update({key : account[key] for key in ("initiatorSecret", "targetSecret") if account.get(key)})
+            account_ids[name] = _Ref("account", name)
+            plan.Add("accounts", LayoutStep("create account {}".format(name), "AddAccount", params,
+                                            creates=lambda result, name=name: {("account", name) : result["accountID"]}))
+        for account_name, _ in self.volumes:
+            if account_name not in account_ids:
+                try:
+                    account_ids[account_name] = inventory.FindAccount(accountName=account_name)["accountID"]
+                except UnknownObjectError:
+                    raise InvalidArgumentError("Account {} is not in the layout or on the cluster".format(account_name))
+
+        # Volumes.  New volumes with the same settings are created together with one call
+        existing_volumes = {}
+        for vol in inventory.volumes.values():
+            existing_volumes.setdefault(vol["name"], []).append(vol)
+        volume_ids = {}
+        create_groups = OrderedDict()
+        for (account_name, name), spec in six.iteritems(self.volumes):
+            account_id = account_ids[account_name]
+            existing = [vol for vol in existing_volumes.get(name, []) if vol["accountID"] == account_id]
+            if not existing:
+                volume_ids[(account_name, name)] = _Ref("volume", account_name, name)
+                group_key = (account_name, spec["totalSize"], spec["enable512e"], json.dumps(spec.get("qos"), sort_keys=True))
+                create_groups.setdefault(group_key, []).append(name)
+                continue
+            if len(existing) > 1:
+                raise InvalidArgumentError("Account {} has {} volumes named {}".format(account_name, len(existing), name))
+            existing = existing[0]
+            volume_ids[(account_name, name)] = existing["volumeID"]
+
+            changes = {}
+            if spec["totalSize"] > existing["totalSize"]:
+                changes["totalSize"] = spec["totalSize"]
+            elif existing["totalSize"] - spec["totalSize"] >= _VOLUME_SIZE_ROUNDING:
+                raise InvalidArgumentError("Volume {} is larger than the layout and cannot be shrunk".format(name))
+            if spec.get("qos"):
+                qos = {key : value for key, value in six.iteritems(spec["qos"]) if existing.get("qos", {}).get(key) != value}
+                if qos:
+                    changes["qos"] = qos
+            if changes:
+                changes["volumeID"] = existing["volumeID"]
+                plan.Add("volumes", LayoutStep("modify volume {}".format(name), "ModifyVolume", changes))
+
+        for (account_name, total_size, enable512e, qos), names in six.iteritems(create_groups):
+            params = {"names" : names,
+                      "accountID" : account_ids[account_name],
+                      "totalSize" : total_size,
+                      "enable512e" : enable512e}
+            qos = json.loads(qos)
+            if qos:
+                params["qos"] = qos
+            plan.Add("volumes", LayoutStep("create {} volumes for account {}".format(len(names), account_name), "CreateMultipleVolumes", params,
+                                           creates=lambda result, account_name=account_name: {("volume", account_name, vol["name"]) : vol["volumeID"] for vol in result["volumes"]}))
+
+        # Volume access groups
+        for name, volgroup in six.iteritems(self.volgroups):
+            initiators = [init.lower() for init in volgroup.get("initiators", [])]
+            volumes = [self._FindVolumeID(vol_name, volume_ids, existing_volumes) for vol_name in volgroup.get("volumes", [])]
+            try:
+                existing = inventory.FindVolumeAccessGroup(volgroupName=name)
+            except UnknownObjectError:
+                existing = None
+            if not existing:
+                plan.Add("volgroups", LayoutStep("create volume access group {}".format(name), "CreateVolumeAccessGroup",
+                                                 {"name" : name, "initiators" : initiators, "volumes" : volumes}))
+                continue
+
+            changes = {}
+            current_initiators = [init.lower() for init in existing["initiators"]]
+            new_initiators = current_initiators + [init for init in initiators if init not in current_initiators]
+            if prune:
+                new_initiators = [init for init in new_initiators if init in initiators]
+            if new_initiators != current_initiators:
+                changes["initiators"] = new_initiators
+
+            current_volumes = list(existing["volumes"])
+            new_volumes = current_volumes + [vol for vol in volumes if vol not in current_volumes]
+            if prune:
+                new_volumes = [vol for vol in new_volumes if vol in volumes]
+            if new_volumes != current_volumes:
+                changes["volumes"] = new_volumes
+
+            if changes:
+                changes["volumeAccessGroupID"] = existing["volumeAccessGroupID"]
+                plan.Add("volgroups", LayoutStep("modify volume access group {}".format(name), "ModifyVolumeAccessGroup", changes))
+
+        return plan
+
+    def _FindVolumeID(self, volumeName, volumeIDs, existingVolumes):
+        """Find the ID or reference for a volume named in a volume access group"""
+        matches = [vol_id for (_, name), vol_id in six.iteritems(volumeIDs) if name == volumeName]
+        if not matches:
+            matches = [vol["volumeID"] for vol in existingVolumes.get(volumeName, [])]
+        if not matches:
+            raise InvalidArgumentError("Volume {} is not in the layout or on the cluster".format(volumeName))
+        if len(matches) > 1:
+            raise InvalidArgumentError("Volume name {} is not unique".format(volumeName))
+        return matches[0]
+
+def ApplyLayout(layout, mvip, username, password, prune=False, test=False):
+    """
+    Bring a cluster in line with a layout.  The cluster state is read once, and only the calls needed to close the
+    differences are made
+
+    Args:
+        layout:     the layout to apply (ClusterLayout)
+        mvip:       the management VIP of the cluster (string)
+        username:   the admin user of the cluster (string)
+        password:   the admin password of the cluster (string)
+        prune:      remove initiators and volumes from the volume access groups in the layout that the layout does not list (bool)
+        test:       only work out and return the plan, do not run it (bool)
+
+    Returns:
+        The plan that was run (LayoutPlan)
+    """
+    inventory = SFCluster(mvip, username, password).Snapshot([InventoryFamily.Accounts, InventoryFamily.Volumes, InventoryFamily.VolumeAccessGroups])
+    plan = layout.Plan(inventory, prune)
+    if not test and len(plan) > 0:
+        plan.Execute(mvip, username, password)
+    return plan
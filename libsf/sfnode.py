@@ -4,13 +4,14 @@ SolidFire node object and related data structures
 """
 import platform
 import re
-import time
 
+from . import clockutil
 from . import netutil
 from . import sfdefaults
 from . import threadutil
 from . import util
-from . import SSHConnection, SolidFireClusterAPI, SolidFireBootstrapAPI, SolidFireNodeAPI, SolidFireError, UnknownObjectError, SFTimeoutError
+from . import waitutil
+from . import SSHConnectionPool, SolidFireClusterAPI, SolidFireBootstrapAPI, SolidFireNodeAPI, SolidFireError, UnknownObjectError, SFTimeoutError
 from .shellutil import Shell
 from .logutil import GetLogger
 from .virtutil import VirtualMachine
@@ -164,7 +165,7 @@ class SFNode(object):
         if self.vm:
             raise NotImplementedError("Cannot get IPMI IP for virtual machines")
 
-        with SSHConnection(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
+        with SSHConnectionPool.Shared().Session(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
             _, stdout, _ = ssh.RunCommand(r"ipmitool lan print | egrep 'IP Address\s+:' | awk '{print $4}'")
             return stdout.strip()
 
@@ -195,7 +196,7 @@ class SFNode(object):
                 self.log.debug2(stdout)
                 break
             retry -= 1
-            time.sleep(sfdefaults.TIME_SECOND * 3)
+            threadutil.Sleep(sfdefaults.TIME_SECOND * 3)
         if retcode != 0:
             raise SolidFireError("ipmitool error: " + stdout + stderr)
         return stdout
@@ -216,7 +217,7 @@ class SFNode(object):
         else:
             timestamp = util.TimestampToStr(since, "%Y%m%d%H%M.%S")
             command = "touch -t " + timestamp + " /tmp/timestamp;find /sf -maxdepth 1 \\( -name \"core*\" ! -name \"core.zktreeutil*\" \\) -newer /tmp/timestamp"
-            with SSHConnection(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
+            with SSHConnectionPool.Shared().Session(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
                 _, stdout, _ = ssh.RunCommand(command)
                 return [line.strip() for line in stdout.split("\n")]
 
@@ -227,8 +228,10 @@ class SFNode(object):
         Args:
             waitForUp:  wait for the node to reboot and come back up
         """
-        with SSHConnection(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
+        with SSHConnectionPool.Shared().Session(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
             ssh.RunCommand("shutdown now -r")
+            # The connection goes down with the node, so do not leave it for the next user
+            SSHConnectionPool.Shared().Discard(ssh)
 
         self.WaitForDown()
 
@@ -242,8 +245,10 @@ class SFNode(object):
         Args:
             waitForUp:  wait for the node to reboot and come back up
         """
-        with SSHConnection(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
+        with SSHConnectionPool.Shared().Session(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
             ssh.RunCommand("reboot -f")
+            # The connection goes down with the node, so do not leave it for the next user
+            SSHConnectionPool.Shared().Discard(ssh)
 
         self.WaitForDown()
 
@@ -268,7 +273,7 @@ class SFNode(object):
             while True:
                 if self.GetPowerState() == "on":
                     break
-                time.sleep(sfdefaults.TIME_SECOND)
+                threadutil.Sleep(sfdefaults.TIME_SECOND)
 
         if waitForUp:
             wait = 20 if self.vm else 180
@@ -287,7 +292,7 @@ class SFNode(object):
             while True:
                 if self.GetPowerState() == "off":
                     break
-                time.sleep(sfdefaults.TIME_SECOND)
+                threadutil.Sleep(sfdefaults.TIME_SECOND)
 
     def GetPowerState(self):
         """
@@ -310,34 +315,29 @@ class SFNode(object):
         Wait for this node to be no longer responding on the network
         """
         self.log.info("Waiting for {} to go down".format(self.ipAddress))
-        while (netutil.Ping(self.ipAddress)):
-            time.sleep(sfdefaults.TIME_SECOND)
+        waitutil.WaitUntil(lambda: not netutil.Ping(self.ipAddress),
+                           strategy=waitutil.ExponentialInterval(initial=1, maximum=5),
+                           description="node {} to go down".format(self.ipAddress))
 
     def WaitForOff(self, timeout=180):
         """
         Wait for this node's power state to be OFF
         This is checking a state, not a transition
         """
-        start_time = time.time()
-        while True:
-            if self.GetPowerState() == "off":
-                break
-            if time.time() - start_time > timeout:
-                raise SFTimeoutError("Timeout waiting for node {} to power off".format(self.ipAddress))
-            time.sleep(2 * sfdefaults.TIME_SECOND)
+        waitutil.WaitUntil(lambda: self.GetPowerState() == "off",
+                           timeout=timeout,
+                           strategy=waitutil.ExponentialInterval(initial=1, maximum=10),
+                           description="node {} to power off".format(self.ipAddress))
 
     def WaitForOn(self, timeout=300):
         """
         Wait for this node's power state to be ON
         This is checking a state, not a transition
         """
-        start_time = time.time()
-        while True:
-            if self.GetPowerState() == "on":
-                break
-            if time.time() - start_time > timeout:
-                raise SFTimeoutError("Timeout waiting for node {} to power on".format(self.ipAddress))
-            time.sleep(2 * sfdefaults.TIME_SECOND)
+        waitutil.WaitUntil(lambda: self.GetPowerState() == "on",
+                           timeout=timeout,
+                           strategy=waitutil.ExponentialInterval(initial=1, maximum=10),
+                           description="node {} to power on".format(self.ipAddress))
 
     def WaitForPing(self, timeout=300):
         """
@@ -346,13 +346,11 @@ class SFNode(object):
         Args:
             timeout:        how long to wait for the node
         """
-        start_time = time.time()
         self.log.info("Waiting for {} to be pingable".format(self.ipAddress))
-        while (not netutil.Ping(self.ipAddress)):
-            time.sleep(sfdefaults.TIME_SECOND)
-            current_time = time.time()
-            if current_time - start_time >= timeout:
-                raise SFTimeoutError("Timeout waiting for node {} to come up".format(self.ipAddress))
+        waitutil.WaitUntil(lambda: netutil.Ping(self.ipAddress),
+                           timeout=timeout,
+                           strategy=waitutil.FibonacciInterval(initial=1, maximum=10),
+                           description="node {} to come up".format(self.ipAddress))
 
     def WaitForUp(self, timeout=600, initialWait=0):
         """
@@ -362,14 +360,13 @@ class SFNode(object):
             timeout:        how long to wait for the node
             initialWait:    how log to wait before checking the first time
         """
-        start_time = time.time()
+        start_time = clockutil.Time()
         self.log.info("Waiting for {} to be pingable".format(self.ipAddress))
-        time.sleep(sfdefaults.TIME_SECOND * initialWait)
-        while (not netutil.Ping(self.ipAddress)):
-            time.sleep(sfdefaults.TIME_SECOND)
-            current_time = time.time()
-            if current_time - start_time >= timeout:
-                raise SFTimeoutError("Timeout waiting for node {} to come up".format(self.ipAddress))
+        threadutil.Sleep(sfdefaults.TIME_SECOND * initialWait)
+        waitutil.WaitUntil(lambda: netutil.Ping(self.ipAddress),
+                           timeout=max(0, timeout - (clockutil.Time() - start_time)),
+                           strategy=waitutil.FibonacciInterval(initial=1, maximum=10),
+                           description="node {} to come up".format(self.ipAddress))
 
         self.WaitForNodeAPI()
 
@@ -441,7 +438,7 @@ class SFNode(object):
         Returns:
             An integer unix timestamp representing the time on the node after being set
         """
-        with SSHConnection(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
+        with SSHConnectionPool.Shared().Session(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
             ssh.RunCommand("date -s \"{}\"".format(timeString))
             _, stdout, _ = ssh.RunCommand("date +%s")
             return int(stdout.strip())
@@ -560,7 +557,7 @@ class SFNode(object):
                     pid = proc["pid"]
             result = self.api.CallWithRetry("KillProcesses", {"pids" : [pid], "signal" : 9}, apiVersion=7.3)
         else:
-            with SSHConnection(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
+            with SSHConnectionPool.Shared().Session(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
                 _, stdout, _ = ssh.RunCommand("ps -eo pid,args | grep sfapp | grep master | awk '{print $1}'")
                 pid = stdout.strip()
                 ssh.RunCommand("kill -9 {}".format(pid))
@@ -701,7 +698,7 @@ class SFNode(object):
 
         else:
             ex = None
-            with SSHConnection(self.ipmiIP, self.ipmiUsername, self.ipmiPassword) as ssh:
+            with SSHConnectionPool.Shared().Session(self.ipmiIP, self.ipmiUsername, self.ipmiPassword) as ssh:
                 # R630
                 _, stdout, _ = ssh.RunCommand("racadm get NIC.VndrConfigPage.3.MacAddr", pipeFail=False)
                 for line in stdout.split("\n"):
@@ -766,5 +763,5 @@ class SFNode(object):
         """
         Empty current log files on the node
         """
-        with SSHConnection(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
+        with SSHConnectionPool.Shared().Session(self.ipAddress, self.sshUsername, self.sshPassword) as ssh:
             ssh.RunCommand("sudo logrotate /etc/logrotate.d/solidfire")
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+"""
+Bulk remote replication operations
+"""
+import atexit
+import copy
+import threading
+from . import SolidFireClusterAPI, GetHighestAPIVersion, SolidFireError
+from . import sfdefaults
+from . import threadutil
+from .logutil import GetLogger
+
+class ReplicationEngine(object):
+    """
+    Run many volume pairing and pair modify calls against a cluster at once.  Calls are spread over a fixed number of
+    worker threads per cluster, and each worker reuses its own API connection for every call it makes.  The shared
+    engines are closed when the process exits
+    """
+
+    _engines = {}
+    _enginesLock = threading.Lock()
+    _closeRegistered = False
+
+    @staticmethod
+    def Get(mvip, username, password):
+        """
+        Get the shared engine for a cluster
+
+        Args:
+            mvip:       the management VIP of the cluster (string)
+            username:   the admin user of the cluster (string)
+            password:   the admin password of the cluster (string)
+
+        Returns:
+            A ReplicationEngine object
+        """
+        with ReplicationEngine._enginesLock:
+            key = (mvip, username, password)
+            if key not in ReplicationEngine._engines:
+                if not ReplicationEngine._closeRegistered:
+                    atexit.register(ReplicationEngine.CloseAll)
+                    ReplicationEngine._closeRegistered = True
+                ReplicationEngine._engines[key] = ReplicationEngine(mvip, username, password)
+            return ReplicationEngine._engines[key]
+
+    @staticmethod
+    def CloseAll():
+        """
+        Close all of the shared engines
+        """
+        with ReplicationEngine._enginesLock:
+            engines = list(ReplicationEngine._engines.values())
+        for engine in engines:
+            engine.Close()
+
+    def Close(self):
+        """
+        Stop the worker threads, aborting any calls that are still running.  If this is the shared engine for the
+        cluster, the next Get makes a new one
+        """
+        with ReplicationEngine._enginesLock:
+            key = (self.mvip, self.username, self.password)
+            if ReplicationEngine._engines.get(key) is self:
+                del ReplicationEngine._engines[key]
+        self._pool.Shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, traceback):
+        self.Close()
+
+    def __init__(self, mvip, username, password, maxConcurrency=None):
+        """
+        Args:
+            mvip:           the management VIP of the cluster
+            username:       the admin username of the cluster
+            password:       the admin password of the cluster
+            maxConcurrency: the most API calls to have outstanding to the cluster at once.  Defaults to sfdefaults.cluster_api_parallel_max
+        """
+        self.mvip = mvip
+        self.username = username
+        self.password = password
+        self.maxConcurrency = int(maxConcurrency or sfdefaults.cluster_api_parallel_max)
+        self.log = GetLogger()
+        self._pool = threadutil.ThreadPool(maxThreads=self.maxConcurrency, useMultiprocessing=False)
+        self._local = threading.local()
+        self._apiVersion = None
+
+    def _API(self):
+        """Get the API connection for the current worker thread"""
+        if not hasattr(self._local, "api"):
+            self._local.api = SolidFireClusterAPI(self.mvip,
+                                                  self.username,
+                                                  self.password,
+                                                  logger=self.log,
+                                                  maxRetryCount=5,
+                                                  retrySleep=20,
+                                                  errorLogThreshold=1,
+                                                  errorLogRepeat=1)
+        return self._local.api
+
+    def _Call(self, methodName, params, apiVersion):
+        """Make one API call, run in a worker thread"""
+        return self._API().CallWithRetry(methodName, params, apiVersion=apiVersion)
+
+    def Post(self, methodName, params, apiVersion=6.0):
+        """
+        Queue an API call to run on one of the worker threads
+
+        Args:
+            methodName:     the name of the API method (string)
+            params:         the parameters to the method (dict)
+            apiVersion:     the API version to use (float)
+
+        Returns:
+            An AsyncResult object
+        """
+        return self._pool.Post(threadutil.threadwrapper(self._Call), methodName, params, apiVersion)
+
+    def GetVolumePairs(self):
+        """
+        Get the active paired volumes on the cluster, indexed by volume ID
+
+        Returns:
+            A dictionary of local volumeID (int) => volume (dict)
+        """
+        if self._apiVersion is None:
+            self._apiVersion = GetHighestAPIVersion(self.mvip, self.username, self.password)
+        result = self._API().CallWithRetry("ListActivePairedVolumes", {}, apiVersion=self._apiVersion)
+        return {vol["volumeID"] : vol for vol in result["volumes"]}
+
+    def ModifyVolumePairs(self, volumeIDs, pairProperties):
+        """
+        Modify the pair properties of many volumes
+
+        Args:
+            volumeIDs:          the IDs of the volumes to modify (list of int)
+            pairProperties:     the pair properties to set on each volume (dict)
+
+        Returns:
+            A dictionary of volumeID (int) => None if the volume was modified, or the exception if it failed
+        """
+        results = {}
+        for vol_id in volumeIDs:
+            params = copy.deepcopy(pairProperties)
+            params["volumeID"] = vol_id
+            results[vol_id] = self.Post("ModifyVolumePair", params)
+        return _Collect(results)
+
+    def PauseVolumes(self, volumeIDs):
+        """
+        Pause replication on many volumes
+
+        Args:
+            volumeIDs:  the IDs of the volumes to pause (list of int)
+
+        Returns:
+            A dictionary of volumeID (int) => None if the volume was paused, or the exception if it failed
+        """
+        return self.ModifyVolumePairs(volumeIDs, {"pausedManual" : True})
+
+    def ResumeVolumes(self, volumeIDs):
+        """
+        Resume replication on many volumes
+
+        Args:
+            volumeIDs:  the IDs of the volumes to resume (list of int)
+
+        Returns:
+            A dictionary of volumeID (int) => None if the volume was resumed, or the exception if it failed
+        """
+        return self.ModifyVolumePairs(volumeIDs, {"pausedManual" : False})
+
+    def PairVolumes(self, remote, volumeMap, mode="Async"):
+        """
+        Pair many volumes with volumes on a remote cluster.  Each pairing key is handed to the remote cluster as soon
+        as it is created, while the rest of the keys are still being created
+
+        Args:
+            remote:     the engine for the remote cluster (ReplicationEngine)
+            volumeMap:  local volumeID => remote volumeID to pair (dict of int => int)
+            mode:       the replication mode - Async, Sync or SnapshotsOnly (string)
+
+        Returns:
+            A dictionary of local volumeID (int) => None if the volume was paired, or the exception if it failed
+        """
+        starts = {vol_id : self.Post("StartVolumePairing", {"volumeID" : vol_id, "mode" : mode}) for vol_id in volumeMap}
+
+        completes = {}
+        errors = {}
+        for vol_id, res in starts.items():
+            try:
+                key = res.Get()["volumePairingKey"]
+            except SolidFireError as ex:
+                errors[vol_id] = ex
+                continue
+            completes[vol_id] = remote.Post("CompleteVolumePairing", {"volumeID" : volumeMap[vol_id], "volumePairingKey" : key})
+
+        errors.update(_Collect(completes))
+        return errors
+
+    @staticmethod
+    def MatchVolumesByName(localVolumes, remoteVolumes, pairedVolumeIDs=None):
+        """
+        Match local volumes to remote volumes with the same name
+
+        Args:
+            localVolumes:       the local volumes to pair (list of dict)
+            remoteVolumes:      the candidate remote volumes (list of dict)
+            pairedVolumeIDs:    local volume IDs that are already paired and should be skipped (iterable of int)
+
+        Returns:
+            A dictionary of local volumeID (int) => remote volumeID (int)
+        """
+        skip = set(pairedVolumeIDs or [])
+        remote_by_name = {vol["name"] : vol["volumeID"] for vol in remoteVolumes}
+        return {vol["volumeID"] : remote_by_name[vol["name"]] for vol in localVolumes if vol["volumeID"] not in skip and vol["name"] in remote_by_name}
+
+def _Collect(asyncResults):
+    """Wait for a dictionary of key => AsyncResult and return a dictionary of key => None or the exception raised"""
+    results = {}
+    for key, res in asyncResults.items():
+        try:
+            res.Get()
+            results[key] = None
+        except SolidFireError as ex:
+            results[key] = ex
+    return results
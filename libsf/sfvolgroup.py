@@ -2,16 +2,12 @@
 """
 SolidFire volume access group object and related data structures
 """
-from . import SolidFireClusterAPI, GetHighestAPIVersion, InvalidArgumentError, UnknownObjectError
+from . import SolidFireClusterAPI, GetHighestAPIVersion, SolidFireError, InvalidArgumentError, UnknownObjectError
+from . import sfdefaults
+from . import threadutil
 from .logutil import GetLogger
-
-def _refresh(fn):
-    """Decorator to refresh the attributes of this object from the cluster"""
-    def wrapper(self, *args, **kwargs):
-        self.Refresh()
-        fn(self, *args, **kwargs)
-        self.Refresh()
-    return wrapper
+import re
+import threading
 
 class SFVolGroup(object):
     """Common interactions with a SolidFire volume group"""
@@ -80,8 +76,8 @@ class SFVolGroup(object):
                                   errorLogRepeat=1)
         version = GetHighestAPIVersion(mvip, username, password)
 
-        vag_list = api.CallWithRetry("ListVolumeAccessGroups", {}, apiVersion=version)
         if volgroupName:
+            vag_list = api.CallWithRetry("ListVolumeAccessGroups", {}, apiVersion=version)
             for vag in vag_list["volumeAccessGroups"]:
                 if vag["name"].lower() == volgroupName.lower():
                     return SFVolGroup(vag, mvip, username, password)
@@ -94,6 +90,8 @@ class SFVolGroup(object):
                 raise InvalidArgumentError("Please specify an integer for volgroupID")
             if volgroupID <= 0:
                 raise InvalidArgumentError("Please specify a positive non-zero integer for volgroupID")
+            # Only read the one group we are looking for
+            vag_list = api.CallWithRetry("ListVolumeAccessGroups", {"startVolumeAccessGroupID" : volgroupID, "limit" : 1}, apiVersion=version)
             for vag in vag_list["volumeAccessGroups"]:
                 if vag["volumeAccessGroupID"] == volgroupID:
                     return SFVolGroup(vag, mvip, username, password, version)
@@ -110,8 +108,7 @@ class SFVolGroup(object):
             password:   the admin password of the cluster
             apiVersion: the API version on the cluster to use
         """
-        for key, value in volgroup.items():
-            setattr(self, key, value)
+        self._Update(volgroup)
 
         self.ID = volgroup["volumeAccessGroupID"]
         self.mvip = mvip
@@ -182,7 +179,70 @@ class SFVolGroup(object):
         params["volumeAccessGroupID"] = self.ID
         self.api.CallWithRetry("DeleteVolumeAccessGroup", params, apiVersion=self.apiVersion)
 
-    @_refresh
+    def _Update(self, volgroup):
+        """Update the attributes of this object from a volumeAccessGroup dictionary"""
+        for key, value in volgroup.items():
+            setattr(self, key, value)
+
+    def ApplyMembership(self, addInitiators=None, removeInitiators=None, addVolumes=None, removeVolumes=None, lunAssignments=None):
+        """
+        Change the initiators, volumes and LUN assignments of the group in one step.  The group is re-read, the changes
+        are applied to its current membership and the result is sent in a single modify call
+
+        Args:
+            addInitiators:      a list of initiator IQNs/WWNs (strings) to add
+            removeInitiators:   a list of initiator IQNs/WWNs (strings) to remove
+            addVolumes:         a list of volume IDs (ints) to add
+            removeVolumes:      a list of volume IDs (ints) to remove
+            lunAssignments:     the new LUN assignments of the volumes in the group (list of dict)
+                                {"volumeID": 1, "lun": 13}
+        """
+        self.Refresh()
+        params = {}
+
+        # Initiators are compared case insensitive
+        current = set(init.lower() for init in self.initiators)
+        remove = set(init.lower() for init in removeInitiators or [])
+        for iqn in sorted(remove.difference(current)):
+            self.log.debug("{} is already not in group {}".format(iqn, self.name))
+        initiators = [init for init in self.initiators if init.lower() not in remove]
+        present = set(init.lower() for init in initiators)
+        for iqn in addInitiators or []:
+            if iqn.lower() in present:
+                self.log.debug("{} is already in group {}".format(iqn, self.name))
+                continue
+            initiators.append(iqn)
+            present.add(iqn.lower())
+        if initiators != self.initiators:
+            params["initiators"] = initiators
+
+        current = set(self.volumes)
+        remove = set(removeVolumes or [])
+        for vol_id in sorted(remove.difference(current)):
+            self.log.debug("volumeID {} is already not in group {}".format(vol_id, self.name))
+        volume_ids = [vol_id for vol_id in self.volumes if vol_id not in remove]
+        present = set(volume_ids)
+        for vol_id in addVolumes or []:
+            if vol_id in present:
+                self.log.debug("volumeID {} is already in group {}".format(vol_id, self.name))
+                continue
+            volume_ids.append(vol_id)
+            present.add(vol_id)
+        if volume_ids != self.volumes:
+            params["volumes"] = volume_ids
+
+        if params:
+            params["volumeAccessGroupID"] = self.ID
+            result = self.api.CallWithRetry("ModifyVolumeAccessGroup", params, apiVersion=self.apiVersion)
+            # Newer API versions return the modified group; otherwise read it back
+            if "volumeAccessGroup" in result:
+                self._Update(result["volumeAccessGroup"])
+            else:
+                self.Refresh()
+
+        if lunAssignments:
+            self.ModifyLUNAssignments(lunAssignments)
+
     def AddInitiators(self, initiatorList):
         """
         Add a list of initiators to the group
@@ -190,21 +250,8 @@ class SFVolGroup(object):
         Args:
             initiatorList: a list of initiator IQNs (strings) to add
         """
-        # Append the IQNs to the existing list
-        full_iqn_list = self.initiators
-        for iqn in initiatorList:
-            if any([iqn.lower() == init.lower() for init in full_iqn_list]):
-                self.log.debug("{} is already in group {}".format(iqn, self.name))
-            else:
-                full_iqn_list.append(iqn)
-
-        # Modify the VAG on the cluster
-        params = {}
-        params["volumeAccessGroupID"] = self.ID
-        params["initiators"] = full_iqn_list
-        self.api.CallWithRetry("ModifyVolumeAccessGroup", params, apiVersion=self.apiVersion)
+        self.ApplyMembership(addInitiators=initiatorList)
 
-    @_refresh
     def RemoveInitiators(self, initiatorList):
         """
         Remove a list of initiators from the group
@@ -212,21 +259,8 @@ class SFVolGroup(object):
         Args:
             initiatorList: a list of initiator IQNs (strings) to remove
         """
-        # Append the IQNs to the existing list
-        full_iqn_list = self.initiators
-        for iqn in initiatorList:
-            if any([iqn.lower() == init.lower() for init in full_iqn_list]):
-                full_iqn_list.remove(iqn)
-            else:
-                self.log.debug("{} is already not in group {}".format(iqn, self.name))
-
-        # Modify the VAG on the cluster
-        params = {}
-        params["volumeAccessGroupID"] = self.ID
-        params["initiators"] = full_iqn_list
-        self.api.CallWithRetry("ModifyVolumeAccessGroup", params, apiVersion=self.apiVersion)
+        self.ApplyMembership(removeInitiators=initiatorList)
 
-    @_refresh
     def AddVolumes(self, volumeIDList):
         """
         Add a list of volumes to the group
@@ -234,20 +268,8 @@ class SFVolGroup(object):
         Args:
             volumeIDList: a list of volume IDs (ints) to add
         """
-        volume_ids = self.volumes
-        for vol_id in volumeIDList:
-            if vol_id not in volume_ids:
-                volume_ids.append(vol_id)
-            else:
-                self.log.debug("volumeID {} is already in group {}".format(vol_id, self.name))
+        self.ApplyMembership(addVolumes=volumeIDList)
 
-        # Add the requested volumes
-        params = {}
-        params["volumes"] = volume_ids
-        params["volumeAccessGroupID"] = self.ID
-        self.api.CallWithRetry("ModifyVolumeAccessGroup", params, apiVersion=self.apiVersion)
-
-    @_refresh
     def RemoveVolumes(self, volumeIDList):
         """
         Remove a list of volumes from the group
@@ -255,18 +277,7 @@ class SFVolGroup(object):
         Args:
             volumeIDList: a list of volume IDs (ints) to remove
         """
-        volume_ids = self.volumes
-        for vol_id in volumeIDList:
-            if vol_id in volume_ids:
-                volume_ids.remove(vol_id)
-            else:
-                self.log.debug("volumeID {} is already not in group {}".format(vol_id, self.name))
-
-        # Remove the requested volumes
-        params = {}
-        params["volumes"] = volume_ids
-        params["volumeAccessGroupID"] = self.ID
-        self.api.CallWithRetry("ModifyVolumeAccessGroup", params, apiVersion=self.apiVersion)
+        self.ApplyMembership(removeVolumes=volumeIDList)
 
     def ModifyLUNAssignments(self, newLUNAssignments):
         """
@@ -280,3 +291,332 @@ class SFVolGroup(object):
         params["volumeAccessGroupID"] = self.ID
         params["lunAssignments"] = newLUNAssignments
         self.api.CallWithRetry("ModifyVolumeAccessGroupLunAssignments", params, apiVersion=self.apiVersion)
+
+class _MembershipRequest(object):
+    """Membership changes for a volume access group from one caller of VolgroupBatcher"""
+
+    def __init__(self, addInitiators, addVolumes):
+        self.addInitiators = list(addInitiators or [])
+        self.addVolumes = list(addVolumes or [])
+        self.done = threading.Event()
+        self.group = None
+        self.error = None
+
+class VolgroupBatcher(object):
+    """
+    Combine additions to volume access groups from many threads into one ModifyVolumeAccessGroup call per group.
+    The first caller for a group waits a short window for other callers, then applies all of their changes together.
+    Changes to the same group are applied one batch at a time, so concurrent callers cannot overwrite each other
+    """
+
+    _batchers = {}
+    _batchersLock = threading.Lock()
+
+    @staticmethod
+    def Get(mvip, username, password):
+        """
+        Get the shared batcher for a cluster
+
+        Args:
+            mvip:       the management VIP of the cluster (string)
+            username:   the admin user of the cluster (string)
+            password:   the admin password of the cluster (string)
+
+        Returns:
+            A VolgroupBatcher object
+        """
+        with VolgroupBatcher._batchersLock:
+            key = (mvip, username, password)
+            if key not in VolgroupBatcher._batchers:
+                VolgroupBatcher._batchers[key] = VolgroupBatcher(mvip, username, password)
+            return VolgroupBatcher._batchers[key]
+
+    def __init__(self, mvip, username, password, window=None):
+        """
+        Args:
+            mvip:       the management VIP of the cluster
+            username:   the admin username of the cluster
+            password:   the admin password of the cluster
+            window:     how long to collect changes before applying them, in seconds.  Defaults to sfdefaults.volgroup_batch_window
+        """
+        self.mvip = mvip
+        self.username = username
+        self.password = password
+        self.window = window
+        self.log = GetLogger()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._groupLocks = {}
+
+    def AddInitiators(self, volgroupID, initiatorList):
+        """
+        Add a list of initiators to a group, combined with other callers adding to the same group
+
+        Args:
+            volgroupID:     the ID of the group (int)
+            initiatorList:  a list of initiator IQNs (strings) to add
+
+        Returns:
+            The group after the change (SFVolGroup)
+        """
+        return self.Submit(volgroupID, addInitiators=initiatorList)
+
+    def AddVolumes(self, volgroupID, volumeIDList):
+        """
+        Add a list of volumes to a group, combined with other callers adding to the same group
+
+        Args:
+            volgroupID:     the ID of the group (int)
+            volumeIDList:   a list of volume IDs (ints) to add
+
+        Returns:
+            The group after the change (SFVolGroup)
+        """
+        return self.Submit(volgroupID, addVolumes=volumeIDList)
+
+    def Submit(self, volgroupID, addInitiators=None, addVolumes=None):
+        """
+        Queue changes to a group and wait for them to be applied
+
+        Args:
+            volgroupID:     the ID of the group (int)
+            addInitiators:  a list of initiator IQNs (strings) to add
+            addVolumes:     a list of volume IDs (ints) to add
+
+        Returns:
+            The group after the change (SFVolGroup)
+        """
+        request = _MembershipRequest(addInitiators, addVolumes)
+        with self._lock:
+            leader = volgroupID not in self._pending
+            self._pending.setdefault(volgroupID, []).append(request)
+            group_lock = self._groupLocks.setdefault(volgroupID, threading.Lock())
+
+        if leader:
+            batch = None
+            try:
+                window = self.window if self.window is not None else sfdefaults.volgroup_batch_window
+                threadutil.Sleep(sfdefaults.TIME_SECOND * window)
+                with group_lock:
+                    with self._lock:
+                        batch = self._pending.pop(volgroupID)
+                    self._ApplyBatch(volgroupID, batch)
+            except BaseException as ex:
+                self._AbandonBatch(volgroupID, batch, ex)
+                raise
+
+        # Wait in slices so a cancelled caller stops waiting
+        while not request.done.wait(threadutil.CancellationToken.POLL_INTERVAL):
+            threadutil.CheckCancelled()
+        if request.error:
+            raise request.error
+        return request.group
+
+    def _AbandonBatch(self, volgroupID, batch, error):
+        """Fail every request in a batch that has not been applied, after the leader collecting it failed"""
+        if batch is None:
+            with self._lock:
+                batch = self._pending.pop(volgroupID, [])
+        for req in batch:
+            if not req.done.is_set():
+                req.error = SolidFireError("Change to volume access group {} was abandoned: {}".format(volgroupID, str(error) or type(error).__name__))
+                req.done.set()
+
+    def _ApplyBatch(self, volgroupID, batch):
+        """Apply a batch of requests to a group and wake up the callers"""
+        try:
+            self.log.debug("Applying {} membership changes to volume access group {}".format(len(batch), volgroupID))
+            try:
+                group = SFVolGroup.Find(self.mvip, self.username, self.password, volgroupID=volgroupID)
+                group.ApplyMembership(addInitiators=[init for req in batch for init in req.addInitiators],
+                                      addVolumes=[vol_id for req in batch for vol_id in req.addVolumes])
+                for req in batch:
+                    req.group = group
+            except SolidFireError as ex:
+                if len(batch) == 1:
+                    batch[0].error = ex
+                    return
+                # One bad request should not fail everyone else, so fall back to applying each request on its own
+                self.log.debug("Combined modify of volume access group {} failed, applying changes individually: {}".format(volgroupID, ex))
+                for req in batch:
+                    try:
+                        group = SFVolGroup.Find(self.mvip, self.username, self.password, volgroupID=volgroupID)
+                        group.ApplyMembership(addInitiators=req.addInitiators, addVolumes=req.addVolumes)
+                        req.group = group
+                    except SolidFireError as e:
+                        req.error = e
+        finally:
+            for req in batch:
+                if req.group is None and req.error is None:
+                    req.error = SolidFireError("Failed to modify volume access group {}".format(volgroupID))
+                req.done.set()
+
+class ShardedVolGroup(object):
+    """
+    A logical volume access group spread across as many real groups as needed to stay under the cluster limit on
+    initiators per group.  The shards are named <baseName>-NNN, new initiators go to the first shard with room for them,
+    and every shard has all of the volumes so that every initiator sees them
+    """
+
+    @staticmethod
+    def ShardName(baseName, index):
+        """
+        Get the name of a shard
+
+        Args:
+            baseName:   the name of the logical group (string)
+            index:      the index of the shard (int)
+
+        Returns:
+            The name of the shard (string)
+        """
+        return "{}-{:03d}".format(baseName, index)
+
+    def __init__(self, baseName, mvip, username, password):
+        """
+        Find the existing shards of a logical group.  There may be none, in which case they are created as volumes and
+        initiators are added
+
+        Args:
+            baseName:   the name of the logical group
+            mvip:       the management VIP of the cluster
+            username:   the admin username of the cluster
+            password:   the admin password of the cluster
+        """
+        self.name = baseName
+        self.mvip = mvip
+        self.username = username
+        self.password = password
+        self.log = GetLogger()
+        self.api = SolidFireClusterAPI(self.mvip,
+                                       self.username,
+                                       self.password,
+                                       logger=self.log,
+                                       maxRetryCount=5,
+                                       retrySleep=20,
+                                       errorLogThreshold=1,
+                                       errorLogRepeat=1)
+        self.apiVersion = GetHighestAPIVersion(mvip, username, password)
+
+        limits = self.api.CallWithRetry("GetLimits", {}, apiVersion=self.apiVersion)
+        self.maxVolumes = limits["volumesPerVolumeAccessGroupCountMax"]
+        self.maxInitiators = limits["initiatorsPerVolumeAccessGroupCountMax"]
+        self.maxVolumeGroups = limits.get("volumeAccessGroupsPerVolumeCountMax")
+
+        self.shards = {}
+        shard_regex = re.compile(r"^{}-(\d{{3,}})$".format(re.escape(baseName)))
+        for vag in self.api.CallWithRetry("ListVolumeAccessGroups", {}, apiVersion=self.apiVersion)["volumeAccessGroups"]:
+            match = shard_regex.match(vag["name"])
+            if match:
+                self.shards[int(match.group(1))] = SFVolGroup(vag, mvip, username, password, self.apiVersion)
+
+    def __str__(self):
+        return "{} ({} shards)".format(self.name, len(self.shards))
+
+    @property
+    def volumes(self):
+        """The list of volume IDs in any of the shards, each listed once in the order they are first found"""
+        volume_ids = []
+        seen = set()
+        for idx in sorted(self.shards):
+            for vol_id in self.shards[idx].volumes:
+                if vol_id not in seen:
+                    seen.add(vol_id)
+                    volume_ids.append(vol_id)
+        return volume_ids
+
+    @property
+    def initiators(self):
+        """The list of initiators in all of the shards"""
+        return [init for idx in sorted(self.shards) for init in self.shards[idx].initiators]
+
+    def Add(self, initiatorList=None, volumeIDList=None):
+        """
+        Add initiators and volumes, spreading the initiators across the shards and adding the volumes to every shard.
+        Each shard that changes gets a single create or modify call
+
+        Args:
+            initiatorList:  a list of initiator IQNs (strings) to add
+            volumeIDList:   a list of volume IDs (ints) to add
+        """
+        present_inits = set(init.lower() for init in self.initiators)
+        new_inits = []
+        for iqn in initiatorList or []:
+            if iqn.lower() not in present_inits:
+                new_inits.append(iqn)
+                present_inits.add(iqn.lower())
+        present_vols = set(self.volumes)
+        new_vols = []
+        for vol_id in volumeIDList or []:
+            if vol_id not in present_vols:
+                new_vols.append(vol_id)
+                present_vols.add(vol_id)
+
+        # An initiator can only be in one group and only sees the volumes in that group, so the initiators are spread
+        # across the shards and every shard gets the whole set of volumes
+        all_vols = sorted(set(self.volumes)) + new_vols
+        if len(all_vols) > self.maxVolumes:
+            raise InvalidArgumentError("{} volumes is more than the limit of {} per volume access group".format(len(all_vols), self.maxVolumes))
+        if new_inits and self.maxInitiators <= 0:
+            raise InvalidArgumentError("The cluster does not allow any initiators in a volume access group")
+
+        # Fill each shard up to the limit, in shard order, then make new shards for the rest
+        shard_inits = {idx : [] for idx in self.shards}
+        idx = 0
+        while new_inits:
+            group = self.shards.get(idx)
+            room = self.maxInitiators - (len(group.initiators) if group else 0)
+            if room > 0:
+                shard_inits[idx] = new_inits[:room]
+                new_inits = new_inits[room:]
+            idx += 1
+        if not shard_inits and all_vols:
+            shard_inits[0] = []
+
+        if self.maxVolumeGroups is not None and all_vols and len(shard_inits) > self.maxVolumeGroups:
+            raise InvalidArgumentError("{} shards is more than the limit of {} volume access groups per volume".format(len(shard_inits), self.maxVolumeGroups))
+
+        additions = {}
+        for idx, inits in shard_inits.items():
+            present = set(self.shards[idx].volumes) if idx in self.shards else set()
+            vols = [vol_id for vol_id in all_vols if vol_id not in present]
+            if inits or vols:
+                additions[idx] = (inits, vols)
+
+        for idx in sorted(additions):
+            inits, vols = additions[idx]
+            if idx in self.shards:
+                self.log.debug("Adding {} initiators and {} volumes to {}".format(len(inits), len(vols), self.shards[idx].name))
+                self.shards[idx].ApplyMembership(addInitiators=inits, addVolumes=vols)
+            else:
+                name = ShardedVolGroup.ShardName(self.name, idx)
+                self.log.debug("Creating {} with {} initiators and {} volumes".format(name, len(inits), len(vols)))
+                params = {"name" : name}
+                if inits:
+                    params["initiators"] = inits
+                if vols:
+                    params["volumes"] = vols
+                result = self.api.CallWithRetry("CreateVolumeAccessGroup", params, apiVersion=self.apiVersion)
+                if "volumeAccessGroup" in result:
+                    self.shards[idx] = SFVolGroup(result["volumeAccessGroup"], self.mvip, self.username, self.password, self.apiVersion)
+                else:
+                    self.shards[idx] = SFVolGroup.Find(self.mvip, self.username, self.password, volgroupID=result["volumeAccessGroupID"])
+
+    def AddInitiators(self, initiatorList):
+        """
+        Add a list of initiators, spreading them across the shards
+
+        Args:
+            initiatorList: a list of initiator IQNs (strings) to add
+        """
+        self.Add(initiatorList=initiatorList)
+
+    def AddVolumes(self, volumeIDList):
+        """
+        Add a list of volumes to every shard
+
+        Args:
+            volumeIDList: a list of volume IDs (ints) to add
+        """
+        self.Add(volumeIDList=volumeIDList)
+
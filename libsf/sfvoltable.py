@@ -0,0 +1,491 @@
+#!/usr/bin/env python
+"""
+Compact column oriented storage for large lists of volumes
+"""
+from array import array
+import marshal
+import operator
+import re
+from . import InvalidArgumentError, UnknownObjectError
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping #pylint: disable=deprecated-class
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Use 64 bit integers where the platform supports them
+try:
+    array("q")
+    _INT_TYPE = "q"
+except ValueError:
+    _INT_TYPE = "l"
+
+# Placeholder in an integer column for a volume that does not have that key
+_MISSING = -(2**63) if _INT_TYPE == "q" else -(2**31)
+
+# Top level integer keys stored in typed arrays
+_INT_COLUMNS = ("volumeID", "accountID", "totalSize", "blockSize", "sliceCount")
+
+# QoS values copied out of the qos dict into typed arrays so they can be filtered and aggregated
+_QOS_COLUMNS = ("minIOPS", "maxIOPS", "burstIOPS")
+
+# Top level keys with a small set of string values, stored as indexes into a per table list of values
+_ENUM_COLUMNS = ("status", "access")
+
+# Most distinct values a serialized column keeps in its dictionary before it switches to packing every value
+_MAX_DISTINCT = 256
+
+# Types of the per volume codes in a serialized column.  Dictionary codes fit in 16 bits, and packed end offsets in 32
+_DICT_CODE_TYPE = "h"
+_PACKED_CODE_TYPE = "i"
+
+def _IsIn(value, values):
+    """Test if a value is in a collection of values"""
+    return value in values
+
+_COMPARE_OPS = {
+    "lt" : operator.lt,
+    "le" : operator.le,
+    "gt" : operator.gt,
+    "ge" : operator.ge,
+    "ne" : operator.ne,
+}
+
+# Comparisons that a missing value never matches.  For the rest a missing value is compared as None
+_ORDER_OPS = (operator.lt, operator.le, operator.gt, operator.ge)
+
+def _Compare(op, value, operand):
+    """Compare a value from a column against a filter operand, where None is a missing value"""
+    if value is None and op in _ORDER_OPS:
+        return False
+    return op(value, operand)
+
+class _Absent(object):
+    """Marker for a key that a volume does not have"""
+    def __reduce__(self):
+        return "_ABSENT"
+_ABSENT = _Absent()
+
+class _BlobColumn(object):
+    """
+    Serialized values of one key.  Values are dictionary encoded while there are only a few distinct values, and
+    appended to a single buffer once there are too many
+    """
+
+    def __init__(self, count=0, packed=False):
+        self.codes = array(_DICT_CODE_TYPE, [-1]) * count
+        self.distinct = []
+        self.lookup = {}
+        self.buffer = None
+        if packed:
+            self._Pack()
+
+    def _Pack(self):
+        """Switch from dictionary encoding to one buffer, where codes are the end offset of each value"""
+        buf = bytearray()
+        ends = array(_PACKED_CODE_TYPE)
+        for code in self.codes:
+            if code >= 0:
+                buf += self.distinct[code]
+            ends.append(len(buf))
+        self.codes = ends
+        self.buffer = buf
+        self.distinct = []
+        self.lookup = {}
+
+    def Append(self, blob):
+        """Add a serialized value, or None if the volume does not have this key"""
+        if self.buffer is not None:
+            if blob:
+                self.buffer += blob
+            self.codes.append(len(self.buffer))
+            return
+        if blob is None:
+            self.codes.append(-1)
+            return
+        code = self.lookup.get(blob)
+        if code is None:
+            if len(self.distinct) >= _MAX_DISTINCT:
+                self._Pack()
+                self.Append(blob)
+                return
+            code = len(self.distinct)
+            self.distinct.append(blob)
+            self.lookup[blob] = code
+        self.codes.append(code)
+
+    def Get(self, idx):
+        """Get a serialized value, or None if the volume does not have this key"""
+        if self.buffer is not None:
+            start = self.codes[idx - 1] if idx > 0 else 0
+            end = self.codes[idx]
+            return bytes(self.buffer[start:end]) if end > start else None
+        code = self.codes[idx]
+        return self.distinct[code] if code >= 0 else None
+
+    def Take(self, indexes):
+        """Make a new column from the given rows of this column"""
+        column = _BlobColumn(packed=self.buffer is not None)
+        if self.buffer is None:
+            column.codes = array(_DICT_CODE_TYPE, [self.codes[i] for i in indexes])
+            column.distinct = list(self.distinct)
+            column.lookup = dict(self.lookup)
+        else:
+            for idx in indexes:
+                column.Append(self.Get(idx))
+        return column
+
+class VolumeRow(Mapping):
+    """Read-only dictionary view of one volume in a VolumeTable"""
+
+    __slots__ = ["_table", "_idx"]
+
+    def __init__(self, table, idx):
+        self._table = table
+        self._idx = idx
+
+    def __getitem__(self, key):
+        value = self._table._GetValue(self._idx, key) #pylint: disable=protected-access
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        for key in self._table._keys: #pylint: disable=protected-access
+            if self._table._GetValue(self._idx, key) is not _ABSENT: #pylint: disable=protected-access
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(self.ToDict())
+
+    def ToDict(self):
+        """
+        Get a regular, modifiable dictionary of this volume
+
+        Returns:
+            A volume dictionary (dict)
+        """
+        return {key : self[key] for key in self}
+
+    copy = ToDict
+
+class VolumeTable(object):
+    """
+    Column oriented table of volumes.  Numeric values and states are stored in typed arrays, and everything else is
+    kept serialized, shared between volumes with the same value, and only unpacked when it is read.  The table acts
+    like a read-only dictionary of volumeID => volume, where each volume is a read-only dictionary view
+    """
+
+    def __init__(self, volumes=None):
+        """
+        Args:
+            volumes:    the volumes to put in the table (iterable of dict)
+        """
+        self._keys = []
+        self._ints = {col : array(_INT_TYPE) for col in _INT_COLUMNS + _QOS_COLUMNS}
+        self._enums = {col : array("H") for col in _ENUM_COLUMNS}
+        self._enumValues = {col : [] for col in _ENUM_COLUMNS}
+        self._blobs = {}
+        self._count = 0
+        self._index = None
+        for vol in volumes or []:
+            self.Append(vol)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_index"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def Append(self, volume):
+        """
+        Add a volume to the table
+
+        Args:
+            volume:     the volume to add (dict)
+        """
+        for key in volume:
+            if key not in self._keys:
+                self._keys.append(key)
+                if key not in _INT_COLUMNS and key not in _ENUM_COLUMNS:
+                    # Names are almost always unique, so do not bother trying to share them
+                    self._blobs[key] = _BlobColumn(self._count, packed=key == "name")
+
+        for col in _INT_COLUMNS:
+            value = volume.get(col)
+            self._ints[col].append(_MISSING if value is None else value)
+        qos = volume.get("qos") or {}
+        for col in _QOS_COLUMNS:
+            value = qos.get(col)
+            self._ints[col].append(_MISSING if value is None else value)
+        for col in _ENUM_COLUMNS:
+            self._enums[col].append(self._EnumCode(col, volume.get(col, _ABSENT)))
+
+        for key, column in self._blobs.items():
+            if key not in volume:
+                column.Append(None)
+                continue
+            value = volume[key]
+            # Volume IQNs are normally <prefix>.<name>.<volumeID>, so only keep the prefix when they are
+            if key == "iqn" and value and value.endswith(".{}.{}".format(volume.get("name"), volume.get("volumeID"))):
+                value = (value[:-len(".{}.{}".format(volume.get("name"), volume.get("volumeID")))],)
+            column.Append(marshal.dumps(value))
+
+        self._count += 1
+        self._index = None
+
+    def _EnumCode(self, column, value):
+        """Get the code for a value in an enum column, adding it if it is new"""
+        values = self._enumValues[column]
+        try:
+            return values.index(value)
+        except ValueError:
+            values.append(value)
+            return len(values) - 1
+
+    def _GetValue(self, idx, key):
+        """Get the value of a key for the volume in a row, or _ABSENT if the volume does not have that key"""
+        if key in _INT_COLUMNS:
+            value = self._ints[key][idx]
+            return _ABSENT if value == _MISSING else value
+        if key in self._enums:
+            return self._enumValues[key][self._enums[key][idx]]
+        if key in self._blobs:
+            blob = self._blobs[key].Get(idx)
+            if blob is None:
+                return _ABSENT
+            value = marshal.loads(blob)
+            if key == "iqn" and isinstance(value, tuple):
+                value = "{}.{}.{}".format(value[0], self._GetValue(idx, "name"), self._ints["volumeID"][idx])
+            return value
+        return _ABSENT
+
+    def _Index(self):
+        if self._index is None:
+            self._index = {vol_id : idx for idx, vol_id in enumerate(self._ints["volumeID"])}
+        return self._index
+
+    def _Take(self, indexes):
+        """Make a new table from the given rows of this table"""
+        table = VolumeTable()
+        table._keys = list(self._keys) #pylint: disable=protected-access
+        table._ints = {col : array(_INT_TYPE, [values[i] for i in indexes]) for col, values in self._ints.items()} #pylint: disable=protected-access
+        table._enums = {col : array("H", [values[i] for i in indexes]) for col, values in self._enums.items()} #pylint: disable=protected-access
+        table._enumValues = {col : list(values) for col, values in self._enumValues.items()} #pylint: disable=protected-access
+        table._blobs = {key : column.Take(indexes) for key, column in self._blobs.items()} #pylint: disable=protected-access
+        table._count = len(indexes) #pylint: disable=protected-access
+        return table
+
+    # Dictionary compatibility, keyed by volumeID
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return iter(self._ints["volumeID"])
+
+    def __contains__(self, volumeID):
+        return volumeID in self._Index()
+
+    def __getitem__(self, volumeID):
+        try:
+            return VolumeRow(self, self._Index()[volumeID])
+        except KeyError:
+            raise UnknownObjectError("Could not find volume {}".format(volumeID))
+
+    def get(self, volumeID, default=None):
+        """Get the volume with the given ID, or default if it is not in the table"""
+        idx = self._Index().get(volumeID)
+        return default if idx is None else VolumeRow(self, idx)
+
+    def keys(self):
+        """Get the list of volume IDs in the table"""
+        return list(self._ints["volumeID"])
+
+    def values(self):
+        """Get the list of volumes in the table"""
+        return [VolumeRow(self, idx) for idx in range(self._count)]
+
+    def items(self):
+        """Get the list of (volumeID, volume) pairs in the table"""
+        return [(vol_id, VolumeRow(self, idx)) for idx, vol_id in enumerate(self._ints["volumeID"])]
+
+    def ToDict(self):
+        """
+        Get a regular dictionary of the volumes in this table
+
+        Returns:
+            A dictionary of volumeID (int) => volume (dict)
+        """
+        return {vol_id : row.ToDict() for vol_id, row in self.items()}
+
+    # Column operations
+
+    def Column(self, column):
+        """
+        Get all of the values of a column
+
+        Args:
+            column:     the name of the column (string)
+
+        Returns:
+            A copy of the values, as a numpy masked array with volumes that do not have the key masked if numpy is
+            available and this is a numeric column, otherwise a list with None for volumes that do not have the key
+        """
+        if column in self._ints and numpy is not None:
+            return numpy.ma.masked_equal(self._IntView(column), _MISSING, copy=True)
+        return self._Values(column)
+
+    def _IntView(self, column):
+        """
+        Get a numpy view of the storage of a numeric column, with _MISSING for volumes that do not have the key.  The
+        table cannot grow while the view exists, so it must not be kept or given to callers
+        """
+        return numpy.frombuffer(self._ints[column], dtype="i{}".format(self._ints[column].itemsize))
+
+    def _Values(self, column):
+        """Get all of the values of a column as a list, with None for volumes that do not have that key"""
+        if column in self._ints:
+            return [None if value == _MISSING else value for value in self._ints[column]]
+        if column in self._enums:
+            values = [None if value is _ABSENT else value for value in self._enumValues[column]]
+            return [values[code] for code in self._enums[column]]
+        if column in self._blobs:
+            values = [self._GetValue(idx, column) for idx in range(self._count)]
+            return [None if value is _ABSENT else value for value in values]
+        raise InvalidArgumentError("{} is not a column in this table".format(column))
+
+    def _Matches(self, column, test):
+        """Get the indexes of the rows where test(value) is true for a column"""
+        if callable(test):
+            return [idx for idx, value in enumerate(self._Values(column)) if value is not None and test(value)]
+
+        op, operand = test
+        if column in self._ints and numpy is not None and (op is _IsIn or operand is not None):
+            values = self._IntView(column)
+            missing = values == _MISSING
+            if op is _IsIn:
+                matches = numpy.isin(values, [value for value in operand if value is not None]) & ~missing
+                if None in operand:
+                    matches |= missing
+            elif op is operator.ne:
+                matches = (values != operand) | missing
+            else:
+                matches = op(values, operand) & ~missing
+            return numpy.flatnonzero(matches).tolist()
+        if column in self._enums:
+            # Compare against the small list of distinct values instead of every row
+            codes = set(code for code, value in enumerate(self._enumValues[column]) if _Compare(op, None if value is _ABSENT else value, operand))
+            return [idx for idx, code in enumerate(self._enums[column]) if code in codes]
+        return [idx for idx, value in enumerate(self._Values(column)) if _Compare(op, value, operand)]
+
+    def Filter(self, namePrefix=None, nameRegex=None, **criteria):
+        """
+        Get the volumes that match all of the given criteria
+
+        Args:
+            namePrefix:     only include volumes with names that start with this prefix (string)
+            nameRegex:      only include volumes with names that match this regex (string)
+            criteria:       column=value to match a value or any of a list of values, or column__op=value where op is one
+                            of lt, le, gt, ge, ne, e.g. Filter(accountID=[1,2], totalSize__ge=1000000000, status="active").
+                            A volume without the key has the value None, which only matches equality and ne
+
+        Returns:
+            A new VolumeTable with the matching volumes
+        """
+        tests = []
+        if namePrefix:
+            tests.append(("name", lambda name: name.startswith(namePrefix)))
+        if nameRegex:
+            regex = re.compile(nameRegex)
+            tests.append(("name", lambda name: regex.search(name) is not None))
+        for key, operand in criteria.items():
+            column, _, op_name = key.partition("__")
+            if op_name:
+                if op_name not in _COMPARE_OPS:
+                    raise InvalidArgumentError("Unknown comparison {}".format(op_name))
+                tests.append((column, (_COMPARE_OPS[op_name], operand)))
+            elif isinstance(operand, (list, tuple, set, frozenset)):
+                tests.append((column, (_IsIn, frozenset(operand))))
+            else:
+                tests.append((column, (operator.eq, operand)))
+
+        selected = None
+        for column, test in tests:
+            matches = set(self._Matches(column, test))
+            selected = matches if selected is None else selected & matches
+        if selected is None:
+            return self
+        return self._Take(sorted(selected))
+
+    def Sort(self, column, reverse=False):
+        """
+        Get the volumes sorted by a column
+
+        Args:
+            column:     the name of the column to sort by (string)
+            reverse:    sort in descending order (bool)
+
+        Returns:
+            A new VolumeTable with the volumes in sorted order
+        """
+        if column in self._ints and numpy is not None:
+            values = self._IntView(column)
+            if reverse:
+                # Sort the rows back to front and then flip the result, so volumes with the same value keep their order
+                order = (len(values) - 1 - numpy.argsort(values[::-1], kind="stable"))[::-1].tolist()
+            else:
+                order = numpy.argsort(values, kind="stable").tolist()
+        else:
+            values = self._Values(column)
+            order = sorted(range(self._count), key=lambda idx: (values[idx] is not None, values[idx]), reverse=reverse)
+        return self._Take(order)
+
+    def Sum(self, column, by=None):
+        """
+        Add up a numeric column, optionally grouped by another column
+
+        Args:
+            column:     the name of the column to add up (string)
+            by:         the name of the column to group by (string)
+
+        Returns:
+            The total (int), or a dictionary of group value => total if by is specified
+        """
+        if column not in self._ints:
+            raise InvalidArgumentError("{} is not a numeric column".format(column))
+        if not by:
+            if numpy is not None:
+                values = self._IntView(column)
+                return int(values[values != _MISSING].sum())
+            return sum(value for value in self._ints[column] if value != _MISSING)
+        totals = {}
+        for key, value in zip(self._Values(by), self._ints[column]):
+            if value != _MISSING:
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def Count(self, by):
+        """
+        Count the volumes grouped by a column
+
+        Args:
+            by:         the name of the column to group by (string)
+
+        Returns:
+            A dictionary of group value => number of volumes
+        """
+        counts = {}
+        for key in self._Values(by):
+            counts[key] = counts.get(key, 0) + 1
+        return counts
@@ -3,18 +3,27 @@
 
 from __future__ import print_function
 from .logutil import GetLogger
+from .util import SecondsToElapsedStr
+from . import clockutil as _clockutil
 from . import sfdefaults as _sfdefaults
-from . import SolidFireError, SFTimeoutError
+from . import SolidFireError, SFTimeoutError, SFCancelledError
 
 import atexit
+import bisect as _bisect
+import collections as _collections
+import contextlib as _contextlib
 import fcntl as _fcntl
 import functools as _functools
+import json as _json
 import multiprocessing as _multiprocessing
 import multiprocessing.pool as _multiprocessing_pool
+import os as _os
 import sys as _sys
 import threading as _threading
+import time as _time
 import traceback as _traceback
 from io import open
+from six.moves import queue as _queue
 
 # Helpful multiprocessing debug for threadpools
 # from logging import DEBUG as _DEBUG_LEVEL
@@ -23,22 +32,46 @@ from io import open
 
 CPU_THREADS = _multiprocessing.cpu_count()
 
-_globalPool = None
-_globalPoolLock = _multiprocessing.Lock()
+_pools = {}
+_poolsLock = _multiprocessing.Lock()
+def _SharedPool(name, createFunc):
+    """Get a process-wide pool by name, creating it the first time it is asked for"""
+    with _poolsLock:
+        if name not in _pools:
+            _pools[name] = createFunc()
+        return _pools[name]
+
+def IOPool():
+    """
+    Get the shared thread pool for I/O bound work like API calls and SSH sessions.
+    It is sized from sfdefaults.concurrency, which is set from the --parallel-max option, and runs the most urgent
+    work first so that control-plane checks are not stuck behind bulk fan-outs
+
+    Returns:
+        PriorityPool
+    """
+    return _SharedPool("io", lambda: PriorityPool(maxThreads=int(_sfdefaults.concurrency)))
+
+def CPUPool():
+    """
+    Get the shared pool for CPU bound work.
+    It has one worker per core, and uses processes instead of threads if sfdefaults.use_multiprocessing is set
+
+    Returns:
+        ThreadPool
+    """
+    return _SharedPool("cpu", lambda: ThreadPool(maxThreads=CPU_THREADS, useMultiprocessing=_sfdefaults.use_multiprocessing))
+
 def GlobalPool():
-    """ Get the global thread pool """
-    #pylint: disable=global-statement
-    global _globalPool
-    #pylint: enable=global-statement
-    with _globalPoolLock:
-        if not _globalPool:
-            _globalPool = ThreadPool()
-    return _globalPool
+    """ Get the global thread pool, which is the shared I/O pool """
+    return IOPool()
 
 def ShutdownGlobalPool():
-    with _globalPoolLock:
-        if _globalPool:
-            _globalPool.Shutdown()
+    """ Shut down all of the shared pools """
+    with _poolsLock:
+        for pool in _pools.values():
+            pool.Shutdown()
+        _pools.clear()
 
 def IsMainThread():
     """
@@ -60,26 +93,227 @@ def IsMainProcess():
 
     return _multiprocessing.current_process().name == "MainProcess"
 
+class CancellationToken(object):
+    """
+    Signal that work should stop, because something cancelled it or because its deadline passed.
+    Tokens nest: a child token is cancelled when its parent is, and its deadline is never later than its parent's.
+    Long running code checks the token of the current thread with CheckCancelled and sleeps with Sleep so that it stops promptly.
+    """
+
+    # The longest to wait between checks of the parent tokens while sleeping
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, timeout=None, parent=None):
+        """
+        Args:
+            timeout:    how long from now the work has before it should give up, in seconds (float)
+            parent:     the token of the work this is part of (CancellationToken)
+        """
+        self.parent = parent
+        self.reason = None
+        self._event = _threading.Event()
+        self.deadline = _clockutil.Time() + timeout if timeout is not None else None
+        if parent is not None and parent.deadline is not None:
+            self.deadline = parent.deadline if self.deadline is None else min(self.deadline, parent.deadline)
+
+    def Cancel(self, reason="Cancelled"):
+        """
+        Cancel the work using this token and any tokens nested under it
+
+        Args:
+            reason:     why the work was cancelled (str)
+        """
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def IsCancelled(self):
+        """
+        Check if this token or one of its parents has been cancelled
+
+        Returns:
+            Boolean true if cancelled, false otherwise
+        """
+        token = self
+        while token is not None:
+            if token._event.is_set():
+                return True
+            token = token.parent
+        return False
+
+    def Expired(self):
+        """
+        Check if the deadline has passed
+
+        Returns:
+            Boolean true if the deadline has passed, false otherwise
+        """
+        return self.deadline is not None and _clockutil.Time() >= self.deadline
+
+    def Remaining(self, limit=None):
+        """
+        Get how long is left before the deadline
+
+        Args:
+            limit:  the most to return, for instance the timeout the caller would otherwise use (float)
+
+        Returns:
+            The seconds left, capped at limit, or limit if there is no deadline (float)
+        """
+        if self.deadline is None:
+            return limit
+        remaining = max(0.0, self.deadline - _clockutil.Time())
+        return remaining if limit is None else min(limit, remaining)
+
+    def Check(self):
+        """
+        Raise if the work should stop
+
+        Raises:
+            SFCancelledError if the token has been cancelled, SFTimeoutError if the deadline has passed
+        """
+        token = self
+        while token is not None:
+            if token._event.is_set():
+                raise SFCancelledError(token.reason)
+            token = token.parent
+        if self.Expired():
+            raise SFTimeoutError("Deadline passed")
+
+    def Sleep(self, seconds):
+        """
+        Sleep, waking up and raising as soon as the token is cancelled or its deadline passes
+
+        Args:
+            seconds:    how long to sleep (float)
+        """
+        self.Check()
+        clock = _clockutil.GetClock()
+        end_time = clock.Time() + self.Remaining(seconds)
+        while True:
+            left = end_time - clock.Time()
+            if left <= 0:
+                break
+            clock.Wait(self._event, min(left, self.POLL_INTERVAL))
+            if self.IsCancelled():
+                break
+        self.Check()
+
+    @_contextlib.contextmanager
+    def Activate(self):
+        """
+        Context manager that makes this the token of the current thread, and of any work it posts to a thread pool
+        """
+        previous = getattr(_threadLocal, "token", None)
+        _threadLocal.token = self
+        try:
+            yield self
+        finally:
+            _threadLocal.token = previous
+
+_threadLocal = _threading.local()
+_rootToken = CancellationToken()
+
+def CurrentToken():
+    """
+    Get the cancellation token of the current thread
+
+    Returns:
+        CancellationToken
+    """
+    return getattr(_threadLocal, "token", None) or _rootToken
+
+def CheckCancelled():
+    """
+    Raise if the work on the current thread has been cancelled or has passed its deadline
+    """
+    CurrentToken().Check()
+
+def Sleep(seconds):
+    """
+    Sleep, waking up and raising as soon as the work on the current thread is cancelled or passes its deadline
+
+    Args:
+        seconds:    how long to sleep (float)
+    """
+    CurrentToken().Sleep(seconds)
+
 class AsyncResult(object):
     """Result object from posting to a ThreadPool"""
 
-    def __init__(self, result):
+    def __init__(self, result=None, token=None):
         self.result = result
+        self.token = token
+        self._lock = _threading.Lock()
+        self._complete = False
+        self._listeners = []
+
+    def _Complete(self, _):
+        """
+        Callback from the pool when the thread has finished
+        """
+        with self._lock:
+            self._complete = True
+            listeners = self._listeners
+            self._listeners = []
+        for listener in listeners:
+            listener.put(self)
+
+    def _Notify(self, listener):
+        """
+        Put this result on a queue when the thread finishes, or right away if it already has
+        """
+        with self._lock:
+            if not self._complete:
+                self._listeners.append(listener)
+                return
+        listener.put(self)
+
+    def Cancel(self, reason="Cancelled"):
+        """
+        Cancel the thread.  It stops at its next cancellation check, or does not start at all if it has not yet
+
+        Args:
+            reason:     why the thread was cancelled (str)
+        """
+        if self.token is not None:
+            self.token.Cancel(reason)
 
     def Get(self):
         """
-        Wait for and return the result of the thread
+        Wait for and return the result of the thread.
+        This gives up if the waiting thread is cancelled or passes its deadline
 
         Returns:
             The return value of the thread
         """
-        return self.result.get(0xFFFF)
+        return self.GetWithTimeout(None)
 
     def GetWithTimeout(self, timeout):
-        try:
-            return self.result.get(timeout)
-        except _multiprocessing.TimeoutError as e:
-            SFTimeoutError("Timeout waiting for thread to complete", innerException=e)
+        """
+        Wait for and return the result of the thread, giving up after a timeout.
+        This also gives up if the waiting thread is cancelled or passes its deadline
+
+        Args:
+            timeout:    how long to wait, in seconds, or None to wait as long as it takes (float)
+
+        Returns:
+            The return value of the thread
+        """
+        token = CurrentToken()
+        end_time = _clockutil.Time() + timeout if timeout is not None else None
+        # Wait in short slices so cancellation is noticed and Ctrl-C can interrupt the wait in python 2
+        while True:
+            self.result.wait(token.Remaining(CancellationToken.POLL_INTERVAL))
+            if self.result.ready():
+                break
+            token.Check()
+            if end_time is not None and _clockutil.Time() >= end_time:
+                raise SFTimeoutError("Timeout waiting for thread to complete")
+        success, value = self.result.get(0)
+        if not success:
+            raise value
+        return value
 
     def Wait(self, timeout):
         """
@@ -91,7 +325,302 @@ class AsyncResult(object):
         Returns:
             Boolean true if the thread is ready or false if the timeout expired (bool)
         """
-        return self.result.wait(timeout)
+        self.result.wait(timeout)
+        return self.result.ready()
+
+class PoolTelemetry(object):
+    """
+    Counts, latencies and throughput of the work run by a pool, for progress reporting.
+    Latencies are counted in a fixed set of buckets, so percentiles can be estimated without keeping every sample.
+    """
+
+    # Upper bounds of the latency buckets, in seconds
+    LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, float("inf"))
+    # How quickly the smoothed throughput follows new samples, and the shortest time to take a sample over
+    THROUGHPUT_WEIGHT = 0.3
+    THROUGHPUT_INTERVAL = 1.0
+    # How many of the longest running items to report
+    STRAGGLER_COUNT = 5
+
+    def __init__(self, name=None):
+        """
+        Args:
+            name:   the name of the pool, for reporting (str)
+        """
+        self.name = name
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.histogram = [0] * len(self.LATENCY_BUCKETS)
+        self.maxLatency = 0.0
+        self.throughput = None
+        self._inflight = {}
+        self._sequence = 0
+        self._sampleStart = _clockutil.Time()
+        self._sampleCount = 0
+        self._lock = _threading.Lock()
+
+    def Submitted(self):
+        """
+        Record that a work item was posted
+        """
+        with self._lock:
+            self.submitted += 1
+
+    def Started(self, description=None):
+        """
+        Record that a work item started running
+
+        Args:
+            description:    what the item is, or a function that returns that, for reporting stragglers (str or callable)
+
+        Returns:
+            A key to pass to Finished
+        """
+        with self._lock:
+            self._sequence += 1
+            self._inflight[self._sequence] = (_clockutil.Time(), description)
+            return self._sequence
+
+    def Finished(self, key, failed=False):
+        """
+        Record that a work item finished
+
+        Args:
+            key:    the key returned from Started, or None if the item never started
+            failed: the item raised an exception (bool)
+        """
+        now = _clockutil.Time()
+        with self._lock:
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+            start = self._inflight.pop(key, None)
+            if start is not None:
+                latency = max(0.0, now - start[0])
+                self.histogram[_bisect.bisect_left(self.LATENCY_BUCKETS, latency)] += 1
+                self.maxLatency = max(self.maxLatency, latency)
+            self._sampleCount += 1
+            self._SampleThroughput(now)
+
+    def _SampleThroughput(self, now):
+        """
+        Fold the items finished since the last sample into the smoothed throughput, once enough time has passed
+        """
+        elapsed = now - self._sampleStart
+        if elapsed < self.THROUGHPUT_INTERVAL:
+            return
+        rate = self._sampleCount / elapsed
+        if self.throughput is None:
+            self.throughput = rate
+        else:
+            self.throughput += self.THROUGHPUT_WEIGHT * (rate - self.throughput)
+        self._sampleStart = now
+        self._sampleCount = 0
+
+    @classmethod
+    def Percentile(cls, histogram, fraction, maxLatency):
+        """
+        Estimate a latency percentile from a histogram, as the upper bound of the bucket it falls in
+
+        Args:
+            histogram:  the count in each of LATENCY_BUCKETS (list of int)
+            fraction:   the percentile to get, between 0 and 1 (float)
+            maxLatency: the longest latency seen, used for the last bucket and as an upper bound (float)
+
+        Returns:
+            The latency in seconds, or None if there are no samples (float)
+        """
+        total = sum(histogram)
+        if total <= 0:
+            return None
+        seen = 0
+        for bound, count in zip(cls.LATENCY_BUCKETS, histogram):
+            seen += count
+            if seen >= fraction * total:
+                return min(bound, maxLatency)
+        return maxLatency
+
+    def Snapshot(self, since=None):
+        """
+        Get the current counts and latencies
+
+        Args:
+            since:  an earlier snapshot to only count the work finished after (dict)
+
+        Returns:
+            A dictionary of telemetry
+        """
+        now = _clockutil.Time()
+        with self._lock:
+            self._SampleThroughput(now)
+            snapshot = {
+                "name" : self.name,
+                "time" : now,
+                "submitted" : self.submitted,
+                "completed" : self.completed,
+                "failed" : self.failed,
+                "running" : len(self._inflight),
+                "histogram" : list(self.histogram),
+                "maxLatency" : self.maxLatency,
+                "throughput" : self.throughput,
+            }
+            inflight = sorted(self._inflight.values(), key=lambda entry: entry[0])[:self.STRAGGLER_COUNT]
+
+        if since:
+            for name in ("submitted", "completed", "failed"):
+                snapshot[name] -= since[name]
+            snapshot["histogram"] = [count - before for count, before in zip(snapshot["histogram"], since["histogram"])]
+        snapshot["queued"] = max(0, snapshot["submitted"] - snapshot["completed"] - snapshot["failed"] - snapshot["running"])
+        snapshot["latency"] = {name : self.Percentile(snapshot["histogram"], fraction, snapshot["maxLatency"])
+                               for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+        snapshot["stragglers"] = [(description() if callable(description) else description, now - start)
+                                  for start, description in inflight]
+        return snapshot
+
+def _DescribeCall(threadFunc, args):
+    """
+    Describe a work item as the name of its function and its args
+    """
+    func = getattr(threadFunc, "func", threadFunc)
+    description = "{}({})".format(getattr(func, "__name__", repr(func)), ", ".join([repr(arg) for arg in args]))
+    return description if len(description) <= 80 else description[:77] + "..."
+
+class ProgressReporter(object):
+    """
+    Report the progress of a bulk operation from the telemetry of the pool running it, as a log line and optionally as a
+    JSON status file for other tools to watch.
+    Only the work finished after the reporter is created is counted, so a shared pool can be reported on by one
+    operation after another.  Use it as a context manager to report in the background while the operation runs.
+    """
+
+    def __init__(self, telemetry, label, total=None, interval=None, statusFile=None):
+        """
+        Args:
+            telemetry:  the telemetry to report (PoolTelemetry)
+            label:      what the operation is, to start each report with (str)
+            total:      how many items the operation will run, defaults to how many have been posted (int)
+            interval:   the shortest time between reports, in seconds, defaults to sfdefaults.progress_interval (float)
+            statusFile: the file to keep the latest progress in, defaults to sfdefaults.progress_status_file (str)
+        """
+        self.telemetry = telemetry
+        self.label = label
+        self.total = total
+        self.interval = float(interval if interval is not None else _sfdefaults.progress_interval)
+        self.statusFile = statusFile if statusFile is not None else _sfdefaults.progress_status_file
+        self._baseline = telemetry.Snapshot()
+        self._lastReport = None
+        self._lock = _threading.Lock()
+        self._stop = _threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = _threading.Thread(target=self._Run, name="ProgressReporter")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, extype, value, tb):
+        self._stop.set()
+        self._thread.join()
+        self.Update(force=True)
+
+    def _Run(self):
+        """
+        Report in the background until the reporter is stopped
+        """
+        while not self._stop.wait(max(1.0, self.interval)):
+            self.Update()
+
+    def Status(self):
+        """
+        Get the progress of the operation
+
+        Returns:
+            A dictionary of progress, the same as is written to the status file
+        """
+        status = self.telemetry.Snapshot(since=self._baseline)
+        status.pop("histogram")
+        status["label"] = self.label
+        status["total"] = self.total if self.total is not None else status["submitted"]
+        status["finished"] = status["completed"] + status["failed"]
+        status["elapsed"] = status["time"] - self._baseline["time"]
+        remaining = max(0, status["total"] - status["finished"])
+        if remaining <= 0:
+            status["eta"] = 0
+        elif status["throughput"]:
+            status["eta"] = remaining / status["throughput"]
+        else:
+            status["eta"] = None
+        return status
+
+    def Update(self, force=False):
+        """
+        Report the progress, unless the last report was less than the interval ago
+
+        Args:
+            force:  report even if the last report was less than the interval ago (bool)
+
+        Returns:
+            The progress that was reported, or None if it was too soon to report (dict)
+        """
+        with self._lock:
+            now = _clockutil.Time()
+            if not force and self._lastReport is not None and now - self._lastReport < self.interval:
+                return None
+            self._lastReport = now
+
+        status = self.Status()
+        log = GetLogger()
+        log.info("{}: {}/{} finished, {} failed, {} running, {} per sec, ETA {}, p95 latency {}".format(
+            self.label,
+            status["finished"],
+            status["total"],
+            status["failed"],
+            status["running"],
+            "{:.1f}".format(status["throughput"]) if status["throughput"] is not None else "-",
+            SecondsToElapsedStr(int(status["eta"])) if status["eta"] is not None else "unknown",
+            "{:.2f}s".format(status["latency"]["p95"]) if status["latency"]["p95"] is not None else "-"))
+        for description, seconds in status["stragglers"]:
+            log.debug("  Running for {}: {}".format(SecondsToElapsedStr(int(seconds)), description))
+        if self.statusFile:
+            self._WriteStatusFile(status)
+        return status
+
+    def _WriteStatusFile(self, status):
+        """
+        Replace the status file with the latest progress.  The new file is written under another name and renamed over the
+        old one, so readers never see a partly written file
+        """
+        temp_file = "{}.tmp".format(self.statusFile)
+        try:
+            with open(temp_file, "wb") as outfile:
+                outfile.write(_json.dumps(status, sort_keys=True).encode("utf-8"))
+            _os.rename(temp_file, self.statusFile)
+        except (IOError, OSError) as ex:
+            GetLogger().debug("Could not write progress to {}: {}".format(self.statusFile, ex))
+
+def _CallCaptured(threadFunc, args, kwargs, token=None, telemetry=None):
+    """
+    Run a thread function and capture its result or exception, so the pool always calls back when it finishes
+
+    Returns:
+        A tuple of (success, return value or exception)
+    """
+    key = telemetry.Started(_functools.partial(_DescribeCall, threadFunc, args)) if telemetry is not None else None
+    try:
+        if token is None:
+            outcome = True, threadFunc(*args, **kwargs)
+        else:
+            token.Check()
+            with token.Activate():
+                outcome = True, threadFunc(*args, **kwargs)
+    except BaseException as e: #pylint: disable=broad-except
+        outcome = False, e
+    if telemetry is not None:
+        telemetry.Finished(key, failed=not outcome[0])
+    return outcome
 
 def _initworkerprocess():
     """
@@ -109,9 +638,33 @@ class ThreadPool(object):
             self.threadPool = _multiprocessing.Pool(processes=maxThreads, initializer=_initworkerprocess)
         else:
             self.threadPool = _multiprocessing_pool.ThreadPool(processes=maxThreads)
+        self.maxThreads = maxThreads
+        self.useMultiprocessing = useMultiprocessing
         self.results = []
+        self.telemetry = PoolTelemetry()
         atexit.register(self.threadPool.close)
 
+    def _Submit(self, threadFunc, args, kwargs):
+        """
+        Start a work item without keeping track of it in the pool.
+        In a thread pool the item gets its own token nested under the token of the posting thread, so cancelling the poster
+        cancels the item.  Tokens cannot be sent to other processes, so items in a process pool cannot be cancelled.
+        """
+        self.telemetry.Submitted()
+        if not self.useMultiprocessing:
+            res = AsyncResult(token=CancellationToken(parent=CurrentToken()))
+            res.result = self.threadPool.apply_async(_CallCaptured, (threadFunc, args, kwargs, res.token, self.telemetry), callback=res._Complete)
+            return res
+
+        # Telemetry cannot be sent to other processes either, so items in a process pool are timed from when they are posted
+        key = self.telemetry.Started(_functools.partial(_DescribeCall, threadFunc, args))
+        res = AsyncResult()
+        def _Finished(outcome):
+            self.telemetry.Finished(key, failed=not outcome[0])
+            res._Complete(outcome)
+        res.result = self.threadPool.apply_async(_CallCaptured, (threadFunc, args, kwargs), callback=_Finished)
+        return res
+
     def Post(self, threadFunc, *args, **kwargs):
         """
         Add a new work item
@@ -124,11 +677,80 @@ class ThreadPool(object):
         Returns:
             AsyncResult object
         """
-        async_res = self.threadPool.apply_async(threadFunc, args, kwargs)
-        res = AsyncResult(async_res)
+        res = self._Submit(threadFunc, args, kwargs)
         self.results.append(res)
         return res
 
+    def ImapUnordered(self, threadFunc, iterable, maxInflight=None):
+        """
+        Run a function on each item from an iterable and yield the return values as they finish.
+        Items are only taken from the iterable as there is room for them, so at most maxInflight items are queued or running at
+        once and very large or endless iterables can be used.  Results are not kept by the pool, so they are released as soon
+        as the caller is done with them.
+        If an item raises, or the caller stops early or is interrupted, no more items are started and the exception is raised.
+
+        Args:
+            threadFunc:     the function to run on each item, it is passed the item as its only argument
+            iterable:       the items to run the function on
+            maxInflight:    the most items to have queued or running at once, defaults to twice the number of threads (int)
+
+        Yields:
+            The return value of the function for each item, in the order they finish
+        """
+        for _, value in self._Imap(threadFunc, iterable, maxInflight):
+            yield value
+
+    def Map(self, threadFunc, iterable, maxInflight=None):
+        """
+        Run a function on each item from an iterable and return the return values in the same order as the items.
+        Items are taken from the iterable as there is room for them, the same as ImapUnordered.
+
+        Args:
+            threadFunc:     the function to run on each item, it is passed the item as its only argument
+            iterable:       the items to run the function on
+            maxInflight:    the most items to have queued or running at once, defaults to twice the number of threads (int)
+
+        Returns:
+            A list of the return values of the function
+        """
+        values = {}
+        for idx, value in self._Imap(threadFunc, iterable, maxInflight):
+            values[idx] = value
+        return [values[idx] for idx in range(len(values))]
+
+    def _Imap(self, threadFunc, iterable, maxInflight):
+        """
+        Feed items to the pool with at most maxInflight outstanding and yield (index, return value) as they finish
+        """
+        maxInflight = maxInflight or 2 * self.maxThreads
+        finished = _queue.Queue()
+        group = CancellationToken(parent=CurrentToken())
+        items = enumerate(iterable)
+        inflight = {}
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(inflight) < maxInflight:
+                    try:
+                        idx, item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    with group.Activate():
+                        res = self._Submit(threadFunc, (item,), {})
+                    inflight[res] = idx
+                    res._Notify(finished)
+
+                if not inflight:
+                    return
+
+                res = _GetFinished(finished)
+                idx = inflight.pop(res)
+                yield idx, res.Get()
+        finally:
+            if inflight:
+                group.Cancel("Cancelled because the caller stopped waiting")
+
     def Wait(self):
         """
         Wait for all threads to finish and collect the results
@@ -136,7 +758,8 @@ class ThreadPool(object):
         Returns:
             Boolean true if all threads succeeded, False if one or more failed
         """
-        return WaitForThreads(self.results)
+        results, self.results = self.results, []
+        return WaitForThreads(results)
 
     def Shutdown(self):
         """
@@ -145,6 +768,482 @@ class ThreadPool(object):
         self.threadPool.close()
         self.threadPool.terminate()
 
+def _GetFinished(finished, deadline=None):
+    """
+    Wait for the next result on a queue of finished results, giving up if the waiting thread is cancelled or the deadline passes
+    """
+    token = CurrentToken()
+    while True:
+        try:
+            # Wait in short slices so cancellation is noticed and Ctrl-C can interrupt the wait in python 2
+            return finished.get(True, CancellationToken.POLL_INTERVAL)
+        except _queue.Empty:
+            token.Check()
+            if deadline is not None and _clockutil.Time() >= deadline:
+                raise SFTimeoutError("Deadline passed")
+
+def AsCompleted(asyncResults, deadline=None):
+    """
+    Yield results as their threads finish, regardless of the order they were posted in
+
+    Args:
+        asyncResults:   the results to wait for (list of AsyncResult)
+        deadline:       the time to give up waiting, as returned by clockutil.Time() (float)
+
+    Yields:
+        Each AsyncResult once its thread has finished
+    """
+    finished = _queue.Queue()
+    pending = len(asyncResults)
+    for res in asyncResults:
+        res._Notify(finished)
+    while pending > 0:
+        yield _GetFinished(finished, deadline)
+        pending -= 1
+
+# Priority classes for work posted to a PriorityPool, most urgent first
+PRIORITY_CRITICAL = 0       # Checks that gate the progress of a workflow, like fault checks and waits
+PRIORITY_INTERACTIVE = 1    # Ordinary work, the default
+PRIORITY_BULK = 2           # Large fan-outs like mass modifies, stats sampling and clone polling
+
+def CurrentPriority():
+    """
+    Get the priority class of the current thread, which work it posts to a PriorityPool runs at
+
+    Returns:
+        One of the PRIORITY_* classes (int)
+    """
+    priority = getattr(_threadLocal, "priority", None)
+    return PRIORITY_INTERACTIVE if priority is None else priority
+
+@_contextlib.contextmanager
+def RunAtPriority(priority):
+    """
+    Context manager that sets the priority class of the current thread, and of any work it posts to a PriorityPool
+
+    Args:
+        priority:   one of the PRIORITY_* classes (int)
+    """
+    previous = getattr(_threadLocal, "priority", None)
+    _threadLocal.priority = priority
+    try:
+        yield
+    finally:
+        _threadLocal.priority = previous
+
+class _DeferredResult(object):
+    """Stands in for a multiprocessing AsyncResult for work that is queued until a thread is free to run it"""
+
+    def __init__(self):
+        self._event = _threading.Event()
+        self._value = None
+
+    def _Set(self, value):
+        self._value = value
+        self._event.set()
+
+    def wait(self, timeout=None):
+        self._event.wait(timeout)
+
+    def ready(self):
+        return self._event.is_set()
+
+    def get(self, timeout=None):
+        self._event.wait(timeout)
+        if not self._event.is_set():
+            raise _multiprocessing.TimeoutError()
+        return self._value
+
+class PriorityPool(ThreadPool):
+    """
+    Thread pool that runs the most urgent queued work first instead of in the order it was posted.
+    Work is posted at the priority class of the posting thread (see RunAtPriority).  Queued work ages, so every
+    agingInterval seconds it has waited counts as one class more urgent and bulk work is never starved.  Each class can
+    be capped at a number of threads, so bulk work always leaves threads free for critical checks.
+    """
+
+    def __init__(self, maxThreads, classLimits=None, agingInterval=None):
+        """
+        Args:
+            maxThreads:     how many items to run at once (int)
+            classLimits:    the most threads each priority class can use, defaults to sfdefaults.scheduler_bulk_share of the
+                            threads for bulk work and no limit for the others (dict of int => int)
+            agingInterval:  how long queued work waits before it counts as one class more urgent, defaults to
+                            sfdefaults.scheduler_aging_interval (float)
+        """
+        super(PriorityPool, self).__init__(maxThreads, useMultiprocessing=False)
+        self.classLimits = {PRIORITY_BULK : max(1, int(maxThreads * float(_sfdefaults.scheduler_bulk_share)))}
+        self.classLimits.update(classLimits or {})
+        self.agingInterval = float(agingInterval if agingInterval is not None else _sfdefaults.scheduler_aging_interval)
+        self._queues = {}
+        self._running = {}
+        self._runningTotal = 0
+        self._sequence = 0
+        self._queueLock = _threading.Lock()
+
+    def _Submit(self, threadFunc, args, kwargs):
+        """
+        Queue a work item at the priority of the posting thread without keeping track of it in the pool
+        """
+        priority = CurrentPriority()
+        self.telemetry.Submitted()
+        res = AsyncResult(_DeferredResult(), token=CancellationToken(parent=CurrentToken()))
+        with self._queueLock:
+            # Ordering by post time plus a penalty for the class is the same as aging each item's priority as it waits
+            self._sequence += 1
+            key = (_clockutil.Time() + priority * self.agingInterval, self._sequence)
+            self._queues.setdefault(priority, _collections.deque()).append((key, priority, threadFunc, args, kwargs, res))
+        self._Dispatch()
+        return res
+
+    def _Dispatch(self):
+        """
+        Start queued work for as long as there are free threads
+        """
+        while True:
+            with self._queueLock:
+                if self._runningTotal >= self.maxThreads:
+                    return
+                candidates = [queue[0] for priority, queue in self._queues.items()
+                              if queue and self._running.get(priority, 0) < self.classLimits.get(priority, self.maxThreads)]
+                if not candidates:
+                    return
+                best = min(candidates, key=lambda item: item[0])
+                self._queues[best[1]].popleft()
+                self._running[best[1]] = self._running.get(best[1], 0) + 1
+                self._runningTotal += 1
+            self.threadPool.apply_async(self._Run, (best,))
+
+    def _Run(self, item):
+        """
+        Run a work item on a pool thread, at its priority
+        """
+        _, priority, threadFunc, args, kwargs, res = item
+        try:
+            with RunAtPriority(priority):
+                outcome = _CallCaptured(threadFunc, args, kwargs, res.token, self.telemetry)
+        finally:
+            with self._queueLock:
+                self._running[priority] -= 1
+                self._runningTotal -= 1
+        res.result._Set(outcome)
+        res._Complete(None)
+        self._Dispatch()
+
+    def Stats(self):
+        """
+        Get how much work is queued and running in each priority class
+
+        Returns:
+            A dictionary of priority class => (queued count, running count)
+        """
+        with self._queueLock:
+            classes = set(self._queues.keys()) | set(self._running.keys())
+            return {priority : (len(self._queues.get(priority, [])), self._running.get(priority, 0)) for priority in classes}
+
+    def Shutdown(self):
+        """
+        Cancel any queued work, abort any running threads and shut down the pool
+        """
+        with self._queueLock:
+            queued = [item for queue in self._queues.values() for item in queue]
+            self._queues = {}
+        for item in queued:
+            self.telemetry.Finished(None, failed=True)
+            res = item[5]
+            res.result._Set((False, SFCancelledError("Cancelled because the pool was shut down")))
+            res._Complete(None)
+        super(PriorityPool, self).Shutdown()
+
+class TaskGroup(object):
+    """
+    A set of related work items that share a cancellation token and an optional deadline.
+    In a fail-fast group the first item to fail cancels the rest, so they stop at their next cancellation check.
+    """
+
+    def __init__(self, pool=None, timeout=None, failFast=True):
+        """
+        Args:
+            pool:       the pool to run the items in, defaults to the shared I/O pool (ThreadPool)
+            timeout:    how long the whole group has before it is cancelled, in seconds (float)
+            failFast:   cancel the rest of the items as soon as one fails (bool)
+        """
+        self.pool = pool or IOPool()
+        self.failFast = failFast
+        self.token = CancellationToken(timeout=timeout, parent=CurrentToken())
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, extype, value, tb):
+        if extype is not None:
+            self.Cancel("Cancelled because of {}".format(extype.__name__))
+
+    def Post(self, threadFunc, *args, **kwargs):
+        """
+        Add a new work item to the group
+
+        Args:
+            threadFunc:     the function to be run as a thread
+            args:           args to pass to the thread function
+            kwargs:         keyword args to pass to the thread function
+
+        Returns:
+            AsyncResult object
+        """
+        with self.token.Activate():
+            res = self.pool._Submit(threadFunc, args, kwargs)
+        self.results.append(res)
+        return res
+
+    def Cancel(self, reason="Cancelled"):
+        """
+        Cancel all of the items in the group
+
+        Args:
+            reason:     why the group was cancelled (str)
+        """
+        self.token.Cancel(reason)
+
+    def Wait(self):
+        """
+        Wait for all of the items in the group to finish.
+        If the deadline passes or the waiting thread is cancelled, the group is cancelled and the error is raised.
+
+        Returns:
+            A list of the return values of the items, in the order they were posted
+
+        Raises:
+            The exception from the first item to fail, after the rest of the items have finished or stopped
+        """
+        first_error = None
+        try:
+            for res in AsCompleted(self.results, self.token.deadline):
+                try:
+                    res.Get()
+                # Items do not have to be wrapped with threadwrapper, so they can fail with any kind of exception
+                except Exception as e: #pylint: disable=broad-except
+                    if first_error is None:
+                        first_error = e
+                        if self.failFast:
+                            self.Cancel("Cancelled because another item in the group failed: {}".format(e))
+        except BaseException:
+            self.Cancel("Cancelled because the group stopped waiting")
+            raise
+
+        if first_error is not None:
+            raise first_error
+        return [res.Get() for res in self.results]
+
+class AdaptiveLimiter(object):
+    """
+    Limit how many operations run at once against one resource, adapting the limit with AIMD (additive increase, multiplicative
+    decrease).  The limit grows by one for each full limit's worth of operations that succeed, and is cut by the backoff factor
+    when an operation fails with a retryable error or takes much longer than usual for its kind of operation.
+    """
+
+    _limiters = {}
+    _limitersLock = _threading.Lock()
+
+    # How quickly the typical latency follows new samples, and how many samples are needed before it is trusted
+    LATENCY_WEIGHT = 0.2
+    LATENCY_MIN_SAMPLES = 5
+
+    def __init__(self, maxLimit, minLimit=1, backoff=0.5, spikeFactor=4, name=None):
+        """
+        Args:
+            maxLimit:       the most operations to ever allow at once (int)
+            minLimit:       the fewest operations to allow at once no matter how many failures there are (int)
+            backoff:        the factor to multiply the limit by when cutting it (float)
+            spikeFactor:    an operation this many times slower than the typical latency for its kind counts as overload (float)
+            name:           the name of the resource, for logging (str)
+        """
+        self.maxLimit = maxLimit
+        self.minLimit = minLimit
+        self.backoff = backoff
+        self.spikeFactor = spikeFactor
+        self.name = name
+        self.limit = float(maxLimit)
+        self.inflight = 0
+        self._latency = {}
+        self._lastCutTime = 0
+        self._cond = _threading.Condition()
+
+    @classmethod
+    def Get(cls, key):
+        """
+        Get the process-wide limiter for a resource, creating it the first time it is asked for.
+        The limit starts at and never goes over sfdefaults.concurrency, the size of the shared I/O pool.
+
+        Args:
+            key:    the resource to limit, for instance the (server, port) of an API endpoint
+
+        Returns:
+            AdaptiveLimiter
+        """
+        with cls._limitersLock:
+            if key not in cls._limiters:
+                cls._limiters[key] = cls(maxLimit=int(_sfdefaults.concurrency),
+                                         spikeFactor=float(_sfdefaults.api_latency_spike_factor),
+                                         name=str(key))
+            return cls._limiters[key]
+
+    @property
+    def Limit(self):
+        """The number of operations that are currently allowed to run at once"""
+        return max(self.minLimit, int(self.limit))
+
+    def Acquire(self):
+        """
+        Wait until there is room under the limit and take a slot.  The wait stops as soon as the calling thread is
+        cancelled or passes its deadline
+
+        Returns:
+            The time the slot was taken, to pass to Release (float)
+        """
+        token = CurrentToken()
+        with self._cond:
+            while self.inflight >= self.Limit:
+                token.Check()
+                # Wait with a timeout so that Ctrl-C can interrupt the wait in python 2, and so cancellation is noticed
+                self._cond.wait(token.Remaining(CancellationToken.POLL_INTERVAL))
+            self.inflight += 1
+        return _time.time()
+
+    def Release(self, startTime, kind=None, failed=False, overloaded=False):
+        """
+        Give back a slot and adjust the limit based on how the operation went
+
+        Args:
+            startTime:  the time returned from Acquire (float)
+            kind:       the kind of operation, so latency is only compared against similar operations (str)
+            failed:     the operation failed, so its latency means nothing (bool)
+            overloaded: the operation failed in a way that means the resource is overloaded (bool)
+        """
+        latency = _time.time() - startTime
+        with self._cond:
+            self.inflight -= 1
+            if not failed:
+                overloaded = self._RecordLatency(kind, latency)
+
+            if overloaded:
+                # Operations that started before the last cut were sent at the old limit, so they should not cut it again
+                if startTime >= self._lastCutTime:
+                    self.limit = max(float(self.minLimit), self.limit * self.backoff)
+                    self._lastCutTime = _time.time()
+                    GetLogger().debug("Reducing concurrency for {} to {}".format(self.name, self.Limit))
+            elif not failed:
+                self.limit = min(float(self.maxLimit), self.limit + 1.0 / self.limit)
+
+            self._cond.notify_all()
+
+    def _RecordLatency(self, kind, latency):
+        """
+        Add a latency sample for a kind of operation and check if it is a spike
+        """
+        typical, samples = self._latency.get(kind, (latency, 0))
+        spike = samples >= self.LATENCY_MIN_SAMPLES and latency > typical * self.spikeFactor
+        self._latency[kind] = (typical + self.LATENCY_WEIGHT * (latency - typical), samples + 1)
+        return spike
+
+    @_contextlib.contextmanager
+    def Slot(self, kind=None):
+        """
+        Context manager that holds a slot for the duration of an operation.
+        A retryable SolidFireError from the operation counts as overload, any other exception just releases the slot.
+
+        Args:
+            kind:   the kind of operation (str)
+        """
+        start_time = self.Acquire()
+        failed = True
+        overloaded = False
+        try:
+            yield
+            failed = False
+        except SolidFireError as ex:
+            overloaded = ex.IsRetryable()
+            raise
+        finally:
+            self.Release(start_time, kind, failed=failed, overloaded=overloaded)
+
+class TokenBucket(object):
+    """
+    Let operations through at a steady rate, allowing short bursts.
+    Tokens are handed out in order, so a caller that has to wait reserves its token and sleeps without holding up the others.
+    """
+
+    _buckets = {}
+    _bucketsLock = _threading.Lock()
+
+    def __init__(self, rate, burst, name=None):
+        """
+        Args:
+            rate:   how many operations to allow per second on average (float)
+            burst:  how many operations to allow at once after a quiet period (int)
+            name:   the name of the bucket, for reporting (str)
+        """
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.name = name
+        self.tokens = self.burst
+        self.waitTime = 0.0
+        self.waitCount = 0
+        self._lastFill = _clockutil.Time()
+        self._lock = _threading.Lock()
+
+    @classmethod
+    def Get(cls, key, rate, burst):
+        """
+        Get the process-wide bucket for a key, creating it the first time it is asked for
+
+        Args:
+            key:    the thing being rate limited, for instance (server, method class)
+            rate:   how many operations to allow per second, or 0 for no limit (float)
+            burst:  how many operations to allow at once after a quiet period (int)
+
+        Returns:
+            TokenBucket, or None if there is no limit
+        """
+        if float(rate) <= 0:
+            return None
+        with cls._bucketsLock:
+            if key not in cls._buckets:
+                cls._buckets[key] = cls(rate, burst, name=str(key))
+            return cls._buckets[key]
+
+    @classmethod
+    def WaitStats(cls):
+        """
+        Get how much the process-wide buckets have held operations back
+
+        Returns:
+            A dictionary of bucket name => (seconds waited, number of operations that waited)
+        """
+        with cls._bucketsLock:
+            return {bucket.name : (bucket.waitTime, bucket.waitCount) for bucket in cls._buckets.values() if bucket.waitCount > 0}
+
+    def Take(self):
+        """
+        Wait for a token
+
+        Returns:
+            How long the caller had to wait, in seconds (float)
+        """
+        with self._lock:
+            now = _clockutil.Time()
+            self.tokens = min(self.burst, self.tokens + (now - self._lastFill) * self.rate)
+            self._lastFill = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            if wait > 0:
+                self.waitTime += wait
+                self.waitCount += 1
+        if wait > 0:
+            Sleep(wait)
+        return wait
+
 def WaitForThreads(asyncResults):
     """
     Wait for a list of threads to finish and collect the results
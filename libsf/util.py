@@ -272,9 +272,9 @@ def BoolType(string, name=None):
         return string
 
     string = str(string).lower()
-    if string in ["f", "false"]:
+    if string in ["f", "false", "0"]:
         return False
-    elif string in ["t", "true"]:
+    elif string in ["t", "true", "1"]:
         return True
 
     if name:
@@ -2,7 +2,10 @@
 """Helpers for interacting with hypervisors and virtual machines"""
 
 from __future__ import absolute_import
+from . import clockutil
 from . import sfdefaults
+from . import threadutil
+from . import waitutil
 from . import SolidFireError, UnauthorizedError, SFTimeoutError, UnknownObjectError, ClientConnectionError, SFConnectionError
 from .logutil import GetLogger
 from .sfclient import SFClient, OSType
@@ -18,7 +21,6 @@ import six.moves.queue
 import requests
 import socket
 import sys
-import time
 from xml.etree import ElementTree
 import six
 
@@ -318,11 +320,14 @@ def VMwareWaitForTasks(connection, tasks):
         version, state = None, None
 
         # Loop looking for updates till the state moves to a completed state.
+        # Check again quickly after each update and back off while nothing is changing
+        intervals = waitutil.ExponentialInterval(initial=0.25, maximum=5).Intervals()
         while len(taskList):
             update = pc.CheckForUpdates(version)
             if not update:
-                time.sleep(1)
+                threadutil.Sleep(next(intervals))
                 continue
+            intervals = waitutil.ExponentialInterval(initial=0.25, maximum=5).Intervals()
             for filterSet in update.filterSet:
                 for objSet in filterSet.objectSet:
                     task = objSet.obj
@@ -507,7 +512,7 @@ class VirtualMachineVMware(VirtualMachine):
         """
         Wait for this VM to be powered on and the guest OS booted up
         """
-        start_time = time.time()
+        start_time = clockutil.Time()
         # Wait for VM to be powered on
         while True:
             vm = VMwareFindObjectGetProperties(self.vsphereConnection, self.vmName, vim.VirtualMachine, ["name", "runtime.powerState"])
@@ -515,9 +520,9 @@ class VirtualMachineVMware(VirtualMachine):
             if vm.runtime.powerState == vim.VirtualMachinePowerState.poweredOn:
                 self.log.info("VM is powered on")
                 break
-            if timeout > 0 and time.time() - start_time > timeout:
+            if timeout > 0 and clockutil.Time() - start_time > timeout:
                 raise SFTimeoutError("Timeout waiting for VM to power on")
-            time.sleep(2)
+            threadutil.Sleep(2)
 
         self.log.info("Waiting for VMware tools")
         # Wait for VMwware tools to be running
@@ -530,9 +535,9 @@ class VirtualMachineVMware(VirtualMachine):
             if vm.guest.toolsStatus == vim.VirtualMachineToolsStatus.toolsOk:
                 self.log.info("VMware tools are running")
                 break
-            if timeout > 0 and time.time() - start_time > timeout:
+            if timeout > 0 and clockutil.Time() - start_time > timeout:
                 raise SFTimeoutError("Timeout waiting for VMware tools to start")
-            time.sleep(2)
+            threadutil.Sleep(2)
 
         # Wait for VM heartbeat to be green
         while True:
@@ -541,9 +546,9 @@ class VirtualMachineVMware(VirtualMachine):
             if vm.guestHeartbeatStatus == vim.ManagedEntityStatus.green:
                 self.log.info("VM guest heartbeat is green")
                 break
-            if timeout > 0 and time.time() - start_time > timeout:
+            if timeout > 0 and clockutil.Time() - start_time > timeout:
                 raise SFTimeoutError("Timeout waiting for guest heartbeat")
-            time.sleep(2)
+            threadutil.Sleep(2)
 
     @_vsphere_session
     def Delete(self):
@@ -1389,7 +1394,7 @@ class VirtualMachineKVM(VirtualMachine):
         """
         Wait for this VM to be powered on and the guest OS booted up
         """
-        start_time = time.time()
+        start_time = clockutil.Time()
         with LibvirtConnection(self.hostServer, self.hostUsername, self.hostPassword) as conn:
             # Wait for VM to be powered on
             while True:
@@ -1398,16 +1403,16 @@ class VirtualMachineKVM(VirtualMachine):
                 if state[0] == libvirt.VIR_DOMAIN_RUNNING:
                     self.log.info("VM is powered on")
                     break
-                if timeout > 0 and time.time() - start_time > timeout:
+                if timeout > 0 and clockutil.Time() - start_time > timeout:
                     raise SFTimeoutError("Timeout waiting for VM to power on")
-                time.sleep(2)
+                threadutil.Sleep(2)
 
             # Wait for qemu agent
             self.log.info("Waiting for guest agent")
             while True:
-                if timeout > 0 and time.time() - start_time > timeout:
+                if timeout > 0 and clockutil.Time() - start_time > timeout:
                     raise SFTimeoutError("Timeout waiting for VM guest agent to start")
-                time.sleep(1)
+                threadutil.Sleep(1)
                 try:
                     libvirt_qemu.qemuAgentCommand(vm, '{"execute":"guest-ping"}', 10, 0)
                     self.log.info("VM guest agent is running")
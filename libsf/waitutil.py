@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+"""
+Helpers for waiting for a condition to become true
+"""
+
+import heapq
+import itertools
+import threading
+from . import clockutil
+from . import sfdefaults
+from . import threadutil
+from . import SFTimeoutError, SFCancelledError
+
+class FixedInterval(object):
+    """Poll at the same interval every time"""
+
+    def __init__(self, interval=1):
+        """
+        Args:
+            interval:   how long to wait between polls, in seconds (float)
+        """
+        self.interval = interval
+
+    def Intervals(self):
+        """
+        Get the time to wait before each successive poll
+
+        Returns:
+            An iterator of intervals in seconds (float)
+        """
+        return itertools.repeat(self.interval)
+
+class ExponentialInterval(object):
+    """Poll quickly at first and back off geometrically, so fast operations are noticed as soon as they finish and slow ones are not polled constantly"""
+
+    def __init__(self, initial=1, factor=2, maximum=30):
+        """
+        Args:
+            initial:    the first interval, in seconds (float)
+            factor:     how much to grow the interval after each poll (float)
+            maximum:    the longest interval, in seconds (float)
+        """
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+
+    def Intervals(self):
+        """
+        Get the time to wait before each successive poll
+
+        Returns:
+            An iterator of intervals in seconds (float)
+        """
+        interval = self.initial
+        while True:
+            yield min(interval, self.maximum)
+            interval *= self.factor
+
+class FibonacciInterval(object):
+    """Back off along the Fibonacci sequence, which grows more gently than doubling"""
+
+    def __init__(self, initial=1, maximum=30):
+        """
+        Args:
+            initial:    the first interval, in seconds (float)
+            maximum:    the longest interval, in seconds (float)
+        """
+        self.initial = initial
+        self.maximum = maximum
+
+    def Intervals(self):
+        """
+        Get the time to wait before each successive poll
+
+        Returns:
+            An iterator of intervals in seconds (float)
+        """
+        previous, current = 0, self.initial
+        while True:
+            yield min(current, self.maximum)
+            previous, current = current, previous + current
+
+class EstimateInterval(object):
+    """
+    Poll based on an estimate of how long the operation will take.  The interval shrinks as the estimated completion gets
+    closer, and once the estimate has passed it backs off exponentially from the minimum
+    """
+
+    def __init__(self, estimate, fraction=0.5, minimum=1, maximum=60):
+        """
+        Args:
+            estimate:   how long the operation is expected to take, in seconds (float)
+            fraction:   the fraction of the estimated time left to wait before each poll (float)
+            minimum:    the shortest interval, in seconds (float)
+            maximum:    the longest interval, in seconds (float)
+        """
+        self.estimate = estimate
+        self.fraction = fraction
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def Intervals(self):
+        """
+        Get the time to wait before each successive poll
+
+        Returns:
+            An iterator of intervals in seconds (float)
+        """
+        elapsed = 0
+        while elapsed < self.estimate:
+            interval = max(self.minimum, min(self.maximum, (self.estimate - elapsed) * self.fraction))
+            elapsed += interval
+            yield interval
+        for interval in ExponentialInterval(self.minimum, 2, self.maximum).Intervals():
+            yield interval
+
+class Waiter(object):
+    """Wait for a predicate to become true, polling it on a backoff schedule"""
+
+    def __init__(self, predicate, timeout=None, strategy=None, progress=None, description="condition"):
+        """
+        Args:
+            predicate:      function to poll, which returns a true value when the wait is over
+            timeout:        how long to wait before giving up, in seconds (float)
+            strategy:       how long to wait between polls, defaults to ExponentialInterval (FixedInterval, ExponentialInterval, FibonacciInterval, EstimateInterval)
+            progress:       function to call after each poll that is not yet true, as progress(attempt, elapsed)
+            description:    what is being waited for, for the timeout message (str)
+        """
+        self.predicate = predicate
+        self.progress = progress
+        self.description = description
+        self.startTime = clockutil.Time()
+        self.deadline = self.startTime + timeout if timeout is not None else None
+        self.attempts = 0
+        # Polls run with the token of the thread that started the wait, so cancelling that thread stops the wait
+        self.token = threadutil.CancellationToken(parent=threadutil.CurrentToken())
+        self._intervals = (strategy or ExponentialInterval()).Intervals()
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+
+    def _Finish(self, value=None, error=None):
+        self._value = value
+        self._error = error
+        self._done.set()
+
+    def _Poll(self):
+        """
+        Poll the predicate once
+
+        Returns:
+            How long to wait before polling again, in seconds, or None if the wait is over (float)
+        """
+        if self.token.IsCancelled():
+            self._Finish(error=SFCancelledError("Cancelled waiting for {}".format(self.description)))
+            return None
+        self.attempts += 1
+        try:
+            with self.token.Activate():
+                value = self.predicate()
+        except Exception as ex: #pylint: disable=broad-except
+            self._Finish(error=ex)
+            return None
+        if value:
+            self._Finish(value=value)
+            return None
+
+        now = clockutil.Time()
+        if self.progress:
+            # A failing callback ends this wait, not the shared scheduler thread polling it
+            try:
+                self.progress(self.attempts, now - self.startTime)
+            except Exception as ex: #pylint: disable=broad-except
+                self._Finish(error=ex)
+                return None
+        if self.deadline is not None and now >= self.deadline:
+            self._Finish(error=SFTimeoutError("Timeout waiting for {}".format(self.description)))
+            return None
+
+        interval = next(self._intervals) * sfdefaults.TIME_SECOND
+        # Always poll one last time right at the deadline
+        if self.deadline is not None:
+            interval = min(interval, self.deadline - now)
+        return interval
+
+    def Done(self):
+        """
+        Check if the wait is over
+
+        Returns:
+            Boolean true if the predicate became true or the wait failed, false otherwise
+        """
+        return self._done.is_set()
+
+    def Cancel(self, reason="Cancelled"):
+        """
+        Stop waiting
+
+        Args:
+            reason:     why the wait was cancelled (str)
+        """
+        self.token.Cancel(reason)
+
+    def Get(self):
+        """
+        Wait for the wait to be over
+
+        Returns:
+            The true value the predicate returned
+
+        Raises:
+            SFTimeoutError if the timeout expired, or the exception the predicate raised
+        """
+        token = threadutil.CurrentToken()
+        while not self._done.wait(threadutil.CancellationToken.POLL_INTERVAL):
+            token.Check()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+class PollScheduler(object):
+    """
+    Poll many waiters from a single background thread, each on its own schedule.
+    Predicates run one at a time on the scheduler thread, so they should be quick checks like a single API call.
+    """
+
+    _shared = None
+    _sharedLock = threading.Lock()
+
+    def __init__(self):
+        self._heap = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._sequence = itertools.count()
+        self._thread = None
+
+    @classmethod
+    def Shared(cls):
+        """
+        Get the scheduler shared by the whole process
+
+        Returns:
+            PollScheduler
+        """
+        with cls._sharedLock:
+            if cls._shared is None:
+                cls._shared = PollScheduler()
+            return cls._shared
+
+    def Schedule(self, predicate, timeout=None, strategy=None, progress=None, description="condition"):
+        """
+        Start polling a predicate in the background.  The arguments are the same as WaitUntil
+
+        Returns:
+            Waiter object to get the result from
+        """
+        waiter = Waiter(predicate, timeout, strategy, progress, description)
+        self._Push(waiter, clockutil.Time())
+        return waiter
+
+    def _Push(self, waiter, dueTime):
+        """
+        Queue a waiter to be polled at a time, starting the scheduler thread if needed
+        """
+        with self._lock:
+            heapq.heappush(self._heap, (dueTime, next(self._sequence), waiter))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._Run, name="PollScheduler")
+                self._thread.daemon = True
+                self._thread.start()
+        self._wakeup.set()
+
+    def _Run(self):
+        """
+        Poll each waiter as it comes due, for the life of the process
+        """
+        while True:
+            # Clear before looking at the queue so a waiter pushed while this thread is deciding how long to wait wakes it
+            self._wakeup.clear()
+            waiter = None
+            with self._lock:
+                delay = self._heap[0][0] - clockutil.Time() if self._heap else None
+                if delay is not None and (delay <= 0 or self._heap[0][2].token.IsCancelled()):
+                    _, _, waiter = heapq.heappop(self._heap)
+
+            if waiter:
+                interval = waiter._Poll()
+                if interval is not None:
+                    self._Push(waiter, clockutil.Time() + interval)
+            elif delay is None:
+                self._wakeup.wait()
+            else:
+                clockutil.GetClock().Wait(self._wakeup, min(delay, threadutil.CancellationToken.POLL_INTERVAL))
+
+def WaitUntil(predicate, timeout=None, strategy=None, progress=None, description="condition"):
+    """
+    Wait for a predicate to become true, polling it on a backoff schedule in the calling thread
+
+    Args:
+        predicate:      function to poll, which returns a true value when the wait is over
+        timeout:        how long to wait before giving up, in seconds (float)
+        strategy:       how long to wait between polls, defaults to ExponentialInterval (FixedInterval, ExponentialInterval, FibonacciInterval, EstimateInterval)
+        progress:       function to call after each poll that is not yet true, as progress(attempt, elapsed)
+        description:    what is being waited for, for the timeout message (str)
+
+    Returns:
+        The true value the predicate returned
+
+    Raises:
+        SFTimeoutError if the timeout expires
+    """
+    waiter = Waiter(predicate, timeout, strategy, progress, description)
+    while True:
+        interval = waiter._Poll()
+        if interval is None:
+            return waiter.Get()
+        threadutil.Sleep(interval)
+
+def WaitUntilAsync(predicate, timeout=None, strategy=None, progress=None, description="condition"):
+    """
+    Start waiting for a predicate to become true on the shared polling thread, so that many waits do not each need
+    a thread of their own.  The arguments are the same as WaitUntil
+
+    Returns:
+        Waiter object; call Get to wait for the result
+    """
+    return PollScheduler.Shared().Schedule(predicate, timeout, strategy, progress, description)
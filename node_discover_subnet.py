@@ -8,6 +8,7 @@ from libsf.apputil import PythonApp
 from libsf.argutil import SFArgumentParser, GetFirstLine, SFArgFormatter
 from libsf.logutil import GetLogger, logargs, SetThreadLogPrefix
 from libsf.util import ValidateAndDefault, IPv4SubnetType
+from libsf import sfdefaults
 from libsf import threadutil
 from libsf.netutil import IPSubnet
 from libsf import SolidFireNodeAPI
@@ -31,24 +32,29 @@ def NodeDiscoverSubnet(subnet):
     all_ips = IPSubnet(subnet).AllHosts()
     log.info("Searching {} IPs for nodes...".format(len(all_ips)))
 
-    pool = threadutil.ThreadPool(64)
-    results = []
-    for idx, node_ip in enumerate(all_ips):
-        results.append(pool.Post(_NodeThread, node_ip))
-
-    found = 0
-    for idx, node_ip in enumerate(all_ips):
-        try:
-            node_info = results[idx].Get()
-            if node_info:
-                log.info("  {:15}  version {:11}  {}{}{}".format(node_ip,
-                                                               node_info["version"],
-                                                               node_info["state"],
-                                                               " cluster " if node_info["state"] != "Available" else "",
-                                                               node_info["cluster"] if node_info["state"] != "Available" else ""))
-                found += 1
-        except SolidFireError as ex:
-            log.error("{}: {}".format(node_ip, str(ex)))
+    # Most addresses in a subnet do not answer and each probe just waits out its timeout, so use a pool of our own
+    # that is much wider than the shared I/O pool
+    pool = threadutil.ThreadPool(maxThreads=sfdefaults.discover_parallel_max, useMultiprocessing=False)
+    try:
+        results = []
+        for idx, node_ip in enumerate(all_ips):
+            results.append(pool.Post(_NodeThread, node_ip))
+
+        found = 0
+        for idx, node_ip in enumerate(all_ips):
+            try:
+                node_info = results[idx].Get()
+                if node_info:
+                    log.info("  {:15}  version {:11}  {}{}{}".format(node_ip,
+                                                                   node_info["version"],
+                                                                   node_info["state"],
+                                                                   " cluster " if node_info["state"] != "Available" else "",
+                                                                   node_info["cluster"] if node_info["state"] != "Available" else ""))
+                    found += 1
+            except SolidFireError as ex:
+                log.error("{}: {}".format(node_ip, str(ex)))
+    finally:
+        pool.Shutdown()
 
     log.info("Found {} nodes".format(found))
     return True
@@ -11,12 +11,11 @@ from libsf.sfnode import SFNode
 from libsf.util import ValidateAndDefault, IPv4AddressType, OptionalValueType, ItemList, SelectionType, StrType, BoolType
 from libsf.util import GetFilename, SolidFireVersion, ParseTimestamp, PrettyJSON, EnsureKeys
 from libsf.netutil import CalculateNetwork, IPInNetwork
-from libsf import sfdefaults, threadutil, pxeutil, labutil, netutil
+from libsf import sfdefaults, threadutil, pxeutil, labutil, netutil, clockutil
 from libsf import SolidFireError, SFConnectionError, InvalidArgumentError, SFTimeoutError, HTTPDownloader
 import json
 import random
 import re
-import time
 
 KNOWN_STATE_TIMEOUTS = {
     "DEFAULT" : 180,
@@ -508,16 +507,16 @@ def _monitor_legacy(node, timeout=3600):
     Monitor old releases RTFI status and return when RTFI is complete
     """
     log = GetLogger()
-    start_time = time.time()
+    start_time = clockutil.Time()
     log.info("Waiting for node to power off")
     while True:
-        time.sleep(20)
+        threadutil.Sleep(sfdefaults.TIME_SECOND * 20)
         if node.GetPowerState() == "off":
             node.PowerOn(waitForUp=False)
             break
 
         # Timeout if the total time has been too long
-        if time.time() - start_time > timeout * sfdefaults.TIME_SECOND:
+        if clockutil.Time() - start_time > timeout * sfdefaults.TIME_SECOND:
             raise SFTimeoutError("Timeout waiting for RTFI to complete")
 
 def _monitor_v80(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_timeout, timeout=3600, agentID=None, configureNetworking="keep"):
@@ -529,11 +528,11 @@ def _monitor_v80(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_time
     removed_pxe = False
     status = None
     previous_status = []
-    last_api_check = time.time()
-    last_power_check = time.time()
+    last_api_check = clockutil.Time()
+    last_power_check = clockutil.Time()
     state_timeout = KNOWN_STATE_TIMEOUTS["DEFAULT"]
     state_start_time = 0
-    start_time = time.time()
+    start_time = clockutil.Time()
     log.debug("Waiting for status server timeout={}".format(startTimeout))
     while True:
         try:
@@ -544,12 +543,12 @@ def _monitor_v80(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_time
             status = None
 
         # Timeout if we haven't gotten any status within the startTimeout period
-        if not previous_status and time.time() - start_time > startTimeout * sfdefaults.TIME_SECOND:
+        if not previous_status and clockutil.Time() - start_time > startTimeout * sfdefaults.TIME_SECOND:
             raise SFTimeoutError("Timeout waiting for RTFI to start")
 
         # If we never got any status, never caught the node powering off, and the node is back up, it probably never PXE booted
-        if rtfiType == "pxe" and not previous_status and time.time() - last_api_check > 20 * sfdefaults.TIME_SECOND:
-            last_api_check = time.time()
+        if rtfiType == "pxe" and not previous_status and clockutil.Time() - last_api_check > 20 * sfdefaults.TIME_SECOND:
+            last_api_check = clockutil.Time()
             log.debug("Checking if node skipped RTFI and came back up")
             if node.IsUp():
                 log.debug("API is back up but never got any RTFI status")
@@ -568,12 +567,12 @@ def _monitor_v80(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_time
 
             # Log some info about how long state transitions take
             if previous_status:
-                log.debug("PreviousState={} duration={} timeout={}".format(previous_status[-1]["state"], time.time() - state_start_time, state_timeout))
+                log.debug("PreviousState={} duration={} timeout={}".format(previous_status[-1]["state"], clockutil.Time() - state_start_time, state_timeout))
             else:
-                log.debug("FirstState duration={}".format(time.time() - start_time))
+                log.debug("FirstState duration={}".format(clockutil.Time() - start_time))
 
             previous_status = status
-            state_start_time = time.time()
+            state_start_time = clockutil.Time()
             state_timeout = KNOWN_STATE_TIMEOUTS.get(previous_status[-1]["state"], None) or KNOWN_STATE_TIMEOUTS["DEFAULT"]
             log.debug("CurrentState={} timeout={}".format(previous_status[-1]["state"], state_timeout))
             log.debug("Waiting for a new status")
@@ -601,19 +600,19 @@ def _monitor_v80(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_time
 
         # If we know RTFI was able to start and the node has now powered down, assume that RTFI finished successfully
         # This is in case we missed the final state, or the final state is unknown to this script
-        if previous_status and time.time() - last_power_check > 20:
-            last_power_check = time.time()
+        if previous_status and clockutil.Time() - last_power_check > 20:
+            last_power_check = clockutil.Time()
             log.debug("Checking if node finished RTFI and powered off")
             if node.GetPowerState() == "off":
                 _handle_coldboot(node, netInfo, configureNetworking)
                 break
 
         # Timeout if the current state has lasted too long
-        if state_start_time > 0 and time.time() - state_start_time > state_timeout:
+        if state_start_time > 0 and clockutil.Time() - state_start_time > state_timeout:
             raise SFTimeoutError("Timeout in {} RTFI state".format(previous_status[-1]["state"]))
 
         # Timeout if the total time has been too long
-        if time.time() - start_time > timeout * sfdefaults.TIME_SECOND:
+        if clockutil.Time() - start_time > timeout * sfdefaults.TIME_SECOND:
             raise SFTimeoutError("Timeout waiting for RTFI to complete")
 
 def _monitor_v90(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_timeout, timeout=3600, agentID=None, configureNetworking="keep"):
@@ -627,13 +626,13 @@ def _monitor_v90(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_time
     removed_pxe = False
     status = None
     previous_status = []
-    last_api_check = time.time()
+    last_api_check = clockutil.Time()
     state_timeout = KNOWN_STATE_TIMEOUTS["DEFAULT"]
     state_start_time = 0
-    start_time = time.time()
+    start_time = clockutil.Time()
     log.debug("Waiting for status server timeout={}".format(startTimeout))
     while True:
-        time.sleep(1)
+        threadutil.Sleep(sfdefaults.TIME_SECOND)
         try:
             status = node.GetAllRTFIStatus()
         except SFConnectionError as ex:
@@ -642,12 +641,12 @@ def _monitor_v90(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_time
             status = None
 
         # Timeout if we haven't gotten any status within the startTimeout period
-        if not previous_status and time.time() - start_time > startTimeout * sfdefaults.TIME_SECOND:
+        if not previous_status and clockutil.Time() - start_time > startTimeout * sfdefaults.TIME_SECOND:
             raise SFTimeoutError("Timeout waiting for RTFI to start")
 
         # If we never got any status, never caught the node powering off, and the node is back up, it probably never PXE booted
-        if rtfiType == "pxe" and not previous_status and time.time() - last_api_check > 20 * sfdefaults.TIME_SECOND:
-            last_api_check = time.time()
+        if rtfiType == "pxe" and not previous_status and clockutil.Time() - last_api_check > 20 * sfdefaults.TIME_SECOND:
+            last_api_check = clockutil.Time()
             log.debug("Checking if node skipped RTFI and came back up")
             if node.IsUp():
                 log.debug("API is back up but never got any RTFI status")
@@ -666,10 +665,10 @@ def _monitor_v90(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_time
 
             # Log some info about how long state transitions take
             if previous_status:
-                duration = time.time() - state_start_time
+                duration = clockutil.Time() - state_start_time
                 log.debug("PreviousState={} duration={} timeout={}".format(previous_status[-1]["state"], duration, state_timeout))
             else:
-                duration = time.time() - start_time
+                duration = clockutil.Time() - start_time
                 log.debug("FirstState duration={}".format(duration))
 
             # Record how long the firmware state lasted so we can guess if RTFI actually flashed the firmware
@@ -677,7 +676,7 @@ def _monitor_v90(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_time
                 firmware_duration = duration
 
             previous_status = status
-            state_start_time = time.time()
+            state_start_time = clockutil.Time()
             state_timeout = KNOWN_STATE_TIMEOUTS.get(previous_status[-1]["state"], None) or KNOWN_STATE_TIMEOUTS["DEFAULT"]
             log.debug("CurrentState={} timeout={}".format(previous_status[-1]["state"], state_timeout))
             log.debug("Waiting for a new status")
@@ -704,11 +703,11 @@ def _monitor_v90(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_time
             raise SolidFireError("RTFI failed")
 
         # Timeout if the current state has lasted too long
-        if state_start_time > 0 and time.time() - state_start_time > state_timeout:
+        if state_start_time > 0 and clockutil.Time() - state_start_time > state_timeout:
             raise SFTimeoutError("Timeout in {} RTFI state".format(previous_status[-1]["state"]))
 
         # Timeout if the total time has been too long
-        if time.time() - start_time > timeout * sfdefaults.TIME_SECOND:
+        if clockutil.Time() - start_time > timeout * sfdefaults.TIME_SECOND:
             raise SFTimeoutError("Timeout waiting for RTFI to complete")
 
 def _monitor_v102(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_timeout, timeout=3600, agentID=None, configureNetworking="keep"):
@@ -727,13 +726,13 @@ def _monitor_v102(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_tim
     removed_pxe = False
     status = None
     previous_status = []
-    last_api_check = time.time()
+    last_api_check = clockutil.Time()
     state_timeout = KNOWN_STATE_TIMEOUTS["DEFAULT"]
     state_start_time = 0
-    start_time = time.time()
+    start_time = clockutil.Time()
     log.debug("Waiting for status server timeout={}".format(startTimeout))
     while True:
-        time.sleep(1)
+        threadutil.Sleep(sfdefaults.TIME_SECOND)
 
         # Try to determine the correct endpoint to use for RTFI status
         if not previous_status:
@@ -756,12 +755,12 @@ def _monitor_v102(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_tim
             status = None
 
         # Timeout if we haven't gotten any status within the startTimeout period
-        if not previous_status and time.time() - start_time > startTimeout * sfdefaults.TIME_SECOND:
+        if not previous_status and clockutil.Time() - start_time > startTimeout * sfdefaults.TIME_SECOND:
             raise SFTimeoutError("Timeout waiting for RTFI to start")
 
         # If we never got any status, never caught the node powering off, and the node is back up, it probably never PXE booted
-        if rtfiType == "pxe" and not previous_status and time.time() - last_api_check > 20 * sfdefaults.TIME_SECOND:
-            last_api_check = time.time()
+        if rtfiType == "pxe" and not previous_status and clockutil.Time() - last_api_check > 20 * sfdefaults.TIME_SECOND:
+            last_api_check = clockutil.Time()
             log.debug("Checking if node skipped RTFI and came back up")
             if node.IsUp():
                 log.debug("API is back up but never got any RTFI status")
@@ -780,10 +779,10 @@ def _monitor_v102(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_tim
 
             # Log some info about how long state transitions take
             if previous_status:
-                duration = time.time() - state_start_time
+                duration = clockutil.Time() - state_start_time
                 log.debug("PreviousState={} duration={} timeout={}".format(previous_status[-1]["state"], duration, state_timeout))
             else:
-                duration = time.time() - start_time
+                duration = clockutil.Time() - start_time
                 log.debug("FirstState duration={}".format(duration))
 
             # Record how long the firmware state lasted so we can guess if RTFI actually flashed the firmware
@@ -791,7 +790,7 @@ def _monitor_v102(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_tim
                 firmware_duration = duration
 
             previous_status = status
-            state_start_time = time.time()
+            state_start_time = clockutil.Time()
             state_timeout = KNOWN_STATE_TIMEOUTS.get(previous_status[-1]["state"], None) or KNOWN_STATE_TIMEOUTS["DEFAULT"]
             log.debug("CurrentState={} timeout={}".format(previous_status[-1]["state"], state_timeout))
             log.debug("Waiting for a new status")
@@ -822,11 +821,11 @@ def _monitor_v102(rtfiType, node, netInfo, startTimeout=sfdefaults.node_boot_tim
             raise SolidFireError("RTFI failed")
 
         # Timeout if the current state has lasted too long
-        if state_start_time > 0 and time.time() - state_start_time > state_timeout:
+        if state_start_time > 0 and clockutil.Time() - state_start_time > state_timeout:
             raise SFTimeoutError("Timeout in {} RTFI state".format(previous_status[-1]["state"]))
 
         # Timeout if the total time has been too long
-        if time.time() - start_time > timeout * sfdefaults.TIME_SECOND:
+        if clockutil.Time() - start_time > timeout * sfdefaults.TIME_SECOND:
             raise SFTimeoutError("Timeout waiting for RTFI to complete")
 
 
@@ -8,9 +8,9 @@ from libsf.apputil import PythonApp
 from libsf.argutil import SFArgumentParser, GetFirstLine, SFArgFormatter
 from libsf.logutil import GetLogger, logargs
 from libsf.sfcluster import SFCluster
+from libsf.sfreplication import ReplicationEngine
 from libsf.util import ValidateAndDefault, IPv4AddressType, BoolType, OptionalValueType, ItemList, SolidFireIDType, PositiveIntegerType, StrType
 from libsf import sfdefaults
-from libsf import threadutil
 from libsf import SolidFireError, UnknownObjectError
 import six
 
@@ -82,21 +82,15 @@ def RemoteRepPauseVolume(volume_names,
         return True
 
     log.info("Modifying volumes...")
-    pool = threadutil.GlobalPool()
-    results = []
     for volume in replicating_volumes:
         log.info("  Pausing volume {}".format(volume["name"]))
-        results.append(pool.Post(_APICallThread, mvip, username, password, volume["volumeID"]))
+    errors = ReplicationEngine.Get(mvip, username, password).PauseVolumes([vol["volumeID"] for vol in replicating_volumes])
 
     allgood = True
-    for idx, volume in enumerate(replicating_volumes):
-        try:
-            
-            results[idx].Get()
-        except SolidFireError as e:
-            log.error("  Error pausing volume {}: {}".format(volume["name"], e))
+    for volume in replicating_volumes:
+        if errors[volume["volumeID"]]:
+            log.error("  Error pausing volume {}: {}".format(volume["name"], errors[volume["volumeID"]]))
             allgood = False
-            continue
 
     if allgood:
         log.passed("Successfully paused all volumes")
@@ -106,12 +100,6 @@ def RemoteRepPauseVolume(volume_names,
         return False
 
 
-@threadutil.threadwrapper
-def _APICallThread(mvip, username, password, volume_id):
-    """Modify a volume pair, run as a thread"""
-    SFCluster(mvip, username, password).ModifyVolumePair(volume_id, {"pausedManual" : True})
-
-
 if __name__ == '__main__':
     parser = SFArgumentParser(description=GetFirstLine(__doc__), formatter_class=SFArgFormatter)
     parser.add_cluster_mvip_args()
@@ -8,9 +8,9 @@ from libsf.apputil import PythonApp
 from libsf.argutil import SFArgumentParser, GetFirstLine, SFArgFormatter
 from libsf.logutil import GetLogger, logargs
 from libsf.sfcluster import SFCluster
+from libsf.sfreplication import ReplicationEngine
 from libsf.util import ValidateAndDefault, StrType, IPv4AddressType, BoolType, OptionalValueType, SolidFireIDType, ItemList, PositiveIntegerType
 from libsf import sfdefaults
-from libsf import threadutil
 from libsf import SolidFireError, UnknownObjectError
 import six
 
@@ -82,21 +82,15 @@ def RemoteRepResumeVolume(volume_names,
         return True
 
     log.info("Modifying volumes...")
-    pool = threadutil.GlobalPool()
-    results = []
     for volume in replicating_volumes:
         log.info("  Resuming volume {}".format(volume["name"]))
-        results.append(pool.Post(_APICallThread, mvip, username, password, volume["volumeID"]))
+    errors = ReplicationEngine.Get(mvip, username, password).ResumeVolumes([vol["volumeID"] for vol in replicating_volumes])
 
     allgood = True
-    for idx, volume in enumerate(replicating_volumes):
-        try:
-            
-            results[idx].Get()
-        except SolidFireError as e:
-            log.error("  Error resuming volume {}: {}".format(volume["name"], e))
+    for volume in replicating_volumes:
+        if errors[volume["volumeID"]]:
+            log.error("  Error resuming volume {}: {}".format(volume["name"], errors[volume["volumeID"]]))
             allgood = False
-            continue
 
     if allgood:
         log.passed("Successfully resumed all volumes")
@@ -105,12 +99,6 @@ def RemoteRepResumeVolume(volume_names,
         log.error("Could not resume all volumes")
         return False
 
-@threadutil.threadwrapper
-def _APICallThread(mvip, username, password, volume_id):
-    """Modify a volume pair, run as a thread"""
-    SFCluster(mvip, username, password).ModifyVolumePair(volume_id, {"pausedManual" : False})
-
-
 if __name__ == '__main__':
     parser = SFArgumentParser(description=GetFirstLine(__doc__), formatter_class=SFArgFormatter)
     parser.add_cluster_mvip_args()
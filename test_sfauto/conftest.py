@@ -8,17 +8,21 @@ import multiprocessing
 import os
 import paramiko
 import pytest
+import shutil
+import tempfile
 import time
 import six.moves.urllib.request
 
-from libsf import sfdefaults, shellutil, logutil
+from libsf import sfdefaults, shellutil, logutil, clockutil
 from .fake_client import FakeClientRegister, FakeShellCommand, FakeParamikoSSHClient
 from .fake_cluster import FakeCluster, fake_urlopen
 from . import globalconfig
 
 # Add a command line option to specify the random seed to be used, so random tests can be repeated
+# Add a command line option to run the micro-benchmarks, which are skipped by default
 def pytest_addoption(parser):
     parser.addoption("--seed", action="store", help="use the given seed instead of generating a new one")
+    parser.addoption("--benchmark", action="store_true", help="run the tests marked as benchmarks and report their times")
 
 # Configure all of the basics that all tests will need
 def pytest_configure(config):
@@ -28,6 +32,9 @@ def pytest_configure(config):
     sfdefaults.TIME_SECOND = 0
     sfdefaults.TIME_HOUR = 1
 
+    # Keep the journals from bulk operations out of the system temp dir
+    sfdefaults.journal_dir = tempfile.mkdtemp(prefix="sfauto-journals-")
+
     # Turn up logging level
     logutil.GetLogger().ShowDebug(10)
     logutil.GetLogger().TruncateMessages(False)
@@ -54,6 +61,8 @@ def pytest_configure(config):
 
 # Teardown run after all tests are completed
 def pytest_unconfigure(config):
+    shutil.rmtree(sfdefaults.journal_dir, ignore_errors=True)
+
     # Only keep the last 10 config files
     config_files = sorted([f for f in glob.glob("test/cluster-*") if os.path.isfile(f)], key=lambda x: os.path.getmtime(x))
     if len(config_files) > 10:
@@ -108,6 +117,19 @@ def fake_cluster_connected_clients(request):
 # ===============================================================================================
 
 
+# ===============================================================================================
+# This fixture runs the test against simulated time, where waits return right away but the clock moves forward as if they
+# had waited for real, so tests can run through the real delays of long workflows
+@pytest.fixture(scope="function")
+def virtual_clock(monkeypatch):
+    monkeypatch.setattr(sfdefaults, "TIME_SECOND", 1)
+    monkeypatch.setattr(sfdefaults, "TIME_MINUTE", 60)
+    monkeypatch.setattr(sfdefaults, "TIME_HOUR", 3600)
+    with clockutil.UseClock(clockutil.VirtualClock()) as clock:
+        yield clock
+# ===============================================================================================
+
+
 # ===============================================================================================
 # Add a timer to each test
 def timer_stop():
@@ -140,6 +162,8 @@ def pytest_runtest_makereport(item, call):
             parent._previousfailed = item
 
 def pytest_runtest_setup(item):
+    if "benchmark" in item.keywords and not item.config.getoption("--benchmark"):
+        pytest.skip("benchmarks only run with --benchmark")
     if "incremental" in item.keywords:
         previousfailed = getattr(item.parent, "_previousfailed", None)
         if previousfailed is not None:
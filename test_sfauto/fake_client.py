@@ -8,6 +8,7 @@ from libsf import shellutil, netutil
 from libsf import ClientError, ClientRefusedError, SolidFireError
 from libsf.logutil import GetLogger
 import copy
+import json
 import random
 import re
 import string
@@ -64,14 +65,25 @@ class FakeParamikoTransport(object):
     def is_active(self):
         return True
 
+    def set_keepalive(self, interval):
+        pass
+
 class FakeParamikoChannel(object):
 
     def __init__(self, returnCode):
         self.returnCode = returnCode
+        self.status_event = threading.Event()
+        self.status_event.set()
+
+    def exit_status_ready(self):
+        return self.status_event.is_set()
 
     def recv_exit_status(self):
         return self.returnCode
 
+    def close(self):
+        pass
+
 class FakeParamikoStream(object):
 
     def __init__(self, data):
@@ -117,7 +129,7 @@ class FakeParamikoSSHClient(object):
     def open_sftp(self):
         return FakeParamikoSFTP()
 
-    def exec_command(self, command):
+    def exec_command(self, command, **kwargs):
 
         client = globalconfig.clients.GetClient(self.ip)
         retcode, stdout_data, stderr_data = client.ExecuteCommand(command)
@@ -337,13 +349,16 @@ class FakeClient(object):
                 (0, " * Starting iSCSI initiator service iscsid\n   ...done.\n * Setting up iSCSI targets\n   ...done.\n * Mounting network filesystems\n   ...done.", ""),
             "systemctl start iscsid":
                 (0, " * Starting iSCSI initiator service iscsid\n   ...done.\n * Setting up iSCSI targets\n   ...done.\n * Mounting network filesystems\n   ...done.", ""),
-            "iscsiadm -m node -o update -n node.startup -v automatic -T":
+            "iscsiadm -m node -o update -n node.startup -v automatic":
                 (0, "", ""),
             "iscsiadm -m discovery -t sendtargets -p": self.iscsiadm_discovery,
             "iscsiadm -m node -l -T ": self.iscsiadm_login_target,
             "iscsiadm -m node -P 1 | grep 'Target:'": self.iscsiadm_list_targets,
             "iscsiadm -m session -P3 | egrep 'Target:|scsi disk' | wc -l": self.get_session_count,
             "iscsiadm -m node -L all" : self.iscsiadm_login_all,
+            "# sfauto health probe":
+                (0, json.dumps({"mac" : "0050569a0b1c", "uptime" : "86400.12", "load" : "0.42", "mem" : "23.5", "cpuidle" : "97.8",
+                                "vdbench" : "1", "vdbenchd" : "0", "vdbenchexit" : "", "iscsid" : "1", "disk" : "41", "ioerrors" : "0"}) + "\n", ""),
             "mkdir -p /mnt/" :
                 (0, "", ""),
             "parted":
@@ -510,18 +525,17 @@ class FakeClient(object):
                     "")
 
     def iscsiadm_login_target(self, command):
-        m = re.search(r"iscsiadm -m node -l -T (\S+)", command)
-        if m:
-            target_iqn = m.group(1)
-            for iqn in six.itervalues(self.volumes):
-                if iqn == target_iqn:
-                    return (0, "", "")
-
+        # iscsiadm -m node -l -T iqn, or several of them at once like iscsiadm -m node -l -T iqn1 & iscsiadm -m node -l -T iqn2 & wait
+        login_details = []
+        for target_iqn in re.findall(r"iscsiadm -m node -l -T (\S+)", command):
+            if target_iqn in six.itervalues(self.volumes):
+                continue
             self.volumes[self.GetNextDiskName()] = target_iqn
-            globalconfig.clients.UpdateClient(self.ip, self)
-            return (0,
-                    "Logging in to [iface: default, target: {}, portal: 10.26.64.70,3260] (multiple)\nLogin to [iface: default, target: {}, portal: 10.26.64.70,3260] successful.".format(target_iqn, target_iqn),
-                    "")
+            login_details.append("Logging in to [iface: default, target: {}, portal: 10.26.64.70,3260] (multiple)\nLogin to [iface: default, target: {}, portal: 10.26.64.70,3260] successful.".format(target_iqn, target_iqn))
+        globalconfig.clients.UpdateClient(self.ip, self)
+        return (0,
+                "\n".join(login_details),
+                "")
 
     def get_session_count(self, command):
         # iscsiadm -m session -P3 | egrep 'Target:|scsi disk' | wc -l
@@ -6,6 +6,7 @@ Fake cluster API
 #pylint: disable=missing-docstring,protected-access, unused-argument, not-context-manager, attribute-defined-outside-init
 
 import base64
+import collections
 import copy
 import datetime
 import json
@@ -15,7 +16,6 @@ import random
 import socket
 import string
 import threading
-import time
 from six.moves.urllib.parse import urlparse
 import uuid
 
@@ -23,6 +23,7 @@ from . import globalconfig
 from .testutil import RandomIP, RandomString, RandomSequence
 from libsf import SolidFireAPIError as SolidFireApiError # compat with sfinstall version
 from libsf import SolidFireError
+from libsf import clockutil
 from libsf.logutil import GetLogger
 from libsf.util import TimestampToStr, UTCTimezone
 from io import open
@@ -589,6 +590,10 @@ class FakeCluster(object):
         self.data = {}
         self.data[NEXTID_PATH] = 10000
         self.dataLock = threading.RLock()
+        self.lastEventID = 0
+        # How long async jobs take to finish, in seconds of clockutil time
+        self.asyncJobDuration = 0
+        self.callCounts = collections.Counter()
 
     def LoadConfig(self, config):
         """Load a cluster configuration"""
@@ -1030,7 +1035,7 @@ class FakeCluster(object):
         with self.dataLock:
             self.data[VERSION_INFO_PATH]["packageName"] = package_name
             self.data[VERSION_INFO_PATH]["pendingVersion"] = version
-            self.data[VERSION_INFO_PATH]["startTime"] = TimestampToStr(time.time() - 60, formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone())
+            self.data[VERSION_INFO_PATH]["startTime"] = TimestampToStr(clockutil.Time() - 60, formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone())
 
             # Stage all of the nodes
             for node_id in self.data[ACTIVE_NODES_PATH].keys():
@@ -1051,7 +1056,7 @@ class FakeCluster(object):
             self.data[VERSION_INFO_PATH]["nodeID"] = 0
             self.data[VERSION_INFO_PATH]["packageName"] = package_name
             self.data[VERSION_INFO_PATH]["pendingVersion"] = version
-            self.data[VERSION_INFO_PATH]["startTime"] = TimestampToStr(time.time() - 60, formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone())
+            self.data[VERSION_INFO_PATH]["startTime"] = TimestampToStr(clockutil.Time() - 60, formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone())
 
             # Stage some of the nodes
             for node_id in random.sample(list(self.data[ACTIVE_NODES_PATH].keys()), random.randint(1, len(list(self.data[ACTIVE_NODES_PATH].keys()))/2)):
@@ -1064,7 +1069,7 @@ class FakeCluster(object):
             self.data[VERSION_INFO_PATH]["nodeID"] = 0
             self.data[VERSION_INFO_PATH]["packageName"] = package_name
             self.data[VERSION_INFO_PATH]["pendingVersion"] = version
-            self.data[VERSION_INFO_PATH]["startTime"] = TimestampToStr(time.time() - 60, formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone())
+            self.data[VERSION_INFO_PATH]["startTime"] = TimestampToStr(clockutil.Time() - 60, formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone())
 
             # Stage all of the nodes
             for node_id in self.data[ACTIVE_NODES_PATH].keys():
@@ -1136,7 +1141,7 @@ class FakeCluster(object):
             "accountID": accountID,
             "attributes": { },
             "blockSize": 4096,
-            "createTime": TimestampToStr(time.time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
+            "createTime": TimestampToStr(clockutil.Time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
             "deleteTime": "",
             "enable512e": enable512e,
             "iqn": "iqn.2010-01.com.solidfire:{}.{}.{}".format(clusterID, volumeName, volumeID),
@@ -1283,6 +1288,9 @@ class FakeCluster(object):
             elif SolidFireVersion(self.data[CLUSTER_VERSION_PATH]).apiVersion < apiVersion:
                 raise SolidFireApiError(methodName, methodParams, ip, endpoint, 'xUnknownAPIVersion', 500, 'HTTP Error 404: Not Found - url=[{}]'.format(endpoint))
 
+        with self.dataLock:
+            self.callCounts[methodName] += 1
+
         apiResponse = {}
         func = getattr(self, methodName, None)
         if func and callable(func):
@@ -1290,6 +1298,11 @@ class FakeCluster(object):
         else:
             raise NotImplementedError("'{}' call has not been faked".format(methodName))
 
+        # Anything that is not a read adds an event to the cluster event log
+        if not methodName.startswith("List") and not methodName.startswith("Get"):
+            with self.dataLock:
+                self.lastEventID += 1
+
         apiResponse = apiResponse or {}
         return apiResponse
 
@@ -1321,8 +1334,14 @@ class FakeCluster(object):
 
     def ListVolumeAccessGroups(self, methodParams, ip="", endpoint="", apiVersion=""):
         with self.dataLock:
-            volgroups = copy.deepcopy(list(self.data[VOLGROUP_PATH].values()))
-            return { "volumeAccessGroups" : volgroups }
+            volgroups = copy.deepcopy(sorted(self.data[VOLGROUP_PATH].values(), key=lambda group: group["volumeAccessGroupID"]))
+        start_id = methodParams.get("startVolumeAccessGroupID", None)
+        if start_id:
+            volgroups = [group for group in volgroups if group["volumeAccessGroupID"] >= start_id]
+        limit = methodParams.get("limit", None)
+        if limit:
+            volgroups = volgroups[:limit]
+        return { "volumeAccessGroups" : volgroups }
 
     def CreateVolumeAccessGroup(self, methodParams, ip="", endpoint="", apiVersion=""):
         name = methodParams.get("name", None)
@@ -1438,6 +1457,11 @@ class FakeCluster(object):
             del self.data[ACCOUNT_PATH][account_id]
         return {}
 
+    def ListEvents(self, methodParams, ip="", endpoint="", apiVersion=""):
+        with self.dataLock:
+            event_ids = list(range(self.lastEventID, 0, -1))[:methodParams.get("maxEvents", 100)]
+        return {"events" : [{"eventID" : event_id, "eventInfo" : {}, "eventInfoType" : "apiEvent", "message" : "API Call"} for event_id in event_ids]}
+
     def GetClusterInfo(self, methodParams, ip="", endpoint="", apiVersion=""):
         with self.dataLock:
             return { "clusterInfo": { "attributes": {},
@@ -1594,8 +1618,8 @@ class FakeCluster(object):
 
             handle_id = self._GetNextIDUnlocked()
             handle = {
-                "createTime" : TimestampToStr(time.time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
-                "lastUpdateTime" : TimestampToStr(time.time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
+                "createTime" : TimestampToStr(clockutil.Time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
+                "lastUpdateTime" : TimestampToStr(clockutil.Time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
                 "result": {
                     "cloneID" : clone_id,
                     "message" : "Clone complete.",
@@ -1604,6 +1628,7 @@ class FakeCluster(object):
                 "resultType" : "Clone",
                 "status" : "complete"
             }
+            handle["completeTime"] = clockutil.Time() + self.asyncJobDuration
             self.data[ASYNC_HANDLES_PATH][handle_id] = handle
 
         return { "asyncHandle" : handle_id }
@@ -1615,9 +1640,38 @@ class FakeCluster(object):
         with self.dataLock:
             if async_id not in self.data[ASYNC_HANDLES_PATH]:
                 raise SolidFireApiError("GetAsyncHandle", methodParams, ip, endpoint, "xDBNoSuchPath", 500, "DBClient operation requested on a non-existent path at [/asyncresults/{}]".format(async_id))
-        handle = copy.deepcopy(self.data[ASYNC_HANDLES_PATH][async_id])
+        handle = self._AsyncHandleStatus(self.data[ASYNC_HANDLES_PATH][async_id])
+        handle.pop("completeTime", None)
+        return handle
+
+    def _AsyncHandleStatus(self, handle):
+        """Get a copy of an async handle showing it as running until its job has had time to finish"""
+        handle = copy.deepcopy(handle)
+        if clockutil.Time() < handle.get("completeTime", 0):
+            handle["status"] = "running"
+            handle.pop("result", None)
+            handle.pop("error", None)
         return handle
 
+    def ListAsyncResults(self, methodParams, ip="", endpoint="", apiVersion=""):
+        result_types = methodParams.get("asyncResultTypes", None)
+        with self.dataLock:
+            handles = []
+            for async_id, handle in self.data[ASYNC_HANDLES_PATH].items():
+                if result_types and handle["resultType"] not in result_types:
+                    continue
+                handle = self._AsyncHandleStatus(handle)
+                handles.append({
+                    "asyncResultID" : async_id,
+                    "completed" : handle["status"] == "complete",
+                    "createTime" : handle["createTime"],
+                    "lastUpdateTime" : handle["lastUpdateTime"],
+                    "resultType" : handle["resultType"],
+                    "success" : "error" not in handle,
+                    "data" : copy.deepcopy(handle.get("error", handle.get("result", {})))
+                })
+        return { "asyncHandles" : handles }
+
     def CreateVolume(self, methodParams, ip="", endpoint="", apiVersion=""):
         account_id = methodParams.get("accountID", None)
         if not account_id:
@@ -1817,6 +1871,70 @@ class FakeCluster(object):
 
         return {}
 
+    def ListActivePairedVolumes(self, methodParams, ip="", endpoint="", apiVersion=""):
+        with self.dataLock:
+            return { "volumes" : copy.deepcopy([vol for vol in self.data[VOLUME_PATH].values() if vol.get("volumePairs")]) }
+
+    def StartVolumePairing(self, methodParams, ip="", endpoint="", apiVersion=""):
+        volume_id = methodParams.get("volumeID", None)
+        if not volume_id:
+            raise SolidFireApiError("StartVolumePairing", methodParams, ip, endpoint, "xMissingParameter", 500, "Missing member=[volumeID]")
+        mode = methodParams.get("mode", "Async")
+
+        with self.dataLock:
+            if volume_id not in self.data[VOLUME_PATH]:
+                raise SolidFireApiError("StartVolumePairing", methodParams, ip, endpoint, "xVolumeIDDoesNotExist", 500, "Volume {} does not exist".format(volume_id))
+            if self.data[VOLUME_PATH][volume_id].get("volumePairs"):
+                raise SolidFireApiError("StartVolumePairing", methodParams, ip, endpoint, "xVolumeAlreadyPaired", 500, "Volume is already paired.")
+
+        # The key carries everything needed to complete the pairing, the same as the real key does
+        key = base64.b64encode(json.dumps({"volumeID" : volume_id, "mode" : mode}).encode("utf-8")).decode("utf-8")
+        return { "volumePairingKey" : key }
+
+    def CompleteVolumePairing(self, methodParams, ip="", endpoint="", apiVersion=""):
+        volume_id = methodParams.get("volumeID", None)
+        if not volume_id:
+            raise SolidFireApiError("CompleteVolumePairing", methodParams, ip, endpoint, "xMissingParameter", 500, "Missing member=[volumeID]")
+        try:
+            key = json.loads(base64.b64decode(methodParams["volumePairingKey"]).decode("utf-8"))
+        except (KeyError, TypeError, ValueError):
+            raise SolidFireApiError("CompleteVolumePairing", methodParams, ip, endpoint, "xInvalidPairingKey", 500, "Invalid volume pairing key.")
+
+        with self.dataLock:
+            for vol_id in (volume_id, key["volumeID"]):
+                if vol_id not in self.data[VOLUME_PATH]:
+                    raise SolidFireApiError("CompleteVolumePairing", methodParams, ip, endpoint, "xVolumeIDDoesNotExist", 500, "Volume {} does not exist".format(vol_id))
+                if self.data[VOLUME_PATH][vol_id].get("volumePairs") and vol_id == volume_id:
+                    raise SolidFireApiError("CompleteVolumePairing", methodParams, ip, endpoint, "xVolumeAlreadyPaired", 500, "Volume is already paired.")
+
+            # This cluster is both ends of the pair
+            pair_uuid = str(uuid.uuid4())
+            for vol_id, remote_id in ((key["volumeID"], volume_id), (volume_id, key["volumeID"])):
+                vol = self.data[VOLUME_PATH][vol_id]
+                vol["volumePairs"] = [
+                    {
+                        "clusterPairID": 1,
+                        "remoteReplication": {
+                            "mode": key["mode"],
+                            "pauseLimit": 3145728000,
+                            "remoteServiceID": random.randint(10, 100),
+                            "resumeDetails": "",
+                            "snapshotReplication": {
+                                "state": "Idle",
+                                "stateDetails": ""
+                            },
+                            "state": "Active",
+                            "stateDetails": ""
+                        },
+                        "remoteSliceID": remote_id,
+                        "remoteVolumeID": remote_id,
+                        "remoteVolumeName": self.data[VOLUME_PATH][remote_id]["name"],
+                        "volumePairUUID": pair_uuid
+                    }]
+                self.data[VOLUME_PATH][vol_id] = vol
+
+        return {}
+
     def ListDrives(self, methodParams, ip="", endpoint="", apiVersion=""):
         with self.dataLock:
             alldrives = self.data[DRIVES_PATH]
@@ -1860,13 +1978,14 @@ class FakeCluster(object):
 
             handle_id = self._GetNextIDUnlocked()
             handle = {
-                "createTime" : TimestampToStr(time.time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
-                "lastUpdateTime" : TimestampToStr(time.time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
+                "createTime" : TimestampToStr(clockutil.Time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
+                "lastUpdateTime" : TimestampToStr(clockutil.Time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
                 "result": {
                 },
                 "resultType" : "AddDrives",
                 "status" : "complete"
             }
+            handle["completeTime"] = clockutil.Time() + self.asyncJobDuration
             self.data[ASYNC_HANDLES_PATH][handle_id] = handle
 
         return { "asyncHandle" : handle_id }
@@ -1892,13 +2011,14 @@ class FakeCluster(object):
 
             handle_id = self._GetNextIDUnlocked()
             handle = {
-                "createTime" : TimestampToStr(time.time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
-                "lastUpdateTime" : TimestampToStr(time.time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
+                "createTime" : TimestampToStr(clockutil.Time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
+                "lastUpdateTime" : TimestampToStr(clockutil.Time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
                 "result": {
                 },
                 "resultType" : "RemoveDrives",
                 "status" : "complete"
             }
+            handle["completeTime"] = clockutil.Time() + self.asyncJobDuration
             self.data[ASYNC_HANDLES_PATH][handle_id] = handle
 
         return { "asyncHandle" : handle_id }
@@ -1918,7 +2038,7 @@ class FakeCluster(object):
     
             for idx, fault in enumerate(faults["faults"], start=1):
                 fault["clusterFaultID"] = idx
-                fault["date"] = TimestampToStr(time.time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone())
+                fault["date"] = TimestampToStr(clockutil.Time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone())
                 fault["resolved"] = False
 
         if fault_types in ["all", "resolved"]:
@@ -2011,7 +2131,7 @@ class FakeCluster(object):
                 ver["clusterVersionInfo"].append({
                     "nodeID" : node_id,
                     "nodeVersion" : node_version,
-                    "nodeInternalRevision" : "BuildType=Release Element=ELEMENT Release=ELEMENT ReleaseShort=ELEMENT Version=VERSION sfdev=9.14 Repository=ELEMENT Revision=ce906c4d4aae Options=timing,timing BuildDate={}".format(TimestampToStr(time.time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone())).replace("ELEMENT", "unobtanium").replace("VERSION", self.data[CLUSTER_VERSION_PATH])
+                    "nodeInternalRevision" : "BuildType=Release Element=ELEMENT Release=ELEMENT ReleaseShort=ELEMENT Version=VERSION sfdev=9.14 Repository=ELEMENT Revision=ce906c4d4aae Options=timing,timing BuildDate={}".format(TimestampToStr(clockutil.Time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone())).replace("ELEMENT", "unobtanium").replace("VERSION", self.data[CLUSTER_VERSION_PATH])
                 })
 
             if SolidFireVersion(self.data[CLUSTER_VERSION_PATH]).major > 5:
@@ -2064,7 +2184,7 @@ class FakeCluster(object):
             self.data[VERSION_INFO_PATH]["nodeID"] = 0
             self.data[VERSION_INFO_PATH]["packageName"] = package_name
             self.data[VERSION_INFO_PATH]["pendingVersion"] = version
-            self.data[VERSION_INFO_PATH]["startTime"] = TimestampToStr(time.time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone())
+            self.data[VERSION_INFO_PATH]["startTime"] = TimestampToStr(clockutil.Time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone())
         return {}
 
     def SetUpgradeNodeId(self, methodParams, ip="", endpoint="", apiVersion=""):
@@ -2099,10 +2219,13 @@ class FakeCluster(object):
             return { "success" : status }
 
     def ListVolumeStatsByVolume(self, methodParams, ip="", endpoint="", apiVersion=""):
+        volume_ids = methodParams.get("volumeIDs", None)
         with self.dataLock:
             node_count = len(list(self.data[ACTIVE_NODES_PATH].keys()))
             stats = []
             for volume in self.data[VOLUME_PATH].values():
+                if volume_ids and volume["volumeID"] not in volume_ids:
+                    continue
                 stats.append({
                     "accountID": volume["accountID"],
                     "actualIOPS":0,
@@ -2125,7 +2248,7 @@ class FakeCluster(object):
                     "readOpsLastSample":0,
                     "samplePeriodMSec":0,
                     "throttle":0,
-                    "timestamp": TimestampToStr(time.time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
+                    "timestamp": TimestampToStr(clockutil.Time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
                     "unalignedReads":0,
                     "unalignedWrites":0,
                     "volumeAccessGroups": volume["volumeAccessGroups"],
@@ -2351,7 +2474,7 @@ class FakeCluster(object):
             ver_info = {}
             for binary in ["sfapp", "sfbasiciocheck", "sfconfig", "sfnetwd", "sfsvcmgr"]:
                 ver_info[binary] = {
-                    "BuildDate" : TimestampToStr(time.time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
+                    "BuildDate" : TimestampToStr(clockutil.Time(), formatString="%Y-%m-%dT%H:%M:%SZ", timeZone=UTCTimezone()),
                     "BuildType" : "Release",
                     "Element" : "unobtanium",
                     "Release" : "unobtanium",
@@ -2452,7 +2575,7 @@ class FakeCluster(object):
                 raise NotImplementedError("path=[{}] has not been implemented".format(path))
 
     def GetTime(self, methodParams, nodeIP, endpoint="", apiVersion=""):
-        timestamp = time.time()
+        timestamp = clockutil.Time()
         times = {
             "hardware" : TimestampToStr(timestamp, formatString="%c 0.%f seconds", timeZone=UTCTimezone()),
             "local" : TimestampToStr(timestamp, formatString="%Y-%m-%dT%H:%M:%Sl", timeZone=UTCTimezone()),
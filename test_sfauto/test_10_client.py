@@ -158,6 +158,18 @@ class TestClientCreateVolgroup(object):
         from client_create_volgroup import ClientCreateVolgroup
         assert ClientCreateVolgroup(client_ips=[RandomIP() for _ in range(random.randint(2, 6))])
 
+    def test_ClientCreateVolgroupSharedGroup(self):
+        print()
+        name = RandomString(random.randint(6, 16))
+        group_id = globalconfig.cluster.CreateVolumeAccessGroup({"name":name})["volumeAccessGroupID"]
+        clients = [globalconfig.clients.CreateClient() for _ in range(random.randint(4, 10))]
+        from client_create_volgroup import ClientCreateVolgroup
+        assert ClientCreateVolgroup(client_ips=[client.ip for client in clients],
+                                    volgroup_name=name)
+
+        group = globalconfig.cluster.ListVolumeAccessGroups({"startVolumeAccessGroupID":group_id, "limit":1})["volumeAccessGroups"][0]
+        assert set(group["initiators"]) == set(client.iqn.lower() for client in clients)
+
 @pytest.mark.incremental
 @pytest.mark.usefixtures("fake_cluster_perclass")
 class TestClientCreateVolumes(object):
@@ -874,6 +886,24 @@ class TestClientLoginVolumes(object):
         print("\ncaptured stdout = [{}]".format(stdout))
         assert "method=[ListAccounts]" in stdout
 
+    def test_negative_ListVolumeAccessGroupsError(self, capfd):
+        print()
+        client_ips = []
+        for _ in range(random.randint(2, 5)):
+            client = globalconfig.clients.CreateClient()
+            globalconfig.cluster.CreateVolumeAccessGroup({"name":client.hostname, "initiators":[client.iqn]})
+            client_ips.append(client.ip)
+
+        from client_login_volumes import ClientLoginVolumes
+        with APIFailure("ListVolumeAccessGroups"):
+            assert not ClientLoginVolumes(client_ips=client_ips,
+                                          auth_type="iqn")
+
+        stdout, _ = capfd.readouterr()
+        print("\ncaptured stdout = [{}]".format(stdout))
+        assert stdout.count("method=[ListVolumeAccessGroups]") == 1
+        assert "Connecting to client" not in stdout
+
     def test_negative_DiscoveryError(self, capfd):
         print()
         volume_count = random.randint(10, 50)
@@ -983,3 +1013,110 @@ class TestClientLogoutVolumes(object):
         assert "Could not log out of volumes on all clients" in stdout
 
 
+
+@pytest.mark.usefixtures("fake_cluster_perclass")
+class TestClientCheckHealth(object):
+
+    def test_ClientCheckHealth(self, capfd):
+        print()
+        client_ips = [RandomIP() for _ in range(random.randint(2, 5))]
+
+        from client_check_health import ClientCheckHealth
+        assert ClientCheckHealth(client_ips=client_ips)
+
+        stdout, _ = capfd.readouterr()
+        print("\ncaptured stdout = [{}]".format(stdout))
+        assert stdout.count("Client is healthy") == len(client_ips)
+        assert stdout.count("CPU usage 2.2%") == len(client_ips)
+        assert "All clients are healthy" in stdout
+
+    def test_negative_ClientCheckHealthVdbenchFailed(self, capfd):
+        print()
+        client_ips = [RandomIP() for _ in range(random.randint(2, 5))]
+        report = {"mac" : "0050569a0b1c", "uptime" : "86400.12", "load" : "0.42", "mem" : "23.5", "cpuidle" : "",
+                  "vdbench" : "0", "vdbenchd" : "1", "vdbenchexit" : "1", "iscsid" : "0", "disk" : "41", "ioerrors" : "3"}
+
+        from client_check_health import ClientCheckHealth
+        with ClientCommandFailure("# sfauto health probe", (0, json.dumps(report), ""), clientIP=client_ips[0]):
+            assert not ClientCheckHealth(client_ips=client_ips)
+
+        stdout, _ = capfd.readouterr()
+        print("\ncaptured stdout = [{}]".format(stdout))
+        assert stdout.count("Client is not healthy") == 1
+        assert "iscsid is not running" in stdout
+        assert "3 I/O errors in the kernel log" in stdout
+        assert "Not all clients are healthy" in stdout
+
+    def test_negative_ClientCheckHealthBadOutput(self, capfd):
+        print()
+        client_ips = [RandomIP() for _ in range(random.randint(2, 5))]
+
+        from client_check_health import ClientCheckHealth
+        with ClientCommandFailure("# sfauto health probe", (0, "mktemp: failed", "")):
+            assert not ClientCheckHealth(client_ips=client_ips)
+
+        stdout, _ = capfd.readouterr()
+        print("\ncaptured stdout = [{}]".format(stdout))
+        assert stdout.count("Could not parse health info") == len(client_ips)
+
+    def test_negative_ClientCheckHealthConnectFailure(self, capfd):
+        print()
+        client_ips = [RandomIP() for _ in range(random.randint(2, 5))]
+
+        from client_check_health import ClientCheckHealth
+        with ClientConnectFailure(random.choice(client_ips)):
+            assert not ClientCheckHealth(client_ips=client_ips)
+
+        stdout, _ = capfd.readouterr()
+        print("\ncaptured stdout = [{}]".format(stdout))
+        assert stdout.count("SSH error:") == 1
+
+@pytest.mark.usefixtures("fake_cluster_perclass")
+class TestClientLoginTargets(object):
+
+    def test_ParallelLoginTargetList(self, monkeypatch):
+        print()
+        from libsf import sfdefaults
+        from libsf.sfclient import SFClient
+        monkeypatch.setattr(sfdefaults, "login_parallel_max", 8)
+        fake = globalconfig.clients.CreateClient()
+        fake.SetClientDiscoverableVolumes(random.randint(30, 60))
+        targets = random.sample(fake.fakeDiscovery, random.randint(9, 30))
+
+        client = SFClient(fake.ip, "root", "password")
+        commands = []
+        original_execute = client.ExecuteCommand
+        def _Execute(command, *args, **kwargs):
+            commands.append(command)
+            return original_execute(command, *args, **kwargs)
+        monkeypatch.setattr(client, "ExecuteCommand", _Execute)
+        client.LoginTargets(loginOrder="parallel", targetList=targets)
+        assert sorted(globalconfig.clients.GetClient(fake.ip).volumes.values()) == sorted(targets)
+        # The logins go in chunks, with one session listing to check them and one update to set them all to log in at boot
+        assert len([command for command in commands if command.startswith("iscsiadm -m node -l")]) == (len(targets) + 7) // 8
+        assert commands.count("iscsiadm -m session -P 0") == 1
+        assert len([command for command in commands if "node.startup" in command]) == 1
+
+    def test_negative_ParallelLoginTargetListFailure(self):
+        print()
+        from libsf import ClientError
+        from libsf.sfclient import SFClient
+        fake = globalconfig.clients.CreateClient()
+        fake.SetClientDiscoverableVolumes(random.randint(10, 20))
+
+        client = SFClient(fake.ip, "root", "password")
+        with ClientCommandFailure("iscsiadm -m node -l -T", (0, "", "")):
+            with pytest.raises(ClientError):
+                client.LoginTargets(loginOrder="parallel", targetList=fake.fakeDiscovery[:5])
+
+    def test_negative_StartupUpdateFailure(self):
+        print()
+        from libsf import ClientError
+        from libsf.sfclient import SFClient
+        fake = globalconfig.clients.CreateClient()
+        fake.SetClientDiscoverableVolumes(random.randint(10, 20))
+
+        client = SFClient(fake.ip, "root", "password")
+        with ClientCommandFailure("iscsiadm -m node -o update -n node.startup -v automatic"):
+            with pytest.raises(ClientError):
+                client.LoginTargets(loginOrder="parallel", targetList=fake.fakeDiscovery)
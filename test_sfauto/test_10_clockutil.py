@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import pytest
+import time
+from libsf import sfdefaults, SFTimeoutError
+from . import globalconfig
+
+class TestVirtualClock(object):
+
+    def test_VirtualClockSleep(self, virtual_clock):
+        print()
+        from libsf import threadutil, clockutil
+        start = virtual_clock.Time()
+        real_start = time.time()
+        threadutil.Sleep(3 * 3600)
+        assert virtual_clock.Time() - start == 3 * 3600
+        assert clockutil.Time() == virtual_clock.Time()
+        assert time.time() - real_start < 5
+
+    def test_negative_VirtualClockDeadline(self, virtual_clock):
+        print()
+        from libsf.threadutil import CancellationToken
+        start = virtual_clock.Time()
+        token = CancellationToken(timeout=600)
+        with token.Activate():
+            with pytest.raises(SFTimeoutError):
+                token.Sleep(3600)
+        assert virtual_clock.Time() - start == 600
+
+    def test_negative_VirtualClockWaitUntil(self, virtual_clock):
+        print()
+        from libsf.waitutil import WaitUntil, FixedInterval
+        start = virtual_clock.Time()
+        with pytest.raises(SFTimeoutError):
+            WaitUntil(lambda: False, timeout=7200, strategy=FixedInterval(60))
+        assert virtual_clock.Time() - start == 7200
+
+    @pytest.mark.usefixtures("fake_cluster_permethod")
+    def test_VirtualClockAsyncJob(self, virtual_clock):
+        print()
+        from libsf.sfcluster import SFCluster
+        from libsf.waitutil import WaitUntil, FixedInterval, ExponentialInterval
+        cluster = SFCluster(sfdefaults.mvip, sfdefaults.username, sfdefaults.password)
+        globalconfig.cluster.asyncJobDuration = 2 * 3600
+        drives = [drive["driveID"] for drive in globalconfig.cluster.ListDrives({})["drives"] if drive["status"] == "available"]
+        if not drives:
+            pytest.skip("No available drives")
+
+        # Measure how many status calls each polling strategy makes while waiting out a two hour job
+        calls = {}
+        for name, strategy in [("fixed", FixedInterval(60)), ("exponential", ExponentialInterval(initial=1, maximum=300))]:
+            handle = globalconfig.cluster.AddDrives({"drives" : drives})["asyncHandle"]
+            start = virtual_clock.Time()
+            before = globalconfig.cluster.callCounts["GetAsyncResult"]
+            result = WaitUntil(lambda: cluster.GetAsyncResult(handle)["status"] == "complete", strategy=strategy)
+            assert result
+            assert virtual_clock.Time() - start >= 2 * 3600
+            calls[name] = globalconfig.cluster.callCounts["GetAsyncResult"] - before
+        print(calls)
+        assert calls["fixed"] > 100
+        assert calls["exponential"] < calls["fixed"] / 3
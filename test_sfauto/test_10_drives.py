@@ -236,3 +236,75 @@ class TestDriveWaitfor(object):
         assert DriveWaitfor(states=["active", "available"],
                              compare="gt",
                              expected=random.randint(1, expected-1))
+
+@pytest.mark.usefixtures("fake_cluster_permethod")
+class TestDriveIndex(object):
+
+    def test_DriveIndex(self):
+        print()
+        from libsf.sfcluster import SFCluster
+        from libsf import sfdefaults
+        index = SFCluster(sfdefaults.mvip, sfdefaults.username, sfdefaults.password).GetDriveIndex()
+        drives = globalconfig.cluster.ListDrives({})["drives"]
+        node_id = random.choice(drives)["nodeID"]
+        assert index.Count() == len(drives)
+        assert index.Count(driveState="available") == len([drive for drive in drives if drive["status"] == "available"])
+        assert sorted([drive["driveID"] for drive in index.Get(driveState=["active", "available"], nodeID=node_id)]) == \
+               sorted([drive["driveID"] for drive in drives if drive["status"] in ["active", "available"] and drive["nodeID"] == node_id])
+        assert index.Count(driveState="active", nodeID=node_id, driveType="volume") == \
+               len([drive for drive in drives if drive["status"] == "active" and drive["nodeID"] == node_id and drive["type"] == "volume"])
+        assert index.Get(nodeID=[]) == []
+        assert index.Find(drives[0]["driveID"])["driveID"] == drives[0]["driveID"]
+
+    def test_WaitForDrives(self):
+        print()
+        from libsf.sfcluster import SFCluster
+        from libsf import sfdefaults
+        checks = []
+        def _Condition(index):
+            checks.append(index.Count())
+            return len(checks) >= 3
+        index = SFCluster(sfdefaults.mvip, sfdefaults.username, sfdefaults.password).WaitForDrives(_Condition, timeout=60)
+        assert len(checks) == 3
+        assert index.Count() == len(globalconfig.cluster.ListDrives({})["drives"])
+
+    def test_WaitForDrivesPolling(self, virtual_clock, monkeypatch):
+        print()
+        from libsf.sfcluster import SFCluster
+        from libsf import sfdefaults
+        # Overrides from the environment are strings
+        monkeypatch.setattr(sfdefaults, "drive_event_poll_interval", "10")
+        monkeypatch.setattr(sfdefaults, "drive_relist_interval", "60")
+        calls = {"ListEvents" : 0, "ListDrives" : 0}
+        def _Counter(method, original):
+            def _Counted(*args, **kwargs):
+                calls[method] += 1
+                return original(*args, **kwargs)
+            return _Counted
+        for method in calls:
+            monkeypatch.setattr(globalconfig.cluster, method, _Counter(method, getattr(globalconfig.cluster, method)))
+        checks = []
+        def _Condition(index):
+            checks.append(virtual_clock.Time())
+            return len(checks) >= 3
+        with APIFailure("ListClusterFaults"):
+            SFCluster(sfdefaults.mvip, sfdefaults.username, sfdefaults.password).WaitForDrives(_Condition, timeout=600)
+        # With no drive events the drives are only listed again every relist interval, with one event check per poll between
+        assert checks[1] - checks[0] == checks[2] - checks[1] == 60
+        assert calls["ListDrives"] == 3
+        assert calls["ListEvents"] == 1 + 2 * 5
+
+    def test_negative_WaitForDrivesTimeout(self):
+        print()
+        from libsf.sfcluster import SFCluster
+        from libsf import sfdefaults, SFTimeoutError
+        with pytest.raises(SFTimeoutError):
+            SFCluster(sfdefaults.mvip, sfdefaults.username, sfdefaults.password).WaitForDrives(lambda index: False, timeout=1)
+
+    def test_negative_WaitForDrivesEventsFailure(self):
+        print()
+        from libsf.sfcluster import SFCluster
+        from libsf import sfdefaults
+        with APIFailure("ListEvents"):
+            with pytest.raises(SolidFireAPIError):
+                SFCluster(sfdefaults.mvip, sfdefaults.username, sfdefaults.password).WaitForDrives(lambda index: True, timeout=60)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import pytest
+import random
+from libsf import sfdefaults, SolidFireAPIError
+from . import globalconfig
+from .fake_cluster import APIFailure
+from .testutil import RandomString
+
+@pytest.fixture
+def inventory_cache(tmpdir, monkeypatch):
+    monkeypatch.setattr(sfdefaults, "inventory_cache", str(tmpdir.join("inventory.sqlite")))
+
+def _Cluster():
+    from libsf.sfcluster import SFCluster
+    return SFCluster(sfdefaults.mvip, sfdefaults.username, sfdefaults.password)
+
+@pytest.mark.usefixtures("fake_cluster_perclass")
+class TestInventoryCache(object):
+
+    def test_negative_InventoryCacheDisabled(self):
+        print()
+        _Cluster().ListActiveVolumes()
+        with APIFailure("ListActiveVolumes"):
+            with pytest.raises(SolidFireAPIError):
+                _Cluster().ListActiveVolumes()
+
+    @pytest.mark.usefixtures("inventory_cache")
+    def test_InventoryCacheListVolumes(self):
+        print()
+        volumes = _Cluster().ListActiveVolumes()
+        with APIFailure("ListActiveVolumes"):
+            cached = _Cluster().ListActiveVolumes()
+        assert sorted([vol["volumeID"] for vol in cached]) == sorted([vol["volumeID"] for vol in volumes])
+
+    @pytest.mark.parametrize("first", ["ListActiveVolumes", "GetActiveVolumes", "SearchForVolumes"])
+    @pytest.mark.usefixtures("inventory_cache")
+    def test_InventoryCacheVolumesVersion(self, first, monkeypatch):
+        print()
+        from libsf import GetHighestAPIVersion
+        versions = []
+        original = globalconfig.cluster.ListActiveVolumes
+        def _ListActiveVolumes(methodParams, ip="", endpoint="", apiVersion=""):
+            versions.append(float(apiVersion))
+            return original(methodParams, ip, endpoint, apiVersion)
+        monkeypatch.setattr(globalconfig.cluster, "ListActiveVolumes", _ListActiveVolumes)
+        calls = {"ListActiveVolumes" : lambda: _Cluster().ListActiveVolumes(),
+                 "GetActiveVolumes" : lambda: _Cluster().GetActiveVolumes(),
+                 "SearchForVolumes" : lambda: _Cluster().SearchForVolumes(volumeRegex=".")}
+        # Whichever call fills the cache, it holds volumes from the highest API version
+        calls.pop(first)()
+        assert versions == [GetHighestAPIVersion(sfdefaults.mvip, sfdefaults.username, sfdefaults.password)]
+        for call in calls.values():
+            call()
+        assert len(versions) == 1
+
+    @pytest.mark.usefixtures("inventory_cache")
+    def test_InventoryCacheFind(self):
+        print()
+        accounts = _Cluster().ListAccounts()
+        account = random.choice(accounts)
+        volgroups = _Cluster().ListVolumeAccessGroups()
+        volgroup = random.choice(volgroups)
+        with APIFailure("ListAccounts"):
+            assert _Cluster().FindAccount(accountName=account.username.upper()).ID == account.ID
+            assert _Cluster().FindAccount(accountID=account.ID).username == account.username
+        with APIFailure("ListVolumeAccessGroups"):
+            assert _Cluster().FindVolumeAccessGroup(volgroupName=volgroup.name).ID == volgroup.ID
+
+    @pytest.mark.usefixtures("inventory_cache")
+    def test_InventoryCacheSnapshot(self):
+        print()
+        inventory = _Cluster().Snapshot()
+        with APIFailure("ListActiveVolumes"):
+            with APIFailure("ListDrives"):
+                cached = _Cluster().Snapshot()
+        assert sorted(cached.volumes.keys()) == sorted(inventory.volumes.keys())
+        assert sorted(cached.drives.keys()) == sorted(inventory.drives.keys())
+
+    @pytest.mark.usefixtures("inventory_cache")
+    def test_InventoryCacheInvalidatedByChange(self):
+        print()
+        account_id = random.choice(_Cluster().ListAccounts()).ID
+        _Cluster().ListActiveVolumes()
+
+        volume_name = RandomString(random.randint(8, 32))
+        from volume_create import VolumeCreate
+        assert VolumeCreate(volume_size=random.randint(1, 8000),
+                            volume_name=volume_name,
+                            volume_count=1,
+                            account_id=account_id)
+
+        assert volume_name in [vol["name"] for vol in _Cluster().ListActiveVolumes()]
+
+    @pytest.mark.usefixtures("inventory_cache")
+    def test_negative_InventoryCacheExpired(self, monkeypatch):
+        print()
+        monkeypatch.setattr(sfdefaults, "inventory_cache_max_age", 0)
+        _Cluster().ListActiveVolumes()
+        with APIFailure("ListActiveVolumes"):
+            with pytest.raises(SolidFireAPIError):
+                _Cluster().ListActiveVolumes()
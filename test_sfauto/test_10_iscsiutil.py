@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import pytest
+import time
+from . import globalconfig
+
+FULL_OUTPUT = """iSCSI Transport Class version 2.0-870
+version 2.0-873
+Target: iqn.2010-01.com.solidfire:abcd.vol1.1 (non-flash)
+	Current Portal: 10.10.10.10:3260,1
+	Persistent Portal: 10.10.10.10:3260,1
+		**********
+		Interface:
+		**********
+		Iface Name: default
+		Iface Transport: tcp
+		Iface IPaddress: 10.10.10.100
+		SID: 4
+		iSCSI Connection State: LOGGED IN
+		iSCSI Session State: LOGGED_IN
+		Internal iscsid Session State: NO CHANGE
+		*********
+		Timeouts:
+		*********
+		Recovery Timeout: 120
+		************************
+		Attached SCSI devices:
+		************************
+		Host Number: 6	State: running
+		scsi6 Channel 00 Id 0 Lun: 0
+			Attached scsi disk sdb		State: running
+	Current Portal: [fe80::1]:3260,1
+	Persistent Portal: [fe80::1]:3260,1
+		SID: 5
+		iSCSI Connection State: TRANSPORT WAIT
+		iSCSI Session State: FAILED
+		Host Number: 7	State: running
+		scsi7 Channel 00 Id 0 Lun: 0
+			Attached scsi disk sdc		State: blocked
+		scsi7 Channel 00 Id 0 Lun: 1
+			Attached scsi disk sdaa		State: running
+Target: iqn.2010-01.com.solidfire:abcd.vol2.2
+	Current Portal: 10.10.10.11:3260,1
+	Persistent Portal: 10.10.10.11:3260,1
+		SID: 6
+		iSCSI Session State: LOGGED_IN
+"""
+
+def SyntheticSessionDump(count):
+    """Build the filtered iscsiadm -m session -P 3 output for a number of sessions"""
+    lines = []
+    for idx in range(1, count + 1):
+        lines.append("Target: iqn.2010-01.com.solidfire:abcd.vol{}.{} (non-flash)".format(idx, idx))
+        lines.append("\tCurrent Portal: 10.10.{}.{}:3260,1".format(idx // 256 % 256, idx % 256))
+        lines.append("\tPersistent Portal: 10.10.10.10:3260,1")
+        lines.append("\t\tSID: {}".format(idx))
+        lines.append("\t\tiSCSI Connection State: LOGGED IN")
+        lines.append("\t\tiSCSI Session State: LOGGED_IN")
+        lines.append("\t\tInternal iscsid Session State: NO CHANGE")
+        lines.append("\t\tHost Number: {}\tState: running".format(idx + 2))
+        lines.append("\t\t\tAttached scsi disk sd{}\t\tState: running".format(idx))
+    return "\n".join(lines) + "\n"
+
+class TestParseSessions(object):
+
+    def test_ParseSessionsFull(self):
+        print()
+        from libsf.iscsiutil import ParseSessions
+        sessions = ParseSessions(FULL_OUTPUT)
+        assert [session.sid for session in sessions] == [4, 5, 6]
+        first, second, third = sessions
+
+        assert first.iqn == "iqn.2010-01.com.solidfire:abcd.vol1.1"
+        assert (first.portal, first.port) == ("10.10.10.10", 3260)
+        assert first.connectionState == "LOGGED IN"
+        assert first.sessionState == "LOGGED_IN"
+        assert first.hostNumber == 6
+        assert first.devices == ["sdb"]
+        assert first.deviceStates == ["running"]
+        assert first.device == "/dev/sdb"
+
+        assert second.iqn == first.iqn
+        assert (second.portal, second.port) == ("fe80::1", 3260)
+        assert second.sessionState == "FAILED"
+        assert second.devices == ["sdc", "sdaa"]
+        assert second.deviceStates == ["blocked", "running"]
+
+        assert third.iqn == "iqn.2010-01.com.solidfire:abcd.vol2.2"
+        assert third.devices == []
+        assert third.device is None
+        assert third.ToDict()["sid"] == 6
+
+    def test_ParseSessionsFiltered(self):
+        print()
+        from libsf.iscsiutil import ParseSessions
+        filtered = "\n".join([line for line in FULL_OUTPUT.split("\n") if any(key in line for key in ["Target:", "Portal:", "State:", "SID:", "disk"])])
+        assert [session.ToDict() for session in ParseSessions(filtered)] == [session.ToDict() for session in ParseSessions(FULL_OUTPUT)]
+
+    def test_ParseSessionsEmpty(self):
+        print()
+        from libsf.iscsiutil import ParseSessions
+        assert ParseSessions("") == []
+        assert ParseSessions("iscsiadm: No active sessions.\n") == []
+
+    def test_ParseSessionsLarge(self):
+        print()
+        from libsf.iscsiutil import ParseSessions
+        session_count = 5000
+        sessions = ParseSessions(SyntheticSessionDump(session_count))
+        assert len(sessions) == session_count
+        assert [session.sid for session in sessions] == list(range(1, session_count + 1))
+        assert all([session.sessionState == "LOGGED_IN" for session in sessions])
+        assert sessions[-1].devices == ["sd{}".format(session_count)]
+        assert sessions[-1].portal == "10.10.{}.{}".format(session_count // 256 % 256, session_count % 256)
+
+    @pytest.mark.benchmark
+    def test_ParseSessionsBenchmark(self):
+        print()
+        from libsf.iscsiutil import ParseSessions
+        session_count = 5000
+        text = SyntheticSessionDump(session_count)
+        times = []
+        for _ in range(10):
+            start = time.time()
+            sessions = ParseSessions(text)
+            times.append(time.time() - start)
+        assert len(sessions) == session_count
+        print("Parsed {} sessions: best {:.1f} ms, mean {:.1f} ms over {} runs".format(session_count, min(times) * 1000, sum(times) / len(times) * 1000, len(times)))
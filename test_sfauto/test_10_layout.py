@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import json
+import pytest
+import random
+from . import globalconfig
+from .fake_cluster import APIFailure
+from .testutil import RandomString, RandomIQN
+
+def _WriteLayout(tmpdir, layout):
+    layout_file = tmpdir.join("layout.json")
+    layout_file.write(json.dumps(layout))
+    return str(layout_file)
+
+def _RandomLayout():
+    account_name = RandomString(random.randint(8, 32))
+    prefix = account_name + "-"
+    volume_count = random.randint(2, 20)
+    return {
+        "accounts" : [ {"name" : account_name} ],
+        "volumes" : [ {"prefix" : prefix, "count" : volume_count, "account" : account_name, "size" : random.randint(1, 8000)},
+                      {"name" : RandomString(random.randint(8, 32)), "account" : account_name, "size" : random.randint(1, 8000), "qos" : {"minIOPS" : 100, "maxIOPS" : 2000, "burstIOPS" : 4000}} ],
+        "volgroups" : [ {"name" : RandomString(random.randint(8, 32)), "initiators" : [RandomIQN()], "volumes" : [prefix + "00001"]} ]
+    }
+
+@pytest.mark.usefixtures("fake_cluster_perclass")
+class TestClusterApplyLayout(object):
+
+    def test_ClusterApplyLayout(self, tmpdir):
+        print()
+        layout = _RandomLayout()
+        from cluster_apply_layout import ClusterApplyLayout
+        assert ClusterApplyLayout(layout=_WriteLayout(tmpdir, layout))
+
+        account = [acc for acc in globalconfig.cluster.ListAccounts({})["accounts"] if acc["username"] == layout["accounts"][0]["name"]][0]
+        volumes = [vol for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"] if vol["accountID"] == account["accountID"]]
+        assert len(volumes) == layout["volumes"][0]["count"] + 1
+        volgroup = [group for group in globalconfig.cluster.ListVolumeAccessGroups({})["volumeAccessGroups"] if group["name"] == layout["volgroups"][0]["name"]][0]
+        assert volgroup["initiators"] == [init.lower() for init in layout["volgroups"][0]["initiators"]]
+        assert len(volgroup["volumes"]) == 1
+
+    def test_ClusterApplyLayoutConverged(self, tmpdir):
+        print()
+        layout_file = _WriteLayout(tmpdir, _RandomLayout())
+        from cluster_apply_layout import ClusterApplyLayout
+        assert ClusterApplyLayout(layout=layout_file)
+
+        # Applying the same layout again should only read the cluster state
+        with APIFailure("AddAccount"):
+            with APIFailure("CreateMultipleVolumes"):
+                with APIFailure("ModifyVolume"):
+                    with APIFailure("CreateVolumeAccessGroup"):
+                        with APIFailure("ModifyVolumeAccessGroup"):
+                            assert ClusterApplyLayout(layout=layout_file)
+
+    def test_ClusterApplyLayoutChanges(self, tmpdir):
+        print()
+        layout = _RandomLayout()
+        from cluster_apply_layout import ClusterApplyLayout
+        assert ClusterApplyLayout(layout=_WriteLayout(tmpdir, layout))
+
+        layout["volumes"][1]["qos"]["maxIOPS"] = 3000
+        new_iqn = RandomIQN()
+        layout["volgroups"][0]["initiators"] = [new_iqn]
+        assert ClusterApplyLayout(layout=_WriteLayout(tmpdir, layout), prune=True)
+
+        volume = [vol for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"] if vol["name"] == layout["volumes"][1]["name"]][0]
+        assert volume["qos"]["maxIOPS"] == 3000
+        volgroup = [group for group in globalconfig.cluster.ListVolumeAccessGroups({})["volumeAccessGroups"] if group["name"] == layout["volgroups"][0]["name"]][0]
+        assert volgroup["initiators"] == [new_iqn.lower()]
+
+    def test_ClusterApplyLayoutTestMode(self, tmpdir):
+        print()
+        layout = _RandomLayout()
+        from cluster_apply_layout import ClusterApplyLayout
+        assert ClusterApplyLayout(layout=_WriteLayout(tmpdir, layout), test=True)
+        assert layout["accounts"][0]["name"] not in [acc["username"] for acc in globalconfig.cluster.ListAccounts({})["accounts"]]
+
+    def test_negative_ClusterApplyLayoutBadLayout(self, tmpdir):
+        print()
+        from cluster_apply_layout import ClusterApplyLayout
+        assert not ClusterApplyLayout(layout=_WriteLayout(tmpdir, {"volumes" : [ {"name" : RandomString(8)} ]}))
+
+    def test_negative_ClusterApplyLayoutMissingFile(self, tmpdir):
+        print()
+        from cluster_apply_layout import ClusterApplyLayout
+        assert not ClusterApplyLayout(layout=str(tmpdir.join("missing.json")))
+
+    def test_negative_ClusterApplyLayoutSearchFailure(self, tmpdir):
+        print()
+        from cluster_apply_layout import ClusterApplyLayout
+        with APIFailure("ListActiveVolumes"):
+            assert not ClusterApplyLayout(layout=_WriteLayout(tmpdir, _RandomLayout()))
+
+    def test_negative_ClusterApplyLayoutFailure(self, tmpdir):
+        print()
+        layout = _RandomLayout()
+        from cluster_apply_layout import ClusterApplyLayout
+        with APIFailure("CreateMultipleVolumes"):
+            assert not ClusterApplyLayout(layout=_WriteLayout(tmpdir, layout))
+
+        # The volume access group depends on the volumes, so it should not have been created
+        assert layout["volgroups"][0]["name"] not in [group["name"] for group in globalconfig.cluster.ListVolumeAccessGroups({})["volumeAccessGroups"]]
@@ -412,3 +412,28 @@ class TestNodeGetBinaryVersion(object):
         with APIFailure("ListAllNodes"):
             assert not NodeGetBinaryVersion()
 
+
+class TestNodeDiscoverSubnet(object):
+
+    def test_NodeDiscoverSubnet(self, monkeypatch):
+        print()
+        from libsf import sfdefaults, threadutil
+        pools = []
+        class _Pool(threadutil.ThreadPool):
+            def __init__(self, *args, **kwargs):
+                super(_Pool, self).__init__(*args, **kwargs)
+                pools.append(self)
+        monkeypatch.setattr(threadutil, "ThreadPool", _Pool)
+        monkeypatch.setattr(sfdefaults, "discover_parallel_max", 8)
+
+        import node_discover_subnet
+        class _Subnet(object):
+            def __init__(self, subnet):
+                pass
+            def AllHosts(self):
+                return ["127.0.0.{}".format(idx) for idx in range(1, 7)]
+        monkeypatch.setattr(node_discover_subnet, "IPSubnet", _Subnet)
+        assert node_discover_subnet.NodeDiscoverSubnet(subnet="127.0.0.0/29")
+        # The scan uses a pool of its own instead of sharing the I/O pool with other bulk work
+        assert len(pools) == 1
+        assert pools[0].maxThreads == 8
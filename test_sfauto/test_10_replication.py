@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import pytest
+import random
+from libsf import SolidFireError, sfdefaults
+from . import globalconfig
+from .fake_cluster import APIFailure
+
+def _Engine():
+    from libsf.sfreplication import ReplicationEngine
+    return ReplicationEngine(sfdefaults.mvip, sfdefaults.username, sfdefaults.password, maxConcurrency=4)
+
+def _UnpairedVolumes(count):
+    volumes = [vol for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"] if not vol.get("volumePairs")]
+    return random.sample(volumes, count)
+
+@pytest.mark.usefixtures("fake_cluster_perclass")
+class TestReplicationEngine(object):
+
+    def test_GetVolumePairs(self):
+        print()
+        paired = [vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"] if vol.get("volumePairs")]
+        with _Engine() as engine:
+            pairs = engine.GetVolumePairs()
+        assert sorted(pairs.keys()) == sorted(paired)
+
+    def test_PairVolumes(self):
+        print()
+        volumes = _UnpairedVolumes(8)
+        volume_map = {local["volumeID"] : remote["volumeID"] for local, remote in zip(volumes[:4], volumes[4:])}
+        with _Engine() as engine:
+            errors = engine.PairVolumes(engine, volume_map)
+            assert errors == {vol_id : None for vol_id in volume_map}
+            pairs = engine.GetVolumePairs()
+        for local_id, remote_id in volume_map.items():
+            assert pairs[local_id]["volumePairs"][0]["remoteVolumeID"] == remote_id
+            assert pairs[remote_id]["volumePairs"][0]["remoteVolumeID"] == local_id
+
+        # Volumes that are already paired fail on their own without stopping the rest
+        more = _UnpairedVolumes(2)
+        volume_map = {volumes[0]["volumeID"] : more[0]["volumeID"], more[1]["volumeID"] : volumes[1]["volumeID"]}
+        with _Engine() as engine:
+            errors = engine.PairVolumes(engine, volume_map)
+        assert all([isinstance(errors[vol_id], SolidFireError) for vol_id in volume_map])
+
+    def test_negative_PairVolumesFailure(self):
+        print()
+        volumes = _UnpairedVolumes(4)
+        volume_map = {volumes[0]["volumeID"] : volumes[1]["volumeID"], volumes[2]["volumeID"] : volumes[3]["volumeID"]}
+        with _Engine() as engine:
+            with APIFailure("StartVolumePairing"):
+                errors = engine.PairVolumes(engine, volume_map)
+            assert all([isinstance(errors[vol_id], SolidFireError) for vol_id in volume_map])
+            with APIFailure("CompleteVolumePairing"):
+                errors = engine.PairVolumes(engine, volume_map)
+            assert all([isinstance(errors[vol_id], SolidFireError) for vol_id in volume_map])
+        assert not [vol for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"] if vol["volumeID"] in volume_map and vol.get("volumePairs")]
+
+    def test_PauseResumeVolumes(self):
+        print()
+        paired = [vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"] if vol.get("volumePairs")]
+        volume_ids = random.sample(paired, 3)
+        with _Engine() as engine:
+            assert engine.PauseVolumes(volume_ids) == {vol_id : None for vol_id in volume_ids}
+            pairs = engine.GetVolumePairs()
+            assert all([pairs[vol_id]["volumePairs"][0]["remoteReplication"]["state"] == "PausedManual" for vol_id in volume_ids])
+            assert engine.ResumeVolumes(volume_ids) == {vol_id : None for vol_id in volume_ids}
+            pairs = engine.GetVolumePairs()
+            assert all([pairs[vol_id]["volumePairs"][0]["remoteReplication"]["state"] == "Active" for vol_id in volume_ids])
+
+    def test_MatchVolumesByName(self):
+        print()
+        from libsf.sfreplication import ReplicationEngine
+        local = [{"volumeID" : 1, "name" : "a"}, {"volumeID" : 2, "name" : "b"}, {"volumeID" : 3, "name" : "c"}]
+        remote = [{"volumeID" : 11, "name" : "a"}, {"volumeID" : 12, "name" : "b"}, {"volumeID" : 14, "name" : "d"}]
+        assert ReplicationEngine.MatchVolumesByName(local, remote) == {1 : 11, 2 : 12}
+        assert ReplicationEngine.MatchVolumesByName(local, remote, pairedVolumeIDs=[2]) == {1 : 11}
+
+    def test_SharedEngineClose(self):
+        print()
+        from libsf.sfreplication import ReplicationEngine
+        engine = ReplicationEngine.Get(sfdefaults.mvip, sfdefaults.username, sfdefaults.password)
+        assert ReplicationEngine.Get(sfdefaults.mvip, sfdefaults.username, sfdefaults.password) is engine
+        engine.Close()
+        other = ReplicationEngine.Get(sfdefaults.mvip, sfdefaults.username, sfdefaults.password)
+        assert other is not engine
+        ReplicationEngine.CloseAll()
+        assert ReplicationEngine.Get(sfdefaults.mvip, sfdefaults.username, sfdefaults.password) is not other
+
+    def test_EngineConcurrencyOverride(self, monkeypatch):
+        print()
+        from libsf.sfreplication import ReplicationEngine
+        # Overrides from the environment are strings
+        monkeypatch.setattr(sfdefaults, "cluster_api_parallel_max", "3")
+        with ReplicationEngine(sfdefaults.mvip, sfdefaults.username, sfdefaults.password) as engine:
+            assert engine.maxConcurrency == 3
+            assert sorted(engine.GetVolumePairs().keys()) == sorted([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"] if vol.get("volumePairs")])
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import pytest
+import threading
+import time
+from libsf import sfdefaults
+from .fake_client import FakeParamikoSSHClient, FakeParamikoSFTP
+from .testutil import RandomIP
+
+@pytest.fixture
+def connect_counts(monkeypatch):
+    counts = {"connect" : 0, "sftp" : 0}
+    original_connect = FakeParamikoSSHClient.connect
+    def _Connect(self, ipAddress, **kwargs):
+        counts["connect"] += 1
+        return original_connect(self, ipAddress, **kwargs)
+    def _OpenSFTP(self):
+        counts["sftp"] += 1
+        return FakeParamikoSFTP()
+    monkeypatch.setattr(FakeParamikoSSHClient, "connect", _Connect)
+    monkeypatch.setattr(FakeParamikoSSHClient, "open_sftp", _OpenSFTP)
+    return counts
+
+@pytest.mark.usefixtures("fake_cluster_perclass")
+class TestSSHConnectionPool(object):
+
+    def test_SSHConnectionPoolReuse(self, connect_counts):
+        print()
+        from libsf import SSHConnectionPool
+        pool = SSHConnectionPool()
+        ip = RandomIP()
+        with pool.Session(ip, "root", "password") as ssh:
+            ssh.RunCommand("hostname")
+        with pool.Session(ip, "root", "password") as ssh:
+            ssh.RunCommand("hostname")
+            ssh.PutFile(__file__, "/tmp/one")
+            ssh.PutFile(__file__, "/tmp/two")
+        assert connect_counts == {"connect" : 1, "sftp" : 1}
+
+        # A different user or password gets a different login
+        pool.Get(ip, "admin", "password")
+        pool.Get(ip, "root", "other")
+        assert connect_counts["connect"] == 3
+
+    def test_SSHConnectionPoolConcurrent(self, connect_counts):
+        print()
+        from libsf import SSHConnectionPool
+        pool = SSHConnectionPool()
+        ip = RandomIP()
+        pool.Get(ip, "root", "password")
+        connections = []
+        def _Run():
+            with pool.Session(ip, "root", "password") as ssh:
+                ssh.RunCommand("hostname")
+                connections.append(ssh)
+        threads = [threading.Thread(target=_Run) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set([id(ssh) for ssh in connections])) == 1
+        assert connect_counts["connect"] == 1
+
+    def test_SSHConnectionPoolIdle(self, connect_counts, virtual_clock):
+        print()
+        from libsf import SSHConnectionPool
+        pool = SSHConnectionPool()
+        ip = RandomIP()
+        first = pool.Get(ip, "root", "password")
+        virtual_clock.Advance(sfdefaults.ssh_idle_timeout / 2)
+        assert pool.Get(ip, "root", "password") is first
+        virtual_clock.Advance(sfdefaults.ssh_idle_timeout + 1)
+        second = pool.Get(ip, "root", "password")
+        assert second is not first
+        assert not first.IsAlive()
+        assert connect_counts["connect"] == 2
+
+    def test_negative_SSHConnectionPoolBroken(self, connect_counts):
+        print()
+        from libsf import SSHConnectionPool
+        pool = SSHConnectionPool()
+        ip = RandomIP()
+        first = pool.Get(ip, "root", "password")
+        first.client.close()
+        first.client = None
+        second = pool.Get(ip, "root", "password")
+        assert second is not first
+        assert second.IsAlive()
+
+        pool.Discard(second)
+        assert not second.IsAlive()
+        assert pool.Get(ip, "root", "password") is not second
+        assert connect_counts["connect"] == 3
+
+    def test_SSHConnectionPoolDiscardInUse(self, slow_channel):
+        print()
+        from libsf import SSHConnectionPool
+        pool = SSHConnectionPool()
+        ip = RandomIP()
+        first = pool.Get(ip, "root", "password")
+        results = []
+        thread = threading.Thread(target=lambda: results.append(first.RunCommand("sleep 1")))
+        thread.daemon = True
+        thread.start()
+        while first.activeCount <= 0:
+            time.sleep(0.01)
+
+        # Another password gets its own connection without closing the one in use
+        other = pool.Get(ip, "root", "other")
+        assert other is not first
+        assert first.IsAlive()
+
+        # Discarding a connection in use leaves it open until the command finishes
+        pool.Discard(first)
+        assert first.IsAlive()
+        assert pool.Get(ip, "root", "password") is not first
+        slow_channel.status_event.set()
+        thread.join()
+        assert results == [(0, "done\n", "")]
+        assert not first.IsAlive()
+        assert other.IsAlive()
+
+    def test_negative_SSHConnectionPoolConnectFailure(self):
+        print()
+        from libsf import SSHConnectionPool, SolidFireError
+        from .fake_client import ClientConnectFailure
+        pool = SSHConnectionPool()
+        ip = RandomIP()
+        with ClientConnectFailure(ip):
+            with pytest.raises(SolidFireError):
+                pool.Get(ip, "root", "password")
+        assert pool.Get(ip, "root", "password").IsAlive()
+
+class _SlowChannel(object):
+    """Channel for a command that exits when its event is set"""
+
+    def __init__(self):
+        self.status_event = threading.Event()
+        self.closed = False
+
+    def exit_status_ready(self):
+        raise AssertionError("Polled the channel instead of waiting for it")
+
+    def recv_exit_status(self):
+        return 0
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def slow_channel(monkeypatch):
+    from .fake_client import FakeParamikoStream
+    channel = _SlowChannel()
+    def _ExecCommand(self, command, **kwargs):
+        stdout = FakeParamikoStream("done")
+        stdout.channel = channel
+        return None, stdout, FakeParamikoStream("")
+    monkeypatch.setattr(FakeParamikoSSHClient, "exec_command", _ExecCommand)
+    return channel
+
+@pytest.mark.usefixtures("fake_cluster_perclass")
+class TestSSHRunCommand(object):
+
+    def test_SSHRunCommandWaitsForExit(self, slow_channel):
+        print()
+        from libsf import SSHConnectionPool
+        ssh = SSHConnectionPool().Get(RandomIP(), "root", "password")
+        timer = threading.Timer(0.05, slow_channel.status_event.set)
+        timer.start()
+        assert ssh.RunCommand("sleep 1") == (0, "done\n", "")
+        timer.join()
+
+    def test_negative_SSHRunCommandTimeout(self, slow_channel):
+        print()
+        from libsf import SSHConnectionPool, SFTimeoutError
+        from libsf.threadutil import CancellationToken
+        ssh = SSHConnectionPool().Get(RandomIP(), "root", "password")
+        with CancellationToken(timeout=0.2).Activate():
+            with pytest.raises(SFTimeoutError):
+                ssh.RunCommand("sleep 1000")
+        assert slow_channel.closed
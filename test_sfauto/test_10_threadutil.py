@@ -0,0 +1,517 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import pytest
+import random
+import threading
+import time
+from libsf import SolidFireError
+from .testutil import RandomString
+
+def _Square(value):
+    time.sleep(random.random() / 100)
+    return value * value
+
+def _FailOnFive(value):
+    if value == 5:
+        raise SolidFireError("Failed on {}".format(value))
+    return value
+
+class TestThreadPool(object):
+
+    def test_Map(self):
+        print()
+        from libsf.threadutil import ThreadPool
+        pool = ThreadPool(maxThreads=4)
+        assert pool.Map(_Square, range(50)) == [value * value for value in range(50)]
+        assert pool.Map(_Square, []) == []
+        assert pool.results == []
+
+    def test_ImapUnordered(self):
+        print()
+        from libsf.threadutil import ThreadPool
+        pool = ThreadPool(maxThreads=4)
+        assert sorted(pool.ImapUnordered(_Square, iter(range(50)), maxInflight=3)) == [value * value for value in range(50)]
+
+    def test_ImapUnorderedBackpressure(self):
+        print()
+        from libsf.threadutil import ThreadPool
+        pool = ThreadPool(maxThreads=8)
+        lock = threading.Lock()
+        state = {"running" : 0, "peak" : 0}
+        def _Track(value):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.01)
+            with lock:
+                state["running"] -= 1
+            return value
+        # Items are pulled from the generator lazily, so it is never more than maxInflight ahead of the results
+        taken = []
+        def _Items():
+            for value in range(40):
+                taken.append(value)
+                yield value
+        for count, _ in enumerate(pool.ImapUnordered(_Track, _Items(), maxInflight=2), start=1):
+            assert len(taken) <= count + 2
+        assert state["peak"] <= 2
+
+    def test_negative_MapFailure(self):
+        print()
+        from libsf.threadutil import ThreadPool
+        pool = ThreadPool(maxThreads=4)
+        with pytest.raises(SolidFireError):
+            pool.Map(_FailOnFive, range(1000), maxInflight=4)
+
+    def test_AsCompleted(self):
+        print()
+        from libsf.threadutil import ThreadPool, AsCompleted
+        pool = ThreadPool(maxThreads=4)
+        results = [pool.Post(_Square, value) for value in range(20)]
+        assert sorted([res.Get() for res in AsCompleted(results)]) == [value * value for value in range(20)]
+        assert pool.Wait()
+        assert pool.results == []
+
+class TestSharedPools(object):
+
+    def test_IOPool(self, monkeypatch):
+        print()
+        from libsf import sfdefaults, threadutil
+        threadutil.ShutdownGlobalPool()
+        monkeypatch.setattr(sfdefaults, "concurrency", "7")
+        pool = threadutil.IOPool()
+        assert pool.maxThreads == 7
+        assert not pool.useMultiprocessing
+        assert threadutil.IOPool() is pool
+        assert threadutil.GlobalPool() is pool
+        threadutil.ShutdownGlobalPool()
+        assert threadutil.IOPool() is not pool
+
+    def test_CPUPool(self):
+        print()
+        from libsf import threadutil
+        pool = threadutil.CPUPool()
+        assert pool.maxThreads == threadutil.CPU_THREADS
+        assert threadutil.CPUPool() is pool
+        assert threadutil.CPUPool() is not threadutil.IOPool()
+        assert pool.Map(_Square, range(10)) == [value * value for value in range(10)]
+
+def _RetryableError():
+    from libsf import SolidFireAPIError
+    return SolidFireAPIError("GetClusterInfo", {}, "1.1.1.1", "https://1.1.1.1/json-rpc/9.0", "xDBConnectionLoss", 500, "DB connection loss")
+
+class TestAdaptiveLimiter(object):
+
+    def test_AdaptiveLimiterBackoff(self):
+        print()
+        from libsf.threadutil import AdaptiveLimiter
+        limiter = AdaptiveLimiter(maxLimit=8)
+        early_start = limiter.Acquire()
+        with pytest.raises(SolidFireError):
+            with limiter.Slot("GetClusterInfo"):
+                raise _RetryableError()
+        assert limiter.Limit == 4
+
+        # A call that started before the cut should not cut again
+        limiter.Release(early_start, failed=True, overloaded=True)
+        assert limiter.Limit == 4
+
+        # Non-retryable errors do not count as overload
+        with pytest.raises(ValueError):
+            with limiter.Slot("GetClusterInfo"):
+                raise ValueError()
+        assert limiter.Limit == 4
+
+        # Growing by one takes about a full limit's worth of successes
+        for _ in range(5):
+            with limiter.Slot("GetClusterInfo"):
+                pass
+        assert limiter.Limit == 5
+        assert limiter.inflight == 0
+
+    def test_AdaptiveLimiterLatencySpike(self):
+        print()
+        from libsf.threadutil import AdaptiveLimiter
+        limiter = AdaptiveLimiter(maxLimit=8, spikeFactor=4)
+        for _ in range(AdaptiveLimiter.LATENCY_MIN_SAMPLES):
+            limiter.Release(limiter.Acquire(), "ListDrives")
+        limiter.Release(limiter.Acquire() - 5, "ListDrives")
+        assert limiter.Limit == 4
+        # Slow calls of another kind are compared against their own history
+        limiter.Release(limiter.Acquire() - 5, "ListVolumes")
+        assert limiter.Limit == 4
+
+    def test_AdaptiveLimiterConcurrency(self):
+        print()
+        from libsf.threadutil import AdaptiveLimiter, ThreadPool
+        limiter = AdaptiveLimiter(maxLimit=3)
+        lock = threading.Lock()
+        state = {"running" : 0, "peak" : 0}
+        def _Limited(_):
+            with limiter.Slot():
+                with lock:
+                    state["running"] += 1
+                    state["peak"] = max(state["peak"], state["running"])
+                time.sleep(0.01)
+                with lock:
+                    state["running"] -= 1
+        ThreadPool(maxThreads=8).Map(_Limited, range(30))
+        assert 1 < state["peak"] <= 3
+
+    def test_negative_AdaptiveLimiterCancelled(self):
+        print()
+        from libsf import SFCancelledError, SFTimeoutError
+        from libsf.threadutil import AdaptiveLimiter, CancellationToken
+        limiter = AdaptiveLimiter(maxLimit=1)
+        start_time = limiter.Acquire()
+        token = CancellationToken()
+        token.Cancel("Stop")
+        with token.Activate():
+            with pytest.raises(SFCancelledError):
+                limiter.Acquire()
+        start = time.time()
+        with CancellationToken(timeout=0.2).Activate():
+            with pytest.raises(SFTimeoutError):
+                limiter.Acquire()
+        assert time.time() - start < 5
+        assert limiter.inflight == 1
+        limiter.Release(start_time)
+
+    @pytest.mark.usefixtures("fake_cluster_perclass")
+    def test_AdaptiveLimiterAPI(self):
+        print()
+        from libsf import sfdefaults, SolidFireClusterAPI
+        from libsf.threadutil import AdaptiveLimiter
+        api = SolidFireClusterAPI(sfdefaults.mvip, sfdefaults.username, sfdefaults.password)
+        api.Call("GetClusterInfo", {})
+        limiter = AdaptiveLimiter.Get((sfdefaults.mvip, 443))
+        assert limiter.inflight == 0
+        assert limiter.maxLimit == int(sfdefaults.concurrency)
+
+    @pytest.mark.parametrize("setting", ["False", "0", False])
+    @pytest.mark.usefixtures("fake_cluster_perclass")
+    def test_AdaptiveLimiterDisabled(self, setting, monkeypatch):
+        print()
+        from libsf import sfdefaults, SolidFireClusterAPI
+        from libsf.threadutil import AdaptiveLimiter
+        def _Get(key):
+            raise AssertionError("Used the limiter when it is turned off")
+        monkeypatch.setattr(AdaptiveLimiter, "Get", _Get)
+        # Overrides from the environment are strings
+        monkeypatch.setattr(sfdefaults, "api_adaptive_concurrency", setting)
+        api = SolidFireClusterAPI(sfdefaults.mvip, sfdefaults.username, sfdefaults.password)
+        api.Call("GetClusterInfo", {})
+
+class TestTokenBucket(object):
+
+    def test_TokenBucket(self):
+        print()
+        from libsf.threadutil import TokenBucket
+        bucket = TokenBucket(rate=20, burst=5)
+        assert sum([bucket.Take() for _ in range(5)]) == 0
+        start = time.time()
+        waits = [bucket.Take() for _ in range(4)]
+        assert time.time() - start >= 0.15
+        assert all([wait > 0 for wait in waits])
+        assert bucket.waitCount == 4
+
+    def test_TokenBucketUnlimited(self):
+        print()
+        from libsf.threadutil import TokenBucket
+        assert TokenBucket.Get(RandomString(8), 0, 10) is None
+
+    def test_TokenBucketShared(self, monkeypatch):
+        print()
+        from libsf.threadutil import TokenBucket, ThreadPool
+        monkeypatch.setattr(TokenBucket, "_buckets", {})
+        key = RandomString(8)
+        start = time.time()
+        ThreadPool(maxThreads=4).Map(lambda _: TokenBucket.Get(key, 50, 2).Take(), range(12))
+        assert time.time() - start >= 0.18
+        wait_time, wait_count = TokenBucket.WaitStats()[str(key)]
+        assert wait_count > 0
+        assert wait_time > 0
+
+    @pytest.mark.usefixtures("fake_cluster_perclass")
+    def test_TokenBucketAPI(self, monkeypatch):
+        print()
+        from libsf import sfdefaults, SolidFireClusterAPI, GetAPIMethodClass
+        from libsf.threadutil import TokenBucket
+        monkeypatch.setattr(TokenBucket, "_buckets", {})
+        monkeypatch.setattr(sfdefaults, "api_read_rate", 1)
+        monkeypatch.setattr(sfdefaults, "api_read_burst", 1)
+        api = SolidFireClusterAPI(sfdefaults.mvip, sfdefaults.username, sfdefaults.password)
+        for _ in range(2):
+            api.Call("GetClusterInfo", {})
+        stats = TokenBucket.WaitStats()
+        assert list(stats.keys()) == [str((sfdefaults.mvip, "read"))]
+        assert stats[str((sfdefaults.mvip, "read"))][1] == 1
+        assert GetAPIMethodClass("CloneVolume") == "clone"
+        assert GetAPIMethodClass("ListDrives") == "read"
+        assert GetAPIMethodClass("AddDrives") == "write"
+
+class TestCancellation(object):
+
+    def test_negative_GetWithTimeout(self):
+        print()
+        from libsf import SFTimeoutError
+        from libsf.threadutil import ThreadPool
+        event = threading.Event()
+        result = ThreadPool(maxThreads=2).Post(event.wait, 5)
+        with pytest.raises(SFTimeoutError):
+            result.GetWithTimeout(0.2)
+        event.set()
+        assert result.GetWithTimeout(5)
+
+    def test_CancellationToken(self):
+        print()
+        from libsf import SFTimeoutError, SFCancelledError
+        from libsf.threadutil import CancellationToken
+        parent = CancellationToken(timeout=60)
+        child = CancellationToken(timeout=600, parent=parent)
+        assert child.deadline == parent.deadline
+        assert 0 < child.Remaining() <= 60
+        assert child.Remaining(5) == 5
+        child.Check()
+        parent.Cancel("Stop")
+        assert child.IsCancelled()
+        with pytest.raises(SFCancelledError):
+            child.Check()
+
+        token = CancellationToken(timeout=0.2)
+        start = time.time()
+        with pytest.raises(SFTimeoutError):
+            token.Sleep(30)
+        assert time.time() - start < 5
+
+    def test_negative_TaskGroupFailFast(self):
+        print()
+        from libsf import SFCancelledError
+        from libsf.threadutil import ThreadPool, TaskGroup, Sleep
+        def _Poll():
+            for _ in range(300):
+                Sleep(0.1)
+        start = time.time()
+        group = TaskGroup(ThreadPool(maxThreads=4))
+        sibling = group.Post(_Poll)
+        group.Post(_FailOnFive, 5)
+        with pytest.raises(SolidFireError) as ex:
+            group.Wait()
+        assert not isinstance(ex.value, SFCancelledError)
+        assert time.time() - start < 10
+        with pytest.raises(SFCancelledError):
+            sibling.Get()
+
+    def test_negative_TaskGroupFailFastOtherError(self):
+        print()
+        from libsf import SFCancelledError
+        from libsf.threadutil import ThreadPool, TaskGroup, Sleep
+        def _Poll():
+            for _ in range(300):
+                Sleep(0.1)
+        def _Fail():
+            raise ValueError("Not a SolidFireError")
+        start = time.time()
+        group = TaskGroup(ThreadPool(maxThreads=4))
+        sibling = group.Post(_Poll)
+        group.Post(_Fail)
+        with pytest.raises(ValueError):
+            group.Wait()
+        assert group.token.IsCancelled()
+        assert time.time() - start < 10
+        with pytest.raises(SFCancelledError):
+            sibling.Get()
+
+    def test_negative_TaskGroupTimeout(self):
+        print()
+        from libsf import SFTimeoutError
+        from libsf.threadutil import ThreadPool, TaskGroup, Sleep
+        with TaskGroup(ThreadPool(maxThreads=2), timeout=0.3) as group:
+            group.Post(Sleep, 30)
+            with pytest.raises(SFTimeoutError):
+                group.Wait()
+
+    def test_TaskGroup(self):
+        print()
+        from libsf.threadutil import ThreadPool, TaskGroup
+        group = TaskGroup(ThreadPool(maxThreads=4))
+        for value in range(10):
+            group.Post(_Square, value)
+        assert group.Wait() == [value * value for value in range(10)]
+
+    @pytest.mark.usefixtures("fake_cluster_perclass")
+    def test_negative_CallWithRetryCancelled(self):
+        print()
+        from libsf import sfdefaults, SolidFireClusterAPI, SFCancelledError
+        from libsf.threadutil import CancellationToken
+        api = SolidFireClusterAPI(sfdefaults.mvip, sfdefaults.username, sfdefaults.password)
+        token = CancellationToken()
+        with token.Activate():
+            api.CallWithRetry("GetClusterInfo", {})
+            token.Cancel()
+            with pytest.raises(SFCancelledError):
+                api.CallWithRetry("GetClusterInfo", {})
+
+class TestPriorityPool(object):
+
+    def test_PriorityPoolOrder(self):
+        print()
+        from libsf.threadutil import PriorityPool, RunAtPriority, PRIORITY_CRITICAL, PRIORITY_INTERACTIVE, PRIORITY_BULK
+        pool = PriorityPool(maxThreads=1, agingInterval=3600)
+        gate = threading.Event()
+        order = []
+        blocker = pool.Post(gate.wait, 5)
+        for priority in [PRIORITY_BULK, PRIORITY_INTERACTIVE, PRIORITY_BULK, PRIORITY_CRITICAL]:
+            with RunAtPriority(priority):
+                pool.Post(order.append, priority)
+        assert pool.Stats()[PRIORITY_BULK] == (2, 0)
+        gate.set()
+        assert pool.Wait()
+        assert order == [PRIORITY_CRITICAL, PRIORITY_INTERACTIVE, PRIORITY_BULK, PRIORITY_BULK]
+
+    def test_PriorityPoolAging(self):
+        print()
+        from libsf.threadutil import PriorityPool, RunAtPriority, PRIORITY_CRITICAL, PRIORITY_BULK
+        pool = PriorityPool(maxThreads=1, agingInterval=0.05)
+        gate = threading.Event()
+        order = []
+        pool.Post(gate.wait, 5)
+        with RunAtPriority(PRIORITY_BULK):
+            pool.Post(order.append, "bulk")
+        # Bulk work that has waited long enough goes ahead of critical work posted after it
+        time.sleep(0.2)
+        with RunAtPriority(PRIORITY_CRITICAL):
+            pool.Post(order.append, "critical")
+        gate.set()
+        assert pool.Wait()
+        assert order == ["bulk", "critical"]
+
+    def test_PriorityPoolClassLimit(self):
+        print()
+        from libsf.threadutil import PriorityPool, RunAtPriority, PRIORITY_CRITICAL, PRIORITY_BULK
+        pool = PriorityPool(maxThreads=4, classLimits={PRIORITY_BULK : 2})
+        lock = threading.Lock()
+        state = {"running" : 0, "peak" : 0}
+        gate = threading.Event()
+        def _Bulk(_):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            gate.wait(5)
+            with lock:
+                state["running"] -= 1
+        with RunAtPriority(PRIORITY_BULK):
+            bulk = [pool.Post(_Bulk, value) for value in range(10)]
+        # Critical work still runs promptly while the bulk work holds all of the threads it is allowed
+        with RunAtPriority(PRIORITY_CRITICAL):
+            assert pool.Post(_Square, 3).GetWithTimeout(5) == 9
+        gate.set()
+        assert pool.Wait()
+        assert state["peak"] == 2
+
+    def test_PriorityPoolNested(self):
+        print()
+        from libsf.threadutil import PriorityPool, RunAtPriority, CurrentPriority, PRIORITY_BULK
+        pool = PriorityPool(maxThreads=2)
+        with RunAtPriority(PRIORITY_BULK):
+            assert pool.Map(lambda _: CurrentPriority(), range(5)) == [PRIORITY_BULK] * 5
+        assert sorted(pool.ImapUnordered(_Square, range(20))) == sorted([value * value for value in range(20)])
+
+    def test_negative_PriorityPoolShutdown(self):
+        print()
+        from libsf import SFCancelledError
+        from libsf.threadutil import PriorityPool
+        pool = PriorityPool(maxThreads=1)
+        gate = threading.Event()
+        pool.Post(gate.wait, 5)
+        queued = pool.Post(_Square, 2)
+        pool.Shutdown()
+        gate.set()
+        with pytest.raises(SFCancelledError):
+            queued.Get()
+
+class TestPoolTelemetry(object):
+
+    def test_PoolTelemetryCounts(self):
+        print()
+        from libsf.threadutil import ThreadPool
+        pool = ThreadPool(maxThreads=4)
+        assert sorted(pool.ImapUnordered(_Square, range(20))) == sorted([value * value for value in range(20)])
+        with pytest.raises(SolidFireError):
+            pool.Post(_FailOnFive, 5).Get()
+        snapshot = pool.telemetry.Snapshot()
+        assert (snapshot["submitted"], snapshot["completed"], snapshot["failed"]) == (21, 20, 1)
+        assert (snapshot["running"], snapshot["queued"]) == (0, 0)
+        assert sum(snapshot["histogram"]) == 21
+        assert 0 < snapshot["latency"]["p50"] <= snapshot["latency"]["p99"] <= 1
+
+    def test_PoolTelemetryStragglers(self):
+        print()
+        from libsf.threadutil import PriorityPool
+        pool = PriorityPool(maxThreads=1)
+        gate = threading.Event()
+        pool.Post(gate.wait, 5)
+        pool.Post(_Square, 3)
+        for _ in range(100):
+            snapshot = pool.telemetry.Snapshot()
+            if snapshot["running"]:
+                break
+            time.sleep(0.05)
+        assert (snapshot["running"], snapshot["queued"]) == (1, 1)
+        assert snapshot["stragglers"][0][0] == "wait(5)"
+        gate.set()
+        assert pool.Wait()
+        assert pool.telemetry.Snapshot()["completed"] == 2
+
+    def test_PoolTelemetryPercentile(self):
+        print()
+        from libsf.threadutil import PoolTelemetry
+        histogram = [0] * len(PoolTelemetry.LATENCY_BUCKETS)
+        assert PoolTelemetry.Percentile(histogram, 0.5, 0) is None
+        histogram[PoolTelemetry.LATENCY_BUCKETS.index(1)] = 90
+        histogram[-1] = 10
+        assert PoolTelemetry.Percentile(histogram, 0.5, 4000) == 1
+        assert PoolTelemetry.Percentile(histogram, 0.95, 4000) == 4000
+
+    def test_PoolTelemetryThroughput(self, virtual_clock):
+        print()
+        from libsf.threadutil import PoolTelemetry, ProgressReporter
+        telemetry = PoolTelemetry()
+        reporter = ProgressReporter(telemetry, "test", total=100, interval=3600)
+        for _ in range(40):
+            key = telemetry.Started()
+            virtual_clock.Advance(0.5)
+            telemetry.Finished(key)
+        status = reporter.Status()
+        assert status["throughput"] == pytest.approx(2)
+        assert status["eta"] == pytest.approx(30)
+        assert status["latency"]["p50"] == 0.5
+
+    def test_ProgressReporterInterval(self, virtual_clock):
+        print()
+        from libsf.threadutil import PoolTelemetry, ProgressReporter
+        reporter = ProgressReporter(PoolTelemetry(), "test", total=10, interval=60, statusFile="")
+        assert reporter.Update() is not None
+        virtual_clock.Advance(30)
+        assert reporter.Update() is None
+        virtual_clock.Advance(31)
+        assert reporter.Update() is not None
+
+    def test_ProgressReporter(self, tmpdir):
+        print()
+        import json
+        from libsf.threadutil import ThreadPool, ProgressReporter
+        pool = ThreadPool(maxThreads=4)
+        pool.Map(_Square, range(5))
+        status_file = str(tmpdir.join("progress.json"))
+        with ProgressReporter(pool.telemetry, "test", total=10, interval=3600, statusFile=status_file) as reporter:
+            assert reporter.Update()["finished"] == 0
+            pool.Map(_Square, range(10))
+            # Reports are rate limited unless forced
+            assert reporter.Update() is None
+        with open(status_file) as infile:
+            status = json.load(infile)
+        assert status["label"] == "test"
+        assert (status["finished"], status["total"], status["failed"], status["eta"]) == (10, 10, 0, 0)
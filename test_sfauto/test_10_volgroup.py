@@ -4,6 +4,7 @@
 from __future__ import print_function
 import pytest
 import random
+import threading
 from libsf import InvalidArgumentError
 from . import globalconfig
 from .fake_cluster import APIFailure, APIVersion
@@ -64,6 +65,76 @@ class TestCreateVolgroup(object):
                                  volume_ids=volume_ids,
                                  test=True)
 
+    def test_CreateVolgroupSharded(self):
+        print()
+        name = RandomString(random.randint(6, 16))
+        iqns = [RandomIQN() for _ in range(random.randint(65, 200))]
+        volume_ids = random.sample([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]], random.randint(2, 15))
+        from volgroup_create import CreateVolumeGroup
+        assert CreateVolumeGroup(volgroup_name=name,
+                                 iqns=iqns,
+                                 volume_ids=volume_ids,
+                                 shard=True)
+
+        shards = [group for group in globalconfig.cluster.ListVolumeAccessGroups({})["volumeAccessGroups"] if group["name"].startswith(name + "-")]
+        assert len(shards) == (len(iqns) + 63) // 64
+        assert all([len(group["initiators"]) <= 64 for group in shards])
+        assert sorted([init for group in shards for init in group["initiators"]]) == sorted([iqn.lower() for iqn in iqns])
+        assert all([sorted(group["volumes"]) == sorted(volume_ids) for group in shards])
+        from libsf import sfdefaults
+        from libsf.sfvolgroup import ShardedVolGroup
+        group = ShardedVolGroup(name, sfdefaults.mvip, sfdefaults.username, sfdefaults.password)
+        assert len(group.shards) >= 2
+        assert sorted(group.volumes) == sorted(volume_ids)
+
+        # Adding more goes into the existing shards first, and new volumes go to every shard
+        more_iqns = [RandomIQN() for _ in range((64 - len(iqns) % 64) % 64)]
+        more_volume_ids = random.sample([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"] if vol["volumeID"] not in volume_ids], 2)
+        assert CreateVolumeGroup(volgroup_name=name,
+                                 iqns=more_iqns,
+                                 volume_ids=more_volume_ids,
+                                 shard=True)
+        shards = [group for group in globalconfig.cluster.ListVolumeAccessGroups({})["volumeAccessGroups"] if group["name"].startswith(name + "-")]
+        assert len(shards) == (len(iqns) + 63) // 64
+        assert all([sorted(group["volumes"]) == sorted(volume_ids + more_volume_ids) for group in shards])
+        group = ShardedVolGroup(name, sfdefaults.mvip, sfdefaults.username, sfdefaults.password)
+        assert sorted(group.volumes) == sorted(volume_ids + more_volume_ids)
+        assert not CreateVolumeGroup(volgroup_name=name,
+                                     shard=True,
+                                     strict=True)
+
+    def test_negative_CreateVolgroupShardedTooManyShards(self):
+        print()
+        volume_ids = random.sample([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]], random.randint(2, 15))
+        from volgroup_create import CreateVolumeGroup
+        name = RandomString(random.randint(6, 16))
+        assert not CreateVolumeGroup(volgroup_name=name,
+                                     iqns=[RandomIQN() for _ in range(64 * 4 + 1)],
+                                     volume_ids=volume_ids,
+                                     shard=True)
+        assert not [group for group in globalconfig.cluster.ListVolumeAccessGroups({})["volumeAccessGroups"] if group["name"].startswith(name + "-")]
+
+    def test_negative_ShardedVolgroupNoRoom(self):
+        print()
+        from libsf import sfdefaults
+        from libsf.sfvolgroup import ShardedVolGroup
+        group = ShardedVolGroup(RandomString(random.randint(6, 16)), sfdefaults.mvip, sfdefaults.username, sfdefaults.password)
+        group.maxInitiators = 0
+        with pytest.raises(InvalidArgumentError):
+            group.Add(initiatorList=[RandomIQN()])
+        group.maxVolumes = 0
+        with pytest.raises(InvalidArgumentError):
+            group.Add(volumeIDList=[random.choice(globalconfig.cluster.ListActiveVolumes({})["volumes"])["volumeID"]])
+        assert not group.shards
+
+    def test_negative_CreateVolgroupShardedLimitsFailure(self):
+        print()
+        from volgroup_create import CreateVolumeGroup
+        with APIFailure("GetLimits"):
+            assert not CreateVolumeGroup(volgroup_name=RandomString(random.randint(6, 16)),
+                                         iqns=[RandomIQN() for _ in range(random.randint(1, 5))],
+                                         shard=True)
+
     def test_negative_CreateVolgroupFailure(self):
         print()
         volume_ids = random.sample([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]], random.randint(2, 15))
@@ -382,6 +453,106 @@ class TestModifyVolgroupLunAssignments(object):
         assert ModifyVolgroupLunAssignments(method="vol",
                                             volgroup_id=volgroup_id)
 
+@pytest.mark.usefixtures("fake_cluster_perclass")
+class TestVolgroupApplyMembership(object):
+
+    def test_ApplyMembership(self):
+        print()
+        volgroup = random.choice([group for group in globalconfig.cluster.ListVolumeAccessGroups({})["volumeAccessGroups"] if len(group["initiators"]) > 1 and len(group["volumes"]) > 0])
+        all_volume_ids = [vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]]
+        add_volumes = random.sample([vid for vid in all_volume_ids if vid not in volgroup["volumes"]], random.randint(1, 5))
+        remove_volumes = random.sample(volgroup["volumes"], 1)
+        add_initiators = [RandomIQN() for _ in range(random.randint(1, 5))]
+        remove_initiators = [volgroup["initiators"][0].upper()]
+
+        from libsf import sfdefaults
+        from libsf.sfcluster import SFCluster
+        group = SFCluster(sfdefaults.mvip, sfdefaults.username, sfdefaults.password).FindVolumeAccessGroup(volgroupID=volgroup["volumeAccessGroupID"])
+        group.ApplyMembership(addInitiators=add_initiators + [volgroup["initiators"][-1]],
+                              removeInitiators=remove_initiators,
+                              addVolumes=add_volumes,
+                              removeVolumes=remove_volumes)
+
+        assert set(group.volumes) == set(volgroup["volumes"]).union(add_volumes).difference(remove_volumes)
+        assert set(init.lower() for init in group.initiators) == set(init.lower() for init in volgroup["initiators"][1:] + add_initiators)
+        assert len(group.initiators) == len(set(init.lower() for init in group.initiators))
+
+    def test_negative_ApplyMembershipFailure(self):
+        print()
+        volgroup = random.choice(globalconfig.cluster.ListVolumeAccessGroups({})["volumeAccessGroups"])
+        from libsf import sfdefaults, SolidFireError
+        from libsf.sfcluster import SFCluster
+        group = SFCluster(sfdefaults.mvip, sfdefaults.username, sfdefaults.password).FindVolumeAccessGroup(volgroupID=volgroup["volumeAccessGroupID"])
+        with APIFailure("ModifyVolumeAccessGroup"):
+            with pytest.raises(SolidFireError):
+                group.ApplyMembership(addInitiators=[RandomIQN()])
+
+@pytest.mark.usefixtures("fake_cluster_perclass")
+class TestVolgroupBatcher(object):
+
+    def test_VolgroupBatcher(self):
+        print()
+        volgroup = random.choice(globalconfig.cluster.ListVolumeAccessGroups({})["volumeAccessGroups"])
+        from libsf import sfdefaults
+        from libsf.sfvolgroup import VolgroupBatcher
+        batcher = VolgroupBatcher(sfdefaults.mvip, sfdefaults.username, sfdefaults.password, window=0)
+        iqns = [RandomIQN() for _ in range(8)]
+        errors = []
+        def _Add(iqn):
+            try:
+                batcher.AddInitiators(volgroup["volumeAccessGroupID"], [iqn])
+            except Exception as ex:
+                errors.append(ex)
+        threads = [threading.Thread(target=_Add, args=(iqn,)) for iqn in iqns]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors
+        group = [group for group in globalconfig.cluster.ListVolumeAccessGroups({})["volumeAccessGroups"] if group["volumeAccessGroupID"] == volgroup["volumeAccessGroupID"]][0]
+        assert set(iqn.lower() for iqn in iqns).issubset(group["initiators"])
+
+    def test_negative_VolgroupBatcherLeaderFails(self, monkeypatch):
+        print()
+        volgroup_id = random.choice(globalconfig.cluster.ListVolumeAccessGroups({})["volumeAccessGroups"])["volumeAccessGroupID"]
+        from libsf import sfdefaults, threadutil, SolidFireError
+        from libsf.sfvolgroup import VolgroupBatcher
+        batcher = VolgroupBatcher(sfdefaults.mvip, sfdefaults.username, sfdefaults.password, window=0)
+        follower_count = 3
+
+        # The leader dies with something other than a SolidFireError while it is collecting the batch
+        leader_waiting = threading.Event()
+        original_sleep = threadutil.Sleep
+        def _Sleep(seconds):
+            if not leader_waiting.is_set():
+                leader_waiting.set()
+                while len(batcher._pending.get(volgroup_id, [])) < follower_count + 1:
+                    original_sleep(0.01)
+                raise RuntimeError("leader died")
+            original_sleep(seconds)
+        monkeypatch.setattr(threadutil, "Sleep", _Sleep)
+
+        errors = []
+        def _Follow():
+            leader_waiting.wait()
+            try:
+                batcher.AddInitiators(volgroup_id, [RandomIQN()])
+            except SolidFireError as ex:
+                errors.append(ex)
+        followers = [threading.Thread(target=_Follow) for _ in range(follower_count)]
+        for thread in followers:
+            thread.daemon = True
+            thread.start()
+        with pytest.raises(RuntimeError):
+            batcher.AddInitiators(volgroup_id, [RandomIQN()])
+        for thread in followers:
+            thread.join(10)
+        assert not any([thread.is_alive() for thread in followers])
+        assert len(errors) == follower_count
+
+        # The next caller for the group leads a new batch
+        assert batcher.AddInitiators(volgroup_id, [RandomIQN()])
+
 @pytest.mark.usefixtures("fake_cluster_perclass")
 class TestRemoveInitiatorsFromVolgroup(object):
 
@@ -429,6 +600,16 @@ class TestRemoveInitiatorsFromVolgroup(object):
         assert RemoveInitiatorsFromVolgroup(initiators=random.sample(volgroup["initiators"], random.randint(1, min(5, len(volgroup["initiators"])))),
                                             volgroup_id=volgroup["volumeAccessGroupID"])
 
+    def test_RemoveInitiatorsFromVolgroupDifferentCase(self):
+        print()
+        volgroup = random.choice([group for group in globalconfig.cluster.ListVolumeAccessGroups({})["volumeAccessGroups"] if len(group["initiators"]) > 0])
+        remove = random.sample(volgroup["initiators"], random.randint(1, min(5, len(volgroup["initiators"]))))
+        from volgroup_remove_initiators import RemoveInitiatorsFromVolgroup
+        assert RemoveInitiatorsFromVolgroup(initiators=[init.upper() for init in remove],
+                                            volgroup_id=volgroup["volumeAccessGroupID"])
+        group = globalconfig.cluster.ListVolumeAccessGroups({"startVolumeAccessGroupID" : volgroup["volumeAccessGroupID"], "limit" : 1})["volumeAccessGroups"][0]
+        assert not set(remove).intersection(group["initiators"])
+
 @pytest.mark.usefixtures("fake_cluster_perclass")
 class TestRemoveVolumesFromVolgroup(object):
 
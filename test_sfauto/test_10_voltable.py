@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import pytest
+import six.moves.cPickle as pickle
+from libsf import InvalidArgumentError, UnknownObjectError
+from . import globalconfig
+
+def _Volumes():
+    volumes = []
+    for vol_id in range(1, 301):
+        volume = {"volumeID" : vol_id,
+                  "name" : "vol{:05d}".format(vol_id),
+                  "accountID" : vol_id % 3 + 1,
+                  "totalSize" : (vol_id % 4 + 1) * 1000000000,
+                  "blockSize" : 4096,
+                  "status" : "active",
+                  "access" : "readWrite",
+                  "enable512e" : vol_id % 2 == 0,
+                  "iqn" : "iqn.2010-01.com.solidfire:abcd.vol{:05d}.{}".format(vol_id, vol_id),
+                  "qos" : {"minIOPS" : 50, "maxIOPS" : 15000, "burstIOPS" : 15000},
+                  "attributes" : {"owner" : "user{}".format(vol_id)}}
+        if vol_id % 10 == 0:
+            volume["access"] = "locked"
+        if vol_id % 7 == 0:
+            # Some volumes are missing keys, like volumes from older API versions
+            del volume["totalSize"]
+            del volume["enable512e"]
+        volumes.append(volume)
+    return volumes
+
+@pytest.fixture(params=["numpy", "python"])
+def voltable_mode(request, monkeypatch):
+    from libsf import sfvoltable
+    if request.param == "numpy":
+        if sfvoltable.numpy is None:
+            pytest.skip("numpy is not installed")
+    else:
+        monkeypatch.setattr(sfvoltable, "numpy", None)
+    return request.param
+
+@pytest.mark.usefixtures("voltable_mode")
+class TestVolumeTable(object):
+
+    def test_VolumeTableRows(self):
+        print()
+        from libsf.sfvoltable import VolumeTable
+        volumes = _Volumes()
+        table = VolumeTable(volumes)
+        assert len(table) == len(volumes)
+        assert list(table.keys()) == [vol["volumeID"] for vol in volumes]
+        assert table.ToDict() == {vol["volumeID"] : vol for vol in volumes}
+        assert table[7].get("totalSize") is None
+        assert "totalSize" not in table[7]
+        assert table[8]["iqn"] == volumes[7]["iqn"]
+        assert 999 not in table
+        assert table.get(999) is None
+        with pytest.raises(UnknownObjectError):
+            table[999]
+
+    def test_VolumeTableFilter(self):
+        print()
+        from libsf.sfvoltable import VolumeTable
+        volumes = _Volumes()
+        table = VolumeTable(volumes)
+        assert table.Filter(accountID=2).keys() == [vol["volumeID"] for vol in volumes if vol["accountID"] == 2]
+        assert table.Filter(accountID=[1, 3]).keys() == [vol["volumeID"] for vol in volumes if vol["accountID"] in (1, 3)]
+        assert table.Filter(totalSize__ge=3000000000).keys() == [vol["volumeID"] for vol in volumes if vol.get("totalSize", 0) >= 3000000000]
+        assert table.Filter(totalSize__ne=1000000000).keys() == [vol["volumeID"] for vol in volumes if vol.get("totalSize") != 1000000000]
+        assert table.Filter(access="locked", accountID=2).keys() == [vol["volumeID"] for vol in volumes if vol["access"] == "locked" and vol["accountID"] == 2]
+        assert table.Filter(enable512e=True).keys() == [vol["volumeID"] for vol in volumes if vol.get("enable512e") is True]
+        assert table.Filter(maxIOPS=15000).keys() == table.keys()
+        assert table.Filter(namePrefix="vol0001").keys() == list(range(10, 20))
+        assert table.Filter(nameRegex=r"5$").keys() == [vol["volumeID"] for vol in volumes if vol["volumeID"] % 10 == 5]
+        assert table.Filter().keys() == table.keys()
+        with pytest.raises(InvalidArgumentError):
+            table.Filter(totalSize__like=1)
+
+    def test_VolumeTableFilterMissing(self):
+        print()
+        from libsf.sfvoltable import VolumeTable
+        volumes = _Volumes()
+        table = VolumeTable(volumes)
+        missing = [vol["volumeID"] for vol in volumes if "totalSize" not in vol]
+        assert table.Filter(totalSize=None).keys() == missing
+        assert table.Filter(enable512e=None).keys() == missing
+        assert table.Filter(totalSize=[None, 1000000000]).keys() == [vol["volumeID"] for vol in volumes if vol.get("totalSize") in (None, 1000000000)]
+        assert table.Filter(totalSize__ne=None).keys() == [vol["volumeID"] for vol in volumes if "totalSize" in vol]
+        assert table.Filter(totalSize__lt=10000000000).keys() == [vol["volumeID"] for vol in volumes if "totalSize" in vol]
+        assert table.Filter(status=None).keys() == []
+
+    def test_VolumeTableSort(self):
+        print()
+        from libsf.sfvoltable import VolumeTable
+        volumes = _Volumes()
+        table = VolumeTable(volumes)
+        for column in ["accountID", "totalSize", "access", "name"]:
+            for reverse in [False, True]:
+                present = sorted([vol for vol in volumes if column in vol], key=lambda vol: vol[column], reverse=reverse)
+                absent = [vol for vol in volumes if column not in vol]
+                expected = absent + present if not reverse else present + absent
+                assert table.Sort(column, reverse=reverse).keys() == [vol["volumeID"] for vol in expected]
+
+    def test_VolumeTableSum(self):
+        print()
+        from libsf.sfvoltable import VolumeTable
+        volumes = _Volumes()
+        table = VolumeTable(volumes)
+        assert table.Sum("totalSize") == sum([vol.get("totalSize", 0) for vol in volumes])
+        by_account = {}
+        for vol in volumes:
+            by_account[vol["accountID"]] = by_account.get(vol["accountID"], 0) + vol.get("totalSize", 0)
+        assert table.Sum("totalSize", by="accountID") == by_account
+        assert table.Filter(accountID=1).Sum("maxIOPS") == 15000 * len([vol for vol in volumes if vol["accountID"] == 1])
+        with pytest.raises(InvalidArgumentError):
+            table.Sum("name")
+
+    def test_VolumeTableCount(self):
+        print()
+        from libsf.sfvoltable import VolumeTable
+        volumes = _Volumes()
+        table = VolumeTable(volumes)
+        assert table.Count("access") == {"readWrite" : 270, "locked" : 30}
+        counts = {}
+        for vol in volumes:
+            counts[vol.get("enable512e")] = counts.get(vol.get("enable512e"), 0) + 1
+        assert table.Count("enable512e") == counts
+        with pytest.raises(InvalidArgumentError):
+            table.Count("nosuchcolumn")
+
+    def test_VolumeTableColumn(self):
+        print()
+        from libsf.sfvoltable import VolumeTable
+        volumes = _Volumes()
+        table = VolumeTable(volumes)
+        sizes = table.Column("totalSize")
+        names = table.Column("name")
+        # The columns are copies, so the table can still grow
+        table.Append({"volumeID" : 1000, "name" : "added", "totalSize" : 5})
+        assert list(sizes.tolist() if hasattr(sizes, "tolist") else sizes) == [vol.get("totalSize") for vol in volumes]
+        assert names == [vol["name"] for vol in volumes]
+        sizes = table.Column("totalSize")
+        assert len(sizes) == len(volumes) + 1
+        assert sizes[-1] == 5
+        with pytest.raises(InvalidArgumentError):
+            table.Column("nosuchcolumn")
+
+    def test_VolumeTablePickle(self):
+        print()
+        from libsf.sfvoltable import VolumeTable
+        volumes = _Volumes()
+        table = VolumeTable(volumes)
+        assert 1 in table
+        copy = pickle.loads(pickle.dumps(table, protocol=2))
+        assert copy.ToDict() == table.ToDict()
+        assert copy.Filter(totalSize=None).keys() == table.Filter(totalSize=None).keys()
+        copy.Append({"volumeID" : 1000, "name" : "added"})
+        assert copy[1000]["name"] == "added"
+        assert "totalSize" not in copy[1000]
@@ -2,9 +2,12 @@
 #pylint: skip-file
 
 from __future__ import print_function
+import glob
+import os
 import pytest
 import random
-from libsf import SolidFireAPIError
+from libsf import SolidFireAPIError, sfdefaults
+from libsf.journalutil import BulkJournal
 from . import globalconfig
 from .fake_cluster import APIFailure, APIVersion
 from .testutil import RandomString, RandomIP
@@ -117,6 +120,62 @@ class TestVolumeCreate(object):
                              wait=random.randint(0, 1),
                              account_id=existing_id)
 
+    def test_VolumeCreateResume(self):
+        print()
+        accounts = globalconfig.cluster.ListAccounts({})["accounts"]
+        existing_id = accounts[random.randint(0, len(accounts)-1)]["accountID"]
+        prefix = RandomString(random.randint(1, 50))
+        count = random.randint(2, 20)
+        volume_size = random.randint(1, 8000)
+        max_iops = random.randint(5000, 90000)
+        existing_journals = set(glob.glob(os.path.join(sfdefaults.journal_dir, "volume_create-*")))
+        from volume_create import VolumeCreate
+        with APIFailure("CreateMultipleVolumes"):
+            assert not VolumeCreate(volume_size=volume_size,
+                                    volume_prefix=prefix,
+                                    volume_count=count,
+                                    min_iops=random.randint(100, 1000),
+                                    max_iops=max_iops,
+                                    burst_iops=max_iops + random.randint(1, 10000),
+                                    enable512e=True,
+                                    account_id=existing_id)
+        journals = set(glob.glob(os.path.join(sfdefaults.journal_dir, "volume_create-*"))) - existing_journals
+        assert len(journals) == 1
+        journal_path = journals.pop()
+
+        # The resumed run uses the settings from the journal, not the defaults
+        assert VolumeCreate(resume=journal_path)
+        assert not os.path.exists(journal_path)
+        names = set(["{}{:05d}".format(prefix, idx) for idx in range(1, count + 1)])
+        volumes = [vol for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"] if vol["name"] in names and vol["accountID"] == existing_id]
+        assert len(volumes) == count
+        assert all([vol["totalSize"] == volume_size * 1000 * 1000 * 1000 for vol in volumes])
+        assert all([vol["qos"]["maxIOPS"] == max_iops for vol in volumes])
+        assert all([vol["enable512e"] for vol in volumes])
+
+    def test_negative_VolumeCreateNoSize(self):
+        print()
+        accounts = globalconfig.cluster.ListAccounts({})["accounts"]
+        existing_id = accounts[random.randint(0, len(accounts)-1)]["accountID"]
+        from libsf import InvalidArgumentError
+        from volume_create import VolumeCreate
+        with pytest.raises(InvalidArgumentError):
+            VolumeCreate(volume_prefix=RandomString(random.randint(1, 50)),
+                         volume_count=random.randint(2, 20),
+                         account_id=existing_id)
+
+    def test_negative_VolumeCreateResumeWrongJournal(self):
+        print()
+        accounts = globalconfig.cluster.ListAccounts({})["accounts"]
+        existing_id = accounts[random.randint(0, len(accounts)-1)]["accountID"]
+        journal = BulkJournal.Create("volume_delete", [1, 2, 3])
+        from volume_create import VolumeCreate
+        assert not VolumeCreate(volume_size=random.randint(1, 8000),
+                                volume_prefix=RandomString(random.randint(1, 50)),
+                                volume_count=random.randint(2, 20),
+                                account_id=existing_id,
+                                resume=journal.path)
+
 @pytest.mark.usefixtures("fake_cluster_perclass")
 class TestVolumeDelete(object):
 
@@ -188,6 +247,22 @@ class TestVolumeDelete(object):
             assert VolumeDelete(volume_ids=random.sample(volume_ids, random.randint(2, 15)),
                              purge=random.choice([True, False]))
 
+    def test_VolumeDeleteResume(self):
+        print()
+        volume_ids = random.sample([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]], random.randint(4, 15))
+        journal = BulkJournal.Create("volume_delete", volume_ids, {"purge" : False})
+
+        # Simulate a run that stopped partway through, with some volumes deleted and some still in flight
+        journal.Complete(volume_ids[:1])
+        journal.Start(volume_ids[1:])
+        globalconfig.cluster.DeleteVolumes({"volumeIDs" : volume_ids[:2]})
+
+        from volume_delete import VolumeDelete
+        assert VolumeDelete(resume=journal.path)
+        assert not os.path.exists(journal.path)
+        active_ids = set([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]])
+        assert active_ids.isdisjoint(volume_ids)
+
 @pytest.mark.usefixtures("fake_cluster_perclass")
 class TestPurgeVolumes(object):
 
@@ -573,6 +648,46 @@ class TestVolumeClone(object):
         assert VolumeClone(clone_count=random.randint(2, 5),
                             volume_ids=volume_ids)
 
+    def test_negative_VolumeCloneNameMultiple(self):
+        print()
+        volume_ids = random.sample([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]], random.randint(2, 5))
+        from volume_clone import VolumeClone
+        assert not VolumeClone(clone_count=1,
+                               clone_name=RandomString(random.randint(8, 32)),
+                               volume_ids=volume_ids)
+        assert not VolumeClone(clone_count=random.randint(2, 5),
+                               clone_name=RandomString(random.randint(8, 32)),
+                               volume_ids=volume_ids[:1])
+
+    def test_negative_VolumeCloneNoCount(self):
+        print()
+        volume_ids = random.sample([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]], random.randint(2, 5))
+        from libsf import InvalidArgumentError
+        from volume_clone import VolumeClone
+        with pytest.raises(InvalidArgumentError):
+            VolumeClone(volume_ids=volume_ids)
+
+    def test_VolumeCloneResume(self):
+        print()
+        source = random.choice(globalconfig.cluster.ListActiveVolumes({})["volumes"])
+        prefix = "-" + RandomString(random.randint(8, 16)) + "-"
+        clone_names = ["{}{}{:05d}".format(source["name"], prefix, idx) for idx in range(1, 4)]
+        # A volume that already has the name of one of the clones does not count as that clone
+        globalconfig.cluster.CreateVolume({"name" : clone_names[1], "accountID" : source["accountID"], "totalSize" : source["totalSize"]})
+        existing_journals = set(glob.glob(os.path.join(sfdefaults.journal_dir, "volume_clone-*")))
+        from volume_clone import VolumeClone
+        with APIFailure("CloneVolume", preSuccessCount=1):
+            assert not VolumeClone(clone_count=3,
+                                   clone_prefix=prefix,
+                                   volume_ids=[source["volumeID"]],
+                                   volume_job_count=1)
+        journals = set(glob.glob(os.path.join(sfdefaults.journal_dir, "volume_clone-*"))) - existing_journals
+        assert len(journals) == 1
+
+        assert VolumeClone(resume=journals.pop())
+        names = [vol["name"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]]
+        assert [names.count(name) for name in clone_names] == [1, 2, 1]
+
     def test_VolumeCloneNewAccount(self):
         print()
         print("all volumes = {}".format(globalconfig.cluster.ListActiveVolumes({})["volumes"]))
@@ -596,6 +711,31 @@ class TestVolumeClone(object):
                             volume_ids=volume_ids,
                             clone_size=clone_size)
 
+    def test_VolumeCloneRollingWindow(self):
+        print()
+        volume_ids = random.sample([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]], random.randint(2, 5))
+        from volume_clone import VolumeClone
+        assert VolumeClone(clone_count=random.randint(3, 7),
+                            volume_ids=volume_ids,
+                            total_job_count=random.randint(1, 4),
+                            volume_job_count=1)
+
+    def test_VolumeCloneNoListAsyncResults(self):
+        print()
+        volume_ids = random.sample([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]], random.randint(2, 5))
+        from volume_clone import VolumeClone
+        with APIFailure("ListAsyncResults", exceptionThrown=SolidFireAPIError("ListAsyncResults", {}, "0.0.0.0", "https://0.0.0.0:443/json-rpc/5.0", "xUnknownAPIMethod", 500, "Unknown API method")):
+            assert VolumeClone(clone_count=random.randint(2, 5),
+                                volume_ids=volume_ids)
+
+    def test_negative_VolumeCloneStatusFailure(self):
+        print()
+        volume_ids = random.sample([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]], random.randint(2, 5))
+        from volume_clone import VolumeClone
+        with APIFailure("ListAsyncResults"):
+            assert not VolumeClone(clone_count=random.randint(2, 5),
+                                    volume_ids=volume_ids)
+
 @pytest.mark.usefixtures("fake_cluster_perclass")
 class TestRemoteRepPauseVolume(object):
 
@@ -685,6 +825,43 @@ class TestForceWoleSync(object):
         assert VolumeForceWholeSync(volume_ids=volume_ids,
                               wait=True)
 
+    def test_VolumeForceWholeSyncSingleNode(self, monkeypatch):
+        print()
+        volume_ids = random.sample([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]], random.randint(2, 5))
+        from libsf.sfcluster import SFCluster
+        monkeypatch.setattr(SFCluster, "GetVolumesSliceServices", lambda self, volumeIDs: {vol_id : {"primary" : 1, "secondaries" : []} for vol_id in volumeIDs})
+        def _Wait(self, volumeIDs, timeout=300):
+            raise AssertionError("Waited for volumes with no secondaries")
+        monkeypatch.setattr(SFCluster, "WaitForVolumesSync", _Wait)
+
+        from volume_force_whole_sync import VolumeForceWholeSync
+        assert VolumeForceWholeSync(volume_ids=volume_ids,
+                              wait=True)
+
+    def test_WaitForVolumesSyncProgress(self, virtual_clock, monkeypatch):
+        print()
+        from libsf import sfdefaults
+        from libsf.sfcluster import SFCluster
+        volume_ids = list(range(1, 6))
+        start = virtual_clock.Time()
+        # One volume finishes syncing every 200 seconds, so the whole set takes far longer than the timeout
+        monkeypatch.setattr(SFCluster, "GetSyncingVolumes", lambda self, volumeIDs: set(volumeIDs[int((virtual_clock.Time() - start) // 200):]))
+        SFCluster(sfdefaults.mvip, sfdefaults.username, sfdefaults.password).WaitForVolumesSync(volume_ids, timeout=300)
+        assert virtual_clock.Time() - start >= 1000
+
+    def test_negative_WaitForVolumesSyncStalled(self, virtual_clock, monkeypatch):
+        print()
+        from libsf import sfdefaults, SFTimeoutError
+        from libsf.sfcluster import SFCluster
+        volume_ids = list(range(1, 6))
+        start = virtual_clock.Time()
+        # Two volumes finish and then the rest never do
+        monkeypatch.setattr(SFCluster, "GetSyncingVolumes", lambda self, volumeIDs: set(volumeIDs[min(2, int((virtual_clock.Time() - start) // 100)):]))
+        with pytest.raises(SFTimeoutError) as ex:
+            SFCluster(sfdefaults.mvip, sfdefaults.username, sfdefaults.password).WaitForVolumesSync(volume_ids, timeout=300)
+        assert "3,4,5" in str(ex.value)
+        assert 500 <= virtual_clock.Time() - start < 600
+
     def test_VolumeForceWholeSyncNoWait(self):
         print()
         volume_ids = random.sample([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]], random.randint(2, 5))
@@ -723,3 +900,12 @@ class TestForceWoleSync(object):
         with APIFailure("ForceWholeFileSync"):
             assert not VolumeForceWholeSync(volume_ids=volume_ids)
 
+    def test_negative_StatsFailure(self):
+        print()
+        volume_ids = random.sample([vol["volumeID"] for vol in globalconfig.cluster.ListActiveVolumes({})["volumes"]], random.randint(2, 5))
+
+        from volume_force_whole_sync import VolumeForceWholeSync
+        with APIFailure("ListVolumeStatsByVolume"):
+            assert not VolumeForceWholeSync(volume_ids=volume_ids,
+                                            wait=True)
+
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import itertools
+import pytest
+import threading
+import time
+from libsf import SolidFireError, SFTimeoutError, SFCancelledError
+
+def _Take(strategy, count):
+    return list(itertools.islice(strategy.Intervals(), count))
+
+class TestWaitUntil(object):
+
+    def test_Intervals(self):
+        print()
+        from libsf.waitutil import FixedInterval, ExponentialInterval, FibonacciInterval, EstimateInterval
+        assert _Take(FixedInterval(3), 3) == [3, 3, 3]
+        assert _Take(ExponentialInterval(initial=1, factor=2, maximum=10), 6) == [1, 2, 4, 8, 10, 10]
+        assert _Take(FibonacciInterval(initial=1, maximum=10), 8) == [1, 1, 2, 3, 5, 8, 10, 10]
+        # Polls get closer together as the estimate approaches, then back off once it has passed
+        intervals = _Take(EstimateInterval(100, fraction=0.5, minimum=5, maximum=60), 8)
+        assert intervals[:4] == [50, 25, 12.5, 6.25]
+        assert intervals[4:] == [5, 5, 5, 10]
+
+    def test_WaitUntil(self):
+        print()
+        from libsf.waitutil import WaitUntil
+        state = {"count" : 0}
+        def _Ready():
+            state["count"] += 1
+            return state["count"] if state["count"] >= 4 else None
+        progress = []
+        assert WaitUntil(_Ready, timeout=30, progress=lambda attempt, elapsed: progress.append(attempt)) == 4
+        assert progress == [1, 2, 3]
+
+    def test_negative_WaitUntilTimeout(self):
+        print()
+        from libsf.waitutil import WaitUntil, FixedInterval
+        with pytest.raises(SFTimeoutError) as ex:
+            WaitUntil(lambda: False, timeout=0.2, strategy=FixedInterval(0.01), description="nothing")
+        assert "nothing" in str(ex.value)
+
+    def test_negative_WaitUntilPredicateError(self):
+        print()
+        from libsf.waitutil import WaitUntil
+        def _Fail():
+            raise SolidFireError("Failed")
+        with pytest.raises(SolidFireError):
+            WaitUntil(_Fail, timeout=30)
+
+    def test_WaitUntilAsync(self):
+        print()
+        from libsf.waitutil import WaitUntilAsync, FixedInterval
+        events = [threading.Event() for _ in range(20)]
+        threads = set()
+        def _Check(event):
+            threads.add(threading.current_thread().name)
+            return event.is_set()
+        waiters = [WaitUntilAsync(lambda event=event: _Check(event), timeout=30, strategy=FixedInterval(0.01)) for event in events]
+        assert not any([waiter.Done() for waiter in waiters])
+        for event in events:
+            event.set()
+        assert all([waiter.Get() for waiter in waiters])
+        # All of the waits were polled from the one shared thread
+        assert threads == set(["PollScheduler"])
+
+    def test_negative_WaitUntilAsyncCancel(self):
+        print()
+        from libsf.waitutil import WaitUntilAsync, FixedInterval
+        waiter = WaitUntilAsync(lambda: False, strategy=FixedInterval(30))
+        waiter.Cancel()
+        with pytest.raises(SFCancelledError):
+            waiter.Get()
+
+    def test_negative_WaitUntilAsyncProgressError(self):
+        print()
+        from libsf.waitutil import WaitUntilAsync, FixedInterval
+        def _Progress(attempt, elapsed):
+            raise SolidFireError("progress failed")
+        failed = WaitUntilAsync(lambda: False, strategy=FixedInterval(0.01), progress=_Progress)
+        with pytest.raises(SolidFireError):
+            failed.Get()
+
+        # The scheduler thread is still running for the waits after it
+        event = threading.Event()
+        waiter = WaitUntilAsync(event.is_set, strategy=FixedInterval(0.01))
+        event.set()
+        assert waiter.Get()
+
+    @pytest.mark.usefixtures("fake_cluster_perclass")
+    def test_WaitForSyncing(self):
+        print()
+        from libsf import sfdefaults
+        from libsf.sfcluster import SFCluster
+        SFCluster(sfdefaults.mvip, sfdefaults.username, sfdefaults.password).WaitForSyncing()
@@ -10,11 +10,13 @@ from libsf.apputil import PythonApp
 from libsf.argutil import SFArgumentParser, GetFirstLine, SFArgFormatter
 from libsf.logutil import GetLogger, SetThreadLogPrefix, logargs
 from libsf.sfclient import SFClient
+from libsf.journalutil import BulkJournal
 from libsf.util import ValidateAndDefault, StrType, ItemList, IPv4AddressType, NameOrID, SelectionType, SolidFireIDType, OptionalValueType
 from libsf import sfdefaults
 from libsf import threadutil
 from libsf import SolidFireError
 from volgroup_add_initiators import AddInitiatorsToVolgroup
+from collections import OrderedDict
 
 @logargs
 @ValidateAndDefault({
@@ -24,6 +26,7 @@ from volgroup_add_initiators import AddInitiatorsToVolgroup
     "volgroup_name" : (OptionalValueType(StrType), None),
     "volgroup_id" : (OptionalValueType(SolidFireIDType), None),
     "connection_type" : (SelectionType(sfdefaults.all_client_connection_types), sfdefaults.connection_type),
+    "resume" : (OptionalValueType(StrType), None),
     "mvip" : (IPv4AddressType, sfdefaults.mvip),
     "username" : (StrType, sfdefaults.username),
     "password" : (StrType, sfdefaults.password),
@@ -34,6 +37,7 @@ def AddClientsToVolgroup(client_ips,
                          volgroup_name,
                          volgroup_id,
                          connection_type,
+                         resume,
                          mvip,
                          username,
                          password):
@@ -47,6 +51,7 @@ def AddClientsToVolgroup(client_ips,
         volgroup_name:      the name of the group
         volgroup_id:        the ID of the group
         connection_type:    the type of volume connection (iSCSI or FC)
+        resume:             the journal of an interrupted run to resume
         mvip:               the management IP of the cluster
         username:           the admin user of the cluster
         password:           the admin password of the cluster
@@ -58,42 +63,62 @@ def AddClientsToVolgroup(client_ips,
     if connection_type == 'fc':
         id_type = "WWN"
 
-    # Launch a thread for each client to go get the IQNs from each
+    try:
+        if resume:
+            journal = BulkJournal.Resume(resume, "volgroup_add_clients")
+        else:
+            journal = BulkJournal.Create("volgroup_add_clients", OrderedDict(enumerate(client_ips)), {"connectionType" : connection_type})
+    except SolidFireError as e:
+        log.error("Could not open journal: {}".format(e))
+        return False
+    connection_type = journal.params["connectionType"]
+
+    # Launch a thread for each client to go get the IQNs from each, skipping clients we already have from a previous run
     log.info("Getting a list of client IQNs")
     pool = threadutil.GlobalPool()
-    results = []
-    for client_ip in client_ips:
-        results.append(pool.Post(_ClientThread, client_ip, client_user, client_pass, connection_type))
+    results = {}
+    for idx, client_ip in journal.Remaining():
+        journal.Start([idx])
+        results[idx] = pool.Post(_ClientThread, client_ip, client_user, client_pass, connection_type)
 
     allgood = True
     add_ids = []
-    for idx, client_ip in enumerate(client_ips):
-        try:
-            client_ids = results[idx].Get()
-        except SolidFireError as e:
-            log.error("  {}: Could not get {}: {}".format(client_ip, id_type, e))
-            allgood = False
-            continue
-
+    for idx, client_ip in journal.planned.items():
+        if idx in results:
+            try:
+                client_ids = results[idx].Get()
+            except SolidFireError as e:
+                log.error("  {}: Could not get {}: {}".format(client_ip, id_type, e))
+                journal.Fail([idx], e)
+                allgood = False
+                continue
+            journal.Complete([idx], client_ids)
+        else:
+            client_ids = journal.completed[idx]
 
         # Check for duplicates and add the IDs to the list
         log.info("{} has {} {}".format(client_ip, id_type, ",".join(client_ids)))
         if not set(client_ids).isdisjoint(add_ids):
             log.error("Duplicate {}".format(id_type))
+            journal.Finish(False)
             return False
         add_ids += client_ids
 
     if not allgood:
         log.error("Could not get {}s from all clients".format(id_type))
+        journal.Finish(False)
         return False
 
-    return AddInitiatorsToVolgroup(initiators=add_ids,
-                                   volgroup_name=volgroup_name,
-                                   volgroup_id=volgroup_id,
-                                   strict=True,
-                                   mvip=mvip,
-                                   username=username,
-                                   password=password)
+    # A resumed run may have already added some of the initiators before it stopped
+    success = AddInitiatorsToVolgroup(initiators=add_ids,
+                                      volgroup_name=volgroup_name,
+                                      volgroup_id=volgroup_id,
+                                      strict=not resume,
+                                      mvip=mvip,
+                                      username=username,
+                                      password=password)
+    journal.Finish(success)
+    return success
 
 @threadutil.threadwrapper
 def _ClientThread(client_ip, client_user, client_pass, connection_type):
@@ -111,6 +136,7 @@ if __name__ == '__main__':
     parser.add_client_list_args()
     parser.add_volgroup_selection_args()
     parser.add_argument("--type", type=str, dest="connection_type", choices=sfdefaults.all_client_connection_types, default=sfdefaults.connection_type, help="the type of volume connection")
+    parser.add_resume_args()
     args = parser.parse_args_to_dict()
 
     app = PythonApp(AddClientsToVolgroup, args)
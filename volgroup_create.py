@@ -8,6 +8,7 @@ from libsf.apputil import PythonApp
 from libsf.argutil import SFArgumentParser, GetFirstLine, SFArgFormatter
 from libsf.logutil import GetLogger, logargs
 from libsf.sfcluster import SFCluster
+from libsf.sfvolgroup import ShardedVolGroup
 from libsf.util import ValidateAndDefault, IPv4AddressType, OptionalValueType, ItemList, SolidFireIDType, PositiveIntegerType, BoolType, StrType
 from libsf import sfdefaults
 from libsf import SolidFireError, UnknownObjectError
@@ -26,6 +27,7 @@ from libsf import SolidFireError, UnknownObjectError
     "source_account_id" : (OptionalValueType(SolidFireIDType), None),
     "test" : (BoolType, False),
     "strict" : (BoolType, False),
+    "shard" : (BoolType, False),
     "mvip" : (IPv4AddressType, sfdefaults.mvip),
     "username" : (StrType, sfdefaults.username),
     "password" : (StrType, sfdefaults.password),
@@ -41,6 +43,7 @@ def CreateVolumeGroup(volgroup_name,
                       source_account_id,
                       test,
                       strict,
+                      shard,
                       mvip,
                       username,
                       password):
@@ -59,6 +62,7 @@ def CreateVolumeGroup(volgroup_name,
         source_account_id:  add volumes from this account to the group
         test:               show the group that would be created but don't actually do it
         strict:             fail if the group already exists
+        shard:              spread the IQNs across as many groups as the cluster limits require, each with all of the volumes, named <volgroup_name>-NNN
         mvip:               the management IP of the cluster
         username:           the admin user of the cluster
         password:           the admin password of the cluster
@@ -85,6 +89,9 @@ def CreateVolumeGroup(volgroup_name,
         add_volume_ids = list(found_volumes.keys())
         add_volume_names = [found_volumes[i]["name"] for i in add_volume_ids]
 
+    if shard:
+        return _CreateShardedGroup(volgroup_name, iqns, add_volume_ids, test, strict, mvip, username, password)
+
     # See if the group already exists
     log.info("Searching for volume groups")
     try:
@@ -122,6 +129,36 @@ def CreateVolumeGroup(volgroup_name,
     log.passed("Successfully created group {}".format(volgroup_name))
     return True
 
+def _CreateShardedGroup(volgroup_name, iqns, volume_ids, test, strict, mvip, username, password):
+    """Create a logical group spread across as many real groups as needed"""
+    log = GetLogger()
+
+    log.info("Searching for volume groups")
+    try:
+        group = ShardedVolGroup(volgroup_name, mvip, username, password)
+    except SolidFireError as e:
+        log.error("Could not search for volume groups: {}".format(e))
+        return False
+    if group.shards and strict:
+        log.error("Group already exists")
+        return False
+
+    shard_count = max(-(-len(iqns or []) // group.maxInitiators), 1) if group.maxInitiators > 0 else 1
+    log.info("Creating volume access group '{}' with {} IQNs and {} volumes in at least {} shards".format(volgroup_name, len(iqns or []), len(volume_ids or []), shard_count))
+
+    if test:
+        log.info("Test option set; group will not be created")
+        return True
+
+    try:
+        group.Add(initiatorList=iqns, volumeIDList=volume_ids)
+    except SolidFireError as e:
+        log.error("Failed to create group: {}".format(e))
+        return False
+
+    log.passed("Successfully created group {} in {} shards".format(volgroup_name, len(group.shards)))
+    return True
+
 
 if __name__ == '__main__':
     parser = SFArgumentParser(description=GetFirstLine(__doc__), formatter_class=SFArgFormatter)
@@ -130,6 +167,7 @@ if __name__ == '__main__':
     parser.add_argument("--iqns", type=ItemList(str), metavar="IQN1,IQN2...",  help="list of initiator IQNs to add to the group")
     parser.add_volume_search_args("to optionally add to the group")
     parser.add_argument("--strict", action="store_true", default=False, help="fail if the group already exists")
+    parser.add_argument("--shard", action="store_true", default=False, help="spread the IQNs across as many groups as the cluster limits require, each with all of the volumes, named <volgroup-name>-NNN")
     args = parser.parse_args_to_dict()
 
     app = PythonApp(CreateVolumeGroup, args)
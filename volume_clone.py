@@ -4,24 +4,25 @@
 This action will create clones of volumes
 
 Specify a single source volume with volume_name/volume_id, or multiple source volumes with source_account/source_account_id/volume_prefix/volume_regex/volume_count
-Specify a single clone name with clone_name, or use clone_prefix to have a unique name generated for each clone
+Specify the clone name with clone_name when creating a single clone, or use clone_prefix to have a unique name generated for each clone
 Use total_job_count/volume_job_count to control how many clones are created in parallel
 """
 
 from libsf.apputil import PythonApp
 from libsf.argutil import SFArgumentParser, GetFirstLine, SFArgFormatter
 from libsf.logutil import GetLogger, logargs
-from libsf.sfcluster import SFCluster
-from libsf.util import ValidateAndDefault, StrType, IPv4AddressType, PositiveNonZeroIntegerType, PositiveIntegerType, OptionalValueType, ItemList, BoolType, SolidFireIDType, SelectionType
+from libsf.sfcluster import SFCluster, AsyncJobTracker
+from libsf.journalutil import BulkJournal
+from libsf.util import ValidateAndDefault, IsSet, StrType, IPv4AddressType, PositiveNonZeroIntegerType, PositiveIntegerType, OptionalValueType, ItemList, BoolType, SolidFireIDType, SelectionType
 from libsf import sfdefaults
-from libsf import SolidFireError, UnknownObjectError
 from libsf import threadutil
-import time
+from libsf import SolidFireError, UnknownObjectError
+from collections import OrderedDict
 
 @logargs
 @ValidateAndDefault({
     # "arg_name" : (arg_type, arg_default)
-    "clone_count" : (PositiveNonZeroIntegerType, None),
+    "clone_count" : (OptionalValueType(PositiveNonZeroIntegerType), None),
     "clone_prefix" : (StrType, "-c"),
     "clone_name" : (OptionalValueType(StrType), None),
     "access" : (SelectionType(sfdefaults.all_volume_access_levels), sfdefaults.volume_access),
@@ -38,6 +39,7 @@ import time
     "source_account" : (OptionalValueType(StrType), None),
     "source_account_id" : (OptionalValueType(SolidFireIDType), None),
     "test" : (BoolType, False),
+    "resume" : (OptionalValueType(StrType), None),
     "mvip" : (IPv4AddressType, sfdefaults.mvip),
     "username" : (StrType, sfdefaults.username),
     "password" : (StrType, sfdefaults.password),
@@ -59,6 +61,7 @@ def VolumeClone(clone_count,
                 source_account,
                 source_account_id,
                 test,
+                resume,
                 mvip,
                 username,
                 password):
@@ -68,7 +71,7 @@ def VolumeClone(clone_count,
     Args:
         clone_count:            the number of clones to create per volume
         clone_prefix:           the prefix to use to generate clone names (name will be volumeName + clone_prefix + "%05d")
-        clone_name:             the name to use for all the clones
+        clone_name:             the name to use for the clone, when creating a single clone
         access:                 the access leve for the clones
         clone_size:             the size of the clones (0 to keep the volume size)
         total_job_count:        the total number of clones to start in parallel on the cluster
@@ -83,6 +86,7 @@ def VolumeClone(clone_count,
         source_account:         select volumes from this account
         source_account_id:      select volumes from this account
         test:                   show the volumes that would be selected but don't actually do anything
+        resume:                 the journal of an interrupted run to resume
         mvip:                   the management IP of the cluster
         username:               the admin user of the cluster
         password:               the admin password of the cluster
@@ -100,81 +104,169 @@ def VolumeClone(clone_count,
             log.error("Failed to get cluster limits: {}".format(e))
             return False
 
-    # Find the dest account
-    dest_account = None
-    if dest_account_name or dest_account_id:
-        log.info("Searching for accounts")
+    if resume:
+        try:
+            journal = BulkJournal.Resume(resume, "volume_clone")
+        except SolidFireError as e:
+            log.error("Could not open journal: {}".format(e))
+            return False
+    else:
+        IsSet(clone_count, "clone_count")
+
+        # Find the dest account
+        dest_account = None
+        if dest_account_name or dest_account_id:
+            log.info("Searching for accounts")
+            try:
+                dest_account = SFCluster(mvip, username, password).FindAccount(accountName=dest_account_name, accountID=dest_account_id)
+            except UnknownObjectError:
+                log.error("Account does not exist")
+                return False
+            except SolidFireError as e:
+                log.error("Could not search for accounts: {}".format(e))
+                return False
+
+        # Get a list of volumes
+        log.info("Searching for volumes")
+        try:
+            match_volumes = cluster.SearchForVolumes(volumeID=volume_ids, volumeName=volume_names, volumeRegex=volume_regex, volumePrefix=volume_prefix, accountName=source_account, accountID=source_account_id, volumeCount=volume_count)
+        except SolidFireError as e:
+            log.error("Failed to search for volumes: {}".format(e))
+            return False
+
+        # Resuming finds finished clones by name, so every planned clone needs a name of its own
+        if clone_name and clone_count * len(match_volumes) > 1:
+            log.error("A clone name can only be used when creating a single clone; use a clone prefix instead")
+            return False
+
+        msg = "{} clones per volume of {} volumes will be created".format(clone_count, len(list(match_volumes.keys())))
+        if dest_account:
+            msg += " in account {}".format(dest_account.username)
+        log.info(msg)
+        if test:
+            log.info("Test option set; no volumes will be cloned")
+            return True
+
+        # Any volume created from here on has a higher ID than every volume that exists now
         try:
-            dest_account = SFCluster(mvip, username, password).FindAccount(accountName=dest_account_name, accountID=dest_account_id)
-        except UnknownObjectError:
-            log.error("Account does not exist")
+            max_volume_id = max([vol["volumeID"] for vol in cluster.ListActiveVolumes()] or [0])
+        except SolidFireError as e:
+            log.error("Failed to list volumes: {}".format(e))
             return False
+
+        # Plan every clone up front so an interrupted run can pick up where it left off
+        clones = OrderedDict()
+        for vol in match_volumes.values():
+            for clone_num in range(1, clone_count+1):
+                clones["{}-{}".format(vol["volumeID"], clone_num)] = {
+                    "volumeID" : vol["volumeID"],
+                    "volumeName" : vol["name"],
+                    "cloneName" : clone_name or "{}{}{:05d}".format(vol["name"], clone_prefix, clone_num)}
+        try:
+            journal = BulkJournal.Create("volume_clone", clones, {"access" : access,
+                                                                  "newSize" : clone_size,
+                                                                  "newAccountID" : dest_account.ID if dest_account else None,
+                                                                  "cloneCount" : clone_count,
+                                                                  "maxVolumeID" : max_volume_id})
         except SolidFireError as e:
-            log.error("Could not search for accounts: {}".format(e))
+            log.error("Could not open journal: {}".format(e))
             return False
 
-    # Get a list of volumes
-    log.info("Searching for volumes")
+    # Any clone that was started when the previous run stopped is finished if its volume exists now.  The cluster
+    # keeps copying the data of a clone that has been created even without anyone waiting on it.  Only volumes created
+    # after the run was planned count, and each one only counts for one clone, since names do not have to be unique
+    def CheckCloned(keys):
+        created = {}
+        for vol in cluster.ListActiveVolumes():
+            if vol["volumeID"] > journal.params.get("maxVolumeID", 0):
+                created[vol["name"]] = created.get(vol["name"], 0) + 1
+        cloned = []
+        for key in keys:
+            if created.get(journal.planned[key]["cloneName"], 0) > 0:
+                created[journal.planned[key]["cloneName"]] -= 1
+                cloned.append(key)
+        return cloned
     try:
-        match_volumes = cluster.SearchForVolumes(volumeID=volume_ids, volumeName=volume_names, volumeRegex=volume_regex, volumePrefix=volume_prefix, accountName=source_account, accountID=source_account_id, volumeCount=volume_count)
+        journal.Reconcile(CheckCloned)
     except SolidFireError as e:
-        log.error("Failed to search for volumes: {}".format(e))
+        log.error("Could not list volumes: {}".format(e))
         return False
 
-    msg = "{} clones per volume of {} volumes will be created".format(clone_count, len(list(match_volumes.keys())))
-    if dest_account:
-        msg += " in account {}".format(dest_account.username)
-    log.info(msg)
-    if test:
-        log.info("Test option set; no volumes will be cloned")
-        return True
+    tracker = AsyncJobTracker(cluster)
+    jobs_pervol = min(journal.params.get("cloneCount") or volume_job_count, volume_job_count)
+    state = {"allgood" : True}
 
-    pool = threadutil.ThreadPool(maxThreads=total_job_count)
-    results = []
-    allgood = True
-    jobs_pervol = min(clone_count, volume_job_count)
-    
-    def MakeCloneOpts(vol, dest_name):
+    def MakeCloneOpts(clone):
         opts = {
-            "volumeID" : vol["volumeID"],
-            "volumeName" : vol["name"],
-            "cloneName" : dest_name,
-            "access" : access}
-        if clone_size and clone_size > 0:
-            opts["newSize"] = clone_size
-        if dest_account:
-            opts["newAccountID"] = dest_account.ID
+            "volumeID" : clone["volumeID"],
+            "cloneName" : clone["cloneName"],
+            "access" : journal.params["access"]}
+        if journal.params["newSize"] and journal.params["newSize"] > 0:
+            opts["newSize"] = journal.params["newSize"]
+        if journal.params["newAccountID"]:
+            opts["newAccountID"] = journal.params["newAccountID"]
         return opts
-    def WaitForCloneResults(result_list):
-        success = True
-        for res, volume in result_list:
-            try:
-                res.Get()
-            except SolidFireError as e:
-                log.error("  Error cloning volume {}: {}".format(volume["name"], e))
-                success = False
-                continue
-        return success
-
-    queued_clones_pervol = 0
-    # Queue up clones for each volume
-    for idx in range(1, clone_count+1, jobs_pervol):
-        for clone_num in range(idx, idx + jobs_pervol):
-            for vol in match_volumes.values():
-                # queue up a clone job for this volume
-                new_clone_name = clone_name or "{}{}{:05d}".format(vol["name"], clone_prefix, clone_num)
-                results.append((pool.Post(_CloneVolume, mvip, username, password, MakeCloneOpts(vol, new_clone_name)), vol))
-            # Make sure we don't go over on the last iteration if clone_count/jobs_pervol is not an even number
-            queued_clones_pervol += 1
-            if queued_clones_pervol >= clone_count:
-                break
-
-        # Wait for jobs to complete so we don't go over jobs_pervol
-        if not WaitForCloneResults(results):
-            allgood = False
-        results = []
-
-    if allgood:
+
+    def CloneComplete(_handle, result, context):
+        key, clone = context
+        running_pervol[clone["volumeID"]] -= 1
+        if "result" in result:
+            log.info("  Clone {} finished".format(clone["cloneName"]))
+            journal.Complete([key])
+        elif "error" in result:
+            log.error("  Error cloning volume {}: Clone {} failed {}: {}".format(clone["volumeName"], clone["cloneName"], result["error"].get("name"), result["error"].get("message")))
+            journal.Fail([key], result["error"].get("message"))
+            state["allgood"] = False
+        else:
+            log.error("  Error cloning volume {}: Unexpected result: {}".format(clone["volumeName"], result))
+            journal.Fail([key], result)
+            state["allgood"] = False
+
+    # Keep a rolling window of clones going, starting a new clone on a volume as soon as one of its slots frees up,
+    # without going over the per-volume or total job limits
+    pending_pervol = OrderedDict()
+    for key, clone in journal.Remaining():
+        pending_pervol.setdefault(clone["volumeID"], []).append((key, clone))
+    running_pervol = {vol_id : 0 for vol_id in pending_pervol}
+    progress = threadutil.ProgressReporter(tracker.telemetry, "Cloning volumes", total=sum([len(clones) for clones in pending_pervol.values()]))
+    while True:
+        started = True
+        while started and len(tracker) < total_job_count:
+            started = False
+            for vol_id in pending_pervol:
+                if len(tracker) >= total_job_count:
+                    break
+                if not pending_pervol[vol_id] or running_pervol[vol_id] >= jobs_pervol:
+                    continue
+                key, clone = pending_pervol[vol_id].pop(0)
+                log.info("  Cloning volume {} to {}".format(clone["volumeName"], clone["cloneName"]))
+                journal.Start([key])
+                try:
+                    handle = cluster.CloneVolume(**MakeCloneOpts(clone))
+                except SolidFireError as e:
+                    log.error("  Error cloning volume {}: {}".format(clone["volumeName"], e))
+                    journal.Fail([key], e)
+                    tracker.telemetry.Finished(None, failed=True)
+                    state["allgood"] = False
+                    continue
+                running_pervol[vol_id] += 1
+                tracker.Add(handle, CloneComplete, (key, clone))
+                started = True
+
+        if len(tracker) <= 0:
+            break
+        try:
+            tracker.WaitForAny()
+        except SolidFireError as e:
+            log.error("Failed to get clone status: {}".format(e))
+            journal.Finish(False)
+            return False
+        progress.Update()
+
+    progress.Update(force=True)
+    journal.Finish(state["allgood"])
+
+    if state["allgood"]:
         log.passed("Successfully cloned all volumes")
         return True
     else:
@@ -182,41 +274,19 @@ def VolumeClone(clone_count,
         return False
 
 
-@threadutil.threadwrapper
-def _CloneVolume(mvip, username, password, clone_options):
-    """Clone a volume and wait for completion, run as a thread"""
-    log = GetLogger()
-    volume_name = clone_options.pop("volumeName")
-    clone_name = clone_options["cloneName"]
-    log.info("  Cloning volume {} to {}".format(volume_name, clone_name))
-
-    cluster = SFCluster(mvip, username, password)
-    handle = cluster.CloneVolume(**clone_options)
-
-    while True:
-        result = cluster.GetAsyncResult(handle)
-        if result["status"].lower() == "complete":
-            if "result" in result:
-                log.info("  Clone {} finished".format(clone_name))
-                break
-            elif "error" in result:
-                raise SolidFireError("  Clone {} failed {}: {}".format(clone_name, result["error"]["name"], result["error"]["message"]))
-            else:
-                raise SolidFireError("  Unexpected result: {}".format(result))
-        time.sleep(sfdefaults.TIME_SECOND * 5)
-
 if __name__ == '__main__':
     parser = SFArgumentParser(description=GetFirstLine(__doc__), formatter_class=SFArgFormatter)
     parser.add_cluster_mvip_args()
-    parser.add_argument("--clone-count", type=PositiveNonZeroIntegerType, required=True, metavar="COUNT", help="the number of clones to create per volume")
+    parser.add_argument("--clone-count", type=PositiveNonZeroIntegerType, metavar="COUNT", help="the number of clones to create per volume")
     parser.add_argument("--clone-prefix", type=str, default="-c", help="the prefix for the clones (clone name will be volume name + clone prefix + %%05d)")
-    parser.add_argument("--clone-name", type=str,  default=None, help="the name to give to the clone")
+    parser.add_argument("--clone-name", type=str,  default=None, help="the name to give to the clone, when creating a single clone")
     parser.add_argument("--access", type=str, choices=sfdefaults.all_volume_access_levels, default=sfdefaults.volume_access, help="the access level for the clones (readOnly, readWrite, locked)")
     parser.add_argument("--clone-size", type=PositiveNonZeroIntegerType, help="the new size for the clone (0 or not specified will keep the same size as the source)")
     parser.add_account_selection_args(required=False, prefix="dest")
     parser.add_argument("--total-job-count", type=int, default=12, metavar="COUNT", help="the total number of clone jobs to start in parallel across the cluster")
     parser.add_argument("--volume-job-count", type=int, metavar="COUNT", help="the number of clone jobs to start in parallel on each volume")
     parser.add_volume_search_args("to be cloned")
+    parser.add_resume_args()
     args = parser.parse_args_to_dict()
 
     app = PythonApp(VolumeClone, args)
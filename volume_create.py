@@ -8,18 +8,20 @@ from libsf.apputil import PythonApp
 from libsf.argutil import SFArgumentParser, GetFirstLine, SFArgFormatter
 from libsf.logutil import GetLogger, logargs
 from libsf.sfcluster import SFCluster
-from libsf.util import ValidateAndDefault, StrType, IPv4AddressType, NameOrID, PositiveNonZeroIntegerType, PositiveIntegerType, OptionalValueType, SolidFireBurstIOPSType, SolidFireMaxIOPSType, SolidFireMinIOPSType, BoolType, SolidFireIDType
+from libsf.journalutil import BulkJournal
+from libsf.util import ValidateAndDefault, IsSet, StrType, IPv4AddressType, NameOrID, PositiveNonZeroIntegerType, PositiveIntegerType, OptionalValueType, SolidFireBurstIOPSType, SolidFireMaxIOPSType, SolidFireMinIOPSType, BoolType, SolidFireIDType
 from libsf import sfdefaults
+from libsf import threadutil
 from libsf import SolidFireError, UnknownObjectError
 import time
 
 @logargs
 @ValidateAndDefault({
     # "arg_name" : (arg_type, arg_default)
-    "volume_size" : (PositiveNonZeroIntegerType, None),
+    "volume_size" : (OptionalValueType(PositiveNonZeroIntegerType), None),
     "volume_prefix" : (OptionalValueType(StrType), None),
     "volume_name" : (OptionalValueType(StrType), None),
-    "volume_count" : (PositiveNonZeroIntegerType, None),
+    "volume_count" : (OptionalValueType(PositiveNonZeroIntegerType), None),
     "volume_start" : (PositiveNonZeroIntegerType, 1),
     "min_iops" : (SolidFireMinIOPSType, sfdefaults.min_iops),
     "max_iops" : (SolidFireMaxIOPSType, sfdefaults.max_iops),
@@ -30,6 +32,7 @@ import time
     "gib" : (BoolType, False),
     "create_single" : (BoolType, False),
     "wait" : (PositiveIntegerType, 0),
+    "resume" : (OptionalValueType(StrType), None),
     "mvip" : (IPv4AddressType, sfdefaults.mvip),
     "username" : (StrType, sfdefaults.username),
     "password" : (StrType, sfdefaults.password),
@@ -48,6 +51,7 @@ def VolumeCreate(volume_size,
                  gib,
                  create_single,
                  wait,
+                 resume,
                  mvip,
                  username,
                  password):
@@ -69,15 +73,31 @@ def VolumeCreate(volume_size,
         gib:                create volume size in GiB instead of GB
         create_single:      create single volumes at once (do not use CreateMultipleVolumes API)
         wait:               wait for this long between creating each volume (seconds)
+        resume:             the journal of an interrupted run to resume.  The volumes are created with the account, size,
+                            QoS and other settings from the journal, and those arguments are ignored
         mvip:               the management IP of the cluster
         username:           the admin user of the cluster
         password:           the admin password of the cluster
     """
     log = GetLogger()
-    NameOrID(account_name, account_id, "account")
+    if not resume:
+        NameOrID(account_name, account_id, "account")
+        IsSet(volume_size, "volume_size")
+        IsSet(volume_count, "volume_count")
 
     cluster = SFCluster(mvip, username, password)
 
+    # Pick up the plan and the settings from the previous run
+    journal = None
+    if resume:
+        try:
+            journal = BulkJournal.Resume(resume, "volume_create")
+        except SolidFireError as e:
+            log.error("Could not open journal: {}".format(e))
+            return False
+        account_name = None
+        account_id = journal.params["accountID"]
+
     # Find the account
     log.info("Searching for accounts")
     try:
@@ -89,47 +109,92 @@ def VolumeCreate(volume_size,
         log.error("Could not search for accounts: {}".format(e))
         return False
 
-    # Naming for the volume
-    if volume_prefix is None:
-        volume_prefix = account.username + "-"
-    vol_fmt_str = "{}{{:05d}}".format(volume_prefix)
-
-    # Size of the volume in bytes
-    if gib:
-        total_size = volume_size * 1024 * 1024 * 1024
-    else:
-        total_size = volume_size * 1000 * 1000 * 1000
+    # Plan the volumes to create, along with every setting they are created with
+    if not journal:
+        # Naming for the volume
+        if volume_prefix is None:
+            volume_prefix = account.username + "-"
+        vol_fmt_str = "{}{{:05d}}".format(volume_prefix)
+        if volume_name and volume_count == 1:
+            vol_names = [volume_name]
+        else:
+            vol_names = [vol_fmt_str.format(vol_num) for vol_num in range(volume_start, volume_start + volume_count)]
+
+        # Size of the volume in bytes
+        if gib:
+            total_size = volume_size * 1024 * 1024 * 1024
+        else:
+            total_size = volume_size * 1000 * 1000 * 1000
+
+        params = {"totalSize" : total_size,
+                  "accountID" : account.ID,
+                  "enable512e" : enable512e,
+                  "minIOPS" : min_iops,
+                  "maxIOPS" : max_iops,
+                  "burstIOPS" : burst_iops,
+                  "createSingle" : bool(create_single or (volume_name and volume_count == 1))}
+        try:
+            journal = BulkJournal.Create("volume_create", vol_names, params)
+        except SolidFireError as e:
+            log.error("Could not open journal: {}".format(e))
+            return False
+
+    total_size = journal.params["totalSize"]
+    create_account_id = journal.params["accountID"]
+    enable512e = journal.params["enable512e"]
+    min_iops = journal.params["minIOPS"]
+    max_iops = journal.params["maxIOPS"]
+    burst_iops = journal.params["burstIOPS"]
+    create_single = journal.params["createSingle"]
+    volume_count = len(journal.planned)
+
+    # Any volume that was being created when the previous run stopped is finished if it exists now
+    def CheckCreated(names):
+        return set(names).intersection([vol["name"] for vol in cluster.ListActiveVolumes() if vol["accountID"] == create_account_id])
+    try:
+        journal.Reconcile(CheckCreated)
+    except SolidFireError as e:
+        log.error("Could not list volumes: {}".format(e))
+        return False
+    vol_names = [name for name, _ in journal.Remaining()]
 
     # Create volumes
-    log.info("Creating {} volumes for {}...".format(volume_count, account.username))
+    log.info("Creating {} volumes for {}...".format(len(vol_names), account.username))
     allgood = True
-    if create_single or (volume_name and volume_count == 1):
-        for vol_num in range(volume_start, volume_start + volume_count):
-            if volume_name and volume_count == 1:
-                vol_name = volume_name
-            else:
-                vol_name = vol_fmt_str.format(vol_num)
-
+    if create_single:
+        telemetry = threadutil.PoolTelemetry("volume_create")
+        progress = threadutil.ProgressReporter(telemetry, "Creating volumes", total=len(vol_names))
+        for vol_name in vol_names:
+            journal.Start([vol_name])
+            key = telemetry.Started(vol_name)
             try:
-                cluster.CreateVolume(vol_name, total_size, account.ID, enable512e, min_iops, max_iops, burst_iops)
+                cluster.CreateVolume(vol_name, total_size, create_account_id, enable512e, min_iops, max_iops, burst_iops)
             except SolidFireError as e:
                 log.error("Failed to create volume {}: {}".format(vol_name, e))
+                journal.Fail([vol_name], e)
+                telemetry.Finished(key, failed=True)
                 allgood = False
-            
+            else:
+                journal.Complete([vol_name])
+                telemetry.Finished(key)
+            progress.Update()
+
             if wait > 0:
                 time.sleep(sfdefaults.TIME_SECOND * wait)
+        progress.Update(force=True)
 
-    else:
-        vol_names = []
-        for vol_num in range(volume_start, volume_start + volume_count):
-            vol_names.append(vol_fmt_str.format(vol_num))
-
+    elif vol_names:
+        journal.Start(vol_names)
         try:
-            cluster.CreateVolumes(vol_names, total_size, account.ID, enable512e, min_iops, max_iops, burst_iops)
+            cluster.CreateVolumes(vol_names, total_size, create_account_id, enable512e, min_iops, max_iops, burst_iops)
         except SolidFireError as e:
             log.error("Failed to create volumes for {}: {}".format(account.username, e))
+            journal.Fail(vol_names, e)
             allgood = False
+        else:
+            journal.Complete(vol_names)
 
+    journal.Finish(allgood)
     if allgood:
         log.passed("Successfully created {} volumes for {}".format(volume_count, account.username))
         return True
@@ -143,8 +208,8 @@ if __name__ == '__main__':
     vol_naming_group = parser.add_mutually_exclusive_group()
     vol_naming_group.add_argument("--volume-name", type=str, metavar="NAME", help="the name for the new volume")
     vol_naming_group.add_argument("--volume-prefix", type=str, metavar="NAME", help="the prefix for creating names for the new volumes (name will be prefix + %%05d)")
-    parser.add_argument("--volume-size", type=PositiveNonZeroIntegerType, required=True, metavar="SIZE", help="the volume size in GB")
-    parser.add_argument("--volume-count", type=PositiveNonZeroIntegerType, required=True, metavar="COUNT", help="the number of volumes to create")
+    parser.add_argument("--volume-size", type=PositiveNonZeroIntegerType, metavar="SIZE", help="the volume size in GB")
+    parser.add_argument("--volume-count", type=PositiveNonZeroIntegerType, metavar="COUNT", help="the number of volumes to create")
     parser.add_argument("--volume-start", type=PositiveNonZeroIntegerType, default=1, required=True, metavar="START", help="the volume number to start naming from")
     parser.add_qos_args()
     parser.add_argument("--enable512e", action="store_true", default=False, help="use 512 byte sector emulation on the volumes")
@@ -153,6 +218,7 @@ if __name__ == '__main__':
     parser.add_argument("--wait", type=PositiveNonZeroIntegerType, metavar="SECONDS", help="wait for this long between creating each volume (seconds)")
 
     parser.add_account_selection_args()
+    parser.add_resume_args()
     args = parser.parse_args_to_dict()
 
     app = PythonApp(VolumeCreate, args)
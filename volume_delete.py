@@ -8,6 +8,7 @@ from libsf.apputil import PythonApp
 from libsf.argutil import SFArgumentParser, GetFirstLine, SFArgFormatter
 from libsf.logutil import GetLogger, logargs
 from libsf.sfcluster import SFCluster
+from libsf.journalutil import BulkJournal
 from libsf.util import ValidateAndDefault, IPv4AddressType, OptionalValueType, ItemList, SolidFireIDType, PositiveIntegerType, BoolType, StrType
 from libsf import sfdefaults
 from libsf import SolidFireError, UnknownObjectError
@@ -24,6 +25,7 @@ from libsf import SolidFireError, UnknownObjectError
     "source_account_id" : (OptionalValueType(SolidFireIDType), None),
     "test" : (BoolType, False),
     "purge" : (BoolType, False),
+    "resume" : (OptionalValueType(StrType), None),
     "mvip" : (IPv4AddressType, sfdefaults.mvip),
     "username" : (StrType, sfdefaults.username),
     "password" : (StrType, sfdefaults.password),
@@ -37,6 +39,7 @@ def VolumeDelete(volume_names,
                   source_account_id,
                   test,
                   purge,
+                  resume,
                   mvip,
                   username,
                   password):
@@ -53,6 +56,7 @@ def VolumeDelete(volume_names,
         source_account_id:  add volumes from this account to the group
         test:               show the volumes that would be added but don't actually do it
         purge:              purge the deleted volumes
+        resume:             the journal of an interrupted run to resume
         mvip:               the management IP of the cluster
         username:           the admin user of the cluster
         password:           the admin password of the cluster
@@ -61,34 +65,67 @@ def VolumeDelete(volume_names,
 
     cluster = SFCluster(mvip, username, password)
 
-    # Get a list of volumes to delete
-    log.info("Searching for volumes")
-    try:
-        match_volumes = cluster.SearchForVolumes(volumeID=volume_ids, volumeName=volume_names, volumeRegex=volume_regex, volumePrefix=volume_prefix, accountName=source_account, accountID=source_account_id, volumeCount=volume_count)
-    except UnknownObjectError:
-        match_volumes = {}
-    except SolidFireError as e:
-        log.error("Failed to search for volumes: {}".format(e))
-        return False
+    if resume:
+        try:
+            journal = BulkJournal.Resume(resume, "volume_delete")
+        except SolidFireError as e:
+            log.error("Could not open journal: {}".format(e))
+            return False
+        purge = journal.params["purge"]
+    else:
+        # Get a list of volumes to delete
+        log.info("Searching for volumes")
+        try:
+            match_volumes = cluster.SearchForVolumes(volumeID=volume_ids, volumeName=volume_names, volumeRegex=volume_regex, volumePrefix=volume_prefix, accountName=source_account, accountID=source_account_id, volumeCount=volume_count)
+        except UnknownObjectError:
+            match_volumes = {}
+        except SolidFireError as e:
+            log.error("Failed to search for volumes: {}".format(e))
+            return False
 
-    if len(list(match_volumes.keys())) <= 0:
-        log.warning("No matching volumes")
-        return True
+        if len(list(match_volumes.keys())) <= 0:
+            log.warning("No matching volumes")
+            return True
 
-    log.info("{} volumes will be deleted: {}".format(len(list(match_volumes.keys())), ",".join(sorted([vol["name"] for vol in match_volumes.values()]))))
+        log.info("{} volumes will be deleted: {}".format(len(list(match_volumes.keys())), ",".join(sorted([vol["name"] for vol in match_volumes.values()]))))
 
-    if test:
-        log.warning("Test option set; volumes will not be deleted")
-        return True
+        if test:
+            log.warning("Test option set; volumes will not be deleted")
+            return True
 
-    log.info("Deleting {} volumes...".format(len(list(match_volumes.keys()))))
+        try:
+            journal = BulkJournal.Create("volume_delete", sorted(match_volumes.keys()), {"purge" : purge})
+        except SolidFireError as e:
+            log.error("Could not open journal: {}".format(e))
+            return False
+
+    # Any volume that was being deleted when the previous run stopped is finished if it is gone now
+    def CheckDeleted(volumeIDs):
+        remaining = set([vol["volumeID"] for vol in cluster.ListActiveVolumes()])
+        if purge:
+            remaining.update([vol["volumeID"] for vol in cluster.ListDeletedVolumes()])
+        return set(volumeIDs) - remaining
     try:
-        cluster.DeleteVolumes(volumeIDs=list(match_volumes.keys()), purge=purge)
+        journal.Reconcile(CheckDeleted)
     except SolidFireError as e:
-        log.error("Failed to delete volumes: {}".format(e))
+        log.error("Could not list volumes: {}".format(e))
         return False
+    delete_ids = [vol_id for vol_id, _ in journal.Remaining()]
+
+    log.info("Deleting {} volumes...".format(len(delete_ids)))
+    if delete_ids:
+        journal.Start(delete_ids)
+        try:
+            cluster.DeleteVolumes(volumeIDs=delete_ids, purge=purge)
+        except SolidFireError as e:
+            log.error("Failed to delete volumes: {}".format(e))
+            journal.Fail(delete_ids, e)
+            journal.Finish(False)
+            return False
+        journal.Complete(delete_ids)
+    journal.Finish(True)
 
-    log.passed("Successfully deleted {} volumes".format(len(list(match_volumes.keys()))))
+    log.passed("Successfully deleted {} volumes".format(len(delete_ids)))
     return True
 
 if __name__ == '__main__':
@@ -96,6 +133,7 @@ if __name__ == '__main__':
     parser.add_cluster_mvip_args()
     parser.add_volume_search_args("to delete")
     parser.add_argument("--purge", action="store_true", default=False, help="purge the volumes after deletion")
+    parser.add_resume_args()
     args = parser.parse_args_to_dict()
 
     app = PythonApp(VolumeDelete, args)
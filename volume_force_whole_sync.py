@@ -7,7 +7,7 @@ from libsf.apputil import PythonApp
 from libsf.argutil import SFArgumentParser, GetFirstLine, SFArgFormatter
 from libsf.logutil import GetLogger, logargs
 from libsf.sfcluster import SFCluster
-from libsf.util import ValidateAndDefault, IPv4AddressType, OptionalValueType, ItemList, SolidFireIDType, PositiveIntegerType, BoolType, StrType
+from libsf.util import ValidateAndDefault, IPv4AddressType, OptionalValueType, ItemList, SolidFireIDType, PositiveIntegerType, PositiveNonZeroIntegerType, BoolType, StrType
 from libsf import sfdefaults
 from libsf import threadutil
 from libsf import SolidFireError
@@ -24,6 +24,7 @@ from libsf import SolidFireError
     "source_account_id" : (OptionalValueType(SolidFireIDType), None),
     "test" : (BoolType, False),
     "wait" : (BoolType, False),
+    "sync_timeout" : (PositiveNonZeroIntegerType, 300),
     "mvip" : (IPv4AddressType, sfdefaults.mvip),
     "username" : (StrType, sfdefaults.username),
     "password" : (StrType, sfdefaults.password),
@@ -37,6 +38,7 @@ def VolumeForceWholeSync(volume_names,
                          source_account_id,
                          test,
                          wait,
+                         sync_timeout,
                          mvip,
                          username,
                          password):
@@ -53,6 +55,7 @@ def VolumeForceWholeSync(volume_names,
         source_account_id:  add volumes from this account to the group
         test:               show the volumes that would be added but don't actually do it
         wait:               wait for syncing to complete
+        sync_timeout:       when waiting, give up if no volume finishes syncing for this many seconds
         mvip:               the management IP of the cluster
         username:           the admin user of the cluster
         password:           the admin password of the cluster
@@ -84,10 +87,17 @@ def VolumeForceWholeSync(volume_names,
         log.warning("Test option set; no action will be taken")
         return True
 
+    # Get the slice placement for all of the volumes at once
+    try:
+        slice_services = cluster.GetVolumesSliceServices(list(match_volumes.keys()))
+    except SolidFireError as e:
+        log.error("Failed to get volume slice services: {}".format(e))
+        return False
+
     pool = threadutil.GlobalPool()
     results = []
     for volume_id in match_volumes.keys():
-        results.append(pool.Post(_VolumeThread, mvip, username, password, volume_id, wait))
+        results.append(pool.Post(_VolumeThread, mvip, username, password, volume_id, slice_services[volume_id]))
 
     allgood = True
     for idx, volume_id in enumerate(match_volumes.keys()):
@@ -98,6 +108,17 @@ def VolumeForceWholeSync(volume_names,
             allgood = False
             continue
 
+    # Wait for the whole set of volumes to finish syncing, polling once for all of them.  Volumes with no secondaries
+    # (single node clusters) were not synced and always look like they are syncing, so leave them out
+    wait_ids = [volume_id for volume_id in match_volumes.keys() if slice_services[volume_id]["secondaries"]]
+    if allgood and wait and wait_ids:
+        log.info("Waiting for {} volumes to sync".format(len(wait_ids)))
+        try:
+            cluster.WaitForVolumesSync(wait_ids, timeout=sync_timeout)
+        except SolidFireError as e:
+            log.error("  Error waiting for volumes to sync: {}".format(e))
+            allgood = False
+
     if allgood:
         log.passed("Successfully synced all volumes")
         return True
@@ -106,11 +127,11 @@ def VolumeForceWholeSync(volume_names,
         return False
 
 @threadutil.threadwrapper
-def _VolumeThread(mvip, username, password, volume_id, wait):
+def _VolumeThread(mvip, username, password, volume_id, slice_services):
     """Force syncing on a volume"""
     log = GetLogger()
     log.info("Forcing whole file sync on volume {}".format(volume_id))
-    SFCluster(mvip, username, password).ForceWholeFileSync(volume_id, wait)
+    SFCluster(mvip, username, password).ForceWholeFileSync(volume_id, sliceServices=slice_services)
 
 
 if __name__ == '__main__':
@@ -118,6 +139,7 @@ if __name__ == '__main__':
     parser.add_cluster_mvip_args()
     parser.add_volume_search_args("to force syncing on")
     parser.add_argument("--wait", action="store_true", default=False, help="wait for syncing to complete")
+    parser.add_argument("--sync-timeout", type=PositiveNonZeroIntegerType, default=300, metavar="SECONDS", help="when waiting, give up if no volume finishes syncing for this long")
     args = parser.parse_args_to_dict()
 
     app = PythonApp(VolumeForceWholeSync, args)
@@ -12,6 +12,7 @@ from libsf.util import ValidateAndDefault, IPv4AddressType, OptionalValueType, I
 from libsf import sfdefaults
 from libsf import threadutil
 from libsf import SolidFireError
+import functools
 
 @logargs
 @ValidateAndDefault({
@@ -93,20 +94,14 @@ def VolumeModify(property_name,
 
     log.info("Modifying volumes...")
     pool = threadutil.GlobalPool()
-    results = []
-    for volume in match_volumes.values():
-        log.info("  Setting {} on volume {}".format(property_name, volume["name"]))
-        results.append(pool.Post(_APICallThread, mvip, username, password, volume["volumeID"], property_name, property_value, post_value))
-
+    modify_func = functools.partial(_APICallThread, mvip, username, password, property_name, property_value, post_value)
     allgood = True
-    for idx, volume in enumerate(match_volumes.values()):
-        try:
-            
-            results[idx].Get()
-        except SolidFireError as e:
-            log.error("  Error modifying volume {}: {}".format(volume["name"], e))
-            allgood = False
-            continue
+    with threadutil.RunAtPriority(threadutil.PRIORITY_BULK), \
+         threadutil.ProgressReporter(pool.telemetry, "Modifying volumes", total=len(match_volumes)):
+        for volume_name, error in pool.ImapUnordered(modify_func, match_volumes.values()):
+            if error:
+                log.error("  Error modifying volume {}: {}".format(volume_name, error))
+                allgood = False
 
     if allgood:
         log.passed("Successfully set {} on all volumes".format(property_name))
@@ -116,20 +111,28 @@ def VolumeModify(property_name,
         return False
 
 @threadutil.threadwrapper
-def _APICallThread(mvip, username, password, volume_id, property_name, property_value, post_value):
+def _APICallThread(mvip, username, password, property_name, property_value, post_value, volume):
     """Modify a volume, run as a thread"""
+    log = GetLogger()
+    log.info("  Setting {} on volume {}".format(property_name, volume["name"]))
+    volume_id = volume["volumeID"]
 
-    # Make the change
-    vol = SFCluster(mvip, username, password).ModifyVolume(volume_id, {property_name : property_value})
+    try:
+        # Make the change
+        vol = SFCluster(mvip, username, password).ModifyVolume(volume_id, {property_name : property_value})
+
+        # Verify that the change was applied
+        if isinstance(post_value, dict):
+            for key, value in post_value.items():
+                if str(vol[property_name][key]) != str(value):
+                    raise SolidFireError("{} is not correct after modifying volume {} [expected={}, actual={}]".format(key, volume_id, value, vol[property_name][key]))
+        else:
+            if str(vol[property_name]) != str(post_value):
+                raise SolidFireError("{} is not correct after modifying volume {} [expected={}, actual={}]".format(property_name, volume_id, post_value, vol[property_name]))
+    except SolidFireError as e:
+        return volume["name"], e
 
-    # Verify that the change was applied
-    if isinstance(post_value, dict):
-        for key, value in post_value.items():
-            if str(vol[property_name][key]) != str(value):
-                raise SolidFireError("{} is not correct after modifying volume {} [expected={}, actual={}]".format(key, volume_id, value, vol[property_name][key]))
-    else:
-        if str(vol[property_name]) != str(post_value):
-            raise SolidFireError("{} is not correct after modifying volume {} [expected={}, actual={}]".format(property_name, volume_id, post_value, vol[property_name]))
+    return volume["name"], None
 
 
 if __name__ == '__main__':